@@ -146,7 +146,7 @@ Return as JSON: {{"posts": [{{"twitter": "...", "linkedin": "...", "category": "
 
         # Use LLM with system + user prompts
         full_prompt = f"{system_prompt}\n\n{user_prompt}"
-        result = self.llm.analyze_json(full_prompt)
+        result = self.llm.analyze_json(full_prompt, use_cache=False)  # Posts must be fresh
 
         # Handle different response formats from LLM
         posts = []
@@ -30,7 +30,8 @@ from typing import Optional
 from dotenv import load_dotenv
 
 from valuation_system.utils.llm_client import LLMClient
-from valuation_system.utils.config_loader import load_sectors_config, get_driver_hierarchy
+from valuation_system.utils.config_loader import get_driver_hierarchy
+from valuation_system.utils.sectors_config import get_sectors_model
 
 logger = logging.getLogger(__name__)
 
@@ -124,8 +125,9 @@ If this event does NOT suggest any new driver beyond the current list, return an
         self.mysql = mysql_client
         self.llm = llm_client or LLMClient()
 
-        # Load group config - try subgroup first, then group, follow primary_group reference
-        sectors_config = load_sectors_config()
+        # Load group config - try subgroup first, then group, follow primary_group reference.
+        # Shared compiled config (read-only here), no per-agent YAML parse.
+        sectors_config = get_sectors_model().raw
         self.config = self._resolve_group_config(sectors_config, valuation_group, valuation_subgroup)
         self.csv_group_name = self.config.get('csv_sector_name', valuation_group or '')
         self.hierarchy = get_driver_hierarchy(sectors_config)
@@ -311,7 +313,7 @@ If this event does NOT suggest any new driver beyond the current list, return an
             subgroup_drivers=subgroup_drivers_text,
         )
 
-        return self.llm.analyze_json(prompt)
+        return self.llm.analyze_json(prompt, call_site='group_driver_impact')
 
     def _apply_driver_change(self, change: dict, source_event: dict):
         """Apply a driver change to state and log it."""
@@ -8,14 +8,20 @@ Edge Cases Handled:
 - Internet unavailable → Skip scan, queue for catchup
 - Source unreachable → Skip that source, continue others
 - Duplicate detection → Deduplicate by headline similarity
-- Rate limiting → Exponential backoff per source
+- Rate limiting → Exponential backoff per source, per-host concurrency cap
+- Slow source → Per-source time budget from submit; late sources are dropped,
+  not waited on, and their feed validators are discarded
+- Unchanged feed → Conditional GET (ETag/Last-Modified), 304 skips parsing
 - Machine was off → Catchup scan for missed period
 """
 
 import os
 import re
 import hashlib
+import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta
 from email.utils import parsedate_to_datetime
 from typing import Optional
@@ -30,11 +36,29 @@ from valuation_system.utils.resilience import (
     retry_with_backoff, check_internet, safe_task_run
 )
 from valuation_system.utils.structured_logger import StructuredLogger
+from valuation_system.utils.http_fetcher import ConcurrentFetcher
+from valuation_system.utils.minhash_index import MinHashLSHIndex
+from valuation_system.utils.company_matcher import get_company_matcher
 
 logger = logging.getLogger(__name__)
 
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
 
+# Per-source scan budget, counted from submit; a source still running after it is dropped
+SOURCE_BUDGET_SECONDS = float(os.getenv('NEWS_SOURCE_BUDGET_SECONDS', 45))
+SOURCE_WORKERS = int(os.getenv('NEWS_SOURCE_WORKERS', 8))
+
+# Batched classification: items per LLM call are capped by count and by estimated prompt tokens
+CLASSIFY_BATCH_SIZE = int(os.getenv('NEWS_CLASSIFY_BATCH_SIZE', 8))
+CLASSIFY_BATCH_TOKENS = int(os.getenv('NEWS_CLASSIFY_BATCH_TOKENS', 6000))
+CLASSIFY_CONCURRENCY = int(os.getenv('NEWS_CLASSIFY_CONCURRENCY', 3))
+CLASSIFY_OUTPUT_TOKENS_PER_ITEM = 350
+
+# Persistent near-duplicate index over the last 24h of stored headlines
+DEDUP_INDEX_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'cache', 'news_dedup_lsh.db')
+DEDUP_WINDOW_HOURS = 24
+COMPANY_DEDUP_THRESHOLD = 0.20  # Stricter threshold when the same company is mentioned
+
 # ---------------------------------------------------------------------------
 # Semantic dedup helpers (module-level)
 # ---------------------------------------------------------------------------
@@ -70,7 +94,7 @@ class NewsScannerAgent:
     5. Microsoft Teams channel (internal research posts)
 
     Flow:
-    scan_all_sources() → classify_news() → deduplicate() → store()
+    scan_all_sources() → deduplicate() → classify_and_store() (batched classify → store)
     """
 
     NEWS_SOURCES = [
@@ -164,6 +188,30 @@ Classify with:
 
 Return as JSON."""
 
+    # Batched variant: static context (watchlist + schema) lives in the system
+    # prompt so it is sent once per batch instead of once per article.
+    CLASSIFICATION_SYSTEM_PROMPT = """You are an equity research analyst classifying news for valuation purposes.
+Respond ONLY with valid JSON.
+
+WATCHED COMPANIES: {watched_companies}
+WATCHED SECTORS: {watched_sectors}
+
+For each article, classify with:
+1. category: One of REGULATORY, MANAGEMENT, PRODUCT, MA, MACRO, COMPETITOR, GOVERNANCE, EARNINGS, POLICY
+2. severity: CRITICAL (immediate valuation impact >5%), HIGH (>2%), MEDIUM (1-2%), LOW (<1%)
+3. affected_companies: List of NSE symbols affected (from watched list, or empty)
+4. affected_sectors: List of sectors affected
+5. scope: MACRO (affects all), SECTOR (affects sector), COMPANY (affects specific company)
+6. valuation_impact_pct: Estimated impact on intrinsic value (-10 to +10)
+7. drivers_affected: Array of objects with driver details:
+   [{{"driver": "revenue_growth", "level": "GROUP", "impact_pct": -3.0}},
+    {{"driver": "cost_of_capital", "level": "MACRO", "impact_pct": +1.5}}]
+   level = MACRO/GROUP/SUBGROUP/COMPANY. impact_pct = estimated % impact on that driver.
+8. summary: 2-sentence summary for quick reference
+9. key_data_points: Any specific numbers mentioned (revenue, %, dates)"""
+
+    BATCH_ITEM_TEMPLATE = "Headline: {headline}\nContent: {content}\nSource: {source}"
+
     def __init__(self, mysql_client, llm_client: LLMClient = None,
                  state_manager: RunStateManager = None):
         self.mysql = mysql_client
@@ -171,6 +219,8 @@ Return as JSON."""
         self.state = state_manager or RunStateManager()
         self.degradation = GracefulDegradation()
         self.slog = StructuredLogger('NewsScannerAgent', logger, mysql_client)
+        self.fetcher = ConcurrentFetcher()
+        self._source_ctx = threading.local()
 
         # Load watchlist
         self._watched_companies = self._load_watchlist()
@@ -178,9 +228,15 @@ Return as JSON."""
 
         # Build fast lookup set for relevance checking (lowercase symbols)
         self._watched_symbols_lower = set(s.lower() for s in self._watched_companies if s)
+        self._classification_system_prompt = self.CLASSIFICATION_SYSTEM_PROMPT.format(
+            watched_companies=', '.join(self._watched_companies),
+            watched_sectors=', '.join(self._watched_sectors),
+        )
 
         # Seen headlines for dedup: load from DB on init for persistent dedup
         self._seen_headlines = self._load_seen_headlines()
+        self._dedup_index = None  # Opened lazily on first dedup
+        self._event_index = None  # Local event timeline index, opened on first store
 
     def _load_seen_headlines(self) -> set:
         """Load headline hashes from recent vs_event_timeline entries for persistent dedup."""
@@ -242,15 +298,15 @@ Return as JSON."""
 
     def scan_all_sources(self, catchup_hours: int = None) -> list:
         """
-        Scan all news sources. Handles:
+        Scan all news sources concurrently. Handles:
         - No internet: Returns empty, queues catchup
         - Individual source failure: Continues with others
+        - Source over budget: Dropped for this cycle (NEWS_SOURCE_BUDGET_SECONDS)
         - Catchup mode: Scans for missed period
 
         Args:
             catchup_hours: If set, scan for news from last N hours (for catchup)
         """
-        import time
         cycle_start = time.time()
         self.slog.log_cycle_start('news_scan')
 
@@ -267,32 +323,37 @@ Return as JSON."""
         all_articles = []
         search_terms = self._build_search_terms()
 
+        executor = ThreadPoolExecutor(max_workers=min(SOURCE_WORKERS, len(self.NEWS_SOURCES)),
+                                      thread_name_prefix='news-source')
+        pending = {}
         for source in self.NEWS_SOURCES:
-            source_start = time.time()
-            try:
-                articles = self._scan_source(source, search_terms, catchup_hours)
-                all_articles.extend(articles)
-                source_elapsed = (time.time() - source_start) * 1000
-
-                # Structured log per-source metrics
-                self.slog.log_source_scan(
-                    source=source['name'],
-                    articles_found=len(articles),
-                    significant_events=sum(1 for a in articles if a.get('severity') in ('CRITICAL', 'HIGH')),
-                    elapsed_ms=source_elapsed
-                )
-
-                logger.info(f"Scanned {source['name']}: {len(articles)} articles in {source_elapsed:.0f}ms")
-            except Exception as e:
-                logger.error(f"Failed to scan {source['name']}: {e}", exc_info=True)
-                self.slog.log_error('source_scan_failed', str(e), source=source['name'])
-                continue
+            deadline = time.monotonic() + SOURCE_BUDGET_SECONDS
+            future = executor.submit(self._timed_scan_source, source, search_terms,
+                                     catchup_hours, deadline)
+            pending[future] = (source, deadline)
+
+        # Consume results in completion order; logging and MySQL stay on this thread
+        while pending:
+            now = time.monotonic()
+            for future, (source, deadline) in list(pending.items()):
+                if deadline <= now and not future.done():
+                    del pending[future]
+                    self._drop_source(source, future)
+            if not pending:
+                break
+            remaining = min(deadline for _, deadline in pending.values()) - now
+            done, _ = wait(pending, timeout=max(remaining, 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                source, _ = pending.pop(future)
+                self._collect_source_result(source, future, all_articles)
+        executor.shutdown(wait=False)
 
         # Deduplicate
         unique = self._deduplicate(all_articles)
         cycle_elapsed = (time.time() - cycle_start) * 1000
 
-        logger.info(f"News scan complete: {len(all_articles)} raw → {len(unique)} unique")
+        logger.info(f"News scan complete: {len(all_articles)} raw → {len(unique)} unique "
+                    f"({self.fetcher.stats['not_modified']} feeds unchanged)")
 
         # Structured log cycle summary
         self.slog.log_cycle_complete(
@@ -308,17 +369,71 @@ Return as JSON."""
 
         return unique
 
+    @property
+    def _scan_deadline(self):
+        """time.monotonic() deadline of the source scan running on this thread, or None."""
+        return getattr(self._source_ctx, 'deadline', None)
+
+    def _timed_scan_source(self, source: dict, search_terms: list,
+                           catchup_hours: int = None, deadline: float = None) -> tuple:
+        """Worker-thread wrapper: (articles, elapsed_ms)."""
+        source_start = time.time()
+        self._source_ctx.deadline = deadline
+        try:
+            articles = self._scan_source(source, search_terms, catchup_hours)
+        finally:
+            self._source_ctx.deadline = None
+        return articles, (time.time() - source_start) * 1000
+
+    def _drop_source(self, source: dict, future):
+        """
+        Give up on a source past its budget. Its thread may still be running, but
+        its fetches stop at the deadline and the fetcher won't stage anything
+        that lands after it, so only what's already staged needs discarding.
+        """
+        future.cancel()
+        if source.get('base_url'):
+            self.fetcher.discard_validators(prefix=source['base_url'])
+        logger.warning(f"Source {source['name']} exceeded {SOURCE_BUDGET_SECONDS:.0f}s scan budget, skipped")
+        self.slog.log_error('source_scan_timeout', f"Exceeded {SOURCE_BUDGET_SECONDS:.0f}s budget",
+                            source=source['name'])
+
+    def _collect_source_result(self, source: dict, future, all_articles: list):
+        """Log one finished source scan and merge its articles."""
+        try:
+            articles, source_elapsed = future.result()
+        except Exception as e:
+            logger.error(f"Failed to scan {source['name']}: {e}", exc_info=True)
+            self.slog.log_error('source_scan_failed', str(e), source=source['name'])
+            return
+
+        all_articles.extend(articles)
+
+        # Structured log per-source metrics
+        self.slog.log_source_scan(
+            source=source['name'],
+            articles_found=len(articles),
+            significant_events=sum(1 for a in articles if a.get('severity') in ('CRITICAL', 'HIGH')),
+            elapsed_ms=source_elapsed
+        )
+
+        logger.info(f"Scanned {source['name']}: {len(articles)} articles in {source_elapsed:.0f}ms")
+
     def classify_and_store(self, articles: list) -> list:
         """
         Classify articles by severity and store significant ones.
+        Articles are classified in token-budgeted batches (bounded concurrency);
+        any article whose batch result is missing or malformed is retried alone.
         Returns list of classified articles with severity >= MEDIUM.
         """
         significant = []
+        lost = 0
+        classifications = self._classify_batched(articles)
 
-        for article in articles:
+        for article, classified in zip(articles, classifications):
             try:
-                classified = self.classify_news(article)
                 if not classified or classified.get('error'):
+                    lost += 1
                     continue
 
                 # Merge original article data with classification
@@ -333,14 +448,24 @@ Return as JSON."""
                 # Store all MEDIUM+ severity events
                 severity = classified.get('severity', 'LOW')
                 if severity in ('CRITICAL', 'HIGH', 'MEDIUM'):
-                    self._store_event(classified)
+                    if not self._store_event(classified):
+                        lost += 1
                     significant.append(classified)
 
             except Exception as e:
                 logger.error(f"Failed to classify article '{article.get('headline', '')[:50]}': {e}",
                              exc_info=True)
+                lost += 1
                 continue
 
+        # Feed validators move forward only once every item is stored (or queued for retry);
+        # otherwise the next conditional GET would 304 past the lost items
+        if lost:
+            logger.warning(f"{lost} articles not classified/stored, feeds will be re-fetched next cycle")
+            self.fetcher.discard_validators()
+        else:
+            self.fetcher.save_validators()
+
         logger.info(f"Classified {len(articles)} articles, {len(significant)} significant")
         return significant
 
@@ -356,7 +481,98 @@ Return as JSON."""
             watched_sectors=', '.join(self._watched_sectors),
         )
 
-        return self.llm.analyze_json(prompt)
+        return self.llm.analyze_json(prompt, call_site='news_classification')
+
+    # =========================================================================
+    # BATCHED CLASSIFICATION
+    # =========================================================================
+
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """Rough token count (~4 chars/token) — only used for batch sizing."""
+        return len(text) // 4 + 1
+
+    def _build_classification_batches(self, articles: list) -> list:
+        """
+        Group article indices into batches bounded by CLASSIFY_BATCH_SIZE items
+        and CLASSIFY_BATCH_TOKENS estimated prompt tokens. Returns [(indices, texts)].
+        """
+        batches = []
+        indices, texts, tokens = [], [], 0
+        for i, article in enumerate(articles):
+            text = self.BATCH_ITEM_TEMPLATE.format(
+                headline=article.get('headline', ''),
+                content=article.get('content', '')[:2000],
+                source=article.get('source', ''),
+            )
+            cost = self._estimate_tokens(text)
+            if indices and (len(indices) >= CLASSIFY_BATCH_SIZE or tokens + cost > CLASSIFY_BATCH_TOKENS):
+                batches.append((indices, texts))
+                indices, texts, tokens = [], [], 0
+            indices.append(i)
+            texts.append(text)
+            tokens += cost
+        if indices:
+            batches.append((indices, texts))
+        return batches
+
+    @staticmethod
+    def _is_valid_classification(result) -> bool:
+        return isinstance(result, dict) and not result.get('error') and 'severity' in result
+
+    def _classify_batch(self, articles: list, indices: list, texts: list) -> list:
+        """Classify one batch; items without a usable result fall back to single calls."""
+        results = [None] * len(indices)
+        if len(indices) > 1:
+            results = self.llm.batch_analyze(
+                texts,
+                system_prompt=self._classification_system_prompt,
+                instruction="Classify each of the following news articles:",
+                temperature=0.1,
+                max_tokens=min(8000, CLASSIFY_OUTPUT_TOKENS_PER_ITEM * len(indices) + 200),
+                call_site='news_classification',
+            )
+
+        for pos, article_idx in enumerate(indices):
+            if self._is_valid_classification(results[pos]):
+                continue
+            if len(indices) > 1:
+                logger.debug(f"Batch result unusable for article {article_idx}, classifying individually")
+            try:
+                results[pos] = self.classify_news(articles[article_idx])
+            except Exception as e:
+                logger.error(f"Failed to classify article "
+                             f"'{articles[article_idx].get('headline', '')[:50]}': {e}")
+                results[pos] = None
+        return results
+
+    def _classify_batched(self, articles: list) -> list:
+        """Classify all articles; returns a list aligned with the input."""
+        if not articles:
+            return []
+
+        batches = self._build_classification_batches(articles)
+        classifications = [None] * len(articles)
+        start = time.time()
+
+        with ThreadPoolExecutor(max_workers=max(1, CLASSIFY_CONCURRENCY),
+                                thread_name_prefix='news-classify') as executor:
+            futures = {
+                executor.submit(self._classify_batch, articles, indices, texts): indices
+                for indices, texts in batches
+            }
+            for future, indices in futures.items():
+                try:
+                    batch_results = future.result()
+                except Exception as e:
+                    logger.error(f"Classification batch failed: {e}", exc_info=True)
+                    continue
+                for article_idx, result in zip(indices, batch_results):
+                    classifications[article_idx] = result
+
+        logger.info(f"Classified {len(articles)} articles in {len(batches)} batches "
+                    f"({time.time() - start:.1f}s)")
+        return classifications
 
     def run_catchup(self) -> dict:
         """
@@ -450,16 +666,17 @@ Return as JSON."""
             logger.error(f"Teams channel scan failed: {e}", exc_info=True)
             return []
 
-    @retry_with_backoff(max_retries=2, base_delay=3.0, exceptions=(requests.RequestException,))
+    @retry_with_backoff(max_retries=2, base_delay=3.0, exceptions=(requests.RequestException,),
+                        deadline_attr='_scan_deadline')
     def _scan_web(self, source: dict) -> list:
         """Scrape a web news source."""
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) '
-                          'AppleWebKit/537.36 (KHTML, like Gecko) '
-                          'Chrome/120.0.0.0 Safari/537.36'
-        }
-        resp = requests.get(source['base_url'], headers=headers, timeout=30)
-        resp.raise_for_status()
+        resp = self.fetcher.get(source['base_url'], timeout=30, deadline=self._scan_deadline)
+        if resp.not_modified:
+            return []
+        if resp.error:
+            raise requests.RequestException(resp.error)
+        if not resp.ok:
+            raise requests.HTTPError(f"HTTP {resp.status} for {source['base_url']}")
 
         soup = BeautifulSoup(resp.text, 'html.parser')
         articles = []
@@ -484,7 +701,8 @@ Return as JSON."""
 
         return articles
 
-    @retry_with_backoff(max_retries=2, base_delay=3.0, exceptions=(requests.RequestException,))
+    @retry_with_backoff(max_retries=2, base_delay=3.0, exceptions=(requests.RequestException,),
+                        deadline_attr='_scan_deadline')
     def _scan_rss(self, source: dict, search_terms: list) -> list:
         """
         Scan RSS feeds for news articles.
@@ -501,16 +719,20 @@ Return as JSON."""
         return self._scan_direct_rss(source)
 
     def _scan_google_news_rss(self, source: dict, search_terms: list) -> list:
-        """Scan Google News RSS with company/sector search terms."""
+        """Scan Google News RSS with company/sector search terms (fetched concurrently)."""
         articles = []
 
-        for term in search_terms[:10]:  # Limit to avoid rate limits
-            url = f"{source['base_url']}{term}&hl=en-IN&gl=IN&ceid=IN:en"
-            try:
-                resp = requests.get(url, timeout=15)
-                if resp.status_code != 200:
-                    continue
+        terms = search_terms[:10]  # Limit to avoid rate limits
+        urls = [f"{source['base_url']}{term}&hl=en-IN&gl=IN&ceid=IN:en" for term in terms]
+        responses = self.fetcher.get_many(urls, timeout=15, deadline=self._scan_deadline)
 
+        for term, resp in zip(terms, responses):
+            if resp.error:
+                logger.warning(f"RSS scan failed for term '{term}': {resp.error}")
+                continue
+            if not resp.ok:  # includes 304 Not Modified: nothing new for this term
+                continue
+            try:
                 soup = BeautifulSoup(resp.text, 'xml')
                 for item in soup.find_all('item', limit=10):
                     title = item.find('title')
@@ -547,10 +769,14 @@ Return as JSON."""
         articles = []
 
         try:
-            response = requests.get(source['base_url'], timeout=15, headers={
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-            })
-            response.raise_for_status()
+            response = self.fetcher.get(source['base_url'], timeout=15, deadline=self._scan_deadline)
+            if response.not_modified:
+                logger.debug(f"{source['name']} feed unchanged since last scan")
+                return articles
+            if response.error:
+                raise requests.RequestException(response.error)
+            if not response.ok:
+                raise requests.HTTPError(f"HTTP {response.status}")
 
             # Parse RSS/Atom feed
             soup = BeautifulSoup(response.text, 'xml')
@@ -660,13 +886,22 @@ Return as JSON."""
             if kw in headline_lower:
                 return True
 
+        # Watched company mentioned by name/alias rather than symbol
+        matcher = get_company_matcher(self.mysql)
+        if matcher:
+            for match in matcher.match_companies(headline):
+                if match.confidence >= 0.8 and match.symbol.lower() in self._watched_symbols_lower:
+                    return True
+
         return False
 
     def _deduplicate(self, articles: list) -> list:
         """Deduplicate articles by headline hash + semantic similarity.
         Pass 1: Exact MD5 dedup (existing persistent check).
         Pass 2: Semantic dedup within 24h window (not just current batch).
-        Pass 3: Company-aware dedup (same company + similar headline = likely duplicate)."""
+        Pass 3: Company-aware dedup (same company + similar headline = likely duplicate).
+        Similarity lookups go through MinHash-LSH indexes (batch + persistent 24h),
+        so cost per article doesn't grow with the window size."""
         # Pass 1: Exact MD5 dedup
         md5_unique = []
         for article in articles:
@@ -679,87 +914,108 @@ Return as JSON."""
         # Pass 2: Semantic dedup against last 24h of headlines (stricter threshold)
         threshold = float(os.getenv('NEWS_SEMANTIC_DEDUP_THRESHOLD', '0.25'))  # Lowered from 0.4
 
-        # Load recent headlines from DB (last 24h) for cross-batch dedup
-        recent_headlines = self._load_recent_headlines_24h()
+        # Persistent index of stored headlines (last 24h) for cross-batch dedup
+        recent_index = self._recent_headline_index()
 
-        kept = []
-        for article in md5_unique:
+        batch_index = MinHashLSHIndex()
+        kept = {}  # key -> article, in keep order
+        for seq, article in enumerate(md5_unique):
             words = _headline_words(article.get('headline', ''))
+            key = str(seq)
             is_dup = False
 
-            # Check against current batch (fast, in-memory)
-            for existing in kept:
-                existing_words = _headline_words(existing.get('headline', ''))
-                if _jaccard(words, existing_words) > threshold:
-                    is_dup = True
-                    # Keep the one with longer content
-                    if len(article.get('content', '')) > len(existing.get('content', '')):
-                        kept.remove(existing)
-                        kept.append(article)
-                    break
+            # Check against current batch (in-memory index)
+            matches = batch_index.query(words, threshold)
+            if matches:
+                is_dup = True
+                # Same pick as a scan over kept: the earliest kept article that matches
+                existing_key = min(matches, key=lambda m: m[2]['order'])[0]
+                existing = kept[existing_key]
+                # Keep the one with longer content
+                if len(article.get('content', '')) > len(existing.get('content', '')):
+                    del kept[existing_key]
+                    batch_index.remove(existing_key)
+                    kept[key] = article
+                    batch_index.add(key, words, {'order': seq})
 
             # Pass 3: Check against last 24h in DB (company-aware dedup)
-            if not is_dup:
-                is_dup = self._is_duplicate_in_recent(article, words, recent_headlines, threshold)
+            if not is_dup and recent_index is not None:
+                is_dup = self._is_duplicate_in_recent(article, words, recent_index, threshold)
 
             if not is_dup:
-                kept.append(article)
+                kept[key] = article
+                batch_index.add(key, words, {'order': seq})
 
+        kept = list(kept.values())
         if len(md5_unique) != len(kept):
             logger.info(f"Semantic dedup: {len(md5_unique)} → {len(kept)} "
                         f"(removed {len(md5_unique) - len(kept)} similar)")
         return kept
 
-    def _load_recent_headlines_24h(self) -> list:
-        """Load headlines from last 24h for cross-batch semantic dedup."""
+    def _recent_headline_index(self) -> Optional[MinHashLSHIndex]:
+        """
+        Open (once) and sync the persistent LSH index of stored headlines.
+        Only events newer than the last synced id are read from MySQL.
+        """
+        try:
+            if self._dedup_index is None:
+                self._dedup_index = MinHashLSHIndex(
+                    db_path=os.getenv('NEWS_DEDUP_INDEX_PATH', DEDUP_INDEX_PATH),
+                    window_hours=DEDUP_WINDOW_HOURS)
+            index = self._dedup_index
+        except Exception as e:
+            logger.warning(f"Dedup index unavailable, skipping cross-batch dedup: {e}")
+            return None
+
+        index.evict_before(time.time() - DEDUP_WINDOW_HOURS * 3600)
         try:
+            last_id = int(index.get_state('last_event_id', 0))
             rows = self.mysql.query("""
-                SELECT headline, search_query, company_id
+                SELECT id, headline, UNIX_TIMESTAMP(event_timestamp) AS ts
                 FROM vs_event_timeline
-                WHERE event_timestamp >= DATE_SUB(NOW(), INTERVAL 24 HOUR)
-                ORDER BY event_timestamp DESC
-            """)
-            return rows if rows else []
+                WHERE id > %s AND event_timestamp >= DATE_SUB(NOW(), INTERVAL 24 HOUR)
+                ORDER BY id
+            """, (last_id,))
+            if rows:
+                index.add_many(self._dedup_entry(r['id'], r.get('headline'), r.get('ts')) for r in rows)
+                index.set_state('last_event_id', max(int(r['id']) for r in rows))
+                logger.debug(f"Dedup index synced {len(rows)} new events ({len(index)} in window)")
         except Exception as e:
-            logger.debug(f"Failed to load recent headlines for dedup: {e}")
-            return []
+            logger.debug(f"Failed to sync dedup index from vs_event_timeline: {e}")
+        return index
+
+    @staticmethod
+    def _dedup_entry(event_id, headline: str, ts=None) -> tuple:
+        """(key, tokens, meta, ts) tuple for the persistent dedup index."""
+        return (f"event:{event_id}", _headline_words(headline), {'headline': headline or ''},
+                float(ts) if ts is not None else None)
+
+    def _headline_symbols(self, headline: str) -> set:
+        """Watched symbols that appear as whole words in the headline."""
+        return self._watched_symbols_lower & set((headline or '').lower().split())
 
     def _is_duplicate_in_recent(self, article: dict, article_words: set,
-                                recent_headlines: list, threshold: float) -> bool:
+                                recent_index: MinHashLSHIndex, threshold: float) -> bool:
         """
         Check if article is duplicate of any recent headline.
         Company-aware: if same company mentioned, use stricter threshold (0.20).
         """
         article_hl = article.get('headline', '').lower()
+        article_companies = self._headline_symbols(article_hl)
 
-        # Extract company symbols from article headline
-        article_companies = set()
-        for sym in self._watched_symbols_lower:
-            if sym in article_hl.split():
-                article_companies.add(sym)
-
-        for recent in recent_headlines:
-            recent_words = _headline_words(recent.get('headline', ''))
-            if not recent_words:
-                continue
-
-            # Company-specific dedup: stricter threshold if same company
-            recent_hl = (recent.get('headline') or '').lower()
-            recent_companies = set()
-            for sym in self._watched_symbols_lower:
-                if sym in recent_hl.split():
-                    recent_companies.add(sym)
+        candidates = recent_index.query(article_words, min(threshold, COMPANY_DEDUP_THRESHOLD))
+        for _, similarity, meta in candidates:
+            recent_hl = (meta.get('headline') or '').lower()
 
             # Same company + similar headline = likely duplicate
-            if article_companies & recent_companies:  # Intersection
-                company_threshold = 0.20  # Stricter for same company
-                if _jaccard(article_words, recent_words) > company_threshold:
-                    logger.debug(f"Company-specific dedup: '{article_hl[:60]}...' similar to "
-                                f"'{recent_hl[:60]}...' (companies: {article_companies & recent_companies})")
-                    return True
+            shared = article_companies & self._headline_symbols(recent_hl)
+            if shared and similarity > COMPANY_DEDUP_THRESHOLD:
+                logger.debug(f"Company-specific dedup: '{article_hl[:60]}...' similar to "
+                            f"'{recent_hl[:60]}...' (companies: {shared})")
+                return True
 
             # General semantic dedup
-            if _jaccard(article_words, recent_words) > threshold:
+            if similarity > threshold:
                 logger.debug(f"General semantic dedup: '{article_hl[:60]}...' similar to '{recent_hl[:60]}...'")
                 return True
 
@@ -835,6 +1091,7 @@ Return as JSON."""
         """
         Extract company_id from headline by matching company names/symbols.
         Used as fallback when scope=COMPANY but affected_companies is empty.
+        Uses the shared Aho-Corasick matcher over the full company universe.
 
         Returns:
             company_id (int) if found, None otherwise
@@ -843,52 +1100,34 @@ Return as JSON."""
             return None
 
         try:
-            # Get all companies from marketscrip (active companies only)
-            companies = self.mysql.query("""
-                SELECT marketscrip_id, symbol, name
-                FROM mssdb.kbapp_marketscrip
-                WHERE scrip_type IN ('', 'EQS')
-                  AND symbol IS NOT NULL
-                  AND symbol != ''
-                  AND name IS NOT NULL
-                ORDER BY LENGTH(name) DESC
-                LIMIT 1000
-            """)
-
-            headline_upper = headline.upper()
-
-            # Try exact symbol match first (faster)
-            for company in companies:
-                symbol = company.get('symbol', '')
-                if symbol and symbol.upper() in headline_upper:
-                    # Verify it's a word boundary (not part of another word)
-                    import re
-                    pattern = r'\b' + re.escape(symbol.upper()) + r'\b'
-                    if re.search(pattern, headline_upper):
-                        logger.debug(f"Matched company by symbol: {symbol} -> {company['marketscrip_id']}")
-                        return company['marketscrip_id']
-
-            # Try company name match (partial match, at least 60% of name)
-            for company in companies:
-                name = company.get('name', '')
-                if not name or len(name) < 5:
-                    continue
-
-                # Extract main company name (before "Limited", "Ltd", etc.)
-                name_parts = name.replace(' Limited', '').replace(' Ltd', '').replace(' Pvt', '')
-                name_clean = name_parts.split()[0] if name_parts else name
-
-                if len(name_clean) >= 5 and name_clean.upper() in headline_upper:
-                    logger.debug(f"Matched company by name: {name_clean} -> {company['marketscrip_id']}")
-                    return company['marketscrip_id']
-
+            matcher = get_company_matcher(self.mysql)
+            match = matcher.best(headline) if matcher else None
+            if match:
+                logger.debug(f"Matched company by {match.kind} '{headline[match.start:match.end]}' "
+                             f"-> {match.company_id} (confidence {match.confidence})")
+                return match.company_id
         except Exception as e:
             logger.debug(f"Failed to extract company from headline: {e}")
 
         return None
 
-    def _store_event(self, classified: dict):
-        """Store a classified news event in MySQL with LLM metadata and semantic grouping."""
+    def _index_event(self, event: dict):
+        """Add a stored event to the local event timeline index (best effort)."""
+        if os.getenv('EVENT_INDEX_ENABLED', '1') != '1':
+            return
+        try:
+            if self._event_index is None:
+                from valuation_system.utils.event_index import EventTimelineIndex
+                self._event_index = EventTimelineIndex()
+            self._event_index.add_events([event])
+        except Exception as e:
+            logger.debug(f"Event index update skipped for event {event.get('id')}: {e}")
+
+    def _store_event(self, classified: dict) -> bool:
+        """
+        Store a classified news event in MySQL with LLM metadata and semantic grouping.
+        Returns False only if the event was lost (not stored and not queued for retry).
+        """
         try:
             # Find company_id if specific company affected
             company_id = None
@@ -946,7 +1185,19 @@ Return as JSON."""
                 logger.error("Failed to insert event into vs_event_timeline, no row ID returned | "
                              "headline=%s | scope=%s | severity=%s",
                              classified.get('headline', '')[:80], scope, severity)
-                return
+                return False
+
+            if self._dedup_index is not None:
+                self._dedup_index.add(*self._dedup_entry(new_id, classified.get('headline', '')[:500]))
+
+            self._index_event({
+                'id': new_id, 'event_date': event_date, 'company_id': company_id,
+                'scope': scope, 'sector': sector, 'severity': severity,
+                'source': classified.get('source', ''), 'event_type': 'NEWS',
+                'headline': classified.get('headline', '')[:500],
+                'summary': classified.get('summary', ''),
+                'grok_synopsis': classified.get('summary', ''),
+            })
 
             # Layer 2: Cross-run semantic grouping
             group_id = self._find_semantic_group(
@@ -969,3 +1220,4 @@ Return as JSON."""
                 'type': 'store_event',
                 'data': classified,
             })
+        return True
@@ -65,8 +65,15 @@ class OrchestratorAgent:
     - Catchup: Fill gaps from downtime
     """
 
-    def __init__(self):
-        """Initialize all components. Handles service unavailability gracefully."""
+    def __init__(self, core_loader: CoreDataLoader = None,
+                 price_loader: PriceLoader = None,
+                 damodaran_loader: DamodaranLoader = None):
+        """
+        Initialize all components. Handles service unavailability gracefully.
+
+        Loaders may be passed in by a long-lived host (webhook worker mode)
+        so the CSVs are read once and shared across jobs.
+        """
         self.state = RunStateManager()
         self.degradation = GracefulDegradation()
         self.llm = LLMClient()
@@ -79,9 +86,9 @@ class OrchestratorAgent:
         self.deps = check_dependencies()
 
         # Initialize data loaders (always available - file-based)
-        self.core_loader = CoreDataLoader()
-        self.price_loader = PriceLoader()
-        self.damodaran_loader = DamodaranLoader()
+        self.core_loader = core_loader or CoreDataLoader()
+        self.price_loader = price_loader or PriceLoader()
+        self.damodaran_loader = damodaran_loader or DamodaranLoader()
 
         # Initialize MySQL client (may fail if MySQL is down)
         self.mysql = None
@@ -157,6 +164,20 @@ class OrchestratorAgent:
         logger.info(f"Active sectors: {list(self.active_sectors.keys())}")
         logger.info(f"Active companies: {list(self.active_companies.keys())}")
 
+    def swap_data_loaders(self, core_loader: CoreDataLoader,
+                          price_loader: PriceLoader,
+                          damodaran_loader: DamodaranLoader):
+        """Point this orchestrator at freshly reloaded data (warm worker mode)."""
+        self.core_loader = core_loader
+        self.price_loader = price_loader
+        self.damodaran_loader = damodaran_loader
+        if self.valuator:
+            self.valuator = ValuatorAgent(
+                self.core_loader, self.price_loader, self.damodaran_loader,
+                self.mysql
+            )
+        logger.info("Orchestrator data loaders swapped")
+
     # =========================================================================
     # HOURLY CYCLE
     # =========================================================================
@@ -1222,8 +1243,10 @@ class OrchestratorAgent:
         if not self.valuator:
             return {'error': 'Valuator not initialized (MySQL may be down)'}
 
+        # No Excel report on this path, so skip the Computation Log trace
         val_result = self.valuator.run_full_valuation(
-            company_config, sector_outlook, sector_config, overrides
+            company_config, sector_outlook, sector_config, overrides,
+            capture_trace=False
         )
 
         # Store result
@@ -20,14 +20,25 @@ Edge Cases:
 - LLM call fails -> Log with traceback, continue to next company
 - Empty event timeline -> Return early with summary, zero fills
 - Driver already filled (race condition) -> Skip, do not overwrite
+- Batch interrupted -> next run_batch resumes after the last company written in order
+
+Config (.env):
+    QUALITATIVE_RETRIEVAL_WORKERS=4       # news/driver retrieval threads
+    QUALITATIVE_LLM_WORKERS=6             # concurrent LLM assessments (provider caps still apply)
+    QUALITATIVE_WRITE_BATCH=50            # driver assessments per bulk write
+    QUALITATIVE_WRITE_FLUSH_SECONDS=2
+    QUALITATIVE_CHECKPOINT_MAX_AGE_HOURS=24
 """
 
 import os
 import sys
 import json
 import time
+import queue
 import logging
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -40,6 +51,14 @@ load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
 
 logger = logging.getLogger(__name__)
 
+RETRIEVAL_WORKERS = int(os.getenv('QUALITATIVE_RETRIEVAL_WORKERS', 4))
+LLM_WORKERS = int(os.getenv('QUALITATIVE_LLM_WORKERS', 6))
+WRITE_BATCH_SIZE = int(os.getenv('QUALITATIVE_WRITE_BATCH', 50))
+WRITE_FLUSH_SECONDS = float(os.getenv('QUALITATIVE_WRITE_FLUSH_SECONDS', 2))
+CHECKPOINT_MAX_AGE_HOURS = float(os.getenv('QUALITATIVE_CHECKPOINT_MAX_AGE_HOURS', 24))
+CHECKPOINT_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'state',
+                               'qualitative_driver_checkpoint.json')
+
 # Maps our valuation_group taxonomy to keyword patterns used in vs_event_timeline.sector
 # (legacy Screener.in naming). Used for sector-level news matching.
 _VALUATION_GROUP_TO_SECTOR_KEYWORDS = {
@@ -69,7 +88,9 @@ class QualitativeDriverAgent:
 
     Qualitative driver categories: STRATEGIC, COMPETITIVE, ESG, REGULATORY, BALANCE_SHEET, GROWTH.
 
-    Rate limits: Max 60 companies per run, 1-second pause between LLM calls.
+    Rate limits: Max 60 companies per run. run_batch is pipelined and relies on the
+    per-provider concurrency cap / token bucket in LLMClient; single-company calls keep
+    the 1-second pause between LLM calls.
     All fills logged to vs_driver_changelog for audit trail.
     """
 
@@ -142,20 +163,34 @@ Return valid JSON only."""
         self._companies_skipped_no_news = 0
         self._errors = []
 
+        # Pipeline settings (run_batch)
+        self.retrieval_workers = RETRIEVAL_WORKERS
+        self.llm_workers = LLM_WORKERS
+        self.write_batch_size = WRITE_BATCH_SIZE
+        self.checkpoint_path = CHECKPOINT_FILE
+        self._llm_pause = 1.0
+        self._lock = threading.Lock()
+
+        # Local event index for news retrieval (opened lazily)
+        self._news_index = None
+        self._news_index_synced_at = 0.0
+
         logger.info("QualitativeDriverAgent initialized")
 
-    def run_batch(self, max_companies: int = 60) -> dict:
+    def run_batch(self, max_companies: int = 60, resume: bool = True) -> dict:
         """
         Run qualitative driver auto-fill for up to max_companies that have empty SEED drivers.
 
-        Process:
-        1. Find distinct companies with empty SEED drivers
-        2. For each (up to max_companies), call populate_qualitative_drivers()
-        3. Pause 1 second between LLM calls
-        4. Return summary dict
+        Process (pipelined, see _run_pipeline):
+        1. Find distinct companies with empty SEED drivers (or resume a checkpointed batch)
+        2. Retrieval stage: empty drivers + recent news per company
+        3. LLM stage: concurrent assessments, paced per provider by LLMClient.limiter
+        4. Write stage: multi-row driver updates + changelog, ordered checkpoint
+        5. Return summary dict
 
         Args:
             max_companies: Maximum companies to process in one run (rate limiting)
+            resume: Continue an interrupted batch from its checkpoint if one exists
 
         Returns:
             Summary dict with counts and any errors
@@ -171,77 +206,60 @@ Return valid JSON only."""
         self._companies_skipped_no_news = 0
         self._errors = []
 
-        # Step 1: Find companies with empty SEED drivers
-        try:
-            companies = self.mysql.query(
-                """SELECT d.company_id, ac.nse_symbol, ac.company_name,
-                          MIN(ac.priority) AS priority
-                   FROM vs_drivers d
-                   JOIN vs_active_companies ac ON d.company_id = ac.company_id
-                   WHERE d.driver_level = 'COMPANY'
-                     AND d.source = 'SEED'
-                     AND (d.current_value IS NULL OR d.current_value = '')
-                     AND d.is_active = 1
-                     AND ac.is_active = 1
-                   GROUP BY d.company_id, ac.nse_symbol, ac.company_name
-                   ORDER BY priority ASC, d.company_id ASC
-                   LIMIT %s""",
-                (max_companies,)
-            )
-        except Exception as e:
-            error_msg = f"Failed to query companies with empty SEED drivers: {e}"
-            logger.error(error_msg, exc_info=True)
-            return {
-                'status': 'ERROR',
-                'error': error_msg,
-                'traceback': traceback.format_exc(),
-                'started_at': start_time.isoformat(),
-                'finished_at': datetime.now().isoformat(),
-            }
-
-        if not companies:
-            logger.info("No companies found with empty SEED drivers. Nothing to do.")
-            return {
-                'status': 'OK',
-                'message': 'No companies with empty SEED drivers found',
-                'companies_found': 0,
-                'started_at': start_time.isoformat(),
-                'finished_at': datetime.now().isoformat(),
-            }
-
-        logger.info(f"Found {len(companies)} companies with empty SEED drivers (processing up to {max_companies})")
-
-        # Step 2: Process each company
-        for idx, company in enumerate(companies):
-            company_id = company['company_id']
-            nse_symbol = company.get('nse_symbol') or ''
-            company_name = company.get('company_name') or ''
-
-            logger.info(f"[{idx + 1}/{len(companies)}] Processing {company_name} ({nse_symbol}, id={company_id})")
-
+        # Step 1: Resume an interrupted batch, else find companies with empty SEED drivers
+        checkpoint = _BatchCheckpoint.load(self.checkpoint_path) if resume else None
+        if checkpoint:
+            companies = checkpoint.companies
+            logger.info(f"Resuming checkpointed batch: {checkpoint.done_through}/{len(companies)} "
+                        f"companies already written")
+        else:
             try:
-                filled_count = self.populate_qualitative_drivers(
-                    company_id=company_id,
-                    nse_symbol=nse_symbol,
-                    company_name=company_name
+                companies = self.mysql.query(
+                    """SELECT d.company_id, ac.nse_symbol, ac.company_name,
+                              MIN(ac.priority) AS priority
+                       FROM vs_drivers d
+                       JOIN vs_active_companies ac ON d.company_id = ac.company_id
+                       WHERE d.driver_level = 'COMPANY'
+                         AND d.source = 'SEED'
+                         AND (d.current_value IS NULL OR d.current_value = '')
+                         AND d.is_active = 1
+                         AND ac.is_active = 1
+                       GROUP BY d.company_id, ac.nse_symbol, ac.company_name
+                       ORDER BY priority ASC, d.company_id ASC
+                       LIMIT %s""",
+                    (max_companies,)
                 )
-                self._companies_processed += 1
-                logger.info(f"  -> Filled {filled_count} drivers for {nse_symbol}")
-
             except Exception as e:
-                error_msg = f"Error processing {company_name} ({nse_symbol}, id={company_id}): {e}"
+                error_msg = f"Failed to query companies with empty SEED drivers: {e}"
                 logger.error(error_msg, exc_info=True)
-                self._errors.append({
-                    'company_id': company_id,
-                    'nse_symbol': nse_symbol,
-                    'company_name': company_name,
-                    'error': str(e),
+                return {
+                    'status': 'ERROR',
+                    'error': error_msg,
                     'traceback': traceback.format_exc(),
-                })
-                # Continue to next company -- do not abort batch on single failure
-                continue
+                    'started_at': start_time.isoformat(),
+                    'finished_at': datetime.now().isoformat(),
+                }
+
+            if not companies:
+                logger.info("No companies found with empty SEED drivers. Nothing to do.")
+                return {
+                    'status': 'OK',
+                    'message': 'No companies with empty SEED drivers found',
+                    'companies_found': 0,
+                    'started_at': start_time.isoformat(),
+                    'finished_at': datetime.now().isoformat(),
+                }
+            checkpoint = _BatchCheckpoint(self.checkpoint_path, companies)
 
-        # Step 3: Build summary
+        logger.info(f"Found {len(companies)} companies with empty SEED drivers (processing up to {max_companies})")
+
+        # Steps 2-4: Pipeline (retrieval → LLM → batched writes)
+        resumed_from = checkpoint.done_through
+        write_batches = self._run_pipeline(companies, checkpoint)
+        if checkpoint.done_through >= len(companies):
+            checkpoint.clear()
+
+        # Step 5: Build summary
         elapsed = (datetime.now() - start_time).total_seconds()
         summary = {
             'status': 'OK' if not self._errors else 'PARTIAL',
@@ -249,156 +267,305 @@ Return valid JSON only."""
             'finished_at': datetime.now().isoformat(),
             'elapsed_seconds': round(elapsed, 1),
             'companies_found': len(companies),
+            'resumed_from': resumed_from,
             'companies_processed': self._companies_processed,
             'companies_skipped_no_news': self._companies_skipped_no_news,
             'drivers_filled': self._drivers_filled,
             'drivers_skipped': self._drivers_skipped,
             'llm_calls_made': self._llm_calls,
+            'write_batches': write_batches,
             'errors_count': len(self._errors),
             'errors': self._errors[:20],  # Truncate to first 20 for readability
         }
+        limiter = getattr(self.llm, 'limiter', None)
+        if limiter is not None:
+            summary['llm_limiter'] = limiter.snapshot()
 
         logger.info(
             f"=== QualitativeDriverAgent batch run COMPLETE ===\n"
-            f"  Companies processed: {self._companies_processed}/{len(companies)}\n"
+            f"  Companies processed: {self._companies_processed}/{len(companies) - resumed_from}\n"
             f"  Companies skipped (no news): {self._companies_skipped_no_news}\n"
             f"  Drivers filled: {self._drivers_filled}\n"
             f"  Drivers skipped: {self._drivers_skipped}\n"
             f"  LLM calls: {self._llm_calls}\n"
+            f"  Write batches: {write_batches}\n"
             f"  Errors: {len(self._errors)}\n"
             f"  Elapsed: {elapsed:.1f}s"
         )
 
         return summary
 
-    def populate_qualitative_drivers(self, company_id: int, nse_symbol: str,
-                                     company_name: str) -> int:
-        """
-        Fill empty SEED drivers for one company using LLM analysis of recent news.
+    # =========================================================================
+    # PIPELINE
+    # =========================================================================
 
-        Steps:
-        1. Get empty SEED drivers for this company
-        2. Get recent news from vs_event_timeline
-        3. If no news, skip (no hallucination policy)
-        4. Send to LLM for batch assessment
-        5. Parse response and update each driver
-        6. Log changes to vs_driver_changelog
+    def _run_pipeline(self, companies: list, checkpoint: '_BatchCheckpoint') -> int:
+        """
+        Bounded-concurrency pipeline over companies[checkpoint.done_through:].
 
-        Args:
-            company_id: marketscrip_id / company_id in vs_drivers
-            nse_symbol: NSE trading symbol
-            company_name: Company display name
+        Retrieval and LLM stages run in separate thread pools; at most
+        retrieval_workers + 2 * llm_workers companies are in flight. Results go to a
+        single writer thread, which batches DB writes and advances the checkpoint
+        in company order. LLM pacing is left to the provider limiter in LLMClient.
 
         Returns:
-            Count of drivers successfully filled
+            Number of write batches flushed
         """
-        logger.debug(f"populate_qualitative_drivers: company_id={company_id}, "
-                     f"nse_symbol={nse_symbol}, company_name={company_name}")
+        writer = _AssessmentWriter(self, checkpoint, self.write_batch_size,
+                                   flush_seconds=WRITE_FLUSH_SECONDS,
+                                   queue_size=self.llm_workers * 4)
+        writer.start()
+        retrieval_pool = ThreadPoolExecutor(self.retrieval_workers, thread_name_prefix='qd-retrieve')
+        llm_pool = ThreadPoolExecutor(self.llm_workers, thread_name_prefix='qd-llm')
+        window = self.retrieval_workers + 2 * self.llm_workers
+        in_flight = {}
+        next_index = checkpoint.done_through
+        self._llm_pause = 0  # Provider limiter paces calls; no fixed sleep between them
+
+        try:
+            while next_index < len(companies) or in_flight:
+                while next_index < len(companies) and len(in_flight) < window:
+                    company = dict(companies[next_index], index=next_index)
+                    logger.info(f"[{next_index + 1}/{len(companies)}] Queued {company.get('company_name')} "
+                                f"({company.get('nse_symbol')}, id={company['company_id']})")
+                    in_flight[retrieval_pool.submit(self._prepare_company, company)] = company
+                    next_index += 1
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    company = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        error_msg = (f"Error processing {company.get('company_name')} "
+                                     f"({company.get('nse_symbol')}, id={company['company_id']}): {e}")
+                        logger.error(error_msg, exc_info=True)
+                        writer.put(dict(company, status='error', error=str(e),
+                                        traceback=traceback.format_exc()))
+                        continue
+                    if result['status'] == 'ready':
+                        in_flight[llm_pool.submit(self._assess_company, result)] = company
+                    else:
+                        writer.put(result)
+        finally:
+            retrieval_pool.shutdown(wait=False, cancel_futures=True)
+            llm_pool.shutdown(wait=False, cancel_futures=True)
+            writer.close()
+            self._llm_pause = 1.0
+
+        return writer.batches
+
+    def _prepare_company(self, company: dict) -> dict:
+        """
+        Retrieval stage: empty SEED drivers, recent news and the prompt news block.
+        Returns the company dict with status 'no_drivers', 'no_news' or 'ready'.
+        """
+        result = dict(company, drivers=[], assessments=[], failed=0, news_count=0)
+        nse_symbol = company.get('nse_symbol') or ''
+        company_name = company.get('company_name') or ''
 
         # Step 1: Get empty SEED drivers for this company
-        empty_drivers = self._get_empty_seed_drivers(company_id)
+        empty_drivers = self._get_empty_seed_drivers(company['company_id'])
         if not empty_drivers:
-            logger.debug(f"No empty SEED drivers for company_id={company_id}")
-            return 0
+            logger.debug(f"No empty SEED drivers for company_id={company['company_id']}")
+            result['status'] = 'no_drivers'
+            return result
 
         logger.info(f"  Found {len(empty_drivers)} empty SEED drivers for {nse_symbol}")
         for d in empty_drivers:
             logger.debug(f"    Driver: {d['driver_name']} (category={d['driver_category']}, id={d['id']})")
+        result['drivers'] = empty_drivers
 
         # Step 2: Get recent news
         news_items = self._get_recent_news(nse_symbol, company_name, days=30)
         if not news_items:
             logger.info(f"  No recent news for {nse_symbol} -- skipping (no-hallucination policy)")
-            self._companies_skipped_no_news += 1
-            return 0
+            result['status'] = 'no_news'
+            return result
 
         logger.info(f"  Found {len(news_items)} news items for {nse_symbol}")
         for n in news_items[:5]:
             logger.debug(f"    News: [{n.get('event_date')}] {n.get('headline', '')[:80]}")
 
         # Step 3: Build news summary for LLM
-        news_summary = self._format_news_for_prompt(news_items)
+        result['news_count'] = len(news_items)
+        result['news_summary'] = self._format_news_for_prompt(news_items)
+        result['status'] = 'ready'
+        return result
 
-        # Step 4: Attempt batch LLM assessment (all drivers at once)
-        filled_count = 0
-        assessments = self._assess_drivers_batch(empty_drivers, company_name, news_summary)
+    def _assess_company(self, result: dict) -> dict:
+        """
+        LLM stage: batch assessment of all drivers, per-driver fallback for any the
+        batch missed (or all of them if the batch failed entirely).
+        """
+        drivers = result['drivers']
+        company_name = result.get('company_name') or ''
+        news_summary = result['news_summary']
 
+        remaining_drivers = drivers
+        assessments = self._assess_drivers_batch(drivers, company_name, news_summary)
         if assessments:
-            # Step 5: Apply assessments from batch
             remaining_drivers = []
-            for driver in empty_drivers:
-                driver_name = driver['driver_name']
-                assessment = assessments.get(driver_name)
+            for driver in drivers:
+                assessment = assessments.get(driver['driver_name'])
                 if assessment:
-                    success = self._apply_assessment(
-                        driver=driver,
-                        assessment=assessment,
-                        company_id=company_id,
-                        company_name=company_name,
-                        nse_symbol=nse_symbol,
-                        news_count=len(news_items)
-                    )
-                    if success:
-                        filled_count += 1
-                        self._drivers_filled += 1
-                    else:
-                        self._drivers_skipped += 1
+                    result['assessments'].append((driver, assessment))
                 else:
                     remaining_drivers.append(driver)
-
-            # Per-driver fallback for any drivers not covered by batch
             if remaining_drivers:
                 logger.info(f"  Batch missed {len(remaining_drivers)} drivers, "
                             f"using per-driver fallback")
-                for driver in remaining_drivers:
-                    assessment = self._assess_driver(
-                        driver_name=driver['driver_name'],
-                        driver_category=driver.get('driver_category', ''),
-                        company_name=company_name,
-                        news_summary=news_summary
-                    )
-                    if assessment and 'error' not in assessment:
-                        success = self._apply_assessment(
-                            driver=driver,
-                            assessment=assessment,
-                            company_id=company_id,
-                            company_name=company_name,
-                            nse_symbol=nse_symbol,
-                            news_count=len(news_items)
-                        )
-                        if success:
-                            filled_count += 1
-                            self._drivers_filled += 1
-                        else:
-                            self._drivers_skipped += 1
-                    else:
-                        self._drivers_skipped += 1
         else:
-            # Batch failed entirely -- fall back to per-driver assessment
-            logger.warning(f"  Batch assessment failed for {nse_symbol}, trying per-driver fallback")
-            for driver in empty_drivers:
-                assessment = self._assess_driver(
-                    driver_name=driver['driver_name'],
-                    driver_category=driver.get('driver_category', ''),
-                    company_name=company_name,
-                    news_summary=news_summary
-                )
-                if assessment and 'error' not in assessment:
-                    success = self._apply_assessment(
-                        driver=driver,
-                        assessment=assessment,
-                        company_id=company_id,
-                        company_name=company_name,
-                        nse_symbol=nse_symbol,
-                        news_count=len(news_items)
-                    )
-                    if success:
-                        filled_count += 1
-                        self._drivers_filled += 1
-                    else:
-                        self._drivers_skipped += 1
-                else:
-                    self._drivers_skipped += 1
+            logger.warning(f"  Batch assessment failed for {result.get('nse_symbol')}, "
+                           f"trying per-driver fallback")
+
+        for driver in remaining_drivers:
+            assessment = self._assess_driver(
+                driver_name=driver['driver_name'],
+                driver_category=driver.get('driver_category', ''),
+                company_name=company_name,
+                news_summary=news_summary
+            )
+            if assessment and 'error' not in assessment:
+                result['assessments'].append((driver, assessment))
+            else:
+                result['failed'] += 1
+
+        result['status'] = 'assessed'
+        return result
+
+    def _write_assessments_bulk(self, pending: list) -> set:
+        """
+        Write stage: apply many (company_result, driver, assessment) in one UPDATE
+        and one changelog INSERT. Same rules as _apply_assessment: enums validated,
+        only still-empty drivers are written.
+
+        Returns:
+            Set of driver ids actually filled
+        """
+        rows = []
+        for result, driver, assessment in pending:
+            direction, trend, reasoning = self._normalize_assessment(driver['driver_name'], assessment)
+            rows.append((result, driver, direction, trend, reasoning))
+
+        # Race condition guard: drop drivers filled since retrieval
+        ids = [driver['id'] for _, driver, *_ in rows]
+        still_empty = {r['id'] for r in self.mysql.query(
+            f"""SELECT id FROM vs_drivers
+                WHERE id IN ({', '.join(['%s'] * len(ids))})
+                  AND (current_value IS NULL OR current_value = '')""",
+            tuple(ids)
+        ) or []}
+        for _, driver, *_ in rows:
+            if driver['id'] not in still_empty:
+                logger.info(f"  Driver {driver['driver_name']} (id={driver['id']}) already filled "
+                            f"(race condition). Skipping.")
+        rows = [row for row in rows if row[1]['id'] in still_empty]
+        if not rows:
+            return set()
+
+        cases = ' '.join(['WHEN %s THEN %s'] * len(rows))
+        params = []
+        for position in (4, 2, 3):  # current_value, impact_direction, trend
+            for row in rows:
+                params.extend((row[1]['id'], row[position]))
+        ids = [row[1]['id'] for row in rows]
+        rows_updated = self.mysql.execute(
+            f"""UPDATE vs_drivers
+                SET current_value = CASE id {cases} END,
+                    impact_direction = CASE id {cases} END,
+                    trend = CASE id {cases} END,
+                    source = 'AUTO',
+                    updated_by = 'qualitative_driver_agent',
+                    last_updated = NOW()
+                WHERE id IN ({', '.join(['%s'] * len(ids))})
+                  AND (current_value IS NULL OR current_value = '')""",
+            tuple(params + ids)
+        )
+
+        if rows_updated < len(rows):
+            # Some drivers were filled concurrently between the check and the UPDATE
+            reasoning_by_id = {row[1]['id']: row[4] for row in rows}
+            ours = {r['id'] for r in self.mysql.query(
+                f"""SELECT id, current_value, updated_by FROM vs_drivers
+                    WHERE id IN ({', '.join(['%s'] * len(ids))})""",
+                tuple(ids)
+            ) or [] if r.get('updated_by') == 'qualitative_driver_agent'
+                and r.get('current_value') == reasoning_by_id.get(r['id'])}
+            logger.warning(f"  Bulk UPDATE wrote {rows_updated}/{len(rows)} drivers; "
+                           f"{len(rows) - len(ours)} filled concurrently")
+            rows = [row for row in rows if row[1]['id'] in ours]
+
+        logger.debug(f"  Bulk updated {len(rows)} vs_drivers rows")
+        try:
+            self.mysql.insert_batch('vs_driver_changelog', [
+                self._changelog_row(driver, result['company_id'], result.get('company_name') or '',
+                                    result.get('nse_symbol') or '', direction, trend, reasoning,
+                                    result['news_count'])
+                for result, driver, direction, trend, reasoning in rows
+            ])
+        except Exception as e:
+            logger.error(f"  Failed to log changelog for {len(rows)} drivers: {e}", exc_info=True)
+            # Do not re-raise -- changelog failure should not prevent the fill
+
+        return {row[1]['id'] for row in rows}
+
+    # =========================================================================
+    # SINGLE COMPANY
+    # =========================================================================
+
+    def populate_qualitative_drivers(self, company_id: int, nse_symbol: str,
+                                     company_name: str) -> int:
+        """
+        Fill empty SEED drivers for one company using LLM analysis of recent news.
+
+        Steps:
+        1. Get empty SEED drivers for this company
+        2. Get recent news from vs_event_timeline
+        3. If no news, skip (no hallucination policy)
+        4. Send to LLM for batch assessment
+        5. Parse response and update each driver
+        6. Log changes to vs_driver_changelog
+
+        Args:
+            company_id: marketscrip_id / company_id in vs_drivers
+            nse_symbol: NSE trading symbol
+            company_name: Company display name
+
+        Returns:
+            Count of drivers successfully filled
+        """
+        logger.debug(f"populate_qualitative_drivers: company_id={company_id}, "
+                     f"nse_symbol={nse_symbol}, company_name={company_name}")
+
+        # Steps 1-3: drivers, news, prompt block
+        result = self._prepare_company({'company_id': company_id, 'nse_symbol': nse_symbol,
+                                        'company_name': company_name})
+        if result['status'] == 'no_news':
+            self._companies_skipped_no_news += 1
+        if result['status'] != 'ready':
+            return 0
+
+        # Step 4: Batch LLM assessment with per-driver fallback
+        self._assess_company(result)
+
+        # Step 5: Apply assessments
+        filled_count = 0
+        for driver, assessment in result['assessments']:
+            success = self._apply_assessment(
+                driver=driver,
+                assessment=assessment,
+                company_id=company_id,
+                company_name=company_name,
+                nse_symbol=nse_symbol,
+                news_count=result['news_count']
+            )
+            if success:
+                filled_count += 1
+                self._drivers_filled += 1
+            else:
+                self._drivers_skipped += 1
+        self._drivers_skipped += result['failed']
 
         return filled_count
 
@@ -441,6 +608,9 @@ Return valid JSON only."""
         4. grok_synopsis LIKE '%symbol%'
         5. Sector-level news: scope IN (GROUP,MACRO) and sector matches company's valuation_group
 
+        Answered from the local event index (utils/event_index.py) when it is
+        enabled and covers the window; falls back to the SQL LIKE query otherwise.
+
         Args:
             nse_symbol: NSE trading symbol
             company_name: Full company name
@@ -450,10 +620,29 @@ Return valid JSON only."""
             List of event dicts from vs_event_timeline, sorted by event_date DESC
         """
         cutoff_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        spec = self._news_search_spec(nse_symbol, company_name)
+        if spec is None:
+            logger.debug(f"No search conditions for {nse_symbol}/{company_name}")
+            return []
 
-        # Build OR conditions for matching
-        conditions = []
-        params = []
+        index = self._get_news_index()
+        if index is not None and cutoff_date >= index.oldest_covered_date:
+            try:
+                events = index.search(cutoff_date, **spec)
+                logger.debug(f"_get_recent_news: {len(events)} events for {nse_symbol} "
+                             f"from index (cutoff={cutoff_date})")
+                return events
+            except Exception as e:
+                logger.warning(f"Event index search failed for {nse_symbol}, using SQL: {e}")
+
+        return self._get_recent_news_sql(spec, cutoff_date, nse_symbol)
+
+    def _news_search_spec(self, nse_symbol: str, company_name: str) -> Optional[dict]:
+        """
+        Matching conditions for a company, shared by the SQL and index paths.
+        Returns None if there is nothing to match on.
+        """
+        spec = {'company_id': None, 'headline_terms': [], 'synopsis_terms': [], 'sector_keywords': []}
 
         # Condition 1: Match by company_id
         company_record = None
@@ -465,39 +654,50 @@ Return valid JSON only."""
                 (nse_symbol,)
             )
             if company_record:
-                conditions.append("e.company_id = %s")
-                params.append(company_record['company_id'])
+                spec['company_id'] = company_record['company_id']
 
         # Condition 2: Match by NSE symbol in headline
         if nse_symbol:
-            conditions.append("e.headline LIKE %s")
-            params.append(f"%{nse_symbol}%")
+            spec['headline_terms'].append(nse_symbol)
 
         # Condition 3: Match by company name keyword in headline
         # Use first significant word of company name (skip "The", short words)
         if company_name:
             name_keyword = self._extract_company_keyword(company_name)
             if name_keyword and len(name_keyword) >= 3:
-                conditions.append("e.headline LIKE %s")
-                params.append(f"%{name_keyword}%")
+                spec['headline_terms'].append(name_keyword)
 
         # Condition 4: Match by symbol in grok_synopsis (broader search)
         if nse_symbol:
-            conditions.append("e.grok_synopsis LIKE %s")
-            params.append(f"%{nse_symbol}%")
+            spec['synopsis_terms'].append(nse_symbol)
 
         # Condition 5: Sector-level news (GROUP/MACRO scope events matching company's sector)
         # Maps valuation_group to legacy sector names in event timeline
         if company_record:
             vg = (company_record.get('valuation_group') or '').upper()
-            sector_keywords = _VALUATION_GROUP_TO_SECTOR_KEYWORDS.get(vg, [])
-            for keyword in sector_keywords:
-                conditions.append("(e.scope IN ('GROUP','MACRO') AND e.sector LIKE %s)")
-                params.append(f"%{keyword}%")
+            spec['sector_keywords'] = list(_VALUATION_GROUP_TO_SECTOR_KEYWORDS.get(vg, []))
 
-        if not conditions:
-            logger.debug(f"No search conditions for {nse_symbol}/{company_name}")
-            return []
+        if not (spec['company_id'] or spec['headline_terms'] or spec['sector_keywords']):
+            return None
+        return spec
+
+    def _get_recent_news_sql(self, spec: dict, cutoff_date: str, nse_symbol: str = '',
+                             limit: int = 50) -> list:
+        """SQL LIKE path: OR of the spec's conditions over vs_event_timeline."""
+        conditions = []
+        params = []
+        if spec['company_id']:
+            conditions.append("e.company_id = %s")
+            params.append(spec['company_id'])
+        for term in spec['headline_terms']:
+            conditions.append("e.headline LIKE %s")
+            params.append(f"%{term}%")
+        for term in spec['synopsis_terms']:
+            conditions.append("e.grok_synopsis LIKE %s")
+            params.append(f"%{term}%")
+        for keyword in spec['sector_keywords']:
+            conditions.append("(e.scope IN ('GROUP','MACRO') AND e.sector LIKE %s)")
+            params.append(f"%{keyword}%")
 
         where_clause = " OR ".join(conditions)
 
@@ -509,7 +709,7 @@ Return valid JSON only."""
                     WHERE e.event_date >= %s
                       AND ({where_clause})
                     ORDER BY e.event_date DESC
-                    LIMIT 50""",
+                    LIMIT {int(limit)}""",
                 tuple([cutoff_date] + params)
             )
             logger.debug(f"_get_recent_news: {len(events) if events else 0} events for "
@@ -519,6 +719,71 @@ Return valid JSON only."""
             logger.error(f"Failed to query news for {nse_symbol}: {e}", exc_info=True)
             return []
 
+    def _get_news_index(self):
+        """
+        Local event index, synced from vs_event_timeline at most once per
+        EVENT_INDEX_SYNC_SECONDS. None when disabled (EVENT_INDEX_ENABLED=0)
+        or unavailable.
+        """
+        if os.getenv('EVENT_INDEX_ENABLED', '1') != '1':
+            return None
+        now = time.monotonic()
+        if self._news_index is not None and now - self._news_index_synced_at < \
+                float(os.getenv('EVENT_INDEX_SYNC_SECONDS', 60)):
+            return self._news_index
+        try:
+            from valuation_system.utils.event_index import EventTimelineIndex
+            if self._news_index is None:
+                self._news_index = EventTimelineIndex()
+                self._news_index.prune()
+            self._news_index.sync(self.mysql)
+            self._news_index_synced_at = now
+        except Exception as e:
+            logger.warning(f"Event index unavailable, using SQL for news retrieval: {e}")
+            self._news_index = None
+        return self._news_index
+
+    def check_news_index_parity(self, companies: list = None, days: int = 30) -> dict:
+        """
+        Compare index results with the SQL LIKE path (no LIMIT on either side).
+
+        Args:
+            companies: [{'nse_symbol', 'company_name'}]; defaults to active companies
+            days: Window to compare
+
+        Returns:
+            {'checked', 'matched', 'mismatches': [{nse_symbol, only_sql, only_index}]}
+        """
+        index = self._get_news_index()
+        if index is None:
+            return {'status': 'ERROR', 'error': 'event index unavailable'}
+        if companies is None:
+            companies = self.mysql.query(
+                """SELECT nse_symbol, company_name FROM vs_active_companies
+                   WHERE is_active = 1 ORDER BY priority, company_id LIMIT 200""")
+
+        cutoff_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        report = {'checked': 0, 'matched': 0, 'mismatches': []}
+        for company in companies:
+            nse_symbol = company.get('nse_symbol') or ''
+            spec = self._news_search_spec(nse_symbol, company.get('company_name') or '')
+            if spec is None:
+                continue
+            sql_ids = {e['id'] for e in self._get_recent_news_sql(spec, cutoff_date, nse_symbol,
+                                                                  limit=100000)}
+            index_ids = {e['id'] for e in index.search(cutoff_date, limit=None, **spec)}
+            report['checked'] += 1
+            if sql_ids == index_ids:
+                report['matched'] += 1
+            else:
+                report['mismatches'].append({
+                    'nse_symbol': nse_symbol,
+                    'only_sql': sorted(sql_ids - index_ids)[:20],
+                    'only_index': sorted(index_ids - sql_ids)[:20],
+                })
+        logger.info(f"News index parity: {report['matched']}/{report['checked']} companies identical")
+        return report
+
     def _extract_company_keyword(self, company_name: str) -> str:
         """
         Extract the most distinctive keyword from a company name for headline matching.
@@ -609,15 +874,17 @@ Return valid JSON only."""
         logger.debug(f"  Batch LLM prompt length: {len(prompt)} chars, {len(drivers)} drivers")
 
         try:
-            self._llm_calls += 1
+            with self._lock:
+                self._llm_calls += 1
             response = self.llm.analyze_json(
                 prompt,
                 system_prompt=self.SYSTEM_PROMPT,
-                temperature=0.3
+                temperature=0.3,
+                call_site='qualitative_drivers'
             )
 
-            # Rate limiting pause
-            time.sleep(1)
+            # Rate limiting pause (0 in pipeline mode, where LLMClient.limiter paces calls)
+            time.sleep(self._llm_pause)
 
             if not response or 'error' in response:
                 logger.warning(f"  LLM batch assessment returned error: {response}")
@@ -695,15 +962,17 @@ Return valid JSON only."""
         logger.debug(f"  Single-driver LLM call for '{driver_name}' ({company_name})")
 
         try:
-            self._llm_calls += 1
+            with self._lock:
+                self._llm_calls += 1
             response = self.llm.analyze_json(
                 prompt,
                 system_prompt=self.SYSTEM_PROMPT,
-                temperature=0.3
+                temperature=0.3,
+                call_site='qualitative_drivers'
             )
 
-            # Rate limiting pause
-            time.sleep(1)
+            # Rate limiting pause (0 in pipeline mode, where LLMClient.limiter paces calls)
+            time.sleep(self._llm_pause)
 
             if not response or 'error' in response:
                 logger.warning(f"  Single-driver LLM assessment returned error for "
@@ -726,6 +995,24 @@ Return valid JSON only."""
                          exc_info=True)
             return {'error': str(e), 'traceback': traceback.format_exc()}
 
+    @staticmethod
+    def _normalize_assessment(driver_name: str, assessment: dict) -> tuple:
+        """Validate direction/trend enums and truncate reasoning. Returns (direction, trend, reasoning)."""
+        # Validate direction enum
+        direction = assessment.get('direction', 'NEUTRAL')
+        if direction not in ('POSITIVE', 'NEGATIVE', 'NEUTRAL'):
+            logger.warning(f"  Invalid direction '{direction}' for {driver_name}, defaulting to NEUTRAL")
+            direction = 'NEUTRAL'
+
+        # Validate trend enum
+        trend = assessment.get('trend', 'STABLE')
+        if trend not in ('UP', 'DOWN', 'STABLE'):
+            logger.warning(f"  Invalid trend '{trend}' for {driver_name}, defaulting to STABLE")
+            trend = 'STABLE'
+
+        reasoning = str(assessment.get('reasoning', ''))[:500]  # Truncate to safe length
+        return direction, trend, reasoning
+
     def _apply_assessment(self, driver: dict, assessment: dict,
                           company_id: int, company_name: str,
                           nse_symbol: str, news_count: int) -> bool:
@@ -748,20 +1035,7 @@ Return valid JSON only."""
         """
         driver_id = driver['id']
         driver_name = driver['driver_name']
-
-        # Validate direction enum
-        direction = assessment.get('direction', 'NEUTRAL')
-        if direction not in ('POSITIVE', 'NEGATIVE', 'NEUTRAL'):
-            logger.warning(f"  Invalid direction '{direction}' for {driver_name}, defaulting to NEUTRAL")
-            direction = 'NEUTRAL'
-
-        # Validate trend enum
-        trend = assessment.get('trend', 'STABLE')
-        if trend not in ('UP', 'DOWN', 'STABLE'):
-            logger.warning(f"  Invalid trend '{trend}' for {driver_name}, defaulting to STABLE")
-            trend = 'STABLE'
-
-        reasoning = str(assessment.get('reasoning', ''))[:500]  # Truncate to safe length
+        direction, trend, reasoning = self._normalize_assessment(driver_name, assessment)
 
         logger.info(f"  Applying: {driver_name} -> direction={direction}, trend={trend}, "
                     f"reasoning='{reasoning[:80]}...'")
@@ -817,6 +1091,30 @@ Return valid JSON only."""
                          exc_info=True)
             return False
 
+    @staticmethod
+    def _changelog_row(driver: dict, company_id: int, company_name: str, nse_symbol: str,
+                       direction: str, trend: str, reasoning: str, news_count: int) -> dict:
+        """vs_driver_changelog row for an auto-filled driver (single and bulk writes)."""
+        change_reason = (
+            f"Auto-filled by QualitativeDriverAgent. "
+            f"Analyzed {news_count} news items for {company_name} ({nse_symbol}). "
+            f"Assessment: direction={direction}, trend={trend}. "
+            f"Reasoning: {reasoning[:200]}"
+        )
+        return {
+            'driver_level': 'COMPANY',
+            'driver_category': driver.get('driver_category', ''),
+            'driver_name': driver['driver_name'],
+            'valuation_group': driver.get('valuation_group', ''),
+            'valuation_subgroup': driver.get('valuation_subgroup', ''),
+            'company_id': company_id,
+            'old_value': None,  # was NULL
+            'new_value': reasoning,
+            'change_reason': change_reason,
+            'triggered_by': 'AGENT_ANALYSIS',
+            'source': 'AUTO',
+        }
+
     def _log_changelog(self, driver: dict, company_id: int, company_name: str,
                        nse_symbol: str, direction: str, trend: str,
                        reasoning: str, news_count: int):
@@ -833,34 +1131,14 @@ Return valid JSON only."""
             reasoning: LLM reasoning text
             news_count: Number of news items analyzed
         """
-        change_reason = (
-            f"Auto-filled by QualitativeDriverAgent. "
-            f"Analyzed {news_count} news items for {company_name} ({nse_symbol}). "
-            f"Assessment: direction={direction}, trend={trend}. "
-            f"Reasoning: {reasoning[:200]}"
-        )
+        row = self._changelog_row(driver, company_id, company_name, nse_symbol,
+                                  direction, trend, reasoning, news_count)
 
         try:
             self.mysql.execute(
-                """INSERT INTO vs_driver_changelog
-                   (driver_level, driver_category, driver_name,
-                    valuation_group, valuation_subgroup,
-                    company_id, old_value, new_value,
-                    change_reason, triggered_by, source)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                (
-                    'COMPANY',
-                    driver.get('driver_category', ''),
-                    driver['driver_name'],
-                    driver.get('valuation_group', ''),
-                    driver.get('valuation_subgroup', ''),
-                    company_id,
-                    None,  # old_value (was NULL)
-                    reasoning,  # new_value
-                    change_reason,
-                    'AGENT_ANALYSIS',
-                    'AUTO',
-                )
+                f"""INSERT INTO vs_driver_changelog ({', '.join(row)})
+                    VALUES ({', '.join(['%s'] * len(row))})""",
+                tuple(row.values())
             )
             logger.debug(f"  Changelog logged for {driver['driver_name']} (company_id={company_id})")
 
@@ -870,6 +1148,164 @@ Return valid JSON only."""
             # Do not re-raise -- changelog failure should not prevent the fill
 
 
+
+# =========================================================================
+# PIPELINE HELPERS
+# =========================================================================
+
+class _BatchCheckpoint:
+    """
+    Ordered checkpoint for run_batch: companies[:done_through] are fully written.
+    Companies finishing out of order are held until every earlier one is done,
+    so a resume never skips work (at worst it re-checks a few filled companies).
+    """
+
+    def __init__(self, path: str, companies: list, done_through: int = 0):
+        self.path = path
+        self.companies = [
+            {'company_id': c['company_id'], 'nse_symbol': c.get('nse_symbol') or '',
+             'company_name': c.get('company_name') or ''}
+            for c in companies
+        ]
+        self.done_through = done_through
+        self._done = set()
+
+    @classmethod
+    def load(cls, path: str) -> Optional['_BatchCheckpoint']:
+        """Unfinished checkpoint younger than CHECKPOINT_MAX_AGE_HOURS, else None."""
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            age_hours = (datetime.now() - datetime.fromisoformat(data['updated_at'])).total_seconds() / 3600
+            if age_hours > CHECKPOINT_MAX_AGE_HOURS or data['done_through'] >= len(data['companies']):
+                logger.info(f"Ignoring stale/finished checkpoint {path} (age={age_hours:.1f}h)")
+                return None
+            return cls(path, data['companies'], data['done_through'])
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable checkpoint {path}: {e}")
+            return None
+
+    def mark_done(self, index: int):
+        self._done.add(index)
+        while self.done_through in self._done:
+            self._done.discard(self.done_through)
+            self.done_through += 1
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'companies': self.companies, 'done_through': self.done_through,
+                           'updated_at': datetime.now().isoformat()}, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logger.error(f"Failed to save batch checkpoint: {e}", exc_info=True)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class _AssessmentWriter(threading.Thread):
+    """
+    Write stage of the run_batch pipeline. Buffers per-company results, writes
+    them with QualitativeDriverAgent._write_assessments_bulk once batch_size
+    drivers are pending (or after flush_seconds idle), updates the agent's
+    counters and advances the checkpoint. Runs in one thread, so counters and
+    checkpoint need no locking.
+    """
+
+    def __init__(self, agent: 'QualitativeDriverAgent', checkpoint: _BatchCheckpoint,
+                 batch_size: int, flush_seconds: float, queue_size: int):
+        super().__init__(name='qd-writer', daemon=True)
+        self.agent = agent
+        self.checkpoint = checkpoint
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.batches = 0
+        self._buffer = []
+        self._buffered_drivers = 0
+
+    def put(self, result: dict):
+        self.queue.put(result)
+
+    def close(self):
+        self.queue.put(None)
+        self.join()
+
+    def run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                result = self.queue.get(timeout=self.flush_seconds)
+            except queue.Empty:
+                result = False  # Idle tick: flush whatever is buffered
+            if result is None:
+                break
+            if result:
+                self._buffer.append(result)
+                self._buffered_drivers += len(result['assessments']) if 'assessments' in result else 0
+            if self._buffer and (self._buffered_drivers >= self.batch_size
+                                 or time.monotonic() - last_flush >= self.flush_seconds):
+                self._safe_flush()
+                last_flush = time.monotonic()
+        self._safe_flush()
+
+    def _safe_flush(self):
+        # The writer must keep draining the queue, or the pipeline would block on put()
+        try:
+            self._flush()
+        except Exception as e:
+            logger.error(f"Assessment writer flush failed: {e}", exc_info=True)
+
+    def _flush(self):
+        results, self._buffer, self._buffered_drivers = self._buffer, [], 0
+        if not results:
+            return
+        agent = self.agent
+        pending = [(r, driver, assessment) for r in results for driver, assessment in r.get('assessments', [])]
+        filled = set()
+        if pending:
+            try:
+                filled = agent._write_assessments_bulk(pending)
+            except Exception as e:
+                logger.error(f"Bulk write of {len(pending)} assessments failed, "
+                             f"applying one by one: {e}", exc_info=True)
+                for r, driver, assessment in pending:
+                    if agent._apply_assessment(driver=driver, assessment=assessment,
+                                               company_id=r['company_id'],
+                                               company_name=r.get('company_name') or '',
+                                               nse_symbol=r.get('nse_symbol') or '',
+                                               news_count=r['news_count']):
+                        filled.add(driver['id'])
+            self.batches += 1
+
+        for r in results:
+            if r['status'] == 'error':
+                agent._errors.append({
+                    'company_id': r['company_id'],
+                    'nse_symbol': r.get('nse_symbol') or '',
+                    'company_name': r.get('company_name') or '',
+                    'error': r['error'],
+                    'traceback': r['traceback'],
+                })
+            else:
+                agent._companies_processed += 1
+                if r['status'] == 'no_news':
+                    agent._companies_skipped_no_news += 1
+                filled_count = sum(1 for driver, _ in r['assessments'] if driver['id'] in filled)
+                agent._drivers_filled += filled_count
+                agent._drivers_skipped += len(r['assessments']) - filled_count + r['failed']
+                if r['status'] == 'assessed':
+                    logger.info(f"  -> Filled {filled_count} drivers for {r.get('nse_symbol')}")
+            self.checkpoint.mark_done(r['index'])
+        self.checkpoint.save()
+
+
 def main():
     """
     CLI entry point for running the qualitative driver agent.
@@ -24,30 +24,13 @@ from valuation_system.models.relative_valuation import RelativeValuation
 from valuation_system.data.processors.financial_processor import FinancialProcessor
 from valuation_system.utils.config_loader import get_blend_weights, load_sectors_config
 from valuation_system.utils.resilience import GracefulDegradation
+from valuation_system.utils.trace_recorder import TraceRecorder
 
 logger = logging.getLogger(__name__)
 
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
 
 
-class ListHandler(logging.Handler):
-    """Logging handler that stores log records in a list for later retrieval.
-    Used to capture computation logs for the Excel Computation Log tab."""
-
-    def __init__(self):
-        super().__init__()
-        self.records = []
-
-    def emit(self, record):
-        self.records.append(record)
-
-    def get_records(self):
-        return list(self.records)
-
-    def clear(self):
-        self.records.clear()
-
-
 class ValuatorAgent:
     """
     Combines all valuation methodologies:
@@ -83,7 +66,8 @@ class ValuatorAgent:
                            sector_outlook: dict,
                            sector_config: dict = None,
                            overrides: dict = None,
-                           company_adjustment: dict = None) -> dict:
+                           company_adjustment: dict = None,
+                           capture_trace: bool = True) -> dict:
         """
         Complete valuation pipeline for a company.
 
@@ -92,13 +76,14 @@ class ValuatorAgent:
             sector_outlook: Output from GroupAnalystAgent.calculate_outlook()
             sector_config: Sector config from sectors.yaml
             overrides: Manual parameter overrides
+            capture_trace: Record the run's log events for the Excel Computation
+                Log tab. Pass False when no report is generated (orchestrator, batch).
 
         Returns:
             Complete valuation result with all methods, scenarios, and audit trail.
         """
         company_name = company_config['csv_name']
         nse_symbol = company_config['nse_symbol']
-        csv_sector = sector_outlook.get('sector', '')
 
         # Load sector config for driver tabs in Excel
         sectors_cfg = load_sectors_config()
@@ -108,14 +93,33 @@ class ValuatorAgent:
 
         logger.info(f"Starting full valuation for {company_name} ({nse_symbol})")
 
-        # Attach ListHandler to capture all computation logs for Excel tab
-        log_handler = ListHandler()
-        log_handler.setLevel(logging.DEBUG)
-        log_handler.setFormatter(logging.Formatter(
-            '%(asctime)s | %(name)s | %(levelname)s | %(message)s'
-        ))
-        root_logger = logging.getLogger('valuation_system')
-        root_logger.addHandler(log_handler)
+        # Capture computation trace for the Excel Computation Log tab
+        recorder = TraceRecorder.from_env() if capture_trace else None
+        if recorder:
+            recorder.attach()
+        try:
+            result = self._run_valuation_pipeline(
+                company_config, sector_outlook, sector_config, overrides,
+                company_adjustment, sectors_cfg
+            )
+        finally:
+            if recorder:
+                recorder.detach()
+
+        if recorder and 'error' not in result:
+            result['_computation_logs'] = recorder.get_records()
+            if recorder.dropped:
+                logger.debug(f"Trace buffer full: {recorder.dropped} oldest events dropped")
+
+        return result
+
+    def _run_valuation_pipeline(self, company_config: dict, sector_outlook: dict,
+                                sector_config: dict, overrides: dict,
+                                company_adjustment: dict, sectors_cfg: dict) -> dict:
+        """Steps 1-8 of run_full_valuation (runs inside the trace capture)."""
+        company_name = company_config['csv_name']
+        nse_symbol = company_config['nse_symbol']
+        csv_sector = sector_outlook.get('sector', '')
 
         # Track data quality issues
         warnings = []
@@ -432,10 +436,6 @@ class ValuatorAgent:
                      f"Upside={upside_pct:+.1f}%, Confidence={confidence:.2f}" if upside_pct else
                      f"Valuation complete for {company_name}: Blended=₹{blended_value:,.2f}")
 
-        # Detach log handler and store captured records for Excel Computation Log tab
-        root_logger.removeHandler(log_handler)
-        result['_computation_logs'] = log_handler.get_records()
-
         return result
 
     def _apply_sector_adjustments(self, dcf_inputs: dict,
@@ -0,0 +1,317 @@
+"""
+Persistent Job Store for the Webhook Server
+SQLite-backed (local file, no service) queue that replaces the in-memory
+active_jobs dict, so job history survives restarts and stays bounded.
+
+- Per-job-type concurrency caps (a second daily run waits, it doesn't fork)
+- Shared caps over a set of job types (group_caps), e.g. every in-process
+  type together limited to the warm worker threads
+- Deduplication: an identical request while one is still PENDING returns
+  the existing job instead of queuing another; its callback_url (if any) is
+  attached to that job so every caller gets notified
+- TTL eviction of finished jobs
+- Queue depth / wait / run latency for /metrics
+
+Config (.env):
+    JOB_STORE_PATH=valuation_system/data/state/webhook_jobs.db
+    JOB_CONCURRENCY=daily=1,hourly=1,portfolio=1,social=1,on-demand=2
+    JOB_RESULT_TTL_HOURS=168
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'state', 'webhook_jobs.db')
+DEFAULT_CONCURRENCY = 'daily=1,hourly=1,portfolio=1,social=1,on-demand=2'
+FINISHED_STATUSES = ('COMPLETED', 'SUCCESS', 'FAILED', 'ERROR', 'INTERRUPTED', 'SKIPPED')
+
+# Params that don't change what a job does (excluded from the dedup key;
+# callbacks of deduplicated requests are collected in jobs.callback_urls)
+_NON_IDENTITY_PARAMS = ('callback_url',)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id        TEXT PRIMARY KEY,
+    job_type      TEXT NOT NULL,
+    params        TEXT,
+    dedup_key     TEXT NOT NULL,
+    status        TEXT NOT NULL,
+    created_at    REAL NOT NULL,
+    started_at    REAL,
+    completed_at  REAL,
+    result        TEXT,
+    error         TEXT,
+    callback_urls TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_type ON jobs (status, job_type, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_dedup ON jobs (dedup_key, status);
+CREATE INDEX IF NOT EXISTS idx_jobs_completed ON jobs (completed_at);
+"""
+
+
+def parse_concurrency(spec: str) -> Dict[str, int]:
+    """Parse 'daily=1,on-demand=4' into {'daily': 1, 'on-demand': 4}."""
+    caps = {}
+    for part in (spec or '').split(','):
+        if '=' in part:
+            name, value = (p.strip() for p in part.split('=', 1))
+            if name and value.isdigit():
+                caps[name] = int(value)
+    return caps
+
+
+def dedup_key(job_type: str, params: Dict = None) -> str:
+    """Stable hash of job type + identity-relevant params."""
+    identity = {k: v for k, v in (params or {}).items()
+                if k not in _NON_IDENTITY_PARAMS and v is not None}
+    payload = json.dumps([job_type, identity], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(ts).isoformat() if ts else None
+
+
+class JobStore:
+    """
+    Durable job queue. Every state transition is a short SQLite transaction;
+    claims use BEGIN IMMEDIATE so two dispatchers can't both start the same
+    job or exceed a type's concurrency cap.
+    """
+
+    def __init__(self, db_path: str = None, concurrency: Dict[str, int] = None,
+                 default_cap: int = 1, ttl_hours: float = None):
+        self.db_path = db_path or os.getenv('JOB_STORE_PATH') or DEFAULT_DB_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.concurrency = concurrency if concurrency is not None else parse_concurrency(
+            os.getenv('JOB_CONCURRENCY', DEFAULT_CONCURRENCY))
+        self.default_cap = default_cap
+        # (job types) → max RUNNING across all of them together
+        self.group_caps: Dict[Tuple[str, ...], int] = {}
+        self.ttl_hours = ttl_hours if ttl_hours is not None else float(
+            os.getenv('JOB_RESULT_TTL_HOURS', 168))
+
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if 'callback_urls' not in columns:  # store created before callbacks were tracked
+                conn.execute("ALTER TABLE jobs ADD COLUMN callback_urls TEXT")
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _connect(self, immediate: bool = False):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def cap_for(self, job_type: str) -> int:
+        return self.concurrency.get(job_type, self.default_cap)
+
+    # ------------------------------------------------------------------
+    # Queue operations
+    # ------------------------------------------------------------------
+
+    def enqueue(self, job_type: str, params: Dict = None,
+                job_id: str = None) -> Tuple[str, bool]:
+        """
+        Queue a job. Returns (job_id, deduplicated). If an identical job is
+        already PENDING, its id is returned and nothing new is queued; the
+        request's callback_url is added to that job's callbacks.
+        """
+        key = dedup_key(job_type, params)
+        callback_url = (params or {}).get('callback_url')
+        now = time.time()
+        job_id = job_id or f"{job_type}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+
+        with self._connect(immediate=True) as conn:
+            existing = conn.execute(
+                "SELECT job_id, callback_urls FROM jobs WHERE dedup_key = ? AND status = 'PENDING' "
+                "ORDER BY created_at LIMIT 1", (key,)
+            ).fetchone()
+            if existing:
+                callbacks = json.loads(existing['callback_urls'] or '[]')
+                if callback_url and callback_url not in callbacks:
+                    callbacks.append(callback_url)
+                    conn.execute("UPDATE jobs SET callback_urls = ? WHERE job_id = ?",
+                                 (json.dumps(callbacks), existing['job_id']))
+                logger.info(f"Job {job_type} deduplicated onto pending {existing['job_id']}")
+                return existing['job_id'], True
+
+            if conn.execute("SELECT 1 FROM jobs WHERE job_id = ?", (job_id,)).fetchone():
+                job_id = f"{job_id}_{int(now * 1000) % 100000}"
+
+            conn.execute(
+                "INSERT INTO jobs (job_id, job_type, params, dedup_key, status, created_at, callback_urls) "
+                "VALUES (?, ?, ?, ?, 'PENDING', ?, ?)",
+                (job_id, job_type, json.dumps(params or {}, default=str), key, now,
+                 json.dumps([callback_url] if callback_url else []))
+            )
+        return job_id, False
+
+    def claim_next(self) -> Optional[dict]:
+        """
+        Move the oldest PENDING job whose type is under its concurrency cap
+        (and under every group cap that covers it) to RUNNING and return it.
+        None when nothing is runnable.
+        """
+        with self._connect(immediate=True) as conn:
+            running = {
+                row['job_type']: row['n'] for row in conn.execute(
+                    "SELECT job_type, COUNT(*) AS n FROM jobs WHERE status = 'RUNNING' GROUP BY job_type")
+            }
+            for row in conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'PENDING' ORDER BY created_at"):
+                if running.get(row['job_type'], 0) >= self.cap_for(row['job_type']):
+                    continue
+                if any(row['job_type'] in types and sum(running.get(t, 0) for t in types) >= cap
+                       for types, cap in self.group_caps.items()):
+                    continue
+                now = time.time()
+                conn.execute("UPDATE jobs SET status = 'RUNNING', started_at = ? WHERE job_id = ?",
+                             (now, row['job_id']))
+                job = self._row_to_dict(row)
+                job.update(status='RUNNING', started_at=_iso(now))
+                return job
+        return None
+
+    def complete(self, job_id: str, status: str, result: Dict = None, error: str = None):
+        """Record the outcome of a RUNNING job."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, completed_at = ?, result = ?, error = ? WHERE job_id = ?",
+                (status, time.time(), json.dumps(result, default=str) if result is not None else None,
+                 error, job_id)
+            )
+
+    def recover_interrupted(self) -> int:
+        """Mark jobs left RUNNING by a previous server process as INTERRUPTED."""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'INTERRUPTED', completed_at = ?, "
+                "error = 'Server restarted while job was running' WHERE status = 'RUNNING'",
+                (time.time(),)
+            )
+            count = cur.rowcount
+        if count:
+            logger.warning(f"Marked {count} interrupted jobs from previous run")
+        return count
+
+    def evict_expired(self) -> int:
+        """Delete finished jobs older than the result TTL."""
+        cutoff = time.time() - self.ttl_hours * 3600
+        placeholders = ','.join('?' * len(FINISHED_STATUSES))
+        with self._connect() as conn:
+            cur = conn.execute(
+                f"DELETE FROM jobs WHERE completed_at < ? AND status IN ({placeholders})",
+                (cutoff, *FINISHED_STATUSES)
+            )
+            count = cur.rowcount
+        if count:
+            logger.info(f"Evicted {count} jobs older than {self.ttl_hours:.0f}h")
+        return count
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> dict:
+        job = {
+            'job_id': row['job_id'],
+            'job_type': row['job_type'],
+            'params': json.loads(row['params']) if row['params'] else {},
+            'status': row['status'],
+            'created_at': _iso(row['created_at']),
+            'started_at': _iso(row['started_at']),
+            'completed_at': _iso(row['completed_at']),
+            'callback_urls': json.loads(row['callback_urls']) if row['callback_urls'] else [],
+        }
+        if row['result']:
+            job['result'] = json.loads(row['result'])
+        if row['error']:
+            job['error'] = row['error']
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def recent_ids(self, limit: int = 10) -> List[str]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT job_id FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [r['job_id'] for r in reversed(rows)]
+
+    def count_by_status(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            return {row['status']: row['n'] for row in conn.execute(
+                "SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+
+    def metrics(self, window_hours: float = 24) -> dict:
+        """Queue depth per type plus wait/run latency over the recent window."""
+        since = time.time() - window_hours * 3600
+        with self._connect() as conn:
+            depth = {row['job_type']: row['n'] for row in conn.execute(
+                "SELECT job_type, COUNT(*) AS n FROM jobs WHERE status = 'PENDING' GROUP BY job_type")}
+            running = {row['job_type']: row['n'] for row in conn.execute(
+                "SELECT job_type, COUNT(*) AS n FROM jobs WHERE status = 'RUNNING' GROUP BY job_type")}
+            oldest = conn.execute(
+                "SELECT MIN(created_at) AS t FROM jobs WHERE status = 'PENDING'").fetchone()['t']
+            timings = conn.execute(
+                "SELECT job_type, started_at - created_at AS wait_s, completed_at - started_at AS run_s "
+                "FROM jobs WHERE completed_at >= ? AND started_at IS NOT NULL", (since,)
+            ).fetchall()
+
+        latency = {}
+        for row in timings:
+            entry = latency.setdefault(row['job_type'], {'waits': [], 'runs': []})
+            entry['waits'].append(row['wait_s'] or 0)
+            entry['runs'].append(row['run_s'] or 0)
+
+        def _p95(values):
+            ordered = sorted(values)
+            return ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+
+        return {
+            'queue_depth': depth,
+            'running': running,
+            'concurrency_caps': dict(self.concurrency),
+            'oldest_pending_age_s': round(time.time() - oldest, 1) if oldest else 0,
+            'status_counts': self.count_by_status(),
+            'latency_s': {
+                job_type: {
+                    'completed': len(v['runs']),
+                    'avg_wait': round(sum(v['waits']) / len(v['waits']), 2),
+                    'p95_wait': round(_p95(v['waits']), 2),
+                    'avg_run': round(sum(v['runs']) / len(v['runs']), 2),
+                    'p95_run': round(_p95(v['runs']), 2),
+                }
+                for job_type, v in latency.items()
+            },
+            'window_hours': window_hours,
+        }
@@ -0,0 +1,299 @@
+"""
+Warm Job Workers for the Webhook Server
+Runs webhook-triggered jobs in-process against long-lived data loaders
+instead of spawning a cold runner.py subprocess per request.
+
+- WarmDataPlane: owns CoreDataLoader / PriceLoader / DamodaranLoader, reloads
+  a loader only when its source file (path or mtime) changes
+- JobWorkerPool: bounded thread pool; each worker thread keeps one
+  OrchestratorAgent built on the shared loaders, rebuilt when its
+  dependencies are degraded, when config/*.yaml changes, or after a TTL
+
+Config (.env):
+    WEBHOOK_WORKER_MODE=warm        # warm | subprocess
+    WEBHOOK_WORKERS=2               # max concurrent in-process jobs
+    DATA_PLANE_CHECK_SECONDS=30     # min interval between source mtime checks
+    ORCHESTRATOR_TTL_SECONDS=3600   # rebuild a warm orchestrator after this long
+    ORCHESTRATOR_RETRY_SECONDS=60   # min interval between rebuilds of a degraded one
+
+Edge Cases:
+- Source file missing → keep the loader already in memory, log warning
+- Reload fails mid-way → old loaders stay in service
+- Unsupported job type → caller falls back to the subprocess path
+- MySQL down when an orchestrator is built (mysql / valuator / news_scanner
+  None) → it is rebuilt on a later job, at most every ORCHESTRATOR_RETRY_SECONDS
+- Orchestrator rebuild fails → the previous orchestrator keeps serving
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from valuation_system.data.loaders.core_loader import CoreDataLoader
+from valuation_system.data.loaders.price_loader import PriceLoader
+from valuation_system.data.loaders.damodaran_loader import DamodaranLoader
+
+logger = logging.getLogger(__name__)
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
+
+MAX_WORKERS = int(os.getenv('WEBHOOK_WORKERS', 2))
+CHECK_INTERVAL_SECONDS = float(os.getenv('DATA_PLANE_CHECK_SECONDS', 30))
+ORCHESTRATOR_TTL_SECONDS = float(os.getenv('ORCHESTRATOR_TTL_SECONDS', 3600))
+ORCHESTRATOR_RETRY_SECONDS = float(os.getenv('ORCHESTRATOR_RETRY_SECONDS', 60))
+CONFIG_DIR = os.path.join(os.path.dirname(__file__), '..', 'config')
+# Config the orchestrator reads once at construction (sectors_config, active_companies fallback)
+ORCHESTRATOR_CONFIG_FILES = ('sectors.yaml', 'companies.yaml')
+
+# Job types that can run in-process; anything else goes through runner.py
+IN_PROCESS_JOBS = ('hourly', 'daily', 'on-demand', 'portfolio')
+
+
+def _file_signature(path: Optional[str]) -> Optional[Tuple[str, float, int]]:
+    """(path, mtime, size) for change detection; None if the file is missing."""
+    if not path or not os.path.isfile(path):
+        return None
+    st = os.stat(path)
+    return (path, st.st_mtime, st.st_size)
+
+
+def _config_signature() -> tuple:
+    return tuple(_file_signature(os.path.join(CONFIG_DIR, name)) for name in ORCHESTRATOR_CONFIG_FILES)
+
+
+class WarmDataPlane:
+    """
+    Process-wide holder for the file-backed data loaders.
+
+    Loaders are treated as read-only once loaded, so worker threads share them.
+    A reload builds new loader objects and swaps them in atomically; in-flight
+    jobs keep using the objects they already hold.
+    """
+
+    def __init__(self, check_interval: float = CHECK_INTERVAL_SECONDS):
+        self.check_interval = check_interval
+        self.generation = 0
+        self.core_loader: Optional[CoreDataLoader] = None
+        self.price_loader: Optional[PriceLoader] = None
+        self.damodaran_loader: Optional[DamodaranLoader] = None
+        self._signatures: Dict[str, tuple] = {}
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.reload_counts = {'core': 0, 'prices': 0, 'damodaran': 0}
+
+    # ------------------------------------------------------------------
+    # Source signatures
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _current_signatures() -> Dict[str, tuple]:
+        core_path = CoreDataLoader._resolve_csv_path()
+        fullstats_path = CoreDataLoader._resolve_fullstats_path()
+        damodaran_cache = os.path.join(
+            os.path.dirname(__file__), '..', 'data', 'cache', 'damodaran_cache.json'
+        )
+        return {
+            'core': (_file_signature(core_path), _file_signature(fullstats_path)),
+            'prices': (_file_signature(os.getenv('MONTHLY_PRICES_PATH')),),
+            'damodaran': (_file_signature(os.path.abspath(damodaran_cache)),),
+        }
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def refresh(self, force: bool = False) -> list:
+        """
+        Reload loaders whose source files changed. Returns the reloaded names.
+        Cheap when nothing changed: a few os.stat calls, rate-limited.
+        """
+        now = time.monotonic()
+        if not force and self.core_loader is not None and now - self._last_check < self.check_interval:
+            return []
+
+        with self._lock:
+            self._last_check = now
+            signatures = self._current_signatures()
+            changed = [name for name, sig in signatures.items()
+                       if force or self._signatures.get(name) != sig]
+            if not changed:
+                return []
+
+            core, prices, damodaran = self.core_loader, self.price_loader, self.damodaran_loader
+            start = time.perf_counter()
+            try:
+                if 'core' in changed or core is None:
+                    core = CoreDataLoader()
+                    _ = core.df  # Force load now, not on the first job
+                if 'prices' in changed or prices is None:
+                    prices = PriceLoader()
+                    _ = prices.df
+                if 'damodaran' in changed or damodaran is None:
+                    damodaran = DamodaranLoader()
+            except Exception as e:
+                logger.error(f"Data plane reload failed, keeping previous loaders: {e}", exc_info=True)
+                return []
+
+            self.core_loader, self.price_loader, self.damodaran_loader = core, prices, damodaran
+            self._signatures = signatures
+            self.generation += 1
+            for name in changed:
+                self.reload_counts[name] += 1
+            logger.info(f"Data plane generation {self.generation}: reloaded {changed} "
+                        f"in {time.perf_counter() - start:.1f}s")
+            return changed
+
+    def get_loaders(self) -> Tuple[int, CoreDataLoader, PriceLoader, DamodaranLoader]:
+        """Return (generation, core, prices, damodaran), reloading if sources changed."""
+        self.refresh()
+        return self.generation, self.core_loader, self.price_loader, self.damodaran_loader
+
+    def stats(self) -> dict:
+        return {
+            'generation': self.generation,
+            'loaded': self.core_loader is not None,
+            'reload_counts': dict(self.reload_counts),
+        }
+
+
+class JobWorkerPool:
+    """
+    Bounded pool that runs webhook jobs in-process on warm orchestrators.
+
+    Each worker thread lazily builds one OrchestratorAgent (MySQL, LLM, GSheet
+    clients included) and reuses it; when the data plane generation moves on,
+    the orchestrator's loaders are swapped instead of rebuilding everything.
+    The orchestrator itself is rebuilt when it came up degraded (no MySQL),
+    when the YAML config changes, or after ttl seconds (active companies).
+    """
+
+    def __init__(self, data_plane: WarmDataPlane = None, max_workers: int = MAX_WORKERS,
+                 ttl: float = ORCHESTRATOR_TTL_SECONDS, retry_after: float = ORCHESTRATOR_RETRY_SECONDS):
+        self.data_plane = data_plane or WarmDataPlane()
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='vs-job')
+        self._local = threading.local()
+        self._running = 0
+        self._count_lock = threading.Lock()
+
+    @staticmethod
+    def supports(job_type: str) -> bool:
+        return job_type in IN_PROCESS_JOBS
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @staticmethod
+    def _build_orchestrator(core, prices, damodaran):
+        from valuation_system.agents.orchestrator import OrchestratorAgent
+        return OrchestratorAgent(core_loader=core, price_loader=prices, damodaran_loader=damodaran)
+
+    @staticmethod
+    def _degraded(orch) -> bool:
+        """Built while MySQL was unavailable: the DB-backed agents are missing."""
+        return any(getattr(orch, name, None) is None for name in ('mysql', 'valuator', 'news_scanner'))
+
+    def _rebuild_reason(self, orch, config: tuple, now: float) -> Optional[str]:
+        local = self._local
+        if orch is None:
+            return 'first job'
+        if local.config != config:
+            return 'config changed'
+        if now - local.built_at >= self.ttl:
+            return f"older than {self.ttl:.0f}s"
+        if self._degraded(orch) and now - local.built_at >= self.retry_after:
+            return 'degraded (no MySQL)'
+        return None
+
+    def _orchestrator(self):
+        """Per-thread warm orchestrator, re-pointed at new data when it reloads."""
+        generation, core, prices, damodaran = self.data_plane.get_loaders()
+        orch = getattr(self._local, 'orchestrator', None)
+        config, now = _config_signature(), time.monotonic()
+        reason = self._rebuild_reason(orch, config, now)
+        if reason:
+            try:
+                fresh = self._build_orchestrator(core, prices, damodaran)
+            except Exception as e:
+                if orch is None:
+                    raise
+                logger.error(f"Warm orchestrator rebuild failed ({reason}), keeping the current one: {e}")
+                self._local.built_at, self._local.config = now, config  # Wait retry_after / ttl to retry
+            else:
+                if orch is not None:
+                    logger.info(f"Warm orchestrator rebuilt: {reason}")
+                orch = fresh
+                self._local.orchestrator, self._local.built_at, self._local.config = orch, now, config
+                self._local.generation = generation
+        if self._local.generation != generation:
+            orch.swap_data_loaders(core, prices, damodaran)
+        self._local.generation = generation
+        return orch
+
+    def run_job(self, job_type: str, params: Dict = None) -> dict:
+        """Execute one job synchronously on the calling worker thread."""
+        from valuation_system.scheduler import runner
+
+        if not self.supports(job_type):
+            raise ValueError(f"Job type '{job_type}' is not supported in-process")
+
+        params = params or {}
+        start = time.perf_counter()
+        with self._count_lock:
+            self._running += 1
+        try:
+            orch = self._orchestrator()
+            if job_type == 'hourly':
+                result = runner.run_hourly(orch=orch)
+            elif job_type == 'daily':
+                result = runner.run_daily(orch=orch)
+            elif job_type == 'portfolio':
+                result = runner.run_portfolio(orch=orch)
+            else:  # on-demand
+                symbol = params.get('symbol')
+                if not symbol and params.get('company_id') and orch.mysql:
+                    row = orch.mysql.query_one(
+                        "SELECT symbol FROM mssdb.kbapp_marketscrip WHERE marketscrip_id = %s",
+                        (params['company_id'],)
+                    )
+                    symbol = row.get('symbol') if row else None
+                if not symbol:
+                    return {'status': 'FAILED', 'error': f"Unknown company: {params}"}
+                result = runner.run_valuation(symbol=symbol, orch=orch)
+        finally:
+            with self._count_lock:
+                self._running -= 1
+
+        result = result if isinstance(result, dict) else {'result': result}
+        status = result.get('status') or ('FAILED' if result.get('error') else 'COMPLETED')
+        return {
+            **result,
+            'status': status,
+            'worker_mode': 'warm',
+            'elapsed_seconds': round(time.perf_counter() - start, 2),
+            'completed_at': datetime.now().isoformat(),
+        }
+
+    async def submit(self, job_type: str, params: Dict = None) -> dict:
+        """Run a job on the pool without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.run_job, job_type, params)
+
+    async def warm_up(self):
+        """Load data in the background at server start so the first job is fast."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.data_plane.refresh, True)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -8,6 +8,9 @@ Endpoints:
 - POST /webhook/valuation/on-demand - Single company valuation
 - GET /status - Health check
 - GET /metrics - System metrics
+
+Jobs run in-process on warm data loaders (api/job_workers.py) by default;
+set WEBHOOK_WORKER_MODE=subprocess to spawn runner.py per job instead.
 """
 
 import os
@@ -24,11 +27,14 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 import uvicorn
 
-# Add parent directory to path
+# Add parent directory (and project root, for valuation_system.* imports) to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from dotenv import load_dotenv
 
+from valuation_system.api.job_store import JobStore
+
 load_dotenv(Path(__file__).parent.parent / 'config' / '.env')
 
 app = FastAPI(
@@ -59,8 +65,47 @@ class JobResponse(BaseModel):
     started_at: str
 
 
-# Background job tracker
-active_jobs = {}
+# Persistent job queue (SQLite) — history, per-type concurrency caps, dedup
+job_store = JobStore()
+EVICTION_INTERVAL_SECONDS = 3600
+
+# Warm in-process workers (WEBHOOK_WORKER_MODE=warm); None → subprocess per job
+worker_pool = None
+if os.getenv('WEBHOOK_WORKER_MODE', 'warm').lower() == 'warm':
+    from valuation_system.api.job_workers import IN_PROCESS_JOBS, JobWorkerPool
+    worker_pool = JobWorkerPool()
+    # A job marked RUNNING should hold a worker thread, not wait behind one:
+    # per type and across all in-process types together
+    for _job_type in IN_PROCESS_JOBS:
+        job_store.concurrency[_job_type] = min(job_store.cap_for(_job_type), worker_pool.max_workers)
+    job_store.group_caps[IN_PROCESS_JOBS] = worker_pool.max_workers
+
+
+@app.on_event("startup")
+async def startup():
+    """Recover the job queue and preload CSVs so the first webhook is fast."""
+    job_store.recover_interrupted()
+    job_store.evict_expired()
+    asyncio.create_task(evict_periodically())
+    if worker_pool:
+        asyncio.create_task(worker_pool.warm_up())
+    await dispatch_jobs()
+
+
+@app.on_event("shutdown")
+async def stop_workers():
+    if worker_pool:
+        worker_pool.shutdown()
+
+
+async def evict_periodically():
+    """Drop finished jobs past JOB_RESULT_TTL_HOURS, once an hour."""
+    while True:
+        await asyncio.sleep(EVICTION_INTERVAL_SECONDS)
+        try:
+            job_store.evict_expired()
+        except Exception as e:
+            print(f"Job eviction failed: {e}")
 
 
 def validate_token(authorization: str):
@@ -78,80 +123,98 @@ def validate_token(authorization: str):
         raise HTTPException(status_code=401, detail="Invalid Authorization header format")
 
 
+def accept_job(job_type: str, params: Dict, job_id: str, message: str,
+               background_tasks: BackgroundTasks) -> JobResponse:
+    """Queue a job (or join an identical pending one) and kick the dispatcher."""
+    job_id, deduplicated = job_store.enqueue(job_type, params, job_id)
+    background_tasks.add_task(dispatch_jobs)
+    return JobResponse(
+        status="DEDUPLICATED" if deduplicated else "ACCEPTED",
+        job_id=job_id,
+        message=message if not deduplicated else f"{message} (identical job already queued)",
+        started_at=datetime.now().isoformat()
+    )
+
+
+async def dispatch_jobs():
+    """Start every queued job that fits under its type's concurrency cap."""
+    while True:
+        job = job_store.claim_next()
+        if not job:
+            return
+        asyncio.create_task(run_job_async(job['job_type'], job['params'], job['job_id']))
+
+
 async def run_job_async(job_type: str, params: Dict = None, job_id: str = None):
     """
-    Execute runner.py in background with JSON output.
+    Execute a claimed job (in-process worker or runner.py subprocess) and
+    record the outcome in the job store.
 
     Args:
         job_type: hourly, daily, on-demand
         params: Additional parameters (symbol, company_id, etc.)
-        job_id: External job ID for tracking
+        job_id: Job ID in the job store
     """
-    if not job_id:
-        job_id = f"{job_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-
-    active_jobs[job_id] = {
-        'status': 'RUNNING',
-        'started_at': datetime.now().isoformat(),
-        'job_type': job_type,
-        'params': params
-    }
-
+    outcome = {}
     try:
-        # Build command
-        cmd = [
-            sys.executable,  # Use same Python interpreter
-            str(RUNNER_PATH),
-            job_type,
-            '--json',
-            '--job-id', job_id
-        ]
-
-        # Add parameters
-        if params:
-            if params.get('symbol'):
-                cmd.extend(['--symbol', params['symbol']])
-            if params.get('company_id'):
-                cmd.extend(['--company-id', str(params['company_id'])])
-            if params.get('callback_url'):
-                cmd.extend(['--callback-url', params['callback_url']])
-
-        # Execute
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-
-        stdout, stderr = await process.communicate()
+        if worker_pool and worker_pool.supports(job_type):
+            result = await worker_pool.submit(job_type, params)
+            outcome = {'status': result.get('status', 'COMPLETED'), 'result': result}
+        else:
+            outcome = await run_subprocess_job(job_type, params, job_id)
+    except Exception as e:
+        outcome = {'status': 'ERROR', 'error': str(e)}
+    finally:
+        job_store.complete(job_id, outcome.get('status', 'ERROR'),
+                           result=outcome.get('result'), error=outcome.get('error'))
+        # A slot just freed up — start whatever was waiting for it
+        await dispatch_jobs()
+
+    # POST to every callback URL attached to the job (deduplicated requests included)
+    job = job_store.get(job_id)
+    for url in (job or {}).get('callback_urls', []):
+        await post_callback(url, job)
+
+
+async def run_subprocess_job(job_type: str, params: Dict, job_id: str) -> dict:
+    """Execute runner.py in a subprocess with JSON output."""
+    # Build command
+    cmd = [
+        sys.executable,  # Use same Python interpreter
+        str(RUNNER_PATH),
+        job_type,
+        '--json',
+        '--job-id', job_id
+    ]
+
+    # Add parameters
+    if params:
+        if params.get('symbol'):
+            cmd.extend(['--symbol', params['symbol']])
+        if params.get('company_id'):
+            cmd.extend(['--company-id', str(params['company_id'])])
+        if params.get('callback_url'):
+            cmd.extend(['--callback-url', params['callback_url']])
+
+    # Execute
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
 
-        # Parse JSON result
-        try:
-            result = json.loads(stdout.decode())
-            active_jobs[job_id].update({
-                'status': result.get('status', 'COMPLETED'),
-                'result': result,
-                'completed_at': datetime.now().isoformat()
-            })
-        except json.JSONDecodeError:
-            active_jobs[job_id].update({
-                'status': 'FAILED',
-                'error': 'Invalid JSON output from runner',
-                'stdout': stdout.decode()[:500],
-                'stderr': stderr.decode()[:500],
-                'completed_at': datetime.now().isoformat()
-            })
-
-        # POST to callback URL if provided
-        if params and params.get('callback_url'):
-            await post_callback(params['callback_url'], active_jobs[job_id])
+    stdout, stderr = await process.communicate()
 
-    except Exception as e:
-        active_jobs[job_id].update({
-            'status': 'ERROR',
-            'error': str(e),
-            'completed_at': datetime.now().isoformat()
-        })
+    # Parse JSON result
+    try:
+        result = json.loads(stdout.decode())
+        return {'status': result.get('status', 'COMPLETED'), 'result': result}
+    except json.JSONDecodeError:
+        return {
+            'status': 'FAILED',
+            'error': 'Invalid JSON output from runner',
+            'result': {'stdout': stdout.decode()[:500], 'stderr': stderr.decode()[:500]},
+        }
 
 
 async def post_callback(url: str, data: Dict):
@@ -180,14 +243,7 @@ async def hourly_news_scan(
 
     job_id = f"hourly_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
 
-    background_tasks.add_task(run_job_async, "hourly", {}, job_id)
-
-    return JobResponse(
-        status="ACCEPTED",
-        job_id=job_id,
-        message="Hourly news scan started",
-        started_at=datetime.now().isoformat()
-    )
+    return accept_job("hourly", {}, job_id, "Hourly news scan started", background_tasks)
 
 
 @app.post("/webhook/valuation/daily", response_model=JobResponse)
@@ -204,14 +260,7 @@ async def daily_valuation(
 
     job_id = f"daily_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
 
-    background_tasks.add_task(run_job_async, "daily", {}, job_id)
-
-    return JobResponse(
-        status="ACCEPTED",
-        job_id=job_id,
-        message="Daily valuation started",
-        started_at=datetime.now().isoformat()
-    )
+    return accept_job("daily", {}, job_id, "Daily valuation started", background_tasks)
 
 
 @app.post("/webhook/valuation/on-demand", response_model=JobResponse)
@@ -247,13 +296,10 @@ async def on_demand_valuation(
         'callback_url': request.callback_url
     }
 
-    background_tasks.add_task(run_job_async, "on-demand", params, job_id)
-
-    return JobResponse(
-        status="ACCEPTED",
-        job_id=job_id,
-        message=f"On-demand valuation started for {request.symbol or request.company_id}",
-        started_at=datetime.now().isoformat()
+    return accept_job(
+        "on-demand", params, job_id,
+        f"On-demand valuation started for {request.symbol or request.company_id}",
+        background_tasks
     )
 
 
@@ -271,23 +317,17 @@ async def social_content_generation(
 
     job_id = f"social_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
 
-    background_tasks.add_task(run_job_async, "social", {}, job_id)
-
-    return JobResponse(
-        status="ACCEPTED",
-        job_id=job_id,
-        message="Social content generation started",
-        started_at=datetime.now().isoformat()
-    )
+    return accept_job("social", {}, job_id, "Social content generation started", background_tasks)
 
 
 @app.get("/status/{job_id}")
 async def get_job_status(job_id: str):
     """Get status of a specific job."""
-    if job_id not in active_jobs:
+    job = job_store.get(job_id)
+    if not job:
         raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
 
-    return active_jobs[job_id]
+    return job
 
 
 @app.get("/status")
@@ -304,8 +344,8 @@ async def system_status():
         'timestamp': datetime.now().isoformat(),
         'dependencies': {},
         'jobs': {
-            'active': len([j for j in active_jobs.values() if j['status'] == 'RUNNING']),
-            'recent': list(active_jobs.keys())[-10:]
+            'active': job_store.count_by_status().get('RUNNING', 0),
+            'recent': job_store.recent_ids(10)
         }
     }
 
@@ -376,12 +416,25 @@ async def system_metrics():
     metrics['active_companies'] = companies['cnt'] if companies else 0
 
     # Job stats
+    counts = job_store.count_by_status()
     metrics['jobs'] = {
-        'total': len(active_jobs),
-        'running': len([j for j in active_jobs.values() if j['status'] == 'RUNNING']),
-        'completed': len([j for j in active_jobs.values() if j['status'] in ['COMPLETED', 'SUCCESS']]),
-        'failed': len([j for j in active_jobs.values() if j['status'] in ['FAILED', 'ERROR']])
+        'total': sum(counts.values()),
+        'pending': counts.get('PENDING', 0),
+        'running': counts.get('RUNNING', 0),
+        'completed': counts.get('COMPLETED', 0) + counts.get('SUCCESS', 0),
+        'failed': counts.get('FAILED', 0) + counts.get('ERROR', 0) + counts.get('INTERRUPTED', 0)
     }
+    metrics['job_queue'] = job_store.metrics()
+
+    if worker_pool:
+        metrics['worker_pool'] = {
+            'mode': 'warm',
+            'max_workers': worker_pool.max_workers,
+            'running': worker_pool.running,
+            'data_plane': worker_pool.data_plane.stats(),
+        }
+    else:
+        metrics['worker_pool'] = {'mode': 'subprocess'}
 
     return metrics
 
@@ -426,4 +479,8 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
+    # Same daily log file as runner.py CLI runs (warm jobs log in this process)
+    from valuation_system.scheduler.runner import configure_logging
+    configure_logging()
+
     start_server(args.host, args.port)
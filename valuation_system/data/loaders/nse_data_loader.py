@@ -5,18 +5,48 @@ Provides access to NSE quarterly filing data as a supplementary data source.
 Used by financial_processor to get latest quarters when core CSV is stale.
 
 Priority: NSE data is checked FIRST for latest 2-3 quarters, then falls back to core CSV.
+
+Source: the NSE quarterly store (storage/nse_quarterly_store.py), pivoted to the
+wide per-company view on load. The store is seeded from the legacy
+nse_quarterly_data.csv on its first append (or explicitly with
+`python -m valuation_system.storage.nse_quarterly_store --import-csv <path>`);
+until then, store values are overlaid cell by cell on the CSV, so companies
+not fetched since the store was created are still served from the CSV.
+If the store is empty, the CSV is read on its own.
+
+Index (built once per load, see _build_index):
+- symbol → row position (first row per symbol, as the old boolean scan returned)
+- metric → (sorted quarter_idx array, column positions), from one parse of the headers
+- metric → dense float matrix (companies × quarters), NaN where missing
+- row → latest quarter_idx with any value
+Per-company lookups are dict hits + array slices; merge_nse_into_financials_batch
+merges a whole batch one metric at a time over the matrices.
 """
 
 import os
 import logging
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Tuple
 from datetime import datetime, timedelta
 
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 
+from valuation_system.storage.nse_quarterly_store import (
+    NSEQuarterlyStore, DEFAULT_DB_PATH as DEFAULT_STORE_PATH, FIXED_COLUMNS,
+)
+
 logger = logging.getLogger(__name__)
 
+TEXT_METRICS = {'filing_date', 'result_type'}  # Per-quarter metadata, not numbers
+
+# Metrics merged into core financials
+MERGE_METRICS = [
+    'sales', 'pat', 'pbidt', 'interest', 'pbt_excp', 'other_income',
+    'depreciation', 'empcost', 'rawmat', 'other_exp', 'total_exp', 'tax',
+    'exceptional', 'paid_up_equity', 'basic_eps', 'diluted_eps'
+]
+
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '..', 'config', '.env'))
 
 NSE_CSV_PATH = os.getenv(
@@ -27,30 +57,115 @@ NSE_CSV_PATH = os.getenv(
 
 class NSEDataLoader:
     """
-    Loads NSE quarterly filing data from nse_quarterly_data.csv.
+    Loads NSE quarterly filing data from the NSE quarterly store
+    (falling back to nse_quarterly_data.csv).
     Provides unified interface matching CoreDataLoader patterns.
     """
 
-    def __init__(self):
+    def __init__(self, store: NSEQuarterlyStore = None, csv_path: str = None):
         self.df = None
-        self.csv_path = NSE_CSV_PATH
+        self.csv_path = csv_path or NSE_CSV_PATH
+        self.store = store
+        self.source = None
         self.loaded_at = None
+        self._row_of: Dict[str, int] = {}
+        self._pos_of_label: Dict = {}
+        self._metric_index: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._matrix: Dict[str, np.ndarray] = {}
+        self._latest_q: Optional[np.ndarray] = None
+
+        if self.store is None and os.path.exists(os.getenv('NSE_QUARTERLY_STORE_PATH') or DEFAULT_STORE_PATH):
+            self.store = NSEQuarterlyStore()
+        if self.store is not None:
+            self._load_store()
+        if self.df is None:
+            if os.path.exists(self.csv_path):
+                self._load()
+            else:
+                logger.debug(f"NSE CSV not found at {self.csv_path} - NSE data unavailable")
+        if self.df is not None:
+            self._build_index()
+
+    def _load_store(self):
+        """Wide view of the latest values in the NSE quarterly store (over the CSV if not yet seeded)."""
+        try:
+            df = self.store.wide_frame()
+            if df.empty:
+                return
+            if not self.store.is_seeded() and os.path.exists(self.csv_path):
+                df = self._overlay_on_csv(df)
+            self.df = df
+            self.source = self.store.db_path
+            self.loaded_at = datetime.now()
+            logger.info(f"NSE data loaded from store: {len(self.df)} companies, {len(self.df.columns)} columns")
+        except Exception as e:
+            logger.error(f"Failed to load NSE store: {e}")
+            self.df = None
 
-        if os.path.exists(self.csv_path):
-            self._load()
-        else:
-            logger.debug(f"NSE CSV not found at {self.csv_path} - NSE data unavailable")
+    def _overlay_on_csv(self, store_df: pd.DataFrame) -> pd.DataFrame:
+        """CSV universe with every cell the store has replaced by the store's value."""
+        csv_df = pd.read_csv(self.csv_path, low_memory=False).drop_duplicates('nse_symbol')
+        merged = store_df.set_index('nse_symbol').combine_first(
+            csv_df.set_index('nse_symbol')).reset_index()
+        fixed = [c for c in FIXED_COLUMNS if c in merged.columns]
+        logger.info(f"NSE store not seeded yet: {len(store_df)} store companies overlaid on "
+                    f"{len(csv_df)} from {self.csv_path}")
+        return merged[fixed + [c for c in merged.columns if c not in FIXED_COLUMNS]]
 
     def _load(self):
         """Load NSE CSV."""
         try:
             self.df = pd.read_csv(self.csv_path, low_memory=False)
+            self.source = self.csv_path
             self.loaded_at = datetime.now()
             logger.info(f"NSE data loaded: {len(self.df)} companies, {len(self.df.columns)} columns")
         except Exception as e:
             logger.error(f"Failed to load NSE CSV: {e}")
             self.df = None
 
+    def _build_index(self):
+        """Parse column headers once and materialise per-metric matrices."""
+        df = self.df
+        self._row_of = {}
+        for pos, symbol in enumerate(df['nse_symbol'].tolist() if 'nse_symbol' in df else []):
+            self._row_of.setdefault(symbol, pos)
+        self._pos_of_label = {label: pos for pos, label in enumerate(df.index)}
+
+        by_metric: Dict[str, List[Tuple[int, int]]] = {}
+        for pos, col in enumerate(df.columns):
+            parts = str(col).rsplit('_', 1)
+            if len(parts) == 2 and parts[1].isdigit():
+                by_metric.setdefault(parts[0], []).append((int(parts[1]), pos))
+
+        self._metric_index = {}
+        self._matrix = {}
+        latest = np.full(len(df), -1, dtype=np.int64)
+        for metric, entries in by_metric.items():
+            entries.sort()
+            quarters = np.array([q for q, _ in entries], dtype=np.int64)
+            positions = np.array([p for _, p in entries], dtype=np.int64)
+            self._metric_index[metric] = (quarters, positions)
+            block = df.iloc[:, positions]
+            present = block.notna().to_numpy()
+            latest = np.maximum(latest, np.where(present, quarters[None, :], -1).max(axis=1))
+            if metric not in TEXT_METRICS:
+                self._matrix[metric] = block.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+        self._latest_q = latest
+        logger.debug(f"NSE index: {len(self._row_of)} symbols, {len(self._matrix)} metric matrices")
+
+    def _position(self, company_data: pd.Series) -> Optional[int]:
+        """Row position of a Series returned by get_company_data (None if it isn't one of ours)."""
+        pos = self._pos_of_label.get(company_data.name)
+        if pos is None or company_data.get('nse_symbol') != self.df['nse_symbol'].iat[pos]:
+            return None
+        return pos
+
+    def _metric_row(self, pos: int, metric: str) -> Dict[int, float]:
+        quarters, _ = self._metric_index[metric]
+        values = self._matrix[metric][pos]
+        present = ~np.isnan(values)
+        return dict(zip(quarters[present].tolist(), values[present].tolist()))
+
     def is_available(self) -> bool:
         """Check if NSE data is available."""
         return self.df is not None and not self.df.empty
@@ -65,11 +180,11 @@ class NSEDataLoader:
         if not self.is_available():
             return None
 
-        matches = self.df[self.df['nse_symbol'] == nse_symbol]
-        if len(matches) == 0:
+        pos = self._row_of.get(nse_symbol)
+        if pos is None:
             return None
 
-        return matches.iloc[0]
+        return self.df.iloc[pos]
 
     def get_metric_dict(self, company_data: pd.Series, metric: str) -> Dict[int, float]:
         """
@@ -85,6 +200,11 @@ class NSEDataLoader:
         if company_data is None:
             return {}
 
+        if metric in self._matrix:
+            pos = self._position(company_data)
+            if pos is not None:
+                return self._metric_row(pos, metric)
+
         result = {}
         for col in company_data.index:
             if col.startswith(f'{metric}_') and col.split('_')[-1].isdigit():
@@ -97,28 +217,20 @@ class NSEDataLoader:
 
     def get_latest_quarter_idx(self, nse_symbol: str) -> Optional[int]:
         """
-        Get the latest quarter index available for a company in NSE data.
+        Get the latest quarter index available for a company in NSE data
+        (latest quarter with at least one non-empty value).
 
         Returns:
             Quarter index (e.g., 151) or None
         """
-        company_data = self.get_company_data(nse_symbol)
-        if company_data is None:
+        if not self.is_available():
             return None
 
-        # Find all quarter indices in the data
-        quarter_indices = []
-        for col in company_data.index:
-            if '_' in col and col.split('_')[-1].isdigit():
-                parts = col.split('_')
-                if len(parts) >= 2:
-                    try:
-                        q_idx = int(parts[-1])
-                        quarter_indices.append(q_idx)
-                    except ValueError:
-                        continue
+        pos = self._row_of.get(nse_symbol)
+        if pos is None or self._latest_q[pos] < 0:
+            return None
 
-        return max(quarter_indices) if quarter_indices else None
+        return int(self._latest_q[pos])
 
     def has_newer_data_than_core(self, nse_symbol: str, core_latest_idx: int) -> bool:
         """
@@ -178,6 +290,18 @@ class NSEDataLoader:
 # HELPER: Merge NSE data into core financials dict
 # =============================================================================
 
+def _financials_key(financials: Dict, metric: str) -> Tuple[str, bool]:
+    """
+    Key in financials that holds the metric's quarter dict:
+    metric_quarterly first, then metric, then metric_annual.
+    Returns (key, exists) — a missing metric maps to a new metric_quarterly key.
+    """
+    for key in (f'{metric}_quarterly', metric, f'{metric}_annual'):
+        if key in financials:
+            return key, True
+    return f'{metric}_quarterly', False
+
+
 def merge_nse_into_financials(financials: Dict, nse_symbol: str, nse_loader: NSEDataLoader) -> Dict:
     """
     Merge NSE quarterly data into financials dict from CoreDataLoader.
@@ -195,52 +319,63 @@ def merge_nse_into_financials(financials: Dict, nse_symbol: str, nse_loader: NSE
     Returns:
         Updated financials dict with NSE data merged in
     """
-    if not nse_loader.is_available():
-        return financials
-
-    company_data = nse_loader.get_company_data(nse_symbol)
-    if company_data is None:
-        return financials
-
-    # Metrics to merge
-    METRICS = [
-        'sales', 'pat', 'pbidt', 'interest', 'pbt_excp', 'other_income',
-        'depreciation', 'empcost', 'rawmat', 'other_exp', 'total_exp', 'tax',
-        'exceptional', 'paid_up_equity', 'basic_eps', 'diluted_eps'
-    ]
-
-    for metric in METRICS:
-        # Get NSE data for this metric
-        nse_data = nse_loader.get_metric_dict(company_data, metric)
-        if not nse_data:
-            continue
-
-        # Find corresponding key in financials
-        # Try metric_quarterly first, then metric, then metric_annual
-        fin_key = None
-        if f'{metric}_quarterly' in financials:
-            fin_key = f'{metric}_quarterly'
-        elif metric in financials:
-            fin_key = metric
-        elif f'{metric}_annual' in financials:
-            fin_key = f'{metric}_annual'
-
-        if fin_key is None:
-            # Create new key
-            fin_key = f'{metric}_quarterly'
-            financials[fin_key] = {}
-
-        # Merge: add NSE quarters that are newer than core CSV
-        core_data = financials[fin_key]
-        if not isinstance(core_data, dict):
-            continue
+    merge_nse_into_financials_batch({nse_symbol: financials}, nse_loader)
+    return financials
 
-        core_latest_idx = max(core_data.keys()) if core_data else 0
 
-        for q_idx, value in nse_data.items():
-            if q_idx > core_latest_idx:
-                # NSE has newer data - add it
-                core_data[q_idx] = value
-                logger.debug(f"[NSE_FILING] {metric} Q{q_idx} = {value:.2f} (newer than core)")
+def merge_nse_into_financials_batch(financials_by_symbol: Dict[str, Dict],
+                                    nse_loader: NSEDataLoader) -> Dict[str, Dict]:
+    """
+    merge_nse_into_financials for a whole batch {nse_symbol: financials}.
 
-    return financials
+    One pass per metric: the batch's rows are sliced out of the metric matrix
+    and compared against each company's latest core quarter in a single
+    vectorised mask; only the (company, quarter) hits are written back.
+    Financials dicts are updated in place. Returns financials_by_symbol.
+    """
+    if not nse_loader.is_available() or not financials_by_symbol:
+        return financials_by_symbol
+
+    batch = [(symbol, financials, nse_loader._row_of[symbol])
+             for symbol, financials in financials_by_symbol.items()
+             if symbol in nse_loader._row_of]
+    if not batch:
+        return financials_by_symbol
+    rows = np.array([pos for _, _, pos in batch], dtype=np.int64)
+    debug = logger.isEnabledFor(logging.DEBUG)
+
+    for metric in MERGE_METRICS:
+        if metric not in nse_loader._matrix:
+            continue
+        quarters, _ = nse_loader._metric_index[metric]
+        block = nse_loader._matrix[metric][rows]                # (companies, quarters)
+        has_data = ~np.isnan(block)
+        companies_with_data = has_data.any(axis=1)
+
+        targets = []
+        core_latest = np.zeros(len(batch), dtype=np.int64)
+        for i, (symbol, financials, _) in enumerate(batch):
+            if not companies_with_data[i]:
+                targets.append(None)
+                continue
+            fin_key, exists = _financials_key(financials, metric)
+            if not exists:
+                financials[fin_key] = {}
+            core_data = financials[fin_key]
+            if not isinstance(core_data, dict):
+                targets.append(None)
+                companies_with_data[i] = False
+                continue
+            core_latest[i] = max(core_data.keys()) if core_data else 0
+            targets.append(core_data)
+
+        # NSE has newer data than core for these (company, quarter) cells
+        newer = has_data & companies_with_data[:, None] & (quarters[None, :] > core_latest[:, None])
+        hit_rows, hit_cols = np.nonzero(newer)
+        for i, q_idx, value in zip(hit_rows.tolist(), quarters[hit_cols].tolist(),
+                                   block[hit_rows, hit_cols].tolist()):
+            targets[i][q_idx] = value
+            if debug:
+                logger.debug(f"[NSE_FILING] {batch[i][0]} {metric} Q{q_idx} = {value:.2f} (newer than core)")
+
+    return financials_by_symbol
@@ -94,7 +94,43 @@ class PriceLoader:
 
         # Get the most recent row for this symbol
         row = symbol_rows.sort_values('daily_date', ascending=False).iloc[0]
+        return self._row_to_latest(row)
 
+    def get_latest_data_batch(self, lookups: list) -> list:
+        """
+        get_latest_data for many companies with one pass over the prices file.
+        lookups: [(symbol, bse_code, company_name), ...] → list of dicts in the same order.
+        NSE symbols and BSE codes are resolved from latest-row-per-key indexes;
+        anything not found there goes through get_latest_data (name / Yahoo fallbacks).
+        """
+        import math
+        by_symbol = self._latest_rows_by('nse_symbol')
+        by_bse = self._latest_rows_by('bse_code')
+
+        results = []
+        for symbol, bse_code, company_name in lookups:
+            if not symbol or symbol == 'nan' or (isinstance(symbol, float) and math.isnan(symbol)):
+                symbol = ''
+            row = by_symbol.get(symbol) if symbol else None
+            if row is None and bse_code:
+                try:
+                    row = by_bse.get(float(bse_code))
+                except (ValueError, TypeError):
+                    row = None
+            if row is not None:
+                results.append(self._row_to_latest(row))
+            else:
+                results.append(self.get_latest_data(symbol, bse_code=bse_code, company_name=company_name))
+        return results
+
+    def _latest_rows_by(self, column: str) -> dict:
+        """{key: most recent row as a record dict} for one lookup column."""
+        rows = self.df[self.df[column].notna()]
+        latest = rows.sort_values('daily_date', ascending=False, kind='stable').drop_duplicates(column)
+        return dict(zip(latest[column], latest.to_dict('records')))
+
+    def _row_to_latest(self, row) -> dict:
+        """Latest-data dict from a prices row (Series or record dict)."""
         return {
             'company_name': row.get('Company Name', ''),
             'cmp': self._safe_float(row.get('close')),
@@ -28,9 +28,18 @@ Employee productivity (31):
 
 Each driver returns: {driver_name, current_value, impact_direction, trend}
 Respects PM overrides: before writing, check source column. If PM_OVERRIDE, skip.
+
+Panel mode (whole universe, see company_driver_panel.py):
+    calc.run_panel(companies)               # compute all drivers + one bulk upsert
+    calc.parity_check(companies, 200)       # sampled diff vs the per-company path
+
+Config (.env):
+    DRIVER_BULK_CHUNK=500    # rows per bulk UPDATE / company_ids per override SELECT
 """
 
 import os
+import time
+import random
 import logging
 import math
 import numpy as np
@@ -40,10 +49,16 @@ from collections import defaultdict
 
 from dotenv import load_dotenv
 
+from valuation_system.data.processors.company_driver_panel import (
+    build_panel, compute_subgroup_state, compute_panel_drivers, diff_driver_lists, metric_lists,
+)
+
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '..', 'config', '.env'))
 
 logger = logging.getLogger(__name__)
 
+BULK_CHUNK = int(os.getenv('DRIVER_BULK_CHUNK', '500'))
+
 
 class CompanyDriverCalculator:
     """Computes quantitative company drivers from core CSV + prices data."""
@@ -260,13 +275,7 @@ class CompanyDriverCalculator:
     def _load_gdp_growth(self):
         """Load GDP growth rate from vs_drivers MACRO level."""
         try:
-            conn = mysql.connector.connect(
-                host=os.getenv('MYSQL_HOST', 'localhost'),
-                port=int(os.getenv('MYSQL_PORT', 3306)),
-                user=os.getenv('MYSQL_USER', 'root'),
-                password=os.getenv('MYSQL_PASSWORD', ''),
-                database=os.getenv('MYSQL_DATABASE', 'rag')
-            )
+            conn = self._mysql_connect()
             cursor = conn.cursor(dictionary=True)
             cursor.execute("""
                 SELECT current_value FROM vs_drivers
@@ -291,6 +300,16 @@ class CompanyDriverCalculator:
             self._gdp_growth = 6.5
             logger.warning(f"Failed to load GDP growth: {e}, using fallback 6.5%%")
 
+    def _mysql_connect(self):
+        """Open a MySQL connection from .env settings."""
+        return mysql.connector.connect(
+            host=os.getenv('MYSQL_HOST', 'localhost'),
+            port=int(os.getenv('MYSQL_PORT', 3306)),
+            user=os.getenv('MYSQL_USER', 'root'),
+            password=os.getenv('MYSQL_PASSWORD', ''),
+            database=os.getenv('MYSQL_DATABASE', 'rag')
+        )
+
     def compute_all_drivers(self, csv_name: str, valuation_subgroup: str,
                             company_id: int, symbol: str = '',
                             valuation_group: str = '', bse_code: str = '') -> list:
@@ -1829,13 +1848,7 @@ class CompanyDriverCalculator:
         Upsert auto-computed drivers to vs_drivers.
         Skips rows where source='PM_OVERRIDE' (PM has manually set them).
         """
-        conn = mysql.connector.connect(
-            host=os.getenv('MYSQL_HOST', 'localhost'),
-            port=int(os.getenv('MYSQL_PORT', 3306)),
-            user=os.getenv('MYSQL_USER', 'root'),
-            password=os.getenv('MYSQL_PASSWORD', ''),
-            database=os.getenv('MYSQL_DATABASE', 'rag')
-        )
+        conn = self._mysql_connect()
         cursor = conn.cursor(dictionary=True)
 
         updated = 0
@@ -1877,6 +1890,186 @@ class CompanyDriverCalculator:
 
         return updated, skipped_pm
 
+    # =========================================================================
+    # PANEL MODE (whole universe, vectorized)
+    # =========================================================================
+
+    def compute_panel(self, companies: list) -> list:
+        """
+        precompute_subgroup_medians + compute_all_drivers for every company in one
+        pass: financials and prices are loaded once and each driver is computed as an
+        array operation over the universe (company_driver_panel).
+
+        Leaves the same subgroup state behind as precompute_subgroup_medians, so
+        per-company calls still work afterwards.
+
+        Returns per-company driver lists in `companies` order; stage timings are in
+        self.panel_timings.
+        """
+        t0 = time.perf_counter()
+        panel = build_panel(self, companies)
+        t1 = time.perf_counter()
+        state = compute_subgroup_state(panel)
+        self._adopt_panel_state(panel, state, metric_lists(state))
+        self._load_gdp_growth()
+        t2 = time.perf_counter()
+        drivers = compute_panel_drivers(panel, state, self._gdp_growth)
+        t3 = time.perf_counter()
+
+        self.panel_timings = {
+            'companies': len(companies),
+            'drivers': sum(len(d) for d in drivers),
+            'load_s': round(t1 - t0, 3),
+            'subgroup_stats_s': round(t2 - t1, 3),
+            'drivers_s': round(t3 - t2, 3),
+            'total_s': round(t3 - t0, 3),
+        }
+        logger.info(f"Panel drivers: {self.panel_timings['drivers']} drivers for {len(companies)} companies "
+                    f"in {self.panel_timings['total_s']:.2f}s (load {self.panel_timings['load_s']:.2f}s)")
+        return drivers
+
+    def _adopt_panel_state(self, panel, state, lists: dict):
+        """Populate the precompute_subgroup_medians attributes from a panel SubgroupState."""
+        self._subgroup_stats = state.stats
+        self._subgroup_totals = state.sg_totals
+        self._group_totals = state.grp_totals
+        self._subgroup_totals_prior = state.sg_totals_prior
+        self._group_totals_prior = state.grp_totals_prior
+        self._subgroup_metric_lists = defaultdict(lambda: defaultdict(list))
+        self._subgroup_capex_sales = defaultdict(list)
+        for sg, metrics in lists.items():
+            self._subgroup_metric_lists[sg].update(metrics)
+            if metrics.get('capex_sales'):
+                self._subgroup_capex_sales[sg] = list(metrics['capex_sales'])
+
+        self._company_aggregates, self._company_aggregates_prior = {}, {}
+        for i in np.flatnonzero(state.agg):
+            csv_name = panel.csv_name[i]
+            self._company_aggregates[csv_name] = {
+                'ttm_sales': float(state.agg_sales[i]),
+                'ttm_pat': float(state.agg_pat[i]),
+                'subgroup': panel.subgroup[i],
+                'group': panel.group[i],
+            }
+            if state.prior_sales[i] > 0:
+                prior = {'sales': float(state.prior_sales[i])}
+                if state.prior_pat[i] > 0:
+                    prior['pat'] = float(state.prior_pat[i])
+                self._company_aggregates_prior[csv_name] = prior
+
+    def upsert_drivers_bulk(self, rows: list, chunk_size: int = BULK_CHUNK) -> dict:
+        """
+        Bulk upsert_drivers_to_db for a whole driver table over one connection.
+        rows: [(company_id, [driver dicts]), ...]
+
+        PM overrides are read with chunked SELECTs and skipped; the remaining drivers
+        are written with chunked multi-row UPDATE ... JOIN statements. Like the
+        per-company path this only updates existing vs_drivers rows.
+        Returns {'updated', 'skipped_pm', 'statements'}.
+        """
+        values = {}
+        for company_id, drivers in rows:
+            if not company_id:
+                continue
+            for d in drivers:
+                values[(company_id, d['driver_name'])] = (d['current_value'], d['impact_direction'], d['trend'])
+        if not values:
+            return {'updated': 0, 'skipped_pm': 0, 'statements': 0}
+
+        conn = self._mysql_connect()
+        cursor = conn.cursor(dictionary=True)
+        updated = 0
+        statements = 0
+        try:
+            overrides = set()
+            company_ids = sorted({cid for cid, _ in values})
+            for start in range(0, len(company_ids), chunk_size):
+                chunk = company_ids[start:start + chunk_size]
+                cursor.execute(f"""
+                    SELECT company_id, driver_name FROM vs_drivers
+                    WHERE driver_level = 'COMPANY' AND source = 'PM_OVERRIDE'
+                      AND company_id IN ({', '.join(['%s'] * len(chunk))})
+                """, tuple(chunk))
+                statements += 1
+                overrides.update((r['company_id'], r['driver_name']) for r in cursor.fetchall())
+
+            pending = [(key, v) for key, v in values.items() if key not in overrides]
+            for start in range(0, len(pending), chunk_size):
+                chunk = pending[start:start + chunk_size]
+                derived = ' UNION ALL '.join(
+                    ['SELECT %s AS company_id, %s AS driver_name, %s AS current_value, '
+                     '%s AS impact_direction, %s AS trend'] + ['SELECT %s, %s, %s, %s, %s'] * (len(chunk) - 1))
+                cursor.execute(f"""
+                    UPDATE vs_drivers d
+                    JOIN ({derived}) v ON d.company_id = v.company_id AND d.driver_name = v.driver_name
+                    SET d.current_value = v.current_value, d.impact_direction = v.impact_direction,
+                        d.trend = v.trend, d.source = 'AUTO', d.last_updated = NOW()
+                    WHERE d.driver_level = 'COMPANY' AND (d.source IS NULL OR d.source <> 'PM_OVERRIDE')
+                """, tuple(p for (cid, name), v in chunk for p in (cid, name) + v))
+                statements += 1
+                updated += max(cursor.rowcount, 0)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+        skipped_pm = len(values) - len(pending)
+        logger.info(f"Bulk driver upsert: updated {updated}, skipped {skipped_pm} PM overrides "
+                    f"in {statements} statements")
+        return {'updated': updated, 'skipped_pm': skipped_pm, 'statements': statements}
+
+    def run_panel(self, companies: list, write: bool = True) -> dict:
+        """compute_panel + upsert_drivers_bulk (companies need 'company_id'). Returns the run report."""
+        drivers = self.compute_panel(companies)
+        report = dict(self.panel_timings)
+        if write:
+            t0 = time.perf_counter()
+            report['upsert'] = self.upsert_drivers_bulk(
+                [(comp.get('company_id'), d) for comp, d in zip(companies, drivers)])
+            report['upsert_s'] = round(time.perf_counter() - t0, 3)
+        return report
+
+    def parity_check(self, companies: list, sample_size: int = 200, seed: int = 0) -> dict:
+        """
+        Compare panel drivers with precompute_subgroup_medians + compute_all_drivers
+        on a random sample of companies (subgroup stats always use the full universe).
+        Companies sharing a csv_name are not sampled: the per-company path keeps a
+        single market-share aggregate per name.
+        Returns {'sampled', 'matched', 'drivers_compared', 'mismatches': [{csv_name, diffs}]}.
+        """
+        panel_drivers = self.compute_panel(companies)
+
+        legacy = type(self)(self.core, self.prices)
+        legacy._mysql_connect = self._mysql_connect
+        legacy.precompute_subgroup_medians(companies)
+
+        names = defaultdict(int)
+        for comp in companies:
+            names[comp.get('csv_name', '')] += 1
+        eligible = [i for i, comp in enumerate(companies) if comp.get('csv_name') and names[comp['csv_name']] == 1]
+        sample = sorted(random.Random(seed).sample(eligible, min(sample_size, len(eligible))))
+
+        mismatches = []
+        compared = 0
+        for i in sample:
+            comp = companies[i]
+            expected = legacy.compute_all_drivers(
+                comp['csv_name'], comp.get('valuation_subgroup', ''), comp.get('company_id'),
+                symbol=comp.get('symbol', ''), valuation_group=comp.get('valuation_group', ''),
+                bse_code=comp.get('bse_code', ''))
+            compared += len(expected)
+            diffs = diff_driver_lists(expected, panel_drivers[i])
+            if diffs:
+                mismatches.append({'csv_name': comp['csv_name'], 'diffs': diffs})
+
+        if mismatches:
+            logger.warning(f"Panel parity: {len(mismatches)}/{len(sample)} sampled companies differ")
+        return {'sampled': len(sample), 'matched': len(sample) - len(mismatches),
+                'drivers_compared': compared, 'mismatches': mismatches}
+
 
 # =============================================================================
 # MODULE-LEVEL HELPER FUNCTIONS
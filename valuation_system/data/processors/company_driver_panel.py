@@ -0,0 +1,902 @@
+"""
+Company Driver Panel
+Whole-universe (panel) mode for CompanyDriverCalculator: every driver is
+computed as a column-wise array operation over all companies at once instead
+of one company at a time.
+
+Layout:
+- build_panel(): one get_company_financials call and one (batched) price
+  lookup per company; each financials series the drivers read is stacked into
+  a SeriesMatrix — values[company, key] over the sorted union of keys, NaN
+  where a company has no value for that key
+- compute_subgroup_state(): the precompute_subgroup_medians state (medians,
+  std, market-share totals, rank reference lists) from grouped operations on
+  the panel
+- compute_panel_drivers(): the 31 drivers as masked array expressions, then
+  emitted per company in the same order and format as compute_all_drivers
+
+Parity with the per-company path is exact by construction:
+- Series helpers reproduce the loader's dict semantics (latest = max key,
+  TTM = last 4 keys rounded to 2dp, CAGR span fallback)
+- Floating-point operations keep the per-company evaluation order; pow and
+  round go through Python scalars
+- Subgroup sums are accumulated in the per-company iteration order (np.add.at)
+- Percentile ranks are one grouped searchsorted over (subgroup, value rank)
+
+Usage:
+    panel = build_panel(calculator, companies)
+    state = compute_subgroup_state(panel)
+    drivers = compute_panel_drivers(panel, state, gdp_growth=6.5)   # [[driver dicts], ...] per company
+
+Edge Cases:
+- get_company_financials raising / returning {} → the company has no drivers
+  and is left out of subgroup statistics (as precompute_subgroup_medians does)
+- Duplicate csv_name rows: each row keeps its own market-share aggregates (the
+  per-company path keeps only the last one per name)
+"""
+
+import math
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EXCLUDED_SUBGROUPS = ('NON_OPERATING', 'NOT_CLASSIFIED')
+
+# Financials keys the drivers read
+ANNUAL_SERIES = ['sales_annual', 'pbidt_annual', 'pat_annual', 'roce', 'roe', 'gpm', 'debt', 'networth',
+                 'pur_of_fixed_assets', 'cashflow_ops_yearly', 'pbt_excp_yearly', 'interest_yearly',
+                 'cash_conversion_cycle', 'total_assets', 'inventories', 'sundry_debtors', 'tot_liab',
+                 'LT_borrow']
+QUARTERLY_SERIES = ['sales_quarterly', 'pbidt_quarterly', 'pat_quarterly', 'interest_quarterly',
+                    'employee_cost_quarterly', 'promoter_holding_quarterly', 'promoter_pledged_quarterly',
+                    'debt_equity_quarterly', 'pledgebypromoter_quarterly', 'roe_3yr_quarterly',
+                    'number_employees_quarterly']
+HALFYEARLY_SERIES = ['inventories_hy', 'sundry_debtors_hy', 'tot_liab_hy', 'LT_borrow_hy', 'cash_and_bank_hy']
+
+DRIVER_ORDER = [
+    'revenue_cagr_3yr', 'ebitda_margin_vs_peers', 'roce_trend', 'debt_equity_change',
+    'promoter_holding_trend', 'fcf_yield', 'earnings_momentum', 'relative_valuation_gap',
+    'market_share_by_revenue', 'market_share_by_profit', 'growth_vs_gdp',
+    'capex_to_sales_trend', 'nwc_to_sales_trend', 'effective_tax_rate', 'cost_of_debt',
+    'promoter_pledge_pct', 'interest_coverage', 'operating_leverage', 'fcf_margin',
+    'earnings_quality', 'capex_phase', 'roe_trend_3y', 'gross_margin_trend',
+    'cash_conversion_cycle', 'earnings_volatility', 'asset_turnover_trend',
+    'operational_excellence', 'financial_health', 'growth_efficiency',
+    'earnings_sustainability', 'employee_productivity',
+]
+
+
+# =============================================================================
+# SERIES MATRICES
+# =============================================================================
+
+def _last_positions(mask: np.ndarray, k: int) -> np.ndarray:
+    """Column positions of the last k True cells per row, right-aligned; -1 pads."""
+    n, m = mask.shape
+    pos = np.sort(np.where(mask, np.arange(m), -1), axis=1)
+    if m < k:
+        pos = np.hstack([np.full((n, k - m), -1), pos])
+    return pos[:, pos.shape[1] - k:]
+
+
+def _take(values: np.ndarray, pos: np.ndarray) -> np.ndarray:
+    if values.shape[1] == 0:
+        return np.full(pos.shape, np.nan)
+    out = values[np.arange(len(values))[:, None], np.maximum(pos, 0)]
+    out[pos < 0] = np.nan
+    return out
+
+
+def _first_valid(window: np.ndarray) -> np.ndarray:
+    """Leftmost non-NaN per row (NaN if none)."""
+    valid = ~np.isnan(window)
+    out = window[np.arange(len(window)), np.argmax(valid, axis=1)] if window.shape[1] else \
+        np.full(len(window), np.nan)
+    return np.where(valid.any(axis=1), out, np.nan)
+
+
+def _last_valid(window: np.ndarray) -> np.ndarray:
+    """Rightmost non-NaN per row (NaN if none)."""
+    return _first_valid(window[:, ::-1])
+
+
+def _py(fn, *arrays: np.ndarray, where: np.ndarray) -> np.ndarray:
+    """Apply a Python scalar function on rows in where (exact pow/round semantics)."""
+    out = np.full(len(where), np.nan)
+    idx = np.flatnonzero(where)
+    if len(idx):
+        out[idx] = [fn(*args) for args in zip(*(a[idx].tolist() for a in arrays))]
+    return out
+
+
+class SeriesMatrix:
+    """One financials series for every company: values[n, m] over sorted keys[m]; NaN = key absent."""
+
+    def __init__(self, dicts: Sequence[dict], key_fn=None):
+        if key_fn:
+            dicts = [{key_fn(k): v for k, v in d.items()} for d in dicts]
+        keys = sorted(set().union(*dicts))
+        self.keys = np.array(keys, dtype=float)
+        col = {k: j for j, k in enumerate(keys)}
+        rows, cols, vals = [], [], []
+        for i, d in enumerate(dicts):
+            rows.extend([i] * len(d))
+            cols.extend(map(col.__getitem__, d))
+            vals.extend(d.values())
+        self.values = np.full((len(dicts), len(keys)), np.nan)
+        self.values[rows, cols] = vals
+        self.mask = ~np.isnan(self.values)
+        self.count = self.mask.sum(axis=1)
+
+    @classmethod
+    def aligned(cls, a: 'SeriesMatrix', b: 'SeriesMatrix'):
+        """(a_values, b_values, keys) on the union key grid."""
+        keys = np.union1d(a.keys, b.keys)
+        return a._reindex(keys), b._reindex(keys), keys
+
+    def _reindex(self, keys: np.ndarray) -> np.ndarray:
+        out = np.full((len(self.values), len(keys)), np.nan)
+        out[:, np.searchsorted(keys, self.keys)] = self.values
+        return out
+
+    def last(self, k: int):
+        """(values, keys) of the last k present keys per row, right-aligned (NaN pads)."""
+        pos = _last_positions(self.mask, k)
+        keys = np.where(pos >= 0, self.keys[np.maximum(pos, 0)] if len(self.keys) else np.nan, np.nan)
+        return _take(self.values, pos), keys
+
+    def latest(self) -> np.ndarray:
+        """get_latest_value: value at the max key (NaN if empty)."""
+        return self.last(1)[0][:, 0]
+
+    def first(self):
+        vals, keys = self.last(self.values.shape[1] or 1)
+        return _first_valid(vals), _first_valid(keys)
+
+    def at(self, keys: np.ndarray) -> np.ndarray:
+        """Value at a per-row key (NaN if that key is absent)."""
+        if not len(self.keys):
+            return np.full(len(keys), np.nan)
+        pos = np.clip(np.searchsorted(self.keys, np.nan_to_num(keys, nan=-1)), 0, len(self.keys) - 1)
+        hit = self.keys[pos] == keys
+        return np.where(hit, self.values[np.arange(len(keys)), pos], np.nan)
+
+    def ttm(self) -> np.ndarray:
+        """get_ttm: round(sum of the last 4 keys, 2); NaN with fewer than 4."""
+        v, _ = self.last(4)
+        total = ((v[:, 0] + v[:, 1]) + v[:, 2]) + v[:, 3]
+        return _py(lambda x: round(x, 2), total, where=self.count >= 4)
+
+    def cagr(self, years: int) -> np.ndarray:
+        """calculate_cagr: requested span first, then the first available key."""
+        end_v, end_k = (a[:, 0] for a in self.last(1))
+        first_v, first_k = self.first()
+        ok_end = (self.count >= 2) & (end_v > 0)
+
+        start_k = np.maximum(first_k, end_k - years)
+        start_v = self.at(start_k)
+        span = end_k - start_k
+        ok1 = ok_end & (start_v > 0) & (span > 0)
+        span2 = end_k - first_k
+        ok2 = ok_end & ~ok1 & (first_v > 0) & (span2 > 0)
+
+        base_v = np.where(ok1, start_v, first_v)
+        n = np.where(ok1, span, span2)
+        return _py(lambda e, s, n_: (e / s) ** (1 / int(n_)) - 1, end_v, base_v, n, where=ok1 | ok2)
+
+
+def _window(a_vals: np.ndarray, b_vals: np.ndarray, k: int):
+    """Last k keys present in both a and b, right-aligned."""
+    pos = _last_positions(~np.isnan(a_vals) & ~np.isnan(b_vals), k)
+    return _take(a_vals, pos), _take(b_vals, pos)
+
+
+def _hy_key(key) -> int:
+    year, half = key
+    return year * 10 + half
+
+
+# =============================================================================
+# PANEL
+# =============================================================================
+
+class DriverPanel:
+    """Company metadata arrays + series matrices + price columns for one universe."""
+
+    def __init__(self, companies: List[dict], financials: List[dict], prices: List[Optional[dict]]):
+        self.companies = companies
+        self.n = len(companies)
+        self.csv_name = [c.get('csv_name', '') for c in companies]
+        self.subgroup = np.array([c.get('valuation_subgroup', '') for c in companies], dtype=object)
+        self.group = np.array([c.get('valuation_group', '') for c in companies], dtype=object)
+        self.ok = np.array([bool(f) for f in financials])
+        self.has_price = np.array([bool(p) for p in prices])
+        self.pe = np.array([_num((p or {}).get('pe')) for p in prices])
+        self.mcap = np.array([_num((p or {}).get('mcap_cr')) for p in prices])
+
+        self.series: Dict[str, SeriesMatrix] = {}
+        for name in ANNUAL_SERIES + QUARTERLY_SERIES:
+            if name == 'LT_borrow':
+                dicts = [f.get('LT_borrow', f.get('lt_borrowings', {})) or {} for f in financials]
+            else:
+                dicts = [f.get(name) or {} for f in financials]
+            self.series[name] = SeriesMatrix(dicts)
+        for name in HALFYEARLY_SERIES:
+            self.series[name] = SeriesMatrix([f.get(name) or {} for f in financials], key_fn=_hy_key)
+
+    def __getitem__(self, name: str) -> SeriesMatrix:
+        return self.series[name]
+
+
+def _num(value) -> float:
+    """Price field → float (NaN for missing/None/NaN, matching falsy checks downstream)."""
+    if value is None:
+        return np.nan
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return np.nan
+    return value
+
+
+def build_panel(calculator, companies: List[dict]) -> DriverPanel:
+    """Load financials and prices for every company once."""
+    financials = []
+    for comp in companies:
+        csv_name = comp.get('csv_name', '')
+        fin = {}
+        if csv_name:
+            try:
+                fin = calculator.core.get_company_financials(csv_name) or {}
+            except Exception as e:
+                logger.debug(f"Panel: no financials for {csv_name}: {e}")
+        financials.append(fin)
+
+    lookups, lookup_rows = [], []
+    for i, comp in enumerate(companies):
+        symbol, bse_code = comp.get('symbol', ''), comp.get('bse_code', '')
+        if financials[i] and (symbol or bse_code):
+            lookups.append((symbol, bse_code, comp.get('csv_name', '')))
+            lookup_rows.append(i)
+    prices: List[Optional[dict]] = [None] * len(companies)
+    if lookups:
+        if hasattr(calculator.prices, 'get_latest_data_batch'):
+            found = calculator.prices.get_latest_data_batch(lookups)
+        else:
+            found = [calculator.prices.get_latest_data(s, bse_code=b, company_name=c) for s, b, c in lookups]
+        for i, data in zip(lookup_rows, found):
+            prices[i] = data
+    return DriverPanel(companies, financials, prices)
+
+
+# =============================================================================
+# SUBGROUP STATE (precompute_subgroup_medians equivalent)
+# =============================================================================
+
+def _codes(labels: np.ndarray, rows: np.ndarray):
+    """First-appearance codes for labels[rows]: (codes for all rows (-1 outside rows), unique labels)."""
+    codes = np.full(len(labels), -1)
+    uniques: Dict = {}
+    for i in np.flatnonzero(rows):
+        key = labels[i]
+        codes[i] = uniques.setdefault(key, len(uniques))
+    return codes, list(uniques)
+
+
+def grouped_percentile_rank(query: np.ndarray, q_group: np.ndarray,
+                            ref: np.ndarray, r_group: np.ndarray) -> np.ndarray:
+    """
+    Share of ref values in the query's group strictly below the query value
+    (_percentile_rank); 0.5 for an empty group or a NaN query.
+    """
+    present = ~np.isnan(query)
+    uniq = np.unique(np.concatenate([ref, query[present]]))
+    base = len(uniq) + 1
+    ref_keys = np.sort(r_group * base + np.searchsorted(uniq, ref))
+    q_rank = np.searchsorted(uniq, np.where(present, query, 0))
+    lo = np.searchsorted(ref_keys, q_group * base)
+    hi = np.searchsorted(ref_keys, q_group * base + base)
+    below = np.searchsorted(ref_keys, q_group * base + q_rank) - lo
+    size = hi - lo
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(present & (size > 0) & (q_group >= 0), below / np.maximum(size, 1), 0.5)
+
+
+class SubgroupState:
+    """Per-row views of the subgroup statistics and totals."""
+
+    def __init__(self):
+        self.stats: Dict[str, Dict[str, dict]] = {}
+        self.rank_refs: Dict[str, tuple] = {}
+
+
+def compute_subgroup_state(panel: DriverPanel, compute_stats=None) -> SubgroupState:
+    """
+    Subgroup medians/std, market-share totals and rank reference lists.
+    compute_stats is the calculator's _compute_stats (same summation order).
+    """
+    from valuation_system.data.processors.company_driver_calculator import _compute_stats
+    compute_stats = compute_stats or _compute_stats
+    state = SubgroupState()
+    n = panel.n
+
+    valid_sg = np.array([bool(sg) and sg not in EXCLUDED_SUBGROUPS for sg in panel.subgroup])
+    sg_codes, sg_labels = _codes(panel.subgroup, valid_sg)
+    # Per-company path walks subgroups in first-appearance order, companies in list order
+    member = valid_sg & panel.ok & np.array([bool(c) for c in panel.csv_name])
+    order = np.lexsort((np.arange(n), sg_codes))
+    order = order[member[order]]
+    state.sg_codes, state.sg_labels, state.member = sg_codes, sg_labels, member
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ttm_sales = panel['sales_quarterly'].ttm()
+        ttm_pbidt = panel['pbidt_quarterly'].ttm()
+        ttm_pat = panel['pat_quarterly'].ttm()
+        ttm_interest = panel['interest_quarterly'].ttm()
+        cagr3 = panel['sales_annual'].cagr(3)
+        roce = panel['roce'].latest()
+        capex = panel['pur_of_fixed_assets'].latest()
+        cfo = panel['cashflow_ops_yearly'].latest()
+
+        sales_pos = ttm_sales > 0
+        margin = np.where(sales_pos & (ttm_pbidt != 0) & ~np.isnan(ttm_pbidt), ttm_pbidt / ttm_sales, np.nan)
+        capex_sales = np.where(~np.isnan(capex) & sales_pos, np.abs(capex) / ttm_sales, np.nan)
+        ic = np.where((ttm_pbidt != 0) & ~np.isnan(ttm_pbidt) & (ttm_interest > 0),
+                      ttm_pbidt / ttm_interest, np.nan)
+        pe = np.where(panel.has_price & (panel.pe > 0), panel.pe, np.nan)
+        fcf_yield = np.where(panel.has_price & ~np.isnan(cfo) & ~np.isnan(capex) & (panel.mcap > 0),
+                             (cfo - np.abs(capex)) / panel.mcap, np.nan)
+        lat_d, lat_nw = panel['debt'].latest(), panel['networth'].latest()
+        nw = np.where(lat_nw == 0, 1.0, lat_nw)
+        de = np.where(~np.isnan(lat_d) & (nw > 0), lat_d / nw, np.nan)
+
+    metrics = {'ebitda_margin': margin, 'pe': pe, 'fcf_yield': fcf_yield, 'revenue_cagr_3yr': cagr3,
+               'capex_sales': capex_sales, 'interest_coverage': ic}
+    bounds = np.flatnonzero(np.diff(sg_codes[order])) + 1
+    for rows in np.split(order, bounds) if len(order) else []:
+        label = sg_labels[sg_codes[rows[0]]]
+        state.stats[label] = {name: compute_stats([v for v in values[rows].tolist() if not math.isnan(v)])
+                              for name, values in metrics.items()}
+    for label in sg_labels:  # Subgroups whose companies all lacked financials
+        state.stats.setdefault(label, {name: {} for name in metrics})
+
+    # Rank reference lists (composite scores), in per-company order
+    for name, values in (('roce', roce), ('opm', margin), ('capex_sales', capex_sales), ('de', de), ('ic', ic)):
+        rows = order[~np.isnan(values[order])]
+        state.rank_refs[name] = (values[rows], sg_codes[rows])
+
+    # Market-share totals, accumulated in per-company order
+    grp_codes, grp_list = _codes(panel.group, member)
+    n_sg, n_grp = len(sg_labels), len(grp_list)
+    agg = member & sales_pos
+    sg_ttm_pat = np.where(ttm_pat > 0, ttm_pat, 0.0)
+
+    sales_vals, sales_keys = panel['sales_annual'].last(2)
+    prior_sales = np.where(agg & (panel['sales_annual'].count >= 2), np.nan_to_num(sales_vals[:, 0]), 0.0)
+    prior_sales = np.where(prior_sales > 0, prior_sales, 0.0)
+    prior_pat = panel['pat_annual'].at(sales_keys[:, 0])
+    prior_pat = np.where((prior_sales > 0) & (panel['pat_annual'].count > 0) & (prior_pat > 0), prior_pat, 0.0)
+
+    def _totals(codes, size, values, rows):
+        totals = np.zeros(size)
+        ordered = order[rows[order]]
+        np.add.at(totals, codes[ordered], values[ordered])
+        touched = np.zeros(size, dtype=bool)
+        touched[codes[ordered]] = True
+        return totals, touched
+
+    sg_sales, sg_has = _totals(sg_codes, n_sg, ttm_sales, agg)
+    sg_pat, _ = _totals(sg_codes, n_sg, sg_ttm_pat, member & (ttm_pat > 0))
+    grp_sales, grp_has = _totals(grp_codes, n_grp, ttm_sales, agg)
+    grp_pat, _ = _totals(grp_codes, n_grp, sg_ttm_pat, member & (ttm_pat > 0))
+    sg_sales_p, sg_has_p = _totals(sg_codes, n_sg, prior_sales, prior_sales > 0)
+    sg_pat_p, _ = _totals(sg_codes, n_sg, prior_pat, prior_pat > 0)
+    grp_sales_p, grp_has_p = _totals(grp_codes, n_grp, prior_sales, prior_sales > 0)
+    grp_pat_p, _ = _totals(grp_codes, n_grp, prior_pat, prior_pat > 0)
+
+    # Totals exist only for subgroups/groups with at least one positive-sales company
+    def _row_view(codes, totals, has):
+        out = np.zeros(n)
+        inside = codes >= 0
+        out[inside] = np.where(has[codes[inside]], totals[codes[inside]], 0.0)
+        return out
+
+    state.agg = agg
+    state.agg_sales = np.where(agg, ttm_sales, 0.0)
+    state.agg_pat = np.where(agg, sg_ttm_pat, 0.0)
+    state.prior_sales, state.prior_pat = prior_sales, prior_pat
+    state.sg_sales, state.sg_pat = _row_view(sg_codes, sg_sales, sg_has), _row_view(sg_codes, sg_pat, sg_has)
+    state.grp_sales = _row_view(grp_codes, grp_sales, grp_has)
+    state.grp_pat = _row_view(grp_codes, grp_pat, grp_has)
+    state.sg_sales_prior = _row_view(sg_codes, sg_sales_p, sg_has_p)
+    state.sg_pat_prior = _row_view(sg_codes, sg_pat_p, sg_has_p)
+    state.grp_totals = {label: {'sales': grp_sales[c], 'pat': grp_pat[c]}
+                        for c, label in enumerate(grp_list) if grp_has[c]}
+    state.grp_totals_prior = {label: {'sales': grp_sales_p[c], 'pat': grp_pat_p[c]}
+                              for c, label in enumerate(grp_list) if grp_has_p[c]}
+    state.sg_totals = {label: {'sales': sg_sales[c], 'pat': sg_pat[c]}
+                       for c, label in enumerate(sg_labels) if sg_has[c]}
+    state.sg_totals_prior = {label: {'sales': sg_sales_p[c], 'pat': sg_pat_p[c]}
+                             for c, label in enumerate(sg_labels) if sg_has_p[c]}
+    return state
+
+
+def metric_lists(state: SubgroupState) -> Dict[str, Dict[str, list]]:
+    """rank_refs regrouped as the calculator's {subgroup: {metric: [values]}} lists."""
+    lists: Dict[str, Dict[str, list]] = {label: {} for label in state.sg_labels}
+    for name, (values, codes) in state.rank_refs.items():
+        for label in lists:
+            lists[label][name] = []
+        for value, code in zip(values.tolist(), codes.tolist()):
+            lists[state.sg_labels[code]][name].append(value)
+    return lists
+
+
+def _row_stat(panel: DriverPanel, state: SubgroupState, metric: str, field: str) -> np.ndarray:
+    out = np.full(panel.n, np.nan)
+    for i, sg in enumerate(panel.subgroup):
+        value = state.stats.get(sg, {}).get(metric, {}).get(field)
+        if value is not None:
+            out[i] = value
+    return out
+
+
+def _classify_vs_median(value: np.ndarray, median: np.ndarray, std: np.ndarray) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (value - median) / std
+    flat = std == 0
+    return np.select(
+        [flat & (value > median * 1.1), flat & (value < median * 0.9),
+         ~flat & (std > 0) & (z > 1.0), ~flat & (std > 0) & (z < -1.0)],
+        ['POSITIVE', 'NEGATIVE', 'POSITIVE', 'NEGATIVE'], 'NEUTRAL')
+
+
+def _band(x: np.ndarray, hi: float, lo: float, above=('POSITIVE', 'UP'), below=('NEGATIVE', 'DOWN'),
+          neutral=('NEUTRAL', 'STABLE')):
+    """(direction, trend) for x > hi / x < lo / otherwise."""
+    direction = np.select([x > hi, x < lo], [above[0], below[0]], neutral[0])
+    trend = np.select([x > hi, x < lo], [above[1], below[1]], neutral[1])
+    return direction, trend
+
+
+def _threshold(x: np.ndarray, pos_above: float, neg_below: float) -> np.ndarray:
+    return np.select([x > pos_above, x < neg_below], ['POSITIVE', 'NEGATIVE'], 'NEUTRAL')
+
+
+def _yoy_std(pat_q: SeriesMatrix):
+    """earnings_volatility std of YoY quarterly growth (np.std on the same ragged lists)."""
+    v, _ = pat_q.last(12)
+    curr, prior = v[:, 4:], np.nan_to_num(v[:, :8])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        yoy = np.where(prior != 0, curr / prior - 1, np.nan)
+    yoy[pat_q.count < 12] = np.nan
+    counts = (~np.isnan(yoy)).sum(axis=1)
+    packed = _take(yoy, _last_positions(~np.isnan(yoy), 8))
+    std = np.full(len(v), np.nan)
+    for length in range(3, 9):
+        rows = np.flatnonzero(counts == length)
+        if len(rows):
+            std[rows] = np.std(packed[rows][:, 8 - length:], axis=1)
+    return std
+
+
+# =============================================================================
+# DRIVERS
+# =============================================================================
+
+def compute_panel_drivers(panel: DriverPanel, state: SubgroupState,
+                          gdp_growth: Optional[float]) -> List[List[dict]]:
+    """All drivers for every company: list (per company) of driver dicts in compute_all_drivers order."""
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        columns = _driver_columns(panel, state, gdp_growth)
+
+    results: List[List[dict]] = [[] for _ in range(panel.n)]
+    for name in DRIVER_ORDER:
+        valid, values, direction, trend = columns[name]
+        valid = valid & panel.ok
+        for i in np.flatnonzero(valid):
+            results[i].append({
+                'driver_name': name,
+                'current_value': values(i),
+                'impact_direction': str(direction[i]),
+                'trend': str(trend[i]),
+            })
+    return results
+
+
+def _driver_columns(p: DriverPanel, st: SubgroupState, gdp: Optional[float]) -> dict:
+    cols = {}
+    stable = np.full(p.n, 'STABLE', dtype=object)
+
+    sales_a, pbidt_a, pat_a = p['sales_annual'], p['pbidt_annual'], p['pat_annual']
+    ttm_sales = p['sales_quarterly'].ttm()
+    ttm_pbidt = p['pbidt_quarterly'].ttm()
+    ttm_interest = p['interest_quarterly'].ttm()
+    cagr3, cagr5 = sales_a.cagr(3), sales_a.cagr(5)
+    latest_capex = p['pur_of_fixed_assets'].latest()
+    latest_cfo = p['cashflow_ops_yearly'].latest()
+    latest_sales = sales_a.latest()
+    latest_pat = pat_a.latest()
+    sales_ok = ttm_sales > 0
+
+    # 1. revenue_cagr_3yr
+    valid = ~np.isnan(cagr3)
+    direction = _classify_vs_median(cagr3, _row_stat(p, st, 'revenue_cagr_3yr', 'median'),
+                                    _row_stat(p, st, 'revenue_cagr_3yr', 'std'))
+    trend = np.select([cagr3 > cagr5 + 0.02, cagr3 < cagr5 - 0.02], ['UP', 'DOWN'], 'STABLE')
+    cols['revenue_cagr_3yr'] = (valid, lambda i: f"{cagr3[i]:.1%}", direction, trend)
+
+    # 2. ebitda_margin_vs_peers
+    margin = ttm_pbidt / ttm_sales
+    valid = sales_ok & ~np.isnan(ttm_pbidt)
+    direction = _classify_vs_median(margin, _row_stat(p, st, 'ebitda_margin', 'median'),
+                                    _row_stat(p, st, 'ebitda_margin', 'std'))
+    prev_v, prev_k = sales_a.last(2)
+    prev_sales = prev_v[:, 0]
+    prev_pbidt = np.nan_to_num(pbidt_a.at(prev_k[:, 0]))
+    prev_margin = prev_pbidt / prev_sales
+    has_prev = (sales_a.count >= 2) & (pbidt_a.count > 0) & (prev_sales > 0)
+    trend = np.select([has_prev & (margin > prev_margin + 0.01), has_prev & (margin < prev_margin - 0.01)],
+                      ['UP', 'DOWN'], 'STABLE')
+    cols['ebitda_margin_vs_peers'] = (valid, lambda i: f"{margin[i]:.1%}", direction, trend)
+
+    # 3. roce_trend
+    w, _ = p['roce'].last(3)
+    latest, first = w[:, 2], _first_valid(w)
+    direction = np.select([latest > first + 2, latest < first - 2], ['POSITIVE', 'NEGATIVE'], 'NEUTRAL')
+    trend = np.select([latest > first + 2, latest < first - 2], ['UP', 'DOWN'], 'STABLE')
+    roce_latest = latest
+    cols['roce_trend'] = (p['roce'].count >= 2, lambda i: f"{roce_latest[i]:.1f}%", direction, trend)
+
+    # 4. debt_equity_change: fullstats quarterly D/E, else annual debt/networth
+    de_q = p['debt_equity_quarterly']
+    w, _ = de_q.last(20)
+    q_mode = de_q.count >= 4
+    q_latest = w[:, 19]
+    q_earlier = np.where(np.minimum(de_q.count, 20) >= 8, w[:, 12], _first_valid(w))
+    d_vals, nw_vals, _ = SeriesMatrix.aligned(p['debt'], p['networth'])
+    d_w, nw_w = _window(d_vals, nw_vals, 3)
+    common = (~np.isnan(d_vals) & ~np.isnan(nw_vals)).sum(axis=1)
+    nw_fix = np.where(nw_w == 0, 1.0, nw_w)
+    ratios = np.where(np.isnan(d_w), np.nan, np.where(nw_fix > 0, d_w / nw_fix, 0.0))
+    a_latest, a_first = ratios[:, 2], _first_valid(ratios)
+    annual_mode = ~q_mode & (p['debt'].count > 0) & (p['networth'].count > 0) & (common >= 2)
+    de_latest = np.where(q_mode, q_latest, a_latest)
+    de_first = np.where(q_mode, q_earlier, a_first)
+    direction = np.select([de_latest < de_first - 0.1, de_latest > de_first + 0.1], ['POSITIVE', 'NEGATIVE'],
+                          'NEUTRAL')
+    trend = np.select([de_latest < de_first - 0.1, de_latest > de_first + 0.1], ['DOWN', 'UP'], 'STABLE')
+    cols['debt_equity_change'] = (q_mode | annual_mode, lambda i: f"{de_latest[i]:.2f}x", direction, trend)
+
+    # 5. promoter_holding_trend
+    prom = p['promoter_holding_quarterly']
+    w, _ = prom.last(4)
+    prom_latest = w[:, 3]
+    prom_change = prom_latest - _first_valid(w)
+    direction, trend = _band(prom_change, 0.5, -1.0)
+    cols['promoter_holding_trend'] = (prom.count >= 2,
+                                      lambda i: f"{prom_latest[i]:.1f}% ({prom_change[i]:+.1f}pp)",
+                                      direction, trend)
+
+    # 6. fcf_yield
+    mcap = np.where(p.has_price, np.nan_to_num(p.mcap), 0.0)
+    fcf_y = (latest_cfo - np.abs(latest_capex)) / mcap
+    valid = ~np.isnan(latest_cfo) & ~np.isnan(latest_capex) & (mcap > 0)
+    direction = _classify_vs_median(fcf_y, _row_stat(p, st, 'fcf_yield', 'median'),
+                                    _row_stat(p, st, 'fcf_yield', 'std'))
+    cols['fcf_yield'] = (valid, lambda i: f"{fcf_y[i]:.1%}", direction, stable)
+
+    # 7. earnings_momentum
+    pat_q = p['pat_quarterly']
+    w, _ = pat_q.last(12)
+    z = np.nan_to_num(w)
+    recent = (((0 + z[:, 8]) + z[:, 9]) + z[:, 10]) + z[:, 11]
+    prev = (((0 + z[:, 4]) + z[:, 5]) + z[:, 6]) + z[:, 7]
+    older = (((0 + z[:, 0]) + z[:, 1]) + z[:, 2]) + z[:, 3]
+    yoy = recent / prev - 1
+    accel = np.where((pat_q.count >= 12) & (older != 0), yoy - (prev / older - 1), 0.0)
+    valid = (pat_q.count >= 8) & (prev != 0)
+    trend = np.select([accel > 0.05, accel < -0.05], ['UP', 'DOWN'], 'STABLE')
+    cols['earnings_momentum'] = (valid, lambda i: f"{yoy[i]:.1%} YoY", _threshold(yoy, 0.15, -0.05), trend)
+
+    # 8. relative_valuation_gap
+    median_pe = _row_stat(p, st, 'pe', 'median')
+    premium = p.pe / median_pe - 1
+    valid = p.has_price & (p.pe > 0) & (median_pe > 0)
+    direction = np.select([premium > 0.20, premium < -0.15], ['NEGATIVE', 'POSITIVE'], 'NEUTRAL')
+    pe = p.pe
+    cols['relative_valuation_gap'] = (
+        valid, lambda i: f"P/E {pe[i]:.1f}x vs {median_pe[i]:.1f}x ({premium[i]:+.0%})", direction, stable)
+
+    # 9. market_share_by_revenue
+    sg_share = np.where(st.sg_sales > 0, st.agg_sales / st.sg_sales * 100, 0.0)
+    grp_share = np.where(st.grp_sales > 0, st.agg_sales / st.grp_sales * 100, 0.0)
+    sg_share_prior = np.where((st.sg_sales_prior > 0) & (st.prior_sales > 0),
+                              st.prior_sales / st.sg_sales_prior * 100, 0.0)
+    sg_change = np.where(sg_share_prior > 0, sg_share - sg_share_prior, 0.0)
+    direction, trend = _band(sg_change, 0.5, -0.5)
+    cs_ratio = np.abs(latest_capex) / st.agg_sales * 100
+    sg_median_cs = np.nan_to_num(_row_stat(p, st, 'capex_sales', 'median')) * 100
+    has_capex = ~np.isnan(latest_capex)
+
+    def _revenue_share(i):
+        context = ''
+        if has_capex[i]:
+            ch, cs, med = sg_change[i], cs_ratio[i], sg_median_cs[i]
+            if ch < -0.5 and cs > med:
+                context = f" | Investing to gain share (capex {cs:.1f}% vs peer {med:.1f}%)"
+            elif ch < -0.5 and cs <= med:
+                context = " | Losing share without investing"
+            elif ch > 0.5 and cs > med:
+                context = f" | Capex-driven share gain (capex {cs:.1f}% vs peer {med:.1f}%)"
+            elif ch > 0.5 and cs <= med:
+                context = " | Organic share gain (brand/distribution)"
+        return f"Subgroup: {sg_share[i]:.1f}% ({sg_change[i]:+.1f}pp) | Group: {grp_share[i]:.1f}%{context}"
+    cols['market_share_by_revenue'] = (st.agg, _revenue_share, direction, trend)
+
+    # 10. market_share_by_profit
+    psg_share = np.where(st.sg_pat > 0, st.agg_pat / st.sg_pat * 100, 0.0)
+    pgrp_share = np.where(st.grp_pat > 0, st.agg_pat / st.grp_pat * 100, 0.0)
+    psg_prior = np.where((st.sg_pat_prior > 0) & (st.prior_pat > 0), st.prior_pat / st.sg_pat_prior * 100, 0.0)
+    psg_change = np.where(psg_prior > 0, psg_share - psg_prior, 0.0)
+    direction, trend = _band(psg_change, 0.5, -0.5)
+    cols['market_share_by_profit'] = (
+        st.agg & (st.agg_pat > 0),
+        lambda i: f"Subgroup: {psg_share[i]:.1f}% ({psg_change[i]:+.1f}pp) | Group: {pgrp_share[i]:.1f}%",
+        direction, trend)
+
+    # 11. growth_vs_gdp
+    if gdp is not None:
+        cagr_pct = cagr3 * 100
+        ratio = cagr_pct / gdp if gdp > 0 else np.zeros(p.n)
+        ratio_5 = (cagr5 * 100) / gdp if gdp > 0 else np.zeros(p.n)
+        has5 = ~np.isnan(cagr5)
+        trend = np.select([has5 & (ratio > ratio_5 + 0.3), has5 & (ratio < ratio_5 - 0.3)], ['UP', 'DOWN'],
+                          'STABLE')
+        cols['growth_vs_gdp'] = (
+            ~np.isnan(cagr3), lambda i: f"CAGR {cagr_pct[i]:.1f}% vs GDP {gdp:.1f}% = {ratio[i]:.1f}x",
+            _threshold(ratio, 2.0, 0.8), trend)
+    else:
+        cols['growth_vs_gdp'] = (np.zeros(p.n, dtype=bool), None, stable, stable)
+
+    # 12. capex_to_sales_trend
+    c_vals, s_vals, _ = SeriesMatrix.aligned(p['pur_of_fixed_assets'], sales_a)
+    c_w, s_w = _window(c_vals, s_vals, 3)
+    common = (~np.isnan(c_vals) & ~np.isnan(s_vals)).sum(axis=1)
+    r = np.where(s_w > 0, np.abs(c_w) / s_w, np.nan)
+    cst_latest, cst_first = _last_valid(r), _first_valid(r)
+    valid = (common >= 2) & ~np.isnan(cst_latest)
+    direction = np.select([cst_latest < cst_first - 0.02], ['POSITIVE'], 'NEUTRAL')
+    trend = np.select([cst_latest < cst_first - 0.02, cst_latest > cst_first + 0.02], ['DOWN', 'UP'], 'STABLE')
+    cols['capex_to_sales_trend'] = (valid, lambda i: f"{cst_latest[i]:.1%}", direction, trend)
+
+    # 13. nwc_to_sales_trend
+    def _hy_or_annual(hy, annual):
+        v = p[hy].latest()
+        return np.where(np.isnan(v), p[annual].latest(), v)
+    inv = _hy_or_annual('inventories_hy', 'inventories')
+    dr = _hy_or_annual('sundry_debtors_hy', 'sundry_debtors')
+    tl = _hy_or_annual('tot_liab_hy', 'tot_liab')
+    ltb = _hy_or_annual('LT_borrow_hy', 'LT_borrow')
+    nwc_pct = ((inv + dr) - (tl - ltb)) / latest_sales
+    valid = (latest_sales > 0) & ~np.isnan(inv) & ~np.isnan(dr) & ~np.isnan(tl) & ~np.isnan(ltb)
+    direction = np.select([nwc_pct < -0.05, nwc_pct > 0.20], ['POSITIVE', 'NEGATIVE'], 'NEUTRAL')
+    cols['nwc_to_sales_trend'] = (valid, lambda i: f"{nwc_pct[i]:.1%}", direction, stable)
+
+    # 14. effective_tax_rate
+    pa_vals, pb_vals, _ = SeriesMatrix.aligned(pat_a, p['pbt_excp_yearly'])
+    pa_w, pb_w = _window(pa_vals, pb_vals, 1)
+    tax = np.maximum(1 - (pa_w[:, 0] / pb_w[:, 0]), 0)
+    valid = pb_w[:, 0] > 0
+    direction = np.select([tax < 0.25, tax > 0.30], ['POSITIVE', 'NEGATIVE'], 'NEUTRAL')
+    cols['effective_tax_rate'] = (valid, lambda i: f"{tax[i]:.1%}", direction, stable)
+
+    # 15. cost_of_debt
+    i_vals, d_vals2, _ = SeriesMatrix.aligned(p['interest_yearly'], p['debt'])
+    i_w, d_w2 = _window(i_vals, d_vals2, 1)
+    cod = i_w[:, 0] / d_w2[:, 0]
+    valid = d_w2[:, 0] > 0
+    cols['cost_of_debt'] = (valid, lambda i: f"{cod[i]:.1%}",
+                            np.select([cod < 0.08, cod > 0.12], ['POSITIVE', 'NEGATIVE'], 'NEUTRAL'), stable)
+
+    # 16. promoter_pledge_pct: fullstats pledge series, else core CSV pledged
+    pledge_q = p['pledgebypromoter_quarterly']
+    w, _ = pledge_q.last(8)
+    q_mode = pledge_q.count > 0
+    pledge = np.where(q_mode, w[:, 7], p['promoter_pledged_quarterly'].latest())
+    earlier = w[:, 0]
+    has8 = q_mode & (pledge_q.count >= 8)
+    trend = np.select([has8 & (pledge > earlier + 2), has8 & (pledge < earlier - 2)], ['UP', 'DOWN'], 'STABLE')
+    direction = np.select([pledge <= 0, pledge > 20, pledge > 5], ['POSITIVE', 'NEGATIVE', 'NEUTRAL'], 'POSITIVE')
+    cols['promoter_pledge_pct'] = (~np.isnan(pledge), lambda i: f"{pledge[i]:.1f}%", direction, trend)
+
+    # 17. interest_coverage
+    ic = ttm_pbidt / ttm_interest
+    valid = ~np.isnan(ttm_pbidt) & (ttm_interest > 0)
+    cols['interest_coverage'] = (valid, lambda i: f"{ic[i]:.1f}x", _threshold(ic, 5, 2), stable)
+
+    # 18. operating_leverage
+    s_vals, pb_vals2, _ = SeriesMatrix.aligned(sales_a, pbidt_a)
+    s_w2, p_w2 = _window(s_vals, pb_vals2, 2)
+    common = (~np.isnan(s_vals) & ~np.isnan(pb_vals2)).sum(axis=1)
+    s_curr, s_prev, p_curr, p_prev = s_w2[:, 1], s_w2[:, 0], p_w2[:, 1], p_w2[:, 0]
+    sales_growth = (s_curr / s_prev) - 1
+    op_lev = ((p_curr / p_prev) - 1) / sales_growth
+    valid = (common >= 2) & (s_prev != 0) & (p_prev != 0) & ~(np.abs(sales_growth) < 0.01)
+    trend = np.select([op_lev > 3, op_lev < 0], ['UP', 'DOWN'], 'STABLE')
+    cols['operating_leverage'] = (valid, lambda i: f"{op_lev[i]:.2f}x", _threshold(op_lev, 1.5, 0.5), trend)
+
+    # 19. fcf_margin
+    fcf_m = (latest_cfo - np.abs(latest_capex)) / latest_sales
+    valid = ~np.isnan(latest_cfo) & ~np.isnan(latest_capex) & (latest_sales > 0)
+    cols['fcf_margin'] = (valid, lambda i: f"{fcf_m[i]:.1%}", _threshold(fcf_m, 0.10, 0), stable)
+
+    # 20. earnings_quality
+    eq = latest_cfo / latest_pat
+    valid = ~np.isnan(latest_cfo) & (latest_pat > 0)
+    cols['earnings_quality'] = (valid, lambda i: f"{eq[i]:.2f}x", _threshold(eq, 0.8, 0.5), stable)
+
+    # 21. capex_phase
+    capex_s = p['pur_of_fixed_assets']
+    w, _ = capex_s.last(3)
+    avg_3y = np.mean(np.abs(w), axis=1)
+    avg_2y = np.mean(np.abs(w[:, 1:]), axis=1)
+    phase = avg_2y / avg_3y
+    valid = (capex_s.count >= 3) & (avg_3y > 0)
+    trend = np.select([(phase > 1.2) & (phase > 1.5), (phase < 0.8) & (phase < 0.6)], ['UP', 'DOWN'], 'STABLE')
+    label = np.select([phase > 1.2, phase < 0.8], ['Expansion', 'Harvesting'], 'Maintenance')
+    cols['capex_phase'] = (valid, lambda i: f"{phase[i]:.2f}x ({label[i]})",
+                           np.full(p.n, 'NEUTRAL', dtype=object), trend)
+
+    # 22. roe_trend_3y: fullstats 3Y rolling ROE, else annual ROE
+    roe3 = p['roe_3yr_quarterly']
+    w, _ = roe3.last(12)
+    q_mode = roe3.count >= 4
+    q_latest = w[:, 11]
+    q_change = q_latest - np.where(roe3.count >= 12, w[:, 0], _first_valid(w))
+    w_a, _ = p['roe'].last(3)
+    a_latest = w_a[:, 2]
+    a_change = a_latest - _first_valid(w_a)
+    roe_latest = np.where(q_mode, q_latest, a_latest)
+    roe_change = np.where(q_mode, q_change, a_change)
+    valid = q_mode | (p['roe'].count >= 2)
+    direction, trend = _band(roe_change, 3, -3)
+    cols['roe_trend_3y'] = (valid, lambda i: f"{roe_latest[i]:.1f}% ({roe_change[i]:+.1f}pp over 3Y)",
+                            direction, trend)
+
+    # 23. gross_margin_trend
+    w, _ = p['gpm'].last(3)
+    gpm_latest, gpm_change = w[:, 2], w[:, 2] - _first_valid(w)
+    direction, trend = _band(gpm_change, 2, -2)
+    cols['gross_margin_trend'] = (p['gpm'].count >= 2,
+                                  lambda i: f"{gpm_latest[i]:.1f}% ({gpm_change[i]:+.1f}pp over 3Y)",
+                                  direction, trend)
+
+    # 24. cash_conversion_cycle (lower is better)
+    w, _ = p['cash_conversion_cycle'].last(3)
+    ccc_latest, ccc_change = w[:, 2], w[:, 2] - _first_valid(w)
+    direction, trend = _band(ccc_change, 10, -10, above=('NEGATIVE', 'UP'), below=('POSITIVE', 'DOWN'))
+    cols['cash_conversion_cycle'] = (p['cash_conversion_cycle'].count >= 2,
+                                     lambda i: f"{ccc_latest[i]:.0f} days ({ccc_change[i]:+.0f}d over 3Y)",
+                                     direction, trend)
+
+    # 25. earnings_volatility
+    yoy_std = _yoy_std(pat_q)
+    vol = yoy_std * 100
+    cols['earnings_volatility'] = (~np.isnan(yoy_std), lambda i: f"Std dev {vol[i]:.0f}%",
+                                   np.select([vol < 15, vol > 40], ['POSITIVE', 'NEGATIVE'], 'NEUTRAL'), stable)
+
+    # 26. asset_turnover_trend
+    s_vals, ta_vals, _ = SeriesMatrix.aligned(sales_a, p['total_assets'])
+    s_w3, ta_w = _window(s_vals, ta_vals, 3)
+    common = (~np.isnan(s_vals) & ~np.isnan(ta_vals)).sum(axis=1)
+    at = np.where(ta_w > 0, s_w3 / ta_w, np.nan)
+    at_latest = _last_valid(at)
+    at_change = at_latest - _first_valid(at)
+    valid = (common >= 2) & ((~np.isnan(at)).sum(axis=1) >= 2)
+    direction, trend = _band(at_change, 0.1, -0.1)
+    cols['asset_turnover_trend'] = (valid, lambda i: f"{at_latest[i]:.2f}x ({at_change[i]:+.2f} over 3Y)",
+                                    direction, trend)
+
+    # 27. operational_excellence: grouped percentile ranks within subgroup
+    sg_codes = st.sg_codes
+    roce_rank = grouped_percentile_rank(roce_latest_all := p['roce'].latest(), sg_codes, *st.rank_refs['roce'])
+    opm_rank = grouped_percentile_rank(margin, sg_codes, *st.rank_refs['opm'])
+    cs = np.where(~np.isnan(latest_capex) & sales_ok, np.abs(latest_capex) / ttm_sales, np.nan)
+    cs_rank = np.where(np.isnan(cs), 0.5, grouped_percentile_rank(1 - cs, sg_codes, *st.rank_refs['capex_sales']))
+    score = 0.4 * roce_rank + 0.3 * opm_rank + 0.3 * cs_rank
+    valid = ~np.isnan(roce_latest_all) & sales_ok & ~np.isnan(ttm_pbidt)
+    cols['operational_excellence'] = (
+        valid, lambda i: f"Score {score[i]:.0%} (ROCE:{roce_latest_all[i]:.0f}%, OPM:{margin[i]:.0%})",
+        _threshold(score, 0.70, 0.30), stable)
+
+    # 28. financial_health
+    lat_d, lat_nw = p['debt'].latest(), p['networth'].latest()
+    de = lat_d / lat_nw
+    fh_ic = np.where((ttm_pbidt != 0) & ~np.isnan(ttm_pbidt) & (ttm_interest > 0), ttm_pbidt / ttm_interest, 0.0)
+    cash = np.nan_to_num(p['cash_and_bank_hy'].latest())
+    cash_to_debt = np.where(lat_d > 0, cash / lat_d, 1.0)
+    fh_score = (0.4 * np.clip(1 - de / 2, 0, 1) + 0.35 * np.clip(fh_ic / 10, 0, 1)
+                + 0.25 * np.clip(cash_to_debt, 0, 1))
+    valid = ~np.isnan(lat_d) & (lat_nw > 0)
+    cols['financial_health'] = (
+        valid, lambda i: (f"Score {fh_score[i]:.0%} (D/E:{de[i]:.1f}x, IC:{fh_ic[i]:.1f}x, "
+                          f"Cash/Debt:{cash_to_debt[i]:.0%})"),
+        _threshold(fh_score, 0.70, 0.30), stable)
+
+    # 29. growth_efficiency
+    ge_cs = np.abs(latest_capex) / latest_sales
+    efficiency = (cagr3 * 100) / (np.maximum(ge_cs, 0.01) * 100)
+    valid = ~np.isnan(cagr3) & ~np.isnan(latest_capex) & (latest_sales > 0)
+    cols['growth_efficiency'] = (
+        valid, lambda i: (f"CAGR/CapIntensity = {efficiency[i]:.1f}x (CAGR:{cagr3[i]:.0%}, "
+                          f"Capex/Sales:{ge_cs[i]:.0%})"),
+        _threshold(efficiency, 3, 1), stable)
+
+    # 30. earnings_sustainability
+    ocf_pat = latest_cfo / latest_pat
+    vol_score = np.where(np.isnan(yoy_std), 0.5, 1 / (1 + yoy_std))
+    es_score = 0.6 * np.minimum(ocf_pat, 1.5) / 1.5 + 0.4 * vol_score
+    valid = ~np.isnan(latest_cfo) & (latest_pat > 0)
+    cols['earnings_sustainability'] = (
+        valid, lambda i: (f"Score {es_score[i]:.0%} (OCF/PAT:{ocf_pat[i]:.1f}x, "
+                          f"Stability:{vol_score[i]:.0%})"),
+        _threshold(es_score, 0.70, 0.30), stable)
+
+    # 31. employee_productivity: fullstats headcount, else sales/empcost
+    emp = p['number_employees_quarterly']
+    w, _ = emp.last(4)
+    latest_emp = w[:, 3]
+    emp_mode = sales_ok & (latest_emp > 0)
+    per_emp = ttm_sales / latest_emp
+    earlier_prod = ttm_sales / w[:, 0]
+    has4 = (emp.count >= 4) & (w[:, 0] > 0)
+    emp_trend = np.select([has4 & (per_emp > earlier_prod * 1.05), has4 & (per_emp < earlier_prod * 0.95)],
+                          ['UP', 'DOWN'], 'STABLE')
+    ttm_emp_cost = p['employee_cost_quarterly'].ttm()
+    ratio_prod = ttm_sales / ttm_emp_cost
+    ratio_mode = ~emp_mode & sales_ok & (ttm_emp_cost > 0)
+    direction = np.where(emp_mode, _threshold(per_emp, 1.0, 0.2), _threshold(ratio_prod, 8, 3))
+    trend = np.where(emp_mode, emp_trend, 'STABLE')
+
+    def _productivity(i):
+        if emp_mode[i]:
+            return f"{per_emp[i]:.2f} Cr/emp ({int(latest_emp[i])} employees)"
+        return f"{ratio_prod[i]:.1f}x (sales/empcost)"
+    cols['employee_productivity'] = (emp_mode | ratio_mode, _productivity, direction, trend)
+
+    return cols
+
+
+def diff_driver_lists(expected: List[dict], actual: List[dict]) -> List[dict]:
+    """Field-level differences between two driver lists for one company (parity checks)."""
+    exp = {d['driver_name']: d for d in expected}
+    act = {d['driver_name']: d for d in actual}
+    diffs = []
+    for name in DRIVER_ORDER:
+        e, a = exp.get(name), act.get(name)
+        if e == a:
+            continue
+        if e is None or a is None:
+            diffs.append({'driver_name': name, 'field': 'presence', 'expected': e is not None,
+                          'actual': a is not None})
+            continue
+        for field in ('current_value', 'impact_direction', 'trend'):
+            if e.get(field) != a.get(field):
+                diffs.append({'driver_name': name, 'field': field, 'expected': e.get(field),
+                              'actual': a.get(field)})
+    if [d['driver_name'] for d in expected] != [d['driver_name'] for d in actual] and not diffs:
+        diffs.append({'driver_name': None, 'field': 'order', 'expected': None, 'actual': None})
+    return diffs
+
+
+def group_counts(drivers: List[List[dict]]) -> Dict[str, int]:
+    counts: Dict[str, int] = defaultdict(int)
+    for company in drivers:
+        for d in company:
+            counts[d['driver_name']] += 1
+    return dict(counts)
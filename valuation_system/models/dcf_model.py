@@ -95,9 +95,8 @@ class FCFFValuation:
             after_tax_cost_of_debt * inputs.debt_ratio
         )
 
-        logger.debug(f"WACC calculation: Ke={cost_of_equity:.4f}, "
-                      f"Kd_at={after_tax_cost_of_debt:.4f}, "
-                      f"D/V={inputs.debt_ratio:.4f}, WACC={wacc:.4f}")
+        logger.debug("WACC calculation: Ke=%.4f, Kd_at=%.4f, D/V=%.4f, WACC=%.4f",
+                     cost_of_equity, after_tax_cost_of_debt, inputs.debt_ratio, wacc)
 
         return wacc
 
@@ -198,12 +197,13 @@ class FCFFValuation:
             terminal_nopat = (terminal_ebitda - terminal_dep) * (1 - tax_rate)
             terminal_fcff = terminal_nopat * (1 - terminal_reinvestment)
 
-            logger.debug(f"Terminal FCFF (NOPAT-based): Rev={terminal_revenue:,.2f}, "
-                          f"EBITDA={terminal_ebitda:,.2f}, Dep={terminal_dep:,.2f}, "
-                          f"NOPAT={terminal_nopat:,.2f}, FCFF={terminal_fcff:,.2f}")
-            logger.debug(f"Terminal FCFF comparison: NOPAT-based={terminal_fcff:,.2f} vs "
-                          f"old method (FCFF*(1+g))={old_terminal_fcff:,.2f}, "
-                          f"diff={((terminal_fcff/old_terminal_fcff)-1)*100:+.1f}%")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Terminal FCFF (NOPAT-based): Rev={terminal_revenue:,.2f}, "
+                              f"EBITDA={terminal_ebitda:,.2f}, Dep={terminal_dep:,.2f}, "
+                              f"NOPAT={terminal_nopat:,.2f}, FCFF={terminal_fcff:,.2f}")
+                logger.debug(f"Terminal FCFF comparison: NOPAT-based={terminal_fcff:,.2f} vs "
+                              f"old method (FCFF*(1+g))={old_terminal_fcff:,.2f}, "
+                              f"diff={((terminal_fcff/old_terminal_fcff)-1)*100:+.1f}%")
         else:
             # Fallback: use old method if revenue/margin not available
             terminal_fcff = old_terminal_fcff
@@ -216,8 +216,9 @@ class FCFFValuation:
 
         terminal_value = terminal_fcff / (wacc - terminal_growth)
 
-        logger.debug(f"Terminal value: g={terminal_growth:.4f}, "
-                      f"FCFF_n+1={terminal_fcff:,.2f}, TV={terminal_value:,.2f}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Terminal value: g={terminal_growth:.4f}, "
+                          f"FCFF_n+1={terminal_fcff:,.2f}, TV={terminal_value:,.2f}")
 
         return {
             'terminal_growth': terminal_growth,
@@ -230,11 +231,13 @@ class FCFFValuation:
             'old_method_fcff': old_terminal_fcff,
         }
 
-    def calculate_intrinsic_value(self, inputs: DCFInputs) -> dict:
+    def calculate_intrinsic_value(self, inputs: DCFInputs, quiet: bool = False) -> dict:
         """
         Main valuation calculation.
 
         Returns complete DCF output with all intermediate calculations.
+        quiet=True skips the per-call diagnostics (value bridge, TV% warnings,
+        result line) — used by Monte Carlo, which calls this thousands of times.
         """
         # WACC
         wacc = self.calculate_wacc(inputs)
@@ -264,7 +267,7 @@ class FCFFValuation:
         pv_terminal = tv_result['terminal_value'] / ((1 + wacc) ** len(projections))
 
         # WEEK 4 FIX: Validate projection period FCFF
-        if pv_fcff < 0:
+        if pv_fcff < 0 and not quiet:
             logger.error(f"⚠️  Projection period PV(FCFF) is NEGATIVE (₹{pv_fcff:,.0f} Cr). "
                         f"This indicates projection assumptions are too aggressive:")
             logger.error(f"   - Check if capex is too high relative to revenue")
@@ -278,12 +281,12 @@ class FCFFValuation:
 
         # WEEK 4 FIX: Validate terminal value percentage
         tv_pct = (pv_terminal / firm_value * 100) if firm_value > 0 else 0
-        if tv_pct > 150:
+        if not quiet and tv_pct > 150:
             logger.warning(f"⚠️  Terminal Value = {tv_pct:.0f}% of firm value (>150% threshold)")
             logger.warning(f"   This suggests projection period FCFF is too low or negative")
             logger.warning(f"   PV(Projection FCFF) = ₹{pv_fcff:,.0f} Cr")
             logger.warning(f"   PV(Terminal Value) = ₹{pv_terminal:,.0f} Cr")
-        elif tv_pct < 20:
+        elif not quiet and tv_pct < 20:
             logger.warning(f"⚠️  Terminal Value = {tv_pct:.0f}% of firm value (<20% threshold)")
             logger.warning(f"   This is unusually low - check if terminal ROCE or growth is too conservative")
 
@@ -291,15 +294,17 @@ class FCFFValuation:
         intrinsic_per_share = equity_value / inputs.shares_outstanding if inputs.shares_outstanding > 0 else 0
 
         # === TRACEABILITY: Log the value bridge ===
-        logger.debug(f"DCF Value Bridge for {inputs.company_name}:")
-        logger.debug(f"  PV of explicit FCFFs:    Rs {pv_fcff:>12,.2f} Cr")
-        logger.debug(f"  PV of Terminal Value:     Rs {pv_terminal:>12,.2f} Cr")
-        logger.debug(f"  = Firm (Enterprise) Value:Rs {firm_value:>12,.2f} Cr")
-        logger.debug(f"  - Net Debt:               Rs {inputs.net_debt:>12,.2f} Cr")
-        logger.debug(f"  + Cash & Equivalents:     Rs {inputs.cash_and_equivalents:>12,.2f} Cr")
-        logger.debug(f"  = Equity Value:            Rs {equity_value:>12,.2f} Cr")
-        logger.debug(f"  / Shares Outstanding:     {inputs.shares_outstanding:>12.2f} Cr")
-        logger.debug(f"  = Intrinsic Per Share:     Rs {intrinsic_per_share:>12,.2f}")
+        # Guarded so the f-strings are only built when DEBUG is actually enabled
+        if not quiet and logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"DCF Value Bridge for {inputs.company_name}:")
+            logger.debug(f"  PV of explicit FCFFs:    Rs {pv_fcff:>12,.2f} Cr")
+            logger.debug(f"  PV of Terminal Value:     Rs {pv_terminal:>12,.2f} Cr")
+            logger.debug(f"  = Firm (Enterprise) Value:Rs {firm_value:>12,.2f} Cr")
+            logger.debug(f"  - Net Debt:               Rs {inputs.net_debt:>12,.2f} Cr")
+            logger.debug(f"  + Cash & Equivalents:     Rs {inputs.cash_and_equivalents:>12,.2f} Cr")
+            logger.debug(f"  = Equity Value:            Rs {equity_value:>12,.2f} Cr")
+            logger.debug(f"  / Shares Outstanding:     {inputs.shares_outstanding:>12.2f} Cr")
+            logger.debug(f"  = Intrinsic Per Share:     Rs {intrinsic_per_share:>12,.2f}")
 
         result = {
             'company': inputs.company_name,
@@ -352,9 +357,10 @@ class FCFFValuation:
             'fcff_projections': projections
         }
 
-        logger.info(f"DCF result for {inputs.company_name}: "
-                     f"Intrinsic=₹{intrinsic_per_share:,.2f}, "
-                     f"WACC={wacc:.2%}, TV%={result['terminal_value_pct']:.1f}%")
+        if not quiet:
+            logger.info(f"DCF result for {inputs.company_name}: "
+                         f"Intrinsic=₹{intrinsic_per_share:,.2f}, "
+                         f"WACC={wacc:.2%}, TV%={result['terminal_value_pct']:.1f}%")
 
         return result
 
@@ -507,7 +513,7 @@ class MonteCarloValuation:
             sim_inputs.beta = max(0.5, sim_inputs.beta)
 
             try:
-                result = dcf_model.calculate_intrinsic_value(sim_inputs)
+                result = dcf_model.calculate_intrinsic_value(sim_inputs, quiet=True)
                 val = result['intrinsic_per_share']
                 if val > 0 and val < base_inputs.base_revenue * 100:  # Sanity check
                     results.append(val)
@@ -0,0 +1,346 @@
+"""
+NSE Fetch Engine — concurrent, rate-limited fetching for the NSE loader.
+
+Replaces the serial "GET, sleep API_PAUSE" loop in NSELoader.fetch_results:
+- Worker threads share ONE global token bucket, so the aggregate request
+  rate to NSE is bounded no matter how many workers run
+- A small pool of independent sessions, each warmed up with homepage cookies
+  and borrowed exclusively per request (NSESession retry semantics per session)
+- Adaptive backoff: a 429/403 halves the global rate and pauses every worker;
+  sustained success creeps the rate back up to the configured ceiling
+- Resumable: each fetched payload is appended to a JSONL progress file, so a
+  crashed sweep restarts with only the symbols it had not finished. The file
+  is keyed by a hash of the sweep (item keys + sweep tag, e.g. the loader
+  mode), so a different sweep never picks up another one's progress
+
+Offline testing: nse_mock_server.NSEMockServer replays recorded responses
+from cache/ and injects 429/403 errors (base_url=server.url).
+
+Config (.env):
+    NSE_FETCH_WORKERS=6
+    NSE_FETCH_SESSIONS=3
+    NSE_FETCH_RATE_PER_SEC=2.0          # ceiling of the global token bucket
+    NSE_FETCH_MIN_RATE_PER_SEC=0.2      # floor after repeated throttling
+    NSE_FETCH_RESUME_HOURS=12           # progress older than this is ignored
+
+Edge Cases:
+- Every retry of a request also waits for a token (retries can't burst)
+- FAILED symbols are not recorded as done, so a resume retries them
+- Progress file unreadable/corrupt line → that line is ignored
+- Progress files of other sweeps older than RESUME_HOURS are deleted
+"""
+
+import os
+import glob
+import json
+import time
+import queue
+import hashlib
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+from valuation_system.nse_results_prototype.nse_filing_prototype import NSESession, NSE_BASE
+from valuation_system.utils.rate_limiter import TokenBucket
+
+logger = logging.getLogger('valuation_system.nse_fetch_engine')
+
+WORKERS = int(os.getenv('NSE_FETCH_WORKERS', '6'))
+SESSIONS = int(os.getenv('NSE_FETCH_SESSIONS', '3'))
+RATE_PER_SEC = float(os.getenv('NSE_FETCH_RATE_PER_SEC', '2.0'))
+MIN_RATE_PER_SEC = float(os.getenv('NSE_FETCH_MIN_RATE_PER_SEC', '0.2'))
+RESUME_HOURS = float(os.getenv('NSE_FETCH_RESUME_HOURS', '12'))
+
+BACKOFF_BASE = 1.5       # seconds, doubled per consecutive throttle
+BACKOFF_MAX = 60.0
+RECOVERY_EVERY = 20      # successes before nudging the rate back up
+RECOVERY_FACTOR = 1.25
+
+
+class PooledNSESession(NSESession):
+    """NSESession against a configurable host, with engine-controlled pacing."""
+
+    def __init__(self, base_url: str = NSE_BASE):
+        super().__init__()
+        self.base_url = base_url.rstrip('/')
+
+    def _refresh_cookies(self):
+        """Homepage GET for cookies (best-effort, same as NSESession)."""
+        try:
+            resp = self.session.get(self.base_url + '/', timeout=15)
+            if resp.status_code == 200:
+                logger.debug(f"NSE cookies obtained: {list(dict(self.session.cookies).keys())}")
+            else:
+                logger.debug(f"NSE homepage returned {resp.status_code} — proceeding without cookies")
+        except Exception as e:
+            logger.debug(f"Cookie refresh failed (non-fatal): {e}")
+        self._cookie_refreshed_at = datetime.now()
+
+    def fetch(self, url: str, engine: 'NSEFetchEngine', max_retries: int = 3) -> Optional[Dict]:
+        """
+        NSESession.get retry loop, but every attempt takes a global token and
+        throttling responses feed the engine's adaptive backoff.
+        Returns parsed JSON or None on failure.
+        """
+        self._ensure_cookies()
+
+        for attempt in range(1, max_retries + 1):
+            engine.wait_for_slot()
+            try:
+                resp = self.session.get(url, timeout=20)
+
+                if resp.status_code in (401, 403):
+                    logger.warning(f"Auth error ({resp.status_code}) for {url}, refreshing cookies...")
+                    engine.on_throttle(resp.status_code)
+                    self._refresh_cookies()
+                    continue
+
+                if resp.status_code == 429:
+                    logger.warning(f"Rate limited (429) for {url}")
+                    engine.on_throttle(429)
+                    continue
+
+                resp.raise_for_status()
+                engine.on_success()
+
+                if not resp.text.strip():
+                    logger.warning(f"Empty response body for {url}")
+                    return {}
+                return resp.json()
+
+            except requests.exceptions.JSONDecodeError:
+                logger.warning(f"Non-JSON response for {url}: {resp.text[:200]}")
+                return None
+            except Exception as e:
+                logger.warning(f"Attempt {attempt} failed for {url}: {e}")
+                if attempt < max_retries:
+                    time.sleep(engine.backoff_base * attempt)
+                else:
+                    logger.error(f"All {max_retries} attempts failed for {url}\n{traceback.format_exc()}")
+        return None
+
+
+class NSEFetchEngine:
+    """
+    Concurrent fetcher: iter_fetch() yields (item, data) as requests complete.
+    One engine per run; sessions are warmed up on first use.
+    """
+
+    def __init__(self, base_url: str = NSE_BASE, workers: int = None, sessions: int = None,
+                 rate_per_sec: float = None, min_rate_per_sec: float = None,
+                 progress_path: str = None, max_retries: int = 3, backoff_base: float = BACKOFF_BASE):
+        self.base_url = base_url.rstrip('/')
+        self.workers = workers or WORKERS
+        self.session_count = max(1, min(sessions or SESSIONS, self.workers))
+        self.max_rate = rate_per_sec or RATE_PER_SEC
+        self.min_rate = min(min_rate_per_sec or MIN_RATE_PER_SEC, self.max_rate)
+        self.progress_path = progress_path  # Base name; the sweep hash is inserted before the suffix
+        self.active_progress_path = progress_path
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+
+        self.bucket = TokenBucket(self.max_rate, capacity=max(1.0, self.max_rate))
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._throttle_streak = 0
+        self._successes = 0
+        self._sessions: Optional[queue.Queue] = None
+        self._progress_lock = threading.Lock()
+        self.stats = {'requests': 0, 'throttled': 0, 'resumed': 0, 'fetched': 0, 'failed': 0,
+                      'min_rate_seen': self.max_rate}
+
+    # ------------------------------------------------------------------
+    # Rate control
+    # ------------------------------------------------------------------
+
+    def wait_for_slot(self):
+        """Block until any global backoff pause has passed and a token is available."""
+        while True:
+            with self._lock:
+                delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                break
+            time.sleep(delay)
+        self.bucket.acquire()
+        with self._lock:
+            self.stats['requests'] += 1
+
+    def on_throttle(self, status: int):
+        """429/403: halve the global rate and pause every worker (exponential in the streak)."""
+        with self._lock:
+            self._throttle_streak += 1
+            self._successes = 0
+            self.stats['throttled'] += 1
+            new_rate = max(self.min_rate, self.bucket.rate * 0.5)
+            pause = min(BACKOFF_MAX, self.backoff_base * 2 ** (self._throttle_streak - 1))
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            self.stats['min_rate_seen'] = min(self.stats['min_rate_seen'], new_rate)
+        self.bucket.set_rate(new_rate)
+        logger.warning(f"NSE throttled ({status}): rate → {new_rate:.2f}/s, pausing {pause:.1f}s")
+
+    def on_success(self):
+        with self._lock:
+            self._throttle_streak = 0
+            self._successes += 1
+            if self._successes % RECOVERY_EVERY or self.bucket.rate >= self.max_rate:
+                return
+            new_rate = min(self.max_rate, self.bucket.rate * RECOVERY_FACTOR)
+        self.bucket.set_rate(new_rate)
+        logger.debug(f"NSE rate recovering → {new_rate:.2f}/s")
+
+    @property
+    def current_rate(self) -> float:
+        return self.bucket.rate
+
+    # ------------------------------------------------------------------
+    # Session pool
+    # ------------------------------------------------------------------
+
+    def _ensure_sessions(self):
+        if self._sessions is not None:
+            return
+        pool = queue.Queue()
+        sessions = [PooledNSESession(self.base_url) for _ in range(self.session_count)]
+        with ThreadPoolExecutor(max_workers=self.session_count) as warmup:
+            list(warmup.map(lambda s: s._refresh_cookies(), sessions))  # Cookie warm-up
+        for session in sessions:
+            pool.put(session)
+        self._sessions = pool
+        logger.info(f"NSE fetch engine: {self.session_count} sessions warmed up, "
+                    f"{self.workers} workers, {self.max_rate:.2f} req/s ceiling")
+
+    def fetch(self, path: str) -> Optional[Dict]:
+        """One GET (path relative to base_url) through a pooled session."""
+        self._ensure_sessions()
+        session = self._sessions.get()
+        try:
+            return session.fetch(self.base_url + path, self, self.max_retries)
+        finally:
+            self._sessions.put(session)
+
+    def close(self):
+        if self._sessions is not None:
+            while not self._sessions.empty():
+                self._sessions.get_nowait().session.close()
+            self._sessions = None
+
+    # ------------------------------------------------------------------
+    # Resumable progress
+    # ------------------------------------------------------------------
+
+    def progress_file_for(self, keys: List[str], sweep_tag: str = '') -> Optional[str]:
+        """Progress file of one sweep: <base>.<sha1(sorted keys + tag)[:12]><suffix>."""
+        if not self.progress_path:
+            return None
+        digest = hashlib.sha1(json.dumps([sweep_tag, sorted(keys)]).encode()).hexdigest()[:12]
+        root, ext = os.path.splitext(self.progress_path)
+        return f"{root}.{digest}{ext or '.jsonl'}"
+
+    def _prune_stale_progress(self):
+        """Delete other sweeps' progress files too old to ever be resumed."""
+        root, ext = os.path.splitext(self.progress_path)
+        cutoff = time.time() - RESUME_HOURS * 3600
+        for path in glob.glob(f"{glob.escape(root)}.*{ext or '.jsonl'}") + [self.progress_path]:
+            try:
+                if path != self.active_progress_path and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                continue
+
+    def load_progress(self) -> Dict[str, Dict]:
+        """{key: data} already fetched by an interrupted run of this sweep (if recent enough)."""
+        path = self.active_progress_path
+        if not path or not os.path.exists(path):
+            return {}
+        age_hours = (time.time() - os.path.getmtime(path)) / 3600
+        if age_hours > RESUME_HOURS:
+            logger.info(f"Ignoring progress file older than {RESUME_HOURS}h: {path}")
+            return {}
+        done = {}
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    done[entry['key']] = entry['data']
+                except (ValueError, KeyError):
+                    continue  # Torn last line from a crash
+        return done
+
+    def _record_progress(self, key: str, data: Dict):
+        if not self.active_progress_path:
+            return
+        line = json.dumps({'key': key, 'data': data, 'at': datetime.now().isoformat()}, default=str)
+        with self._progress_lock:
+            with open(self.active_progress_path, 'a') as f:
+                f.write(line + '\n')
+
+    def clear_progress(self):
+        """Remove the current sweep's progress file (after its results are stored)."""
+        if self.active_progress_path and os.path.exists(self.active_progress_path):
+            os.remove(self.active_progress_path)
+
+    # ------------------------------------------------------------------
+    # Batch API
+    # ------------------------------------------------------------------
+
+    def iter_fetch(self, items: List[Dict], path_for: Callable[[Dict], str],
+                   key_for: Callable[[Dict], str], resume: bool = True,
+                   sweep_tag: str = '') -> Iterator[Tuple[Dict, Optional[Dict]]]:
+        """
+        Fetch path_for(item) for every item concurrently; yield (item, data) in
+        completion order (data None on failure). Items already in this sweep's
+        progress file (same keys, same sweep_tag) are yielded first without a request.
+        """
+        self.active_progress_path = self.progress_file_for([key_for(item) for item in items], sweep_tag)
+        if self.progress_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.progress_path)), exist_ok=True)
+            self._prune_stale_progress()
+        done = self.load_progress() if resume else {}
+        if not resume:
+            self.clear_progress()
+
+        pending = []
+        for item in items:
+            key = key_for(item)
+            if key in done:
+                self.stats['resumed'] += 1
+                yield item, done[key]
+            else:
+                pending.append(item)
+        if done:
+            logger.info(f"Resumed {self.stats['resumed']} results from {self.active_progress_path}, "
+                        f"{len(pending)} left to fetch")
+        if not pending:
+            return
+
+        def _one(item):
+            data = self.fetch(path_for(item))
+            if data is not None:
+                self._record_progress(key_for(item), data)
+            return data
+
+        start = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='nse-fetch')
+        try:
+            futures = {executor.submit(_one, item): item for item in pending}
+            for n, future in enumerate(as_completed(futures), 1):
+                item = futures[future]
+                try:
+                    data = future.result()
+                except Exception as e:
+                    logger.error(f"Fetch crashed for {key_for(item)}: {e}\n{traceback.format_exc()}")
+                    data = None
+                self.stats['fetched' if data is not None else 'failed'] += 1
+                if n % 100 == 0:
+                    elapsed = time.monotonic() - start
+                    logger.info(f"  Progress: {n}/{len(pending)} ({n / elapsed * 60:.0f}/min), "
+                                f"rate={self.current_rate:.2f}/s, throttled={self.stats['throttled']}")
+                yield item, data
+        finally:
+            # Consumer stopped early (crash/interrupt): let in-flight requests land, drop the rest
+            executor.shutdown(wait=True, cancel_futures=True)
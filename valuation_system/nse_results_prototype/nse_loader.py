@@ -2,7 +2,7 @@
 NSE Filing Data — Production Loader
 
 Event-driven fetching: discover new filings from global endpoints, fetch only
-companies with new data, update tracker state, and merge into CSV.
+companies with new data, update tracker state, and append to the NSE quarterly store.
 
 Modes:
   --mode daily     Event-driven: discover today's filings, fetch only new ones (default)
@@ -41,7 +41,10 @@ from valuation_system.nse_results_prototype.nse_filing_prototype import (
     _nse_date_to_quarter_index, _safe_float, _extract_results_quarters,
     GLOBAL_ENDPOINTS, COMPANY_ENDPOINTS,
 )
+from valuation_system.nse_results_prototype.nse_fetch_engine import NSEFetchEngine
+from valuation_system.nse_results_prototype.nse_tracker import NSETracker, TRACKER_BACKEND, default_backend
 from valuation_system.storage.mysql_client import get_mysql_client
+from valuation_system.storage.nse_quarterly_store import NSEQuarterlyStore
 
 # --- Logging ---
 LOG_DIR = os.getenv('LOG_DIR', os.path.join(os.path.dirname(__file__), '..', 'logs'))
@@ -66,6 +69,11 @@ NSE_CACHE_DIR = os.getenv(
     'NSE_CACHE_DIR',
     os.path.join(os.path.dirname(__file__), 'cache')
 )
+NSE_STATE_DIR = os.getenv(
+    'NSE_STATE_DIR',
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'state')
+)
+EXPORT_CSV = os.getenv('NSE_EXPORT_CSV', '0') == '1'  # Legacy wide CSV for external readers
 BATCH_SIZE = int(os.getenv('NSE_FETCH_BATCH_SIZE', '50'))
 API_PAUSE = float(os.getenv('NSE_RATE_LIMIT_PAUSE', '1.5'))
 LAKHS_TO_CR = 100.0
@@ -102,15 +110,23 @@ class NSELoader:
     Lifecycle:
     1. discover()  — Find companies with new filings (event-driven)
     2. fetch()     — Fetch results for discovered companies
-    3. store()     — Update MySQL tracker + merge into CSV
+    3. store()     — Update fetch tracker + append to NSEQuarterlyStore
     4. validate()  — Compare against core CSV where overlap exists
 
-    State is tracked in vs_nse_fetch_tracker (MySQL).
+    State is tracked in vs_nse_fetch_tracker (MySQL, or a local SQLite copy
+    with NSE_TRACKER_BACKEND=sqlite), written in bulk through NSETracker.
     """
 
-    def __init__(self):
-        self.mysql = get_mysql_client()
+    def __init__(self, mysql_client=None, nse_base: str = NSE_BASE, progress_path: str = None,
+                 store: NSEQuarterlyStore = None, tracker: NSETracker = None):
+        uses_mysql = tracker.backend.name == 'mysql' if tracker else TRACKER_BACKEND != 'sqlite'
+        self.mysql = mysql_client or (get_mysql_client() if uses_mysql else None)
+        self.tracker = tracker or NSETracker(default_backend(self.mysql))
+        self.store = store or NSEQuarterlyStore()
         self.nse = NSESession()
+        self.nse_base = nse_base
+        self.progress_path = progress_path or os.path.join(NSE_STATE_DIR, 'nse_fetch_progress.jsonl')
+        self.fetch_stats: Dict = {}
         self.issues: List[Dict] = []  # Batch issues log
         self._start_time = datetime.now()
 
@@ -191,7 +207,7 @@ class NSELoader:
             # Single symbol mode
             fetch_list = []
             for sym in symbols:
-                company = self.mysql.get_company_by_symbol(sym)
+                company = self.mysql.get_company_by_symbol(sym) if self.mysql else None
                 if company:
                     fetch_list.append({
                         'nse_symbol': sym,
@@ -210,13 +226,9 @@ class NSELoader:
             logger.info(f"  Symbol mode: {len(fetch_list)} companies")
             return fetch_list
 
-        # Get all tracked symbols from MySQL
+        # Get all tracked symbols
         tracked = {}
-        tracker_rows = self.mysql.query(
-            "SELECT nse_symbol, company_id, latest_quarter_end, last_fetch_date, data_hash "
-            "FROM vs_nse_fetch_tracker"
-        )
-        for row in tracker_rows:
+        for row in self.tracker.rows():
             tracked[row['nse_symbol']] = row
 
         if mode == 'sweep':
@@ -287,6 +299,8 @@ class NSELoader:
             min_mcap_cr: Minimum market cap in crores (default: 2500)
         """
         logger.info(f"  Seeding tracker from vs_active_companies (mcap > {min_mcap_cr} Cr)...")
+        if self.mysql is None:
+            raise ValueError("Seed mode needs MySQL (vs_active_companies); unset NSE_TRACKER_BACKEND=sqlite")
 
         # Get all active companies with NSE symbols
         companies = self.mysql.query(
@@ -385,98 +399,103 @@ class NSELoader:
     # FETCH: Get results from NSE API
     # =========================================================================
 
-    def fetch_results(self, fetch_list: List[Dict]) -> Dict[str, Dict]:
+    def fetch_results(self, fetch_list: List[Dict], resume: bool = True,
+                      engine: NSEFetchEngine = None, sweep_tag: str = '') -> Dict[str, Dict]:
         """
         Fetch quarterly results for each company in fetch_list.
         Returns {symbol: {results_data, quote_data, xbrl_url, ...}}.
-        Rate-limited with configurable pause.
+
+        Requests run concurrently through NSEFetchEngine (global token bucket,
+        pooled sessions, adaptive backoff on 429/403). Fetched payloads are
+        checkpointed to a progress file derived from self.progress_path and
+        keyed by the fetch list + sweep_tag, so a crashed sweep resumes with
+        the symbols it had not finished; run() clears it after store.
         """
         total = len(fetch_list)
-        logger.info(f"=== FETCH: {total} companies, batch_size={BATCH_SIZE}, pause={API_PAUSE}s ===")
+        engine = engine or NSEFetchEngine(base_url=self.nse_base, progress_path=self.progress_path)
+        logger.info(f"=== FETCH: {total} companies, workers={engine.workers}, "
+                    f"sessions={engine.session_count}, rate<={engine.max_rate}/s ===")
 
         all_results = {}
         success = 0
         failed = 0
         no_data = 0
 
-        for i, company in enumerate(fetch_list):
-            symbol = company['nse_symbol']
-            company_id = company.get('company_id')
-
-            if (i + 1) % 100 == 0:
-                elapsed = (datetime.now() - self._start_time).total_seconds()
-                rate = (i + 1) / elapsed * 60 if elapsed > 0 else 0
-                logger.info(f"  Progress: {i+1}/{total} ({rate:.0f}/min), "
-                           f"success={success}, failed={failed}, no_data={no_data}")
-
-            # Fetch results-comparision endpoint
-            url = NSE_BASE + COMPANY_ENDPOINTS['results'].format(symbol=symbol)
-            data = self.nse.get(url)
-            time.sleep(API_PAUSE)
-
-            if data is None:
-                failed += 1
-                self._log_issue(symbol, company.get('company_name', ''),
-                                'ERROR', f"API returned None for {symbol}")
-                self._update_tracker(symbol, company_id, status='FAILED')
-                continue
-
-            quarters = _extract_results_quarters(data)
-            if not quarters:
-                no_data += 1
-                self._log_issue(symbol, company.get('company_name', ''),
-                                'WARNING', f"No quarter records for {symbol}")
-                self._update_tracker(symbol, company_id, status='NO_DATA')
-                continue
+        try:
+            for company, data in engine.iter_fetch(
+                    fetch_list,
+                    path_for=lambda c: COMPANY_ENDPOINTS['results'].format(symbol=c['nse_symbol']),
+                    key_for=lambda c: c['nse_symbol'],
+                    resume=resume, sweep_tag=sweep_tag):
+                symbol = company['nse_symbol']
+                company_id = company.get('company_id')
+
+                if data is None:
+                    failed += 1
+                    self._log_issue(symbol, company.get('company_name', ''),
+                                    'ERROR', f"API returned None for {symbol}")
+                    self._update_tracker(symbol, company_id, status='FAILED')
+                    continue
 
-            # Compute data hash to detect changes
-            data_hash = hashlib.md5(
-                json.dumps(quarters, sort_keys=True, default=str).encode()
-            ).hexdigest()
+                quarters = _extract_results_quarters(data)
+                if not quarters:
+                    no_data += 1
+                    self._log_issue(symbol, company.get('company_name', ''),
+                                    'WARNING', f"No quarter records for {symbol}")
+                    self._update_tracker(symbol, company_id, status='NO_DATA')
+                    continue
 
-            all_results[symbol] = {
-                'quarters': quarters,
-                'data_hash': data_hash,
-                'company_id': company_id,
-                'company_name': company.get('company_name', symbol),
-                'xbrl_url': company.get('xbrl_url', ''),
-                'reason': company.get('reason', ''),
-            }
-            success += 1
+                # Compute data hash to detect changes
+                data_hash = hashlib.md5(
+                    json.dumps(quarters, sort_keys=True, default=str).encode()
+                ).hexdigest()
+
+                all_results[symbol] = {
+                    'quarters': quarters,
+                    'data_hash': data_hash,
+                    'company_id': company_id,
+                    'company_name': company.get('company_name', symbol),
+                    'xbrl_url': company.get('xbrl_url', ''),
+                    'reason': company.get('reason', ''),
+                }
+                success += 1
 
-            logger.debug(f"  [{i+1}/{total}] {symbol}: {len(quarters)} quarters fetched")
+                logger.debug(f"  {symbol}: {len(quarters)} quarters fetched")
+        finally:
+            engine.close()
 
-        logger.info(f"  FETCH complete: {success} success, {failed} failed, {no_data} no_data")
+        self.fetch_stats = dict(engine.stats, final_rate=round(engine.current_rate, 3))
+        logger.info(f"  FETCH complete: {success} success, {failed} failed, {no_data} no_data "
+                    f"(requests={engine.stats['requests']}, throttled={engine.stats['throttled']}, "
+                    f"resumed={engine.stats['resumed']})")
         return all_results
 
     # =========================================================================
-    # STORE: Update tracker + merge into CSV
+    # STORE: Update tracker + append to quarterly store
     # =========================================================================
 
     def store_results(self, all_results: Dict[str, Dict]) -> str:
         """
-        1. Update vs_nse_fetch_tracker for each company
-        2. Build/merge nse_quarterly_data.csv
-
-        Returns path to the CSV file.
+        1. Update vs_nse_fetch_tracker for each company (buffered, flushed in bulk)
+        2. Append the fetched quarters to the NSE quarterly store (long format,
+           one transaction — no read/merge/rewrite of the whole universe).
+           The first append seeds the store from nse_quarterly_data.csv, so
+           companies not fetched since the switch stay available
+        3. Optionally (NSE_EXPORT_CSV=1) refresh nse_quarterly_data.csv from the store
+
+        Returns path to the store file.
         """
         logger.info(f"=== STORE: {len(all_results)} companies ===")
 
-        # Load existing CSV if it exists
-        csv_path = NSE_QUARTERLY_CSV_PATH
-        existing_df = None
-        if os.path.exists(csv_path):
-            existing_df = pd.read_csv(csv_path, low_memory=False)
-            logger.info(f"  Loaded existing CSV: {len(existing_df)} rows, {len(existing_df.columns)} cols")
-
-        # Build new rows
         new_rows = []
+        company_names = {}
+        q_indices = set()
         tracker_updates = 0
 
         for symbol, result_data in all_results.items():
             quarters = result_data['quarters']
             company_id = result_data.get('company_id')
-            company_name = result_data.get('company_name', symbol)
+            company_names[symbol] = result_data.get('company_name', symbol)
             data_hash = result_data.get('data_hash', '')
             xbrl_url = result_data.get('xbrl_url', '')
 
@@ -486,19 +505,13 @@ class NSELoader:
             latest_result_type = None
             latest_filing_date = None
 
-            row = {
-                'company_name': company_name,
-                'nse_symbol': symbol,
-                'data_source': 'NSE_FILING',
-                'fetch_date': datetime.now().strftime('%Y-%m-%d'),
-            }
-
             for q_record in quarters:
                 period_end = q_record.get('re_to_dt', '')
                 qi = _nse_date_to_quarter_index(period_end)
                 if qi is None:
                     continue
                 q_idx, q_label = qi
+                q_indices.add(q_idx)
 
                 # Track latest quarter
                 try:
@@ -513,32 +526,33 @@ class NSELoader:
 
                 # Extract metrics
                 for metric_name, nse_field in METRICS.items():
+                    value = None
                     if nse_field is not None:
                         raw_val = _safe_float(q_record.get(nse_field))
                         if raw_val is not None:
                             if metric_name in NO_CONVERT:
-                                row[f'{metric_name}_{q_idx}'] = round(raw_val, 2)
+                                value = round(raw_val, 2)
                             else:
-                                row[f'{metric_name}_{q_idx}'] = round(raw_val / LAKHS_TO_CR, 2)
+                                value = round(raw_val / LAKHS_TO_CR, 2)
                     elif metric_name == 'pbidt':
                         pbt = _safe_float(q_record.get('re_pro_loss_bef_tax'))
                         dep = _safe_float(q_record.get('re_depr_und_exp'))
                         intr = _safe_float(q_record.get('re_int_new'))
                         if pbt is not None and dep is not None:
-                            row[f'pbidt_{q_idx}'] = round((pbt + dep + (intr or 0)) / LAKHS_TO_CR, 2)
+                            value = round((pbt + dep + (intr or 0)) / LAKHS_TO_CR, 2)
                     elif metric_name == 'totalincome':
                         ns = _safe_float(q_record.get('re_net_sale'))
                         oi = _safe_float(q_record.get('re_oth_inc_new'))
                         if ns is not None:
-                            row[f'totalincome_{q_idx}'] = round((ns + (oi or 0)) / LAKHS_TO_CR, 2)
+                            value = round((ns + (oi or 0)) / LAKHS_TO_CR, 2)
+                    if value is not None:
+                        new_rows.append((symbol, q_idx, metric_name, value))
 
                 # Filing metadata per quarter
-                row[f'filing_date_{q_idx}'] = q_record.get('re_create_dt', '')
-                row[f'result_type_{q_idx}'] = q_record.get('re_res_type', '')
-
-            new_rows.append(row)
+                new_rows.append((symbol, q_idx, 'filing_date', q_record.get('re_create_dt', '')))
+                new_rows.append((symbol, q_idx, 'result_type', q_record.get('re_res_type', '')))
 
-            # Update tracker in MySQL
+            # Update tracker (flushed in bulk below)
             filing_date_parsed = None
             if latest_filing_date:
                 try:
@@ -559,93 +573,38 @@ class NSELoader:
             )
             tracker_updates += 1
 
-        logger.info(f"  Updated {tracker_updates} tracker rows in MySQL")
+        self.tracker.flush()
+        logger.info(f"  Updated {tracker_updates} tracker rows — {self.tracker.report()}")
 
-        # Merge with existing CSV
-        if new_rows:
-            new_df = pd.DataFrame(new_rows)
-
-            if existing_df is not None and not existing_df.empty:
-                # Remove existing rows for symbols we're updating
-                updating_symbols = set(new_df['nse_symbol'].values)
-                kept_df = existing_df[~existing_df['nse_symbol'].isin(updating_symbols)]
-                merged_df = pd.concat([kept_df, new_df], ignore_index=True)
-                logger.info(f"  Merged: {len(kept_df)} kept + {len(new_df)} new/updated = {len(merged_df)} total")
-            else:
-                merged_df = new_df
-                logger.info(f"  Created new CSV with {len(merged_df)} rows")
-
-            # Sort columns: fixed cols first, then metric columns sorted
-            fixed_cols = ['company_name', 'nse_symbol', 'data_source', 'fetch_date']
-            metric_cols = sorted(
-                [c for c in merged_df.columns if c not in fixed_cols],
-                key=lambda x: (x.rsplit('_', 1)[0],
-                               int(x.rsplit('_', 1)[1]) if len(x.rsplit('_', 1)) == 2 and x.rsplit('_', 1)[1].isdigit() else 0)
-            )
-            merged_df = merged_df[[c for c in fixed_cols if c in merged_df.columns] + metric_cols]
-
-            # Write CSV
-            os.makedirs(os.path.dirname(csv_path), exist_ok=True)
-            merged_df.to_csv(csv_path, index=False)
-            logger.info(f"  CSV saved: {csv_path} ({len(merged_df)} companies, {len(merged_df.columns)} columns)")
-
-            # Log quarters covered
-            q_indices = set()
-            for col in metric_cols:
-                parts = col.rsplit('_', 1)
-                if len(parts) == 2 and parts[1].isdigit():
-                    q_indices.add(int(parts[1]))
-            if q_indices:
-                q_labels = []
-                for qi in sorted(q_indices):
-                    fy = 1989 + (qi - 1) // 4
-                    q = (qi - 1) % 4 + 1
-                    q_labels.append(f"FY{fy}Q{q}({qi})")
-                logger.info(f"  Quarters covered: {', '.join(q_labels)}")
-
-            return csv_path
-        else:
+        if not new_rows:
             logger.info("  No new data to store")
-            return csv_path
+            return self.store.db_path
+
+        self.store.seed_from_csv(NSE_QUARTERLY_CSV_PATH)
+        written = self.store.append(new_rows, companies=company_names, source='NSE_FILING')
+        logger.info(f"  Store: appended {written} rows for {len(company_names)} companies → {self.store.db_path}")
+
+        if q_indices:
+            q_labels = []
+            for qi in sorted(q_indices):
+                fy = 1989 + (qi - 1) // 4
+                q = (qi - 1) % 4 + 1
+                q_labels.append(f"FY{fy}Q{q}({qi})")
+            logger.info(f"  Quarters covered: {', '.join(q_labels)}")
+
+        if EXPORT_CSV:
+            exported = self.store.export_csv(NSE_QUARTERLY_CSV_PATH)
+            logger.info(f"  CSV exported: {NSE_QUARTERLY_CSV_PATH} ({exported} companies)")
+
+        return self.store.db_path
 
     def _update_tracker(self, symbol: str, company_id: Optional[int],
                         status: str = 'SUCCESS', **kwargs):
-        """Update or insert a tracker row in vs_nse_fetch_tracker."""
+        """Buffer a tracker update for symbol; written by the next tracker flush (store_results)."""
         try:
-            existing = self.mysql.query_one(
-                "SELECT id FROM vs_nse_fetch_tracker WHERE nse_symbol = %s",
-                (symbol,)
-            )
-
-            if existing:
-                # Update
-                set_parts = ["last_fetch_date = NOW()", f"last_fetch_status = '{status}'"]
-                params = []
-                for key, val in kwargs.items():
-                    if val is not None:
-                        set_parts.append(f"{key} = %s")
-                        params.append(val)
-                params.append(symbol)
-                self.mysql.execute(
-                    f"UPDATE vs_nse_fetch_tracker SET {', '.join(set_parts)} "
-                    f"WHERE nse_symbol = %s",
-                    tuple(params)
-                )
-            else:
-                # Insert
-                insert_data = {
-                    'nse_symbol': symbol,
-                    'company_id': company_id or 0,
-                    'last_fetch_date': datetime.now(),
-                    'last_fetch_status': status,
-                }
-                for key, val in kwargs.items():
-                    if val is not None:
-                        insert_data[key] = val
-                self.mysql.insert('vs_nse_fetch_tracker', insert_data)
-
+            self.tracker.record(symbol, company_id, status=status, **kwargs)
         except Exception as e:
-            logger.error(f"  Failed to update tracker for {symbol}: {e}\n{traceback.format_exc()}")
+            logger.error(f"  Failed to record tracker update for {symbol}: {e}\n{traceback.format_exc()}")
 
     # =========================================================================
     # VALIDATE: Compare against core CSV
@@ -804,7 +763,7 @@ class NSELoader:
             'api_calls': 0,
             'companies_fetched': 0,
             'companies_failed': 0,
-            'csv_path': '',
+            'store_path': '',
             'issues_path': '',
         }
 
@@ -826,14 +785,18 @@ class NSELoader:
                 return summary
 
             # Step 3: Fetch
-            all_results = self.fetch_results(fetch_list)
+            engine = NSEFetchEngine(base_url=self.nse_base, progress_path=self.progress_path)
+            all_results = self.fetch_results(fetch_list, engine=engine, sweep_tag=mode)
             summary['companies_fetched'] = len(all_results)
             summary['companies_failed'] = len(fetch_list) - len(all_results)
-            summary['api_calls'] += len(fetch_list)
+            summary['api_calls'] += self.fetch_stats.get('requests', len(fetch_list))
+            summary['fetch_stats'] = self.fetch_stats
 
             # Step 4: Store
-            csv_path = self.store_results(all_results)
-            summary['csv_path'] = csv_path
+            store_path = self.store_results(all_results)
+            summary['store_path'] = store_path
+            summary['tracker_stats'] = dict(self.tracker.stats)
+            engine.clear_progress()  # Stored — nothing left to resume
 
             # Step 5: Validate (sample)
             if all_results and mode in ('sweep', 'seed'):
@@ -854,7 +817,7 @@ class NSELoader:
             logger.info(f"  Fetched: {summary['companies_fetched']}/{summary.get('companies_to_fetch', 0)}")
             logger.info(f"  Failed: {summary['companies_failed']}")
             logger.info(f"  API calls: {summary['api_calls']}")
-            logger.info(f"  CSV: {csv_path}")
+            logger.info(f"  Store: {store_path}")
             if issues_path:
                 logger.info(f"  Issues: {issues_path} ({len(self.issues)} issues)")
             logger.info("=" * 80)
@@ -864,6 +827,7 @@ class NSELoader:
             summary['status'] = 'FAILED'
             summary['error'] = str(e)
             self._log_issue('SYSTEM', '', 'ERROR', f"Loader failed: {e}\n{traceback.format_exc()}")
+            self.tracker.flush()  # Keep the FAILED/NO_DATA outcomes recorded before the error
             self.write_issues_csv()
 
         return summary
@@ -898,8 +862,12 @@ def main():
     print(f"  Fetched:   {result.get('companies_fetched', 0)}/{result.get('companies_to_fetch', 0)}")
     print(f"  Failed:    {result.get('companies_failed', 0)}")
     print(f"  API calls: {result.get('api_calls', 0)}")
+    if result.get('tracker_stats'):
+        t = result['tracker_stats']
+        print(f"  Tracker:   {t['rows_flushed']} rows in {t['statements']} statements "
+              f"(saved {t['saved_round_trips']} of {t['legacy_round_trips']} round-trips)")
     print(f"  Elapsed:   {result.get('elapsed_seconds', 0)}s")
-    print(f"  CSV:       {result.get('csv_path', '')}")
+    print(f"  Store:     {result.get('store_path', '')}")
     if result.get('issues_path'):
         print(f"  Issues:    {result.get('issues_path')} ({result.get('issues_count', 0)})")
     if result.get('validation'):
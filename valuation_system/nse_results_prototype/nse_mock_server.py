@@ -0,0 +1,198 @@
+"""
+NSE Mock Server — offline stand-in for www.nseindia.com.
+
+Replays the recorded responses in cache/ so the fetch engine (and the loader
+on top of it) can be exercised without network access or NSE's rate limits:
+
+- GET /                                  sets an 'nsit' session cookie
+- GET /api/results-comparision?symbol=X  cache/X/results.json; unknown symbols
+                                         replay a recorded company's payload
+- GET /api/quote-equity?symbol=X         cache/X/quote.json (same fallback)
+- GET /api/corporate-announcements?...   cache/X/announcements.json
+- GET /api/<global endpoint>             cache/_global/<name>.json
+
+Throttling injection (what the engine has to survive):
+- throttle_rate:   fraction of API requests answered 429 (seeded, reproducible)
+- forbidden_rate:  fraction answered 403 (as NSE does when the cookie is stale)
+- max_rps:         sliding 1-second window; requests above it get 429
+- require_cookie:  API requests without the homepage cookie get 403
+
+Usage (tests):
+    with NSEMockServer(throttle_rate=0.05, max_rps=50) as server:
+        engine = NSEFetchEngine(base_url=server.url, ...)
+
+Edge Cases:
+- Unknown API path → 404
+- Symbols listed in empty_symbols → {"resCmpData": []} (the loader's NO_DATA path)
+"""
+
+import os
+import json
+import time
+import random
+import logging
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+from valuation_system.nse_results_prototype.nse_filing_prototype import COMPANY_ENDPOINTS, GLOBAL_ENDPOINTS
+
+logger = logging.getLogger('valuation_system.nse_mock_server')
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), 'cache')
+COOKIE_NAME = 'nsit'
+
+
+def _route_table() -> List[Tuple[str, Dict[str, str], str]]:
+    """(path, fixed query params, recorded file name), derived from the real endpoint definitions."""
+    routes = []
+    for name, template in list(COMPANY_ENDPOINTS.items()) + list(GLOBAL_ENDPOINTS.items()):
+        url = urlparse(template)
+        fixed = {k: v[0] for k, v in parse_qs(url.query).items() if k != 'symbol'}
+        routes.append((url.path, fixed, name))
+    return routes
+
+
+def _match_route(routes, path: str, query: Dict[str, list]) -> Optional[str]:
+    for route_path, fixed, name in routes:
+        if route_path == path and all(query.get(k, [None])[0] == v for k, v in fixed.items()):
+            return name
+    return None
+
+
+class NSEMockServer:
+    """Threaded local HTTP server replaying recorded NSE responses with injected throttling."""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, throttle_rate: float = 0.0,
+                 forbidden_rate: float = 0.0, max_rps: float = None, require_cookie: bool = True,
+                 latency: float = 0.0, empty_symbols=(), seed: int = 42,
+                 host: str = '127.0.0.1', port: int = 0):
+        self.cache_dir = cache_dir
+        self.throttle_rate = throttle_rate
+        self.forbidden_rate = forbidden_rate
+        self.max_rps = max_rps
+        self.require_cookie = require_cookie
+        self.latency = latency
+        self.empty_symbols = set(empty_symbols)
+        self.counts = {'api': 0, 'ok': 0, '429': 0, '403': 0, 'cookie': 0}
+        self.requests_by_symbol: Dict[str, int] = {}
+        self._rng = random.Random(seed)
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self._routes = _route_table()
+        self._files: Dict[str, Optional[dict]] = {}
+        self._templates = sorted(d for d in os.listdir(cache_dir)
+                                 if not d.startswith('_') and os.path.isdir(os.path.join(cache_dir, d)))
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, payload=None, headers: Dict[str, str] = None):
+                body = json.dumps(payload if payload is not None else {}).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path in ('', '/'):
+                    with server._lock:
+                        server.counts['cookie'] += 1
+                    self._send(200, {}, {'Set-Cookie': f"{COOKIE_NAME}=mock-{time.time_ns()}; Path=/"})
+                    return
+
+                query = parse_qs(url.query)
+                name = _match_route(server._routes, url.path, query)
+                if name is None:
+                    self._send(404, {'error': 'not found'})
+                    return
+
+                symbol = query.get('symbol', [''])[0]
+                status = server._admit(symbol, COOKIE_NAME in (self.headers.get('Cookie') or ''))
+                if status != 200:
+                    self._send(status, {})
+                    return
+                if server.latency:
+                    time.sleep(server.latency)
+                self._send(200, server.payload(name, symbol))
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self.url = f"http://{host}:{self._httpd.server_address[1]}"
+        self._thread = None
+
+    def _admit(self, symbol: str, has_cookie: bool) -> int:
+        """Decide the status code for one API request and update the counters."""
+        now = time.monotonic()
+        with self._lock:
+            self.counts['api'] += 1
+            if symbol:
+                self.requests_by_symbol[symbol] = self.requests_by_symbol.get(symbol, 0) + 1
+
+            status = 200
+            if self.require_cookie and not has_cookie:
+                status = 403
+            elif self.max_rps:
+                while self._recent and now - self._recent[0] > 1.0:
+                    self._recent.popleft()
+                if len(self._recent) >= self.max_rps:
+                    status = 429
+            if status == 200:
+                roll = self._rng.random()
+                if roll < self.throttle_rate:
+                    status = 429
+                elif roll < self.throttle_rate + self.forbidden_rate:
+                    status = 403
+
+            if status == 200:
+                self._recent.append(now)
+                self.counts['ok'] += 1
+            else:
+                self.counts[str(status)] += 1
+            return status
+
+    def _load(self, relative: str) -> Optional[dict]:
+        if relative not in self._files:
+            path = os.path.join(self.cache_dir, relative)
+            data = None
+            if os.path.exists(path):
+                with open(path, 'r') as f:
+                    data = json.load(f)
+            self._files[relative] = data
+        return self._files[relative]
+
+    def payload(self, name: str, symbol: str = '') -> dict:
+        """Recorded response for an endpoint; unknown symbols borrow a recorded company's."""
+        if name == 'results' and symbol in self.empty_symbols:
+            return {'resCmpData': []}
+        with self._lock:
+            if name in GLOBAL_ENDPOINTS:
+                return self._load(os.path.join('_global', f"{name}.json")) or {}
+            data = self._load(os.path.join(symbol, f"{name}.json")) if symbol else None
+            if data is None and self._templates:
+                template = self._templates[sum(map(ord, symbol)) % len(self._templates)]
+                data = self._load(os.path.join(template, f"{name}.json"))
+        return data or {}
+
+    def start(self) -> 'NSEMockServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,322 @@
+"""
+NSE Fetch Tracker — buffered, bulk-upserted fetch bookkeeping
+
+Replaces the per-symbol SELECT + INSERT/UPDATE on vs_nse_fetch_tracker
+(~2 round-trips per company per run) with an in-memory buffer that is
+flushed as ONE multi-row upsert per chunk:
+
+- record(symbol, company_id, status, **fields) merges outcomes per symbol
+  (later non-None fields win; failed attempts are counted)
+- flush() groups pending rows by column set (so a row only overwrites the
+  columns it actually carries, like the old UPDATE did) and writes each
+  group in chunks of NSE_TRACKER_CHUNK_SIZE
+- stats reports statements issued vs the legacy per-row round-trips
+
+Backends:
+- MySQLTrackerBackend:  INSERT ... ON DUPLICATE KEY UPDATE via mysql_client.execute
+- SQLiteTrackerBackend: same table in a local embedded DB (INSERT ... ON CONFLICT),
+                        so the loader can track state without MySQL
+
+fetch_attempts counts consecutive unsuccessful fetches (FAILED/NO_DATA);
+a SUCCESS resets it to 0. When a SUCCESS is buffered before later failures,
+the flushed count replaces the stored one instead of adding to it.
+
+Usage:
+    tracker = NSETracker(MySQLTrackerBackend(get_mysql_client()))
+    tracker.record('BEL', 1, 'SUCCESS', latest_quarter_idx=147, data_hash='...')
+    tracker.record('XYZ', 2, 'FAILED')
+    tracker.flush()
+    tracker.stats  # {'records': 2, 'statements': 2, 'legacy_round_trips': 4, 'saved_round_trips': 2, ...}
+
+    python -m valuation_system.nse_results_prototype.nse_tracker --stats
+
+Config (.env):
+    NSE_TRACKER_BACKEND=mysql           # or sqlite
+    NSE_TRACKER_DB_PATH=valuation_system/data/state/nse_fetch_tracker.db
+    NSE_TRACKER_CHUNK_SIZE=500
+
+Edge Cases:
+- A failed flush keeps the rows pending (logged); the next flush retries them
+- Pending rows are auto-flushed once they reach the chunk size
+- default_backend() checks the MySQL table has fetch_attempts (migration 004)
+  and raises at startup instead of leaving every flush failing
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+from datetime import datetime, date
+from typing import Dict, List, Optional, Any, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
+
+logger = logging.getLogger('valuation_system.nse_tracker')
+
+TRACKER_BACKEND = os.getenv('NSE_TRACKER_BACKEND', 'mysql')
+TRACKER_DB_PATH = os.getenv(
+    'NSE_TRACKER_DB_PATH',
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'state', 'nse_fetch_tracker.db')
+)
+CHUNK_SIZE = int(os.getenv('NSE_TRACKER_CHUNK_SIZE', '500'))
+TABLE = 'vs_nse_fetch_tracker'
+FAILED_STATUSES = {'FAILED', 'NO_DATA'}
+TRACKED_COLUMNS = (
+    'latest_quarter_end', 'latest_quarter_idx', 'result_type', 'filing_date',
+    'quarters_available', 'data_hash', 'xbrl_url', 'xbrl_parsed', 'has_segments',
+)
+
+_SQLITE_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {TABLE} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    company_id INTEGER NOT NULL DEFAULT 0,
+    nse_symbol TEXT NOT NULL UNIQUE,
+    latest_quarter_end TEXT,
+    latest_quarter_idx INTEGER,
+    result_type TEXT,
+    filing_date TEXT,
+    last_fetch_date TEXT,
+    last_fetch_status TEXT DEFAULT 'SUCCESS',
+    fetch_attempts INTEGER DEFAULT 0,
+    quarters_available INTEGER DEFAULT 0,
+    data_hash TEXT,
+    xbrl_url TEXT,
+    xbrl_parsed INTEGER DEFAULT 0,
+    has_segments INTEGER DEFAULT 0,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+class MySQLTrackerBackend:
+    """vs_nse_fetch_tracker in MySQL; one INSERT ... ON DUPLICATE KEY UPDATE per chunk."""
+
+    name = 'mysql'
+
+    def __init__(self, mysql_client):
+        self.mysql = mysql_client
+
+    def check_schema(self):
+        """Raise if vs_nse_fetch_tracker predates migration 004 (no fetch_attempts column)."""
+        if not self.mysql.query(f"SHOW COLUMNS FROM {TABLE} LIKE 'fetch_attempts'"):
+            raise RuntimeError(f"{TABLE}.fetch_attempts is missing: apply "
+                               f"storage/migrations/004_add_fetch_attempts_to_nse_tracker.sql")
+
+    def upsert(self, columns: Tuple[str, ...], rows: List[tuple], reset_attempts: bool = False) -> int:
+        """
+        Write rows (values in `columns` order) in one statement. Returns statements issued.
+        reset_attempts: the rows' fetch_attempts replace the stored count (a SUCCESS was buffered).
+        """
+        placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+        updates = []
+        for col in columns:
+            if col in ('nse_symbol', 'company_id'):
+                continue
+            if col == 'fetch_attempts' and reset_attempts:
+                updates.append("fetch_attempts = VALUES(fetch_attempts)")
+            elif col == 'fetch_attempts':
+                updates.append("fetch_attempts = IF(VALUES(last_fetch_status) = 'SUCCESS', 0, "
+                               "fetch_attempts + VALUES(fetch_attempts))")
+            else:
+                updates.append(f"{col} = VALUES({col})")
+        sql = (f"INSERT INTO {TABLE} ({', '.join(columns)}) VALUES "
+               f"{', '.join([placeholders] * len(rows))} "
+               f"ON DUPLICATE KEY UPDATE {', '.join(updates)}")
+        self.mysql.execute(sql, tuple(v for row in rows for v in row))
+        return 1
+
+    def rows(self) -> List[Dict]:
+        return self.mysql.query(
+            f"SELECT nse_symbol, company_id, latest_quarter_end, last_fetch_date, data_hash "
+            f"FROM {TABLE}"
+        )
+
+
+class SQLiteTrackerBackend:
+    """vs_nse_fetch_tracker mirrored in a local SQLite file (no MySQL needed)."""
+
+    name = 'sqlite'
+
+    def __init__(self, db_path: str = TRACKER_DB_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = sqlite3.connect(db_path)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SQLITE_SCHEMA)
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN")
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def upsert(self, columns: Tuple[str, ...], rows: List[tuple], reset_attempts: bool = False) -> int:
+        updates = []
+        for col in columns:
+            if col in ('nse_symbol', 'company_id'):
+                continue
+            if col == 'fetch_attempts' and reset_attempts:
+                updates.append("fetch_attempts = excluded.fetch_attempts")
+            elif col == 'fetch_attempts':
+                updates.append("fetch_attempts = CASE WHEN excluded.last_fetch_status = 'SUCCESS' THEN 0 "
+                               "ELSE fetch_attempts + excluded.fetch_attempts END")
+            else:
+                updates.append(f"{col} = excluded.{col}")
+        updates.append("updated_at = CURRENT_TIMESTAMP")
+        placeholders = '(' + ', '.join(['?'] * len(columns)) + ')'
+        sql = (f"INSERT INTO {TABLE} ({', '.join(columns)}) VALUES "
+               f"{', '.join([placeholders] * len(rows))} "
+               f"ON CONFLICT(nse_symbol) DO UPDATE SET {', '.join(updates)}")
+        params = [v.isoformat() if isinstance(v, (datetime, date)) else v for row in rows for v in row]
+        with self._connect() as conn:
+            conn.execute(sql, params)
+        return 1
+
+    def rows(self) -> List[Dict]:
+        """Same shape as the MySQL SELECT (dates parsed back to date/datetime)."""
+        with self._connect() as conn:
+            result = []
+            for r in conn.execute(f"SELECT * FROM {TABLE} ORDER BY nse_symbol"):
+                row = dict(r)
+                for col in ('latest_quarter_end', 'filing_date'):
+                    if row[col]:
+                        row[col] = date.fromisoformat(row[col][:10])
+                if row['last_fetch_date']:
+                    row['last_fetch_date'] = datetime.fromisoformat(row['last_fetch_date'])
+                result.append(row)
+            return result
+
+
+def default_backend(mysql_client=None):
+    """Backend selected by NSE_TRACKER_BACKEND (the MySQL schema is checked up front)."""
+    if TRACKER_BACKEND == 'sqlite':
+        return SQLiteTrackerBackend()
+    if mysql_client is None:
+        from valuation_system.storage.mysql_client import get_mysql_client
+        mysql_client = get_mysql_client()
+    backend = MySQLTrackerBackend(mysql_client)
+    backend.check_schema()
+    return backend
+
+
+class NSETracker:
+    """Accumulates per-symbol fetch outcomes and flushes them as chunked bulk upserts."""
+
+    def __init__(self, backend, chunk_size: int = CHUNK_SIZE):
+        self.backend = backend
+        self.chunk_size = max(1, chunk_size)
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.stats = {'records': 0, 'rows_flushed': 0, 'statements': 0, 'flush_errors': 0,
+                      'legacy_round_trips': 0, 'saved_round_trips': 0}
+
+    def record(self, symbol: str, company_id: Optional[int], status: str = 'SUCCESS', **fields):
+        """Buffer one fetch outcome; non-None fields overwrite the tracker columns on flush."""
+        unknown = set(fields) - set(TRACKED_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown tracker columns: {sorted(unknown)}")
+        with self._lock:
+            row = self._pending.setdefault(symbol, {'nse_symbol': symbol, 'company_id': company_id or 0,
+                                                    'fetch_attempts': 0})
+            if company_id:
+                row['company_id'] = company_id
+            row['last_fetch_date'] = datetime.now().replace(microsecond=0)
+            row['last_fetch_status'] = status
+            row['fetch_attempts'] = row['fetch_attempts'] + 1 if status in FAILED_STATUSES else 0
+            if status not in FAILED_STATUSES:
+                row['_reset'] = True  # Later failures in this buffer count from 0, not the stored value
+            row.update({k: v for k, v in fields.items() if v is not None})
+            self.stats['records'] += 1
+            self.stats['legacy_round_trips'] += 2  # SELECT id + INSERT/UPDATE per call
+            full = len(self._pending) >= self.chunk_size
+        if full:
+            self.flush()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> int:
+        """Write all pending rows; returns rows written. Rows stay pending if the backend fails."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        groups: Dict[Tuple[Tuple[str, ...], bool], List[Dict]] = {}
+        for row in pending.values():
+            columns = tuple(sorted(col for col in row if not col.startswith('_')))
+            groups.setdefault((columns, bool(row.get('_reset'))), []).append(row)
+
+        written = 0
+        failed: Dict[str, Dict] = {}
+        for (columns, reset), rows in groups.items():
+            for start in range(0, len(rows), self.chunk_size):
+                chunk = rows[start:start + self.chunk_size]
+                try:
+                    values = [tuple(r[col] for col in columns) for r in chunk]
+                    self.stats['statements'] += self.backend.upsert(columns, values, reset_attempts=reset)
+                    written += len(chunk)
+                except Exception as e:
+                    self.stats['flush_errors'] += 1
+                    logger.error(f"  Tracker flush failed for {len(chunk)} rows "
+                                 f"({chunk[0]['nse_symbol']}...): {e}", exc_info=True)
+                    failed.update({r['nse_symbol']: r for r in chunk})
+
+        if failed:
+            with self._lock:
+                for symbol, row in failed.items():
+                    self._pending.setdefault(symbol, row)  # A newer record() wins over the failed row
+        self.stats['rows_flushed'] += written
+        self.stats['saved_round_trips'] = self.stats['legacy_round_trips'] - self.stats['statements']
+        return written
+
+    def rows(self) -> List[Dict]:
+        """Tracker rows (flushes first so reads see this run's outcomes)."""
+        self.flush()
+        return self.backend.rows()
+
+    def report(self) -> str:
+        s = self.stats
+        return (f"Tracker ({self.backend.name}): {s['records']} records → {s['rows_flushed']} rows in "
+                f"{s['statements']} statements (legacy: {s['legacy_round_trips']} round-trips, "
+                f"saved {s['saved_round_trips']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='NSE fetch tracker (local SQLite backend)')
+    parser.add_argument('--db', type=str, default=TRACKER_DB_PATH)
+    parser.add_argument('--stats', action='store_true', help='Status counts for the local tracker')
+    parser.add_argument('--dump', action='store_true', help='Print every tracker row as JSON')
+    args = parser.parse_args()
+
+    rows = SQLiteTrackerBackend(args.db).rows()
+    if args.dump:
+        for row in rows:
+            print(json.dumps(row, default=str))
+    else:
+        counts: Dict[str, int] = {}
+        for row in rows:
+            counts[row['last_fetch_status']] = counts.get(row['last_fetch_status'], 0) + 1
+        print(f"{args.db}: {len(rows)} symbols {counts}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""
+XBRL Parser Benchmark + Synthetic Filings
+Generates Ind-AS (in-capmkt) result filings with known values and measures
+the streaming parser: files/sec across worker counts, and peak memory on a
+single large filing (segment-heavy) relative to its size on disk.
+
+A synthetic filing has:
+- Current quarter + same quarter last year (3-month durations), a YTD
+  duration (must be ignored) and an instant context
+- Segment contexts (xbrldi:explicitMember) repeating the revenue/profit
+  tags per segment — must not leak into entity-level metrics
+- INR facts in rupees, EPS in INR/share, one nil fact (ExceptionalItems)
+- Optionally: facts before the contexts, and a non-default namespace prefix
+
+Usage:
+    python -m valuation_system.nse_results_prototype.xbrl_bench --files 2000 --workers 1,4,8
+    python -m valuation_system.nse_results_prototype.xbrl_bench --write-fixtures path/to/dir --files 50
+
+Edge Cases:
+- Values are derived from the seed; synthetic_filing() also returns what the parser must produce
+- Q1 filings (Apr-Jun) carry YTD facts equal to the quarter, as real ones do
+"""
+
+import os
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from datetime import date
+from typing import Dict, List, Tuple
+
+from valuation_system.nse_results_prototype.xbrl_parser import (
+    FACT_MAP, CRORE, parse_xbrl, parse_directory, quarter_index,
+)
+
+logger = logging.getLogger('valuation_system.xbrl_bench')
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'xbrl')
+PER_SHARE = {'basic_eps', 'diluted_eps'}
+QUARTER_ENDS = [(3, 31), (6, 30), (9, 30), (12, 31)]
+
+
+def _quarter_start(end: date) -> date:
+    month = end.month - 2
+    return date(end.year, month, 1)
+
+
+def _year_earlier(end: date) -> date:
+    return date(end.year - 1, end.month, end.day)
+
+
+def _values(rng: random.Random) -> Dict[str, float]:
+    """Entity-level crore values for one quarter (internally consistent where it matters)."""
+    v = {m: round(rng.uniform(10, 5000), 2) for m in FACT_MAP.values()}
+    v['basic_eps'] = round(rng.uniform(-5, 80), 2)
+    v['diluted_eps'] = round(v['basic_eps'] * 0.99, 2)
+    v['totalincome'] = round(v['sales'] + v['other_income'], 2)
+    return v
+
+
+def synthetic_filing(symbol: str, quarter_end: date, seed: int = 0, segments: int = 3,
+                     facts_first: bool = False, prefix: str = 'in-capmkt') -> Tuple[str, Dict[int, Dict[str, float]]]:
+    """(XML text, expected {quarter_idx: {metric: value}}) for one filing."""
+    rng = random.Random(f"{symbol}:{quarter_end}:{seed}")
+    current, prior = _values(rng), _values(rng)
+    prior_end = _year_earlier(quarter_end)
+    fy_start = date(quarter_end.year if quarter_end.month > 3 else quarter_end.year - 1, 4, 1)
+
+    def duration(cid, start, end, member=None):
+        seg = (f"<xbrli:segment><xbrldi:explicitMember dimension=\"{prefix}:SegmentsAxis\">"
+               f"{prefix}:{member}</xbrldi:explicitMember></xbrli:segment>") if member else ''
+        return (f"<xbrli:context id=\"{cid}\"><xbrli:entity><xbrli:identifier scheme=\"http://www.nseindia.com\">"
+                f"{symbol}</xbrli:identifier>{seg}</xbrli:entity><xbrli:period><xbrli:startDate>{start}"
+                f"</xbrli:startDate><xbrli:endDate>{end}</xbrli:endDate></xbrli:period></xbrli:context>")
+
+    contexts = [
+        duration('OneD', _quarter_start(quarter_end), quarter_end),
+        duration('OneD_PY', _quarter_start(prior_end), prior_end),
+        duration('FourD', fy_start, quarter_end),
+        (f"<xbrli:context id=\"OneI\"><xbrli:entity><xbrli:identifier scheme=\"http://www.nseindia.com\">"
+         f"{symbol}</xbrli:identifier></xbrli:entity><xbrli:period><xbrli:instant>{quarter_end}</xbrli:instant>"
+         f"</xbrli:period></xbrli:context>"),
+    ]
+    contexts += [duration(f"Seg{i}", _quarter_start(quarter_end), quarter_end, f"Segment{i}Member")
+                 for i in range(segments)]
+    units = [
+        '<xbrli:unit id="INR"><xbrli:measure>iso4217:INR</xbrli:measure></xbrli:unit>',
+        ('<xbrli:unit id="INRPerShare"><xbrli:divide><xbrli:unitNumerator><xbrli:measure>iso4217:INR'
+         '</xbrli:measure></xbrli:unitNumerator><xbrli:unitDenominator><xbrli:measure>xbrli:shares'
+         '</xbrli:measure></xbrli:unitDenominator></xbrli:divide></xbrli:unit>'),
+        '<xbrli:unit id="pure"><xbrli:measure>xbrli:pure</xbrli:measure></xbrli:unit>',
+    ]
+
+    def fact(name, metric, context, values):
+        if metric == 'exceptional':
+            return f"<{prefix}:{name} contextRef=\"{context}\" unitRef=\"INR\" xsi:nil=\"true\"/>"
+        if metric in PER_SHARE:
+            return (f"<{prefix}:{name} contextRef=\"{context}\" unitRef=\"INRPerShare\" decimals=\"2\">"
+                    f"{values[metric]:.2f}</{prefix}:{name}>")
+        return (f"<{prefix}:{name} contextRef=\"{context}\" unitRef=\"INR\" decimals=\"-5\">"
+                f"{round(values[metric] * CRORE)}</{prefix}:{name}>")
+
+    facts = [
+        f"<{prefix}:Symbol contextRef=\"OneD\">{symbol}</{prefix}:Symbol>",
+        f"<{prefix}:NameOfTheCompany contextRef=\"OneD\">{symbol} Limited</{prefix}:NameOfTheCompany>",
+        f"<{prefix}:NatureOfReportStandaloneConsolidated contextRef=\"OneD\">Consolidated"
+        f"</{prefix}:NatureOfReportStandaloneConsolidated>",
+        f"<{prefix}:DateOfEndOfReportingPeriod contextRef=\"OneD\">{quarter_end}</{prefix}:DateOfEndOfReportingPeriod>",
+    ]
+    # Q1 (Apr-Jun): the year-to-date period is the quarter itself
+    ytd = current if quarter_end.month == 6 else {m: round(v * 3, 2) for m, v in current.items()}
+    for name, metric in FACT_MAP.items():
+        context = 'OneI' if metric == 'paid_up_equity' else 'OneD'
+        facts.append(fact(name, metric, 'FourD', ytd))  # YTD first: must not win over the quarter
+        facts.append(fact(name, metric, context, current))
+        facts.append(fact(name, metric, 'OneD_PY', prior))
+    for i in range(segments):
+        seg_values = {m: round(v / (segments + 1), 2) for m, v in current.items()}
+        facts.append(fact('RevenueFromOperations', 'sales', f"Seg{i}", seg_values))
+        facts.append(fact('ProfitBeforeTax', 'pbt_excp', f"Seg{i}", seg_values))
+        facts.append(f"<{prefix}:DescriptionOfSegment contextRef=\"Seg{i}\">Segment {i} "
+                     f"{'x' * 200}</{prefix}:DescriptionOfSegment>")
+
+    body = facts + contexts + units if facts_first else contexts + units + facts
+    xml = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<xbrli:xbrl xmlns:xbrli="http://www.xbrl.org/2003/instance" '
+           'xmlns:xbrldi="http://xbrl.org/2006/xbrldi" xmlns:iso4217="http://www.xbrl.org/2003/iso4217" '
+           'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+           f'xmlns:{prefix}="http://www.sebi.gov.in/xbrl/2023-12-31/in-capmkt">\n'
+           '<link:schemaRef xmlns:link="http://www.xbrl.org/2003/linkbase" xlink:type="simple" '
+           'xmlns:xlink="http://www.w3.org/1999/xlink" '
+           'xlink:href="Ind-AS_Financial_Results.xsd"/>\n'
+           + '\n'.join(body) + '\n</xbrli:xbrl>\n')
+
+    expected = {}
+    for end, values in ((quarter_end, current), (prior_end, prior)):
+        q = {m: v for m, v in values.items() if m != 'exceptional'}
+        q['pbidt'] = round(q['pbt_excp'] + q['depreciation'] + q['interest'], 2)
+        expected[quarter_index(end)] = q
+    return xml, expected
+
+
+def _quarter_ends(count: int, last: date = date(2025, 12, 31)) -> List[date]:
+    ends, year = [], last.year
+    while len(ends) < count:
+        for month, day in reversed(QUARTER_ENDS):
+            end = date(year, month, day)
+            if end <= last and len(ends) < count:
+                ends.append(end)
+        year -= 1
+    return ends
+
+
+def write_fixtures(directory: str, count: int, segments: int = 3, with_expected: bool = False) -> List[str]:
+    """
+    count synthetic filings under directory (variants rotate facts_first / prefix).
+    with_expected also writes expected.json: {file name: {quarter_idx: {metric: value}}}.
+    """
+    os.makedirs(directory, exist_ok=True)
+    ends = _quarter_ends(8)
+    paths, expected_by_file = [], {}
+    for i in range(count):
+        xml, expected = synthetic_filing(f"SYM{i:05d}", ends[i % len(ends)], seed=i, segments=segments,
+                                  facts_first=i % 3 == 1, prefix='in-capmkt' if i % 2 == 0 else 'ns0')
+        path = os.path.join(directory, f"SYM{i:05d}_{ends[i % len(ends)]:%Y%m%d}.xml")
+        with open(path, 'w') as f:
+            f.write(xml)
+        paths.append(path)
+        expected_by_file[os.path.basename(path)] = expected
+    if with_expected:
+        with open(os.path.join(directory, 'expected.json'), 'w') as f:
+            json.dump(expected_by_file, f, indent=1, sort_keys=True)
+    return paths
+
+
+def run_benchmark(files: int = 2000, workers: List[int] = (1, 4), segments: int = 3,
+                  large_segments: int = 20000) -> List[dict]:
+    """One row per worker count (throughput), plus one memory row for a large filing."""
+    report = []
+    tmp = tempfile.mkdtemp(prefix='xbrl_bench_')
+    try:
+        write_fixtures(tmp, files, segments=segments)
+        size_mb = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp)) / 1e6
+        for n in workers:
+            start = time.perf_counter()
+            results = list(parse_directory(tmp, workers=n))
+            elapsed = time.perf_counter() - start
+            report.append({'mode': f"workers={n}", 'files': files, 'mb': round(size_mb, 1),
+                           'elapsed_s': round(elapsed, 3), 'files_per_s': round(files / elapsed, 1),
+                           'errors': sum(1 for r in results if r.get('error'))})
+
+        xml, expected = synthetic_filing('LARGE', date(2025, 12, 31), segments=large_segments)
+        path = os.path.join(tmp, 'large.xml')
+        with open(path, 'w') as f:
+            f.write(xml)
+        del xml
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = parse_xbrl(path)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report.append({'mode': 'large_file', 'mb': round(os.path.getsize(path) / 1e6, 1),
+                       'elements': result['elements'], 'elapsed_s': round(elapsed, 3),
+                       'peak_mb': round(peak / 1e6, 2), 'parity': result['quarters'] == expected})
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='XBRL streaming parser benchmark')
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--workers', type=str, default='1,4', help='Comma-separated worker counts')
+    parser.add_argument('--segments', type=int, default=3, help='Segment contexts per filing')
+    parser.add_argument('--large-segments', type=int, default=20000, help='Segments in the large-file run')
+    parser.add_argument('--write-fixtures', type=str, default=None, help='Only write filings to this directory')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    if args.write_fixtures:
+        paths = write_fixtures(args.write_fixtures, args.files, args.segments, with_expected=True)
+        print(f"Wrote {len(paths)} filings + expected.json")
+    else:
+        for row in run_benchmark(args.files, [int(w) for w in args.workers.split(',')],
+                                 args.segments, args.large_segments):
+            print(row)
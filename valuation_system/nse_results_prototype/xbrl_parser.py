@@ -1,32 +1,63 @@
 """
-XBRL Parser for NSE Filing Segment Data (Phase 2 — Skeleton)
+XBRL Parser for NSE Financial-Results Filings
 
-Parses XBRL XML files from NSE filings to extract:
-1. Business segment revenue, profit, assets, liabilities
-2. Geographic segment breakdown
-3. Additional balance sheet items not available in JSON API
+Streaming parser for Ind-AS XBRL result filings (in-capmkt taxonomy) that
+maps tagged facts to the loader's quarterly metric names (sales, pat, pbidt,
+interest, depreciation, tax, basic_eps, ...), in crores like nse_loader.
 
-XBRL URLs are tracked in vs_nse_fetch_tracker.xbrl_url.
+How a filing is read:
+- xml.etree iterparse, one top-level element at a time; every processed
+  element is dropped from the tree, so memory is bounded by the number of
+  *relevant* facts, not the file size (segment breakdowns, notes, text
+  blocks and linkbase references are skipped as they stream past)
+- Contexts → period (duration start/end or instant) + whether dimensional;
+  dimensional contexts (segments, geographies) are excluded from the
+  entity-level quarterly metrics
+- Units → INR (value / 1e7 → crores), INR per share (as-is), pure/shares
+- Quarter = duration contexts of ~3 months (80-100 days), keyed by the
+  core-CSV quarter index of their end date; YTD/annual contexts are ignored
+- Facts may appear before the contexts they reference (resolved at the end)
+
+Sources:
+- LocalXBRLSource: filings on disk (network download is out of scope);
+  tracker xbrl_url values resolve to <XBRL_LOCAL_DIR>/<file name>
+- parse_directory(): a directory of filings through a process pool
 
 Usage:
-    python -m valuation_system.nse_results_prototype.xbrl_parser --symbol EICHERMOT
+    python -m valuation_system.nse_results_prototype.xbrl_parser --file path/to/filing.xml
+    python -m valuation_system.nse_results_prototype.xbrl_parser --dir path/to/filings --workers 8
+    python -m valuation_system.nse_results_prototype.xbrl_parser --dir path/to/filings --store
     python -m valuation_system.nse_results_prototype.xbrl_parser --batch --limit 100
 
-Implementation Notes:
-- NSE XBRL uses Ind-AS taxonomy (Indian Accounting Standards)
-- Segment data is in "in-bse:SegmentReportingDisclosure" or similar elements
-- 3,796 of 3,809 quarterly filings have XBRL XML URLs
-- Parsed segments are stored in vs_company_segments + vs_segment_financials
-- Segment → valuation_subgroup mapping requires PM approval (same flow as vs_discovered_drivers)
+Config (.env):
+    XBRL_LOCAL_DIR=valuation_system/nse_results_prototype/cache/xbrl
+    XBRL_WORKERS=<cpu count>
+    XBRL_NATURE=Consolidated       # Basis stored: Consolidated or Standalone
+
+Edge Cases:
+- Nil facts (xsi:nil="true") and non-numeric values are skipped
+- Non-INR monetary units are skipped (logged once per filing)
+- First fact wins when a filing repeats a metric for the same quarter
+- Malformed XML → {'error': ...} for that file; the batch continues
+- Only filings of the XBRL_NATURE basis reach the store (both bases share the
+  same metric keys, so mixing them would interleave standalone and
+  consolidated quarters); a filing without a nature fact is taken as-is
 
-Status: SKELETON — implementation deferred to separate session.
+Segment reporting (vs_company_segments / vs_segment_financials) is still
+Phase 2: parse_segments / store_segments remain unimplemented.
 """
 
 import os
 import sys
+import glob
 import logging
 import argparse
-from typing import Dict, List, Optional, Any
+import traceback
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Any, Tuple
+from urllib.parse import urlparse
 
 from dotenv import load_dotenv
 
@@ -35,22 +66,260 @@ load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
 
 logger = logging.getLogger('valuation_system.xbrl_parser')
 
+XBRL_LOCAL_DIR = os.getenv('XBRL_LOCAL_DIR', os.path.join(os.path.dirname(__file__), 'cache', 'xbrl'))
+XBRL_WORKERS = int(os.getenv('XBRL_WORKERS', '0')) or (os.cpu_count() or 2)
+XBRL_NATURE = os.getenv('XBRL_NATURE', 'Consolidated')
+CRORE = 1e7
+XSI_NIL = '{http://www.w3.org/2001/XMLSchema-instance}nil'
+
+# Ind-AS (in-capmkt) element local name → quarterly metric (same names as nse_loader.METRICS)
+FACT_MAP = {
+    'RevenueFromOperations': 'sales',
+    'OtherIncome': 'other_income',
+    'Income': 'totalincome',
+    'CostOfMaterialsConsumed': 'rawmat',
+    'EmployeeBenefitExpense': 'empcost',
+    'FinanceCosts': 'interest',
+    'DepreciationDepletionAndAmortisationExpense': 'depreciation',
+    'OtherExpenses': 'other_exp',
+    'Expenses': 'total_exp',
+    'ExceptionalItemsBeforeTax': 'exceptional',
+    'ProfitBeforeTax': 'pbt_excp',
+    'TaxExpense': 'tax',
+    'CurrentTax': 'curr_tax',
+    'DeferredTax': 'def_tax',
+    'ProfitLossForPeriod': 'pat',
+    'PaidUpValueOfEquityShareCapital': 'paid_up_equity',
+    'BasicEarningsLossPerShareFromContinuingOperations': 'basic_eps',
+    'DilutedEarningsLossPerShareFromContinuingOperations': 'diluted_eps',
+}
+# Filing-level text facts
+TEXT_FACTS = {
+    'Symbol': 'symbol',
+    'NameOfTheCompany': 'company_name',
+    'NatureOfReportStandaloneConsolidated': 'nature',
+    'WhetherResultsAreAuditedOrUnaudited': 'audited',
+    'DateOfEndOfReportingPeriod': 'period_end',
+}
+QUARTER_DAYS = (80, 100)
+MONTH_TO_QUARTER = {3: 4, 6: 1, 9: 2, 12: 3}
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def quarter_index(day: date) -> Optional[int]:
+    """Core-CSV quarter index of a quarter-end date (same formula as _nse_date_to_quarter_index)."""
+    q = MONTH_TO_QUARTER.get(day.month)
+    if q is None:
+        return None
+    fy = day.year if day.month <= 3 else day.year + 1
+    return (fy - 1989) * 4 + q
+
+
+def _parse_context(elem) -> Tuple[Optional[date], Optional[date], Optional[date], bool]:
+    start = end = instant = None
+    dimensional = False
+    for child in elem.iter():
+        name = _local(child.tag)
+        if name == 'startDate':
+            start = date.fromisoformat(child.text.strip()[:10])
+        elif name == 'endDate':
+            end = date.fromisoformat(child.text.strip()[:10])
+        elif name == 'instant':
+            instant = date.fromisoformat(child.text.strip()[:10])
+        elif name in ('explicitMember', 'typedMember'):
+            dimensional = True
+    return start, end, instant, dimensional
+
+
+def _parse_unit(elem) -> str:
+    """'inr', 'per_share', 'foreign' or 'other'."""
+    if any(_local(child.tag) == 'divide' for child in elem.iter()):
+        return 'per_share'
+    measures = [(child.text or '').strip() for child in elem.iter() if _local(child.tag) == 'measure']
+    if measures and measures[0].startswith('iso4217:'):
+        return 'inr' if measures[0] == 'iso4217:INR' else 'foreign'
+    return 'other'
+
+
+def _quarter_of(elem) -> Optional[int]:
+    """Quarter index of a context element; None for dimensional, YTD/annual or odd periods."""
+    start, end, instant, dimensional = _parse_context(elem)
+    if dimensional:
+        return None
+    if end is not None and start is not None:
+        days = (end - start).days + 1
+        if not QUARTER_DAYS[0] <= days <= QUARTER_DAYS[1]:
+            return None  # YTD / annual
+        return quarter_index(end)
+    if instant is not None:
+        return quarter_index(instant)
+    return None
+
+
+def parse_xbrl(source) -> Dict[str, Any]:
+    """
+    Stream one XBRL instance (path or binary file object).
+
+    Facts are resolved as soon as their context and unit are known; only
+    facts that arrive before them are buffered until the end of the file.
+
+    Returns {'symbol', 'company_name', 'nature', 'audited', 'period_end',
+             'quarters': {quarter_idx: {metric: value}}, 'facts': n_mapped, 'elements': n_seen}
+    """
+    contexts: Dict[str, Optional[int]] = {}  # context id → quarter index (None = not entity-level quarterly)
+    units: Dict[str, str] = {}
+    pending: List[Tuple[str, str, Optional[str], str]] = []  # (metric, contextRef, unitRef, text)
+    quarters: Dict[int, Dict[str, float]] = {}
+    info: Dict[str, Any] = {}
+    skipped_units = set()
+    counts = {'mapped': 0, 'elements': 0}
+
+    def resolve(metric: str, context_ref: str, unit_ref: Optional[str], text: str) -> bool:
+        """Apply one fact; False if its context/unit has not been seen yet."""
+        if context_ref not in contexts or (unit_ref and unit_ref not in units):
+            return False
+        q_idx = contexts[context_ref]
+        unit = units.get(unit_ref, 'other')
+        if q_idx is None:
+            return True
+        if unit == 'foreign':
+            skipped_units.add(unit_ref)
+            return True
+        try:
+            value = float(text)
+        except ValueError:
+            return True
+        if unit == 'inr':
+            value = value / CRORE
+        bucket = quarters.setdefault(q_idx, {})
+        if metric not in bucket:
+            bucket[metric] = round(value, 2)
+            counts['mapped'] += 1
+        return True
+
+    depth = 0
+    root = None
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1:
+            continue  # Children are handled with their top-level element
+
+        counts['elements'] += 1
+        name = _local(elem.tag)
+        if name == 'context':
+            contexts[elem.get('id')] = _quarter_of(elem)
+        elif name == 'unit':
+            units[elem.get('id')] = _parse_unit(elem)
+        elif name in FACT_MAP:
+            if elem.get(XSI_NIL) != 'true' and elem.text:
+                fact = (FACT_MAP[name], elem.get('contextRef'), elem.get('unitRef'), elem.text.strip())
+                if not resolve(*fact):
+                    pending.append(fact)
+        elif name in TEXT_FACTS and elem.text and TEXT_FACTS[name] not in info:
+            info[TEXT_FACTS[name]] = elem.text.strip()
+        root.clear()  # Bounded memory: drop everything processed so far
+
+    for fact in pending:
+        resolve(*fact)  # Facts whose context never appears are dropped here
+    if skipped_units:
+        logger.warning(f"{info.get('symbol', source)}: skipped facts in non-INR units {sorted(skipped_units)}")
+
+    # Derived metrics, as nse_loader computes them from the JSON API
+    for values in quarters.values():
+        pbt, dep = values.get('pbt_excp'), values.get('depreciation')
+        if 'pbidt' not in values and pbt is not None and dep is not None:
+            values['pbidt'] = round(pbt + dep + (values.get('interest') or 0), 2)
+        if 'totalincome' not in values and values.get('sales') is not None:
+            values['totalincome'] = round(values['sales'] + (values.get('other_income') or 0), 2)
+
+    return {**info, 'quarters': quarters, 'facts': counts['mapped'], 'elements': counts['elements']}
+
+
+def parse_file(path: str) -> Dict[str, Any]:
+    """parse_xbrl for a path; errors are returned, not raised (batch/worker friendly)."""
+    try:
+        result = parse_xbrl(path)
+    except Exception as e:
+        return {'path': path, 'error': f"{type(e).__name__}: {e}", 'quarters': {}}
+    result['path'] = path
+    return result
+
+
+def parse_directory(directory: str, workers: int = None, pattern: str = '*.xml',
+                    chunksize: int = 16) -> Iterator[Dict[str, Any]]:
+    """Parse every filing under directory in worker processes; yields results as they finish (in order)."""
+    paths = sorted(glob.glob(os.path.join(directory, '**', pattern), recursive=True))
+    workers = workers or XBRL_WORKERS
+    if workers <= 1 or len(paths) < 2:
+        for path in paths:
+            yield parse_file(path)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(parse_file, paths, chunksize=chunksize)
+
+
+def is_store_basis(result: Dict[str, Any], nature: str = None) -> bool:
+    """True if the filing's Standalone/Consolidated basis is the one the store keeps."""
+    filed = (result.get('nature') or '').strip().lower()
+    return not filed or filed == (nature or XBRL_NATURE).strip().lower()
+
+
+def to_store_rows(result: Dict[str, Any], source: str = 'NSE_XBRL', nature: str = None) -> List[Tuple]:
+    """(symbol, quarter_idx, metric, value, source) rows for NSEQuarterlyStore.append; [] for the other basis."""
+    symbol = result.get('symbol')
+    if not symbol or not is_store_basis(result, nature):
+        return []
+    return [(symbol, q_idx, metric, value, source)
+            for q_idx, values in result.get('quarters', {}).items()
+            for metric, value in values.items()]
+
+
+class LocalXBRLSource:
+    """Filings on local disk, addressed by tracker URL (file name) or symbol."""
+
+    def __init__(self, root: str = XBRL_LOCAL_DIR):
+        self.root = root
+
+    def path_for(self, url_or_symbol: str) -> Optional[str]:
+        name = os.path.basename(urlparse(url_or_symbol).path) or url_or_symbol
+        candidate = os.path.join(self.root, name)
+        if os.path.isfile(candidate):
+            return candidate
+        matches = sorted(glob.glob(os.path.join(self.root, f"{url_or_symbol}*.xml")))
+        return matches[-1] if matches else None
+
 
 class XBRLParser:
     """
-    Downloads and parses XBRL XML files from NSE filings.
-
-    Phase 2 implementation will:
-    1. Download XBRL XML from URLs stored in vs_nse_fetch_tracker.xbrl_url
-    2. Parse Ind-AS taxonomy to extract segment reporting
-    3. Store segments in vs_company_segments (with LLM-suggested subgroup mapping)
-    4. Store quarterly segment financials in vs_segment_financials
-    5. Sync new segments to GSheet "Segments" tab for PM approval
+    Parses XBRL result filings tracked in vs_nse_fetch_tracker.xbrl_url from
+    a local source into the NSE quarterly store.
+
+    Phase 2 (not yet implemented): segment reporting into
+    vs_company_segments / vs_segment_financials with GSheet approval.
     """
 
-    def __init__(self):
-        from valuation_system.storage.mysql_client import get_mysql_client
-        self.mysql = get_mysql_client()
+    def __init__(self, mysql_client=None, source: LocalXBRLSource = None, store=None):
+        if mysql_client is None:
+            from valuation_system.storage.mysql_client import get_mysql_client
+            mysql_client = get_mysql_client()
+        self.mysql = mysql_client
+        self.source = source or LocalXBRLSource()
+        self._store = store
+
+    @property
+    def store(self):
+        if self._store is None:
+            from valuation_system.storage.nse_quarterly_store import NSEQuarterlyStore
+            self._store = NSEQuarterlyStore()
+        return self._store
 
     def get_unparsed_xbrl_urls(self, limit: int = 100) -> List[Dict]:
         """Get companies with XBRL URLs that haven't been parsed yet."""
@@ -64,9 +333,11 @@ class XBRLParser:
         )
 
     def download_xbrl(self, url: str) -> Optional[str]:
-        """Download XBRL XML from NSE. Returns XML content string."""
-        # TODO: Phase 2 implementation
-        raise NotImplementedError("XBRL download not yet implemented")
+        """Local path of the filing for url (network download is out of scope)."""
+        path = self.source.path_for(url)
+        if path is None:
+            logger.warning(f"XBRL filing not available locally: {url}")
+        return path
 
     def parse_segments(self, xml_content: str, symbol: str) -> List[Dict]:
         """
@@ -101,36 +372,92 @@ class XBRLParser:
         raise NotImplementedError("Segment storage not yet implemented")
 
     def run(self, symbol: str = None, batch: bool = False, limit: int = 100) -> Dict:
-        """Run XBRL parsing for one or more companies."""
-        raise NotImplementedError("XBRL parsing not yet implemented — Phase 2")
+        """Parse tracked filings (one symbol, or a batch of unparsed ones) into the quarterly store."""
+        if symbol:
+            rows = self.mysql.query(
+                "SELECT nse_symbol, company_id, xbrl_url, latest_quarter_idx "
+                "FROM vs_nse_fetch_tracker WHERE nse_symbol = %s", (symbol,))
+        else:
+            rows = self.get_unparsed_xbrl_urls(limit=limit if batch else 1)
+
+        summary = {'requested': len(rows), 'parsed': 0, 'missing': 0, 'failed': 0,
+                   'other_basis': 0, 'rows_stored': 0}
+        for row in rows:
+            path = self.download_xbrl(row['xbrl_url'])
+            if path is None:
+                summary['missing'] += 1
+                continue
+            result = parse_file(path)
+            if result.get('error'):
+                summary['failed'] += 1
+                logger.error(f"  {row['nse_symbol']}: {result['error']}")
+                continue
+            result.setdefault('symbol', row['nse_symbol'])
+            if not is_store_basis(result):
+                # Marked parsed all the same: the tracker would otherwise retry this filing forever
+                summary['other_basis'] += 1
+                logger.info(f"  {row['nse_symbol']}: {result.get('nature')} filing skipped (XBRL_NATURE={XBRL_NATURE})")
+            else:
+                names = {result['symbol']: result['company_name']} if result.get('company_name') else None
+                summary['rows_stored'] += self.store.append(to_store_rows(result), companies=names,
+                                                            source='NSE_XBRL')
+            self.mysql.execute("UPDATE vs_nse_fetch_tracker SET xbrl_parsed = 1 WHERE nse_symbol = %s",
+                               (row['nse_symbol'],))
+            summary['parsed'] += 1
+        logger.info(f"XBRL run: {summary}")
+        return summary
 
 
 def main():
-    parser = argparse.ArgumentParser(description='XBRL Segment Data Parser (Phase 2)')
-    parser.add_argument('--symbol', type=str, help='Parse single company')
+    parser = argparse.ArgumentParser(description='XBRL financial-results parser')
+    parser.add_argument('--file', type=str, help='Parse a single filing and print the quarters')
+    parser.add_argument('--dir', type=str, help='Parse every *.xml under a directory')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes for --dir')
+    parser.add_argument('--store', action='store_true', help='Append --dir results to the NSE quarterly store')
+    parser.add_argument('--symbol', type=str, help='Parse a tracked company from the local source')
     parser.add_argument('--batch', action='store_true', help='Process batch of unparsed companies')
     parser.add_argument('--limit', type=int, default=100, help='Batch size limit')
     args = parser.parse_args()
 
-    print("XBRL Parser — Phase 2 (Not Yet Implemented)")
-    print("This module will parse XBRL XML files from NSE filings")
-    print("to extract business/geographic segment data for SOTP valuation.")
-    print()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(name)s: %(message)s')
+
+    if args.file:
+        result = parse_file(args.file)
+        print(f"{result.get('symbol')} ({result.get('nature', '?')}): {result.get('error') or ''}")
+        for q_idx, values in sorted(result['quarters'].items()):
+            print(f"  Q{q_idx}: {values}")
+        return
+
+    if args.dir:
+        store = None
+        if args.store:
+            from valuation_system.storage.nse_quarterly_store import NSEQuarterlyStore
+            store = NSEQuarterlyStore()
+        parsed = failed = stored = 0
+        pending, names = [], {}
+        for result in parse_directory(args.dir, workers=args.workers):
+            if result.get('error'):
+                failed += 1
+                logger.error(f"  {result['path']}: {result['error']}")
+                continue
+            parsed += 1
+            if store is not None:
+                rows = to_store_rows(result)
+                pending.extend(rows)
+                if rows and result.get('company_name'):
+                    names[result['symbol']] = result['company_name']
+                if len(pending) >= 50000:
+                    stored += store.append(pending, companies=names, source='NSE_XBRL')
+                    pending, names = [], {}
+        if store is not None and pending:
+            stored += store.append(pending, companies=names, source='NSE_XBRL')
+        print(f"Parsed {parsed} filings, {failed} failed" + (f", {stored} rows stored" if store else ''))
+        return
 
-    # Show how many XBRL URLs are available
     try:
-        xbrl_parser = XBRLParser()
-        unparsed = xbrl_parser.get_unparsed_xbrl_urls(limit=5)
-        total = xbrl_parser.mysql.query_one(
-            "SELECT COUNT(*) as cnt FROM vs_nse_fetch_tracker "
-            "WHERE xbrl_url IS NOT NULL AND xbrl_url != ''"
-        )
-        print(f"XBRL URLs available: {total['cnt'] if total else 0}")
-        print(f"Sample unparsed companies:")
-        for row in unparsed:
-            print(f"  {row['nse_symbol']}: {row.get('xbrl_url', 'N/A')[:80]}")
+        print(XBRLParser().run(symbol=args.symbol, batch=args.batch, limit=args.limit))
     except Exception as e:
-        print(f"Could not query tracker: {e}")
+        print(f"XBRL run failed: {e}\n{traceback.format_exc()}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,339 @@
+"""
+Pipeline Executor — DAG execution for xyops pipeline definitions
+
+Runs a PIPELINES entry (see xyops_config.py) as a dependency graph instead
+of a strict sequence:
+
+- Dependencies: a step's 'depends_on' list; a step without one depends on
+  the step declared before it (so undeclared pipelines keep their old order),
+  'depends_on': [] makes it a root
+- Shared instances: one instance per (module, class) per run, built lazily
+  and reused by every step of that class (OrchestratorAgent loads its CSVs,
+  MySQL pool and LLM/GSheet clients once). Steps on the same instance are
+  serialized — agents are not assumed to be thread-safe
+- Concurrency: ready steps run in a thread pool (PIPELINE_MAX_WORKERS)
+- Timeouts: step 'timeout_minutes'; the pipeline 'timeout_minutes' is an
+  overall deadline — steps not started by then are SKIPPED
+- Retries: step 'retries' / 'retry_backoff_minutes', defaulting to the
+  pipeline-level values; a retry whose backoff would end past the pipeline
+  deadline is not attempted (the step stays FAILED)
+- Timing: one JSONL record per step appended to PIPELINE_TIMING_LOG
+- Dry run: plan() / format_plan() show the execution waves without importing
+  or running anything
+
+Usage:
+    from valuation_system.pipelines.pipeline_executor import PipelineExecutor
+    result = PipelineExecutor('daily_valuation', PIPELINES['daily_valuation']).run()
+    print(PipelineExecutor('daily_valuation', PIPELINES['daily_valuation']).format_plan())
+
+Config (.env):
+    PIPELINE_MAX_WORKERS=4
+    PIPELINE_TIMING_LOG=valuation_system/logs/pipeline_timings.jsonl
+
+Edge Cases:
+- A timed-out step cannot be killed (threads); it is marked TIMEOUT, is not
+  retried, and its thread is abandoned. Later steps on the same instance wait
+  for it to release the instance, bounded by their own timeout. A TimeoutError
+  raised by the step itself is an ordinary failure and is retried
+- With alert_on_failure, a failed step stops the pipeline: running steps
+  finish, nothing new starts (SKIPPED). Without it, dependents still run —
+  the old runner also carried on after a failure
+- Unknown dependency names or cycles → ValueError before anything runs
+"""
+
+import os
+import json
+import time
+import logging
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = int(os.getenv('PIPELINE_MAX_WORKERS', '4'))
+TIMING_LOG = os.getenv(
+    'PIPELINE_TIMING_LOG',
+    os.path.join(os.getenv('LOG_DIR', os.path.join(os.path.dirname(__file__), '..', 'logs')),
+                 'pipeline_timings.jsonl')
+)
+
+
+class _StepTimeout(Exception):
+    """An attempt outran its budget. Distinct from a TimeoutError the step raises itself."""
+
+    def __init__(self, budget: float):
+        super().__init__(f"timed out after {budget:.1f}s")
+        self.budget = budget
+
+
+def build_dag(steps: List[Dict]) -> Dict[str, List[str]]:
+    """{step name: [dependency names]}; validates names and rejects cycles."""
+    names = [s['name'] for s in steps]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate step names: {names}")
+    dag = {}
+    for i, step in enumerate(steps):
+        deps = step.get('depends_on')
+        if deps is None:
+            deps = [steps[i - 1]['name']] if i > 0 else []
+        unknown = [d for d in deps if d not in names]
+        if unknown:
+            raise ValueError(f"Step {step['name']} depends on unknown step(s): {unknown}")
+        dag[step['name']] = list(deps)
+    waves(dag)  # Raises on cycles
+    return dag
+
+
+def waves(dag: Dict[str, List[str]]) -> List[List[str]]:
+    """Topological levels: every step in wave N depends only on steps in waves < N."""
+    remaining = {name: set(deps) for name, deps in dag.items()}
+    done, levels = set(), []
+    while remaining:
+        ready = [name for name, deps in remaining.items() if deps <= done]
+        if not ready:
+            raise ValueError(f"Dependency cycle among steps: {sorted(remaining)}")
+        levels.append(ready)
+        done.update(ready)
+        for name in ready:
+            del remaining[name]
+    return levels
+
+
+class _InstanceRegistry:
+    """One lazily-built instance (and one run lock) per (module, class) for a pipeline run."""
+
+    def __init__(self):
+        self._instances: Dict[Tuple[str, str], Any] = {}
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._guard = threading.Lock()
+        self.constructed: Dict[str, int] = {}
+
+    def lock_for(self, key: Tuple[str, str]) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, key: Tuple[str, str]) -> Tuple[Any, bool]:
+        """(instance, reused). Caller holds lock_for(key), so construction happens once."""
+        if key in self._instances:
+            return self._instances[key], True
+        cls = getattr(importlib.import_module(key[0]), key[1])
+        instance = cls()
+        self._instances[key] = instance
+        self.constructed[key[1]] = self.constructed.get(key[1], 0) + 1
+        return instance, False
+
+
+class PipelineExecutor:
+    """Executes one pipeline definition as a DAG with shared instances, timeouts and retries."""
+
+    def __init__(self, name: str, pipeline: Dict, max_workers: int = MAX_WORKERS,
+                 timing_log: Optional[str] = TIMING_LOG, sleep: Callable[[float], None] = time.sleep):
+        self.name = name
+        self.pipeline = pipeline
+        self.steps = {s['name']: s for s in pipeline['steps']}
+        self.dag = build_dag(pipeline['steps'])
+        self.max_workers = max(1, max_workers)
+        self.timing_log = timing_log
+        self._sleep = sleep
+        self.instances = _InstanceRegistry()
+        self._log_lock = threading.Lock()
+
+    # -------------------------------------------------------------------------
+    # Plan (dry run)
+    # -------------------------------------------------------------------------
+
+    def plan(self) -> List[List[Dict]]:
+        """Execution waves with the settings each step will run with. Imports nothing."""
+        result = []
+        for wave in waves(self.dag):
+            result.append([{
+                'name': name,
+                'callable': self._callable_name(self.steps[name]),
+                'depends_on': self.dag[name],
+                'timeout_minutes': self.steps[name].get('timeout_minutes'),
+                'retries': self._retries(self.steps[name]),
+                'shared_instance': 'class' in self.steps[name],
+            } for name in wave])
+        return result
+
+    def format_plan(self) -> str:
+        lines = [f"Pipeline {self.name}: {len(self.steps)} steps, max_workers={self.max_workers}, "
+                 f"deadline={self.pipeline.get('timeout_minutes')}min"]
+        classes: Dict[str, int] = {}
+        for i, wave in enumerate(self.plan(), 1):
+            lines.append(f"  Wave {i}:")
+            for step in wave:
+                deps = f" after {', '.join(step['depends_on'])}" if step['depends_on'] else ''
+                lines.append(f"    {step['name']:<24} {step['callable']}{deps} "
+                             f"[timeout={step['timeout_minutes']}min, retries={step['retries']}]")
+                if step['shared_instance']:
+                    cls = self.steps[step['name']]['class']
+                    classes[cls] = classes.get(cls, 0) + 1
+        if classes:
+            lines.append("  Shared instances: " + ', '.join(f"{c} ×{n} steps" for c, n in classes.items()))
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _callable_name(step: Dict) -> str:
+        if 'function' in step:
+            return f"{step['module']}.{step['function']}()"
+        if 'class' in step and 'method' in step:
+            return f"{step['class']}.{step['method']}()"
+        return '<none>'
+
+    def _retries(self, step: Dict) -> int:
+        return int(step.get('retries', self.pipeline.get('retries', 0)))
+
+    # -------------------------------------------------------------------------
+    # Run
+    # -------------------------------------------------------------------------
+
+    def run(self) -> Dict:
+        """Execute the DAG. Result keeps run_pipeline's shape (pipeline/steps/status/...)."""
+        started = time.monotonic()
+        deadline_min = self.pipeline.get('timeout_minutes')
+        deadline = started + deadline_min * 60 if deadline_min else None
+        stop_on_failure = bool(self.pipeline.get('alert_on_failure'))
+        result = {'pipeline': self.name, 'started_at': datetime.now().isoformat(),
+                  'steps': {}, 'status': 'RUNNING'}
+        logger.info(f"Starting pipeline: {self.name} — {self.pipeline.get('description', '')} "
+                    f"({len(self.steps)} steps, {len(waves(self.dag))} waves)")
+
+        pending = dict(self.dag)
+        finished: Dict[str, str] = {}  # name → status
+        running = {}
+        stopped = False
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"pipeline-{self.name}")
+        try:
+            while pending or running:
+                if not stopped:
+                    for name in [n for n, deps in pending.items() if all(d in finished for d in deps)]:
+                        if deadline and time.monotonic() > deadline:
+                            break
+                        del pending[name]
+                        running[pool.submit(self._run_step, name, deadline)] = name
+                if not running:
+                    break  # Stopped, or past the deadline with nothing in flight
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    step_result = future.result()
+                    result['steps'][name] = step_result
+                    finished[name] = step_result['status']
+                    if step_result['status'] != 'SUCCESS' and stop_on_failure and not stopped:
+                        stopped = True
+                        result['failed_step'] = name
+                        result['error'] = step_result.get('error')
+        finally:
+            pool.shutdown(wait=False)  # Timed-out attempts may still be running
+
+        for name in pending:
+            reason = 'upstream failure' if stopped else 'pipeline deadline'
+            result['steps'][name] = {'status': 'SKIPPED', 'reason': reason}
+            self._write_timing(name, {'status': 'SKIPPED', 'attempts': 0, 'elapsed_s': 0})
+
+        result['status'] = 'FAILED' if stopped else ('TIMEOUT' if pending else 'SUCCESS')
+        result['failed_steps'] = [n for n, s in finished.items() if s != 'SUCCESS']
+        result['elapsed_s'] = round(time.monotonic() - started, 3)
+        result['instances_constructed'] = dict(self.instances.constructed)
+        result['completed_at'] = datetime.now().isoformat()
+        logger.info(f"Pipeline {self.name} completed: {result['status']} in {result['elapsed_s']}s "
+                    f"(failed: {result['failed_steps'] or 'none'})")
+        return result
+
+    def _run_step(self, name: str, deadline: Optional[float]) -> Dict:
+        """All attempts of one step (runs on a pool thread)."""
+        step = self.steps[name]
+        logger.info(f"  Step: {name} — {step.get('description', '')}")
+        retries = self._retries(step)
+        backoff = float(step.get('retry_backoff_minutes', self.pipeline.get('retry_backoff_minutes', 0))) * 60
+        timeout = step.get('timeout_minutes')
+        step_result = {'status': 'RUNNING', 'started_at': datetime.now().isoformat(), 'attempts': 0}
+        start = time.monotonic()
+
+        for attempt in range(retries + 1):
+            step_result['attempts'] = attempt + 1
+            budget = timeout * 60 if timeout else None
+            if deadline:
+                remaining = deadline - time.monotonic()
+                budget = remaining if budget is None else min(budget, remaining)
+            try:
+                output, reused = self._attempt(step, budget)
+                step_result.update(status='SUCCESS', output=output, instance_reused=reused)
+                step_result.pop('error', None)
+                break
+            except _StepTimeout as e:
+                step_result.update(status='TIMEOUT', error=str(e))
+                logger.error(f"  Step {name} {e} (attempt {attempt + 1})")
+                break  # The attempt is still running; a retry would race it
+            except Exception as e:
+                step_result.update(status='FAILED', error=str(e))
+                logger.error(f"  Step {name} failed (attempt {attempt + 1}/{retries + 1}): {e}", exc_info=True)
+                if attempt < retries:
+                    delay = backoff * (attempt + 1)
+                    if deadline and time.monotonic() + delay >= deadline:
+                        logger.warning(f"  Step {name}: no retry — backoff of {delay:.0f}s "
+                                       f"would pass the pipeline deadline")
+                        break
+                    self._sleep(delay)
+
+        step_result['completed_at'] = datetime.now().isoformat()
+        step_result['elapsed_s'] = round(time.monotonic() - start, 3)
+        self._write_timing(name, step_result)
+        return step_result
+
+    def _attempt(self, step: Dict, budget: Optional[float]) -> Tuple[Any, bool]:
+        """Run the step's callable on its own thread so the budget can be enforced."""
+        box: Dict[str, Any] = {}
+        done = threading.Event()
+        kwargs = step.get('kwargs', {})
+
+        def target():
+            try:
+                if 'function' in step:
+                    fn = getattr(importlib.import_module(step['module']), step['function'])
+                    box['output'], box['reused'] = fn(**kwargs), False
+                elif 'class' in step and 'method' in step:
+                    key = (step['module'], step['class'])
+                    with self.instances.lock_for(key):
+                        instance, box['reused'] = self.instances.get(key)
+                        box['output'] = getattr(instance, step['method'])(**kwargs)
+                else:
+                    box['output'], box['reused'] = {'error': 'No callable defined for step'}, False
+            except BaseException as e:
+                box['error'] = e
+            finally:
+                done.set()
+
+        threading.Thread(target=target, daemon=True, name=f"step-{step['name']}").start()
+        if budget is None:
+            done.wait()
+        elif not done.wait(max(0.0, budget)):
+            raise _StepTimeout(max(0.0, budget))
+        if 'error' in box:
+            error = box['error']
+            if not isinstance(error, Exception):  # e.g. SystemExit from a CLI main()
+                raise RuntimeError(f"step exited: {error!r}") from error
+            raise error
+        return box['output'], box['reused']
+
+    def _write_timing(self, name: str, step_result: Dict):
+        if not self.timing_log:
+            return
+        record = {'pipeline': self.name, 'step': name, 'status': step_result['status'],
+                  'attempts': step_result.get('attempts', 0), 'elapsed_s': step_result.get('elapsed_s'),
+                  'started_at': step_result.get('started_at'), 'completed_at': step_result.get('completed_at'),
+                  'instance_reused': step_result.get('instance_reused'), 'logged_at': datetime.now().isoformat()}
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.timing_log)), exist_ok=True)
+            with self._log_lock, open(self.timing_log, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        except OSError as e:
+            logger.warning(f"Could not write step timing to {self.timing_log}: {e}")
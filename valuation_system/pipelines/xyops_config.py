@@ -3,7 +3,9 @@
 XYOps Pipeline Configuration for Valuation System
 
 Defines 5 declarative pipelines with scheduling, dependencies, alerting, and monitoring.
-Each pipeline is a sequence of steps that can be executed by the XYOps scheduler.
+Each pipeline is a set of steps that can be executed by the XYOps scheduler. Steps run
+in declaration order unless they declare 'depends_on' (a list of step names; [] = no
+upstream step), which lets PipelineExecutor run independent steps concurrently.
 
 Pipelines:
 1. macro_sync      — 06:00 IST daily: Scrape macro data, sync to MySQL/GSheet, assess materiality
@@ -24,6 +26,8 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 from dotenv import load_dotenv
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
 
+from valuation_system.pipelines.pipeline_executor import PipelineExecutor
+
 logger = logging.getLogger(__name__)
 
 # =============================================================================
@@ -71,6 +75,7 @@ PIPELINES = {
                 'module': 'valuation_system.agents.orchestrator',
                 'class': 'OrchestratorAgent',
                 'method': '_assess_materiality',
+                'depends_on': ['sync_macro_to_mysql'],  # Independent of the GSheet sync
                 'timeout_minutes': 5,
             },
         ],
@@ -175,6 +180,7 @@ PIPELINES = {
                 'module': 'valuation_system.agents.orchestrator',
                 'class': 'OrchestratorAgent',
                 'method': '_process_approved_discoveries',
+                'depends_on': [],  # Independent of the NSE fetch
                 'timeout_minutes': 2,
             },
             {
@@ -182,6 +188,7 @@ PIPELINES = {
                 'description': 'Run batch valuation for all active companies',
                 'module': 'valuation_system.utils.batch_valuation',
                 'function': 'main',
+                'depends_on': ['nse_fetch', 'process_discoveries'],
                 'timeout_minutes': 100,
                 'note': 'batch_valuation.py handles DB saves, GSheet updates, Excel reports',
             },
@@ -198,6 +205,7 @@ PIPELINES = {
                 'module': 'valuation_system.agents.orchestrator',
                 'class': 'OrchestratorAgent',
                 'method': '_assess_materiality',
+                'depends_on': ['batch_valuation'],  # Runs alongside the GSheet sync
                 'timeout_minutes': 5,
             },
         ],
@@ -244,15 +252,16 @@ PIPELINES = {
                 'description': 'Pre-compute peer statistics for all 66 valuation subgroups (quality score cache)',
                 'module': 'valuation_system.utils.populate_peer_stats',
                 'function': 'populate_peer_stats',
-                'kwargs': {'force_refresh': True},
+                'kwargs': {'incremental': True},
                 'timeout_minutes': 10,
-                'note': 'Refreshes cached median ROCE, growth, D/E, pledge for quality score calculations',
+                'note': 'Refreshes cached ROCE, growth, D/E, pledge stats for subgroups whose members or financials changed',
             },
             {
                 'name': 'full_gsheet_sync',
                 'description': 'Sync all 7 GSheet tabs (Macro, Group, Subgroup, Companies, Discovered)',
                 'module': 'valuation_system.utils.sync_drivers_to_gsheet',
                 'function': 'main',
+                'depends_on': ['refresh_peer_stats'],
                 'timeout_minutes': 15,
             },
             {
@@ -262,6 +271,7 @@ PIPELINES = {
                 'class': 'GroupAnalystAgent',
                 'method': 'detect_trend_developments',
                 'parallel_per_group': True,
+                'depends_on': ['refresh_peer_stats'],  # Runs alongside the GSheet sync
                 'timeout_minutes': 20,
             },
             {
@@ -270,6 +280,7 @@ PIPELINES = {
                 'module': 'valuation_system.agents.orchestrator',
                 'class': 'OrchestratorAgent',
                 'method': '_assess_materiality',
+                'depends_on': ['trend_detection'],
                 'timeout_minutes': 10,
             },
         ],
@@ -320,72 +331,22 @@ PIPELINES = {
 # PIPELINE RUNNER (standalone execution)
 # =============================================================================
 
-def run_pipeline(pipeline_name: str) -> dict:
+def run_pipeline(pipeline_name: str, dry_run: bool = False, max_workers: int = None) -> dict:
     """
-    Execute a named pipeline. Each step is run sequentially.
-    Returns dict with step results and overall status.
+    Execute a named pipeline as a dependency DAG (see PipelineExecutor): one
+    shared instance per class, independent steps in parallel, per-step
+    timeouts/retries, per-step timing records.
+    Returns dict with step results and overall status; dry_run returns the plan only.
     """
     if pipeline_name not in PIPELINES:
         raise ValueError(f"Unknown pipeline: {pipeline_name}. Available: {list(PIPELINES.keys())}")
 
-    pipeline = PIPELINES[pipeline_name]
-    logger.info(f"Starting pipeline: {pipeline_name} — {pipeline['description']}")
-
-    result = {
-        'pipeline': pipeline_name,
-        'started_at': datetime.now().isoformat(),
-        'steps': {},
-        'status': 'RUNNING',
-    }
-
-    for step in pipeline['steps']:
-        step_name = step['name']
-        logger.info(f"  Step: {step_name} — {step['description']}")
-
-        step_result = {'status': 'RUNNING', 'started_at': datetime.now().isoformat()}
-
-        try:
-            if 'function' in step:
-                # Module-level function call
-                import importlib
-                mod = importlib.import_module(step['module'])
-                fn = getattr(mod, step['function'])
-                step_output = fn()
-            elif 'class' in step and 'method' in step:
-                # Class method call
-                import importlib
-                mod = importlib.import_module(step['module'])
-                cls = getattr(mod, step['class'])
-                instance = cls()
-                method = getattr(instance, step['method'])
-                step_output = method()
-            else:
-                step_output = {'error': 'No callable defined for step'}
-
-            step_result['output'] = step_output
-            step_result['status'] = 'SUCCESS'
-
-        except Exception as e:
-            logger.error(f"  Step {step_name} failed: {e}", exc_info=True)
-            step_result['status'] = 'FAILED'
-            step_result['error'] = str(e)
-
-            # If alert_on_failure is True, the pipeline should stop
-            if pipeline.get('alert_on_failure'):
-                result['status'] = 'FAILED'
-                result['failed_step'] = step_name
-                result['error'] = str(e)
-                result['steps'][step_name] = step_result
-                result['completed_at'] = datetime.now().isoformat()
-                return result
-
-        step_result['completed_at'] = datetime.now().isoformat()
-        result['steps'][step_name] = step_result
-
-    result['status'] = 'SUCCESS'
-    result['completed_at'] = datetime.now().isoformat()
-    logger.info(f"Pipeline {pipeline_name} completed: {result['status']}")
-    return result
+    kwargs = {'max_workers': max_workers} if max_workers else {}
+    executor = PipelineExecutor(pipeline_name, PIPELINES[pipeline_name], **kwargs)
+    if dry_run:
+        return {'pipeline': pipeline_name, 'status': 'DRY_RUN', 'plan': executor.plan(),
+                'plan_text': executor.format_plan(), 'steps': {}}
+    return executor.run()
 
 
 def get_pipeline_status() -> dict:
@@ -404,19 +365,28 @@ def get_pipeline_status() -> dict:
 
 
 if __name__ == '__main__':
-    import sys
+    import argparse
     logging.basicConfig(level=logging.INFO, format='%(name)s - %(levelname)s - %(message)s')
 
-    if len(sys.argv) > 1:
-        pipeline_name = sys.argv[1]
-        result = run_pipeline(pipeline_name)
-        print(f"\nPipeline result: {result['status']}")
-        for step_name, step_result in result['steps'].items():
-            print(f"  {step_name}: {step_result['status']}")
+    parser = argparse.ArgumentParser(description='Run an xyops pipeline')
+    parser.add_argument('pipeline', nargs='?', help='Pipeline name')
+    parser.add_argument('--dry-run', action='store_true', help='Print the execution plan only')
+    parser.add_argument('--max-workers', type=int, default=None, help='Concurrent steps')
+    args = parser.parse_args()
+
+    if args.pipeline:
+        result = run_pipeline(args.pipeline, dry_run=args.dry_run, max_workers=args.max_workers)
+        if args.dry_run:
+            print(result['plan_text'])
+        else:
+            print(f"\nPipeline result: {result['status']} ({result['elapsed_s']}s)")
+            for step_name, step_result in result['steps'].items():
+                print(f"  {step_name}: {step_result['status']} "
+                      f"({step_result.get('elapsed_s', 0)}s, attempts={step_result.get('attempts', 0)})")
     else:
         print("Available pipelines:")
         for name, info in get_pipeline_status().items():
             print(f"  {name}: {info['description']}")
             print(f"    Schedule: {info['schedule']}, Steps: {info['steps']}, "
                   f"Timeout: {info['timeout_minutes']}min")
-        print(f"\nUsage: python3 {sys.argv[0]} <pipeline_name>")
+        print(f"\nUsage: python3 {sys.argv[0]} <pipeline_name> [--dry-run]")
@@ -63,38 +63,44 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
 
-# Configure logging
 LOG_DIR = os.getenv('LOG_DIR', os.path.join(os.path.dirname(__file__), '..', 'logs'))
-os.makedirs(LOG_DIR, exist_ok=True)
-
-logging.basicConfig(
-    level=os.getenv('LOG_LEVEL', 'DEBUG'),
-    format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
-    handlers=[
-        logging.FileHandler(
-            os.path.join(LOG_DIR, f"{datetime.now().strftime('%Y-%m-%d')}.log")
-        ),
-        logging.StreamHandler(sys.stdout),
-    ]
-)
 logger = logging.getLogger('valuation_system')
 
 
-def run_hourly():
+def configure_logging():
+    """
+    Root logging for CLI runs (daily file in LOG_DIR + stdout). Called from
+    __main__ only, so importing the runner in-process (webhook warm workers)
+    leaves the host's logging alone.
+    """
+    os.makedirs(LOG_DIR, exist_ok=True)
+    logging.basicConfig(
+        level=os.getenv('LOG_LEVEL', 'DEBUG'),
+        format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
+        handlers=[
+            logging.FileHandler(
+                os.path.join(LOG_DIR, f"{datetime.now().strftime('%Y-%m-%d')}.log")
+            ),
+            logging.StreamHandler(sys.stdout),
+        ]
+    )
+
+
+def run_hourly(orch=None):
     """Hourly cycle: news scan → classify → update drivers."""
     from valuation_system.agents.orchestrator import OrchestratorAgent
-    orch = OrchestratorAgent()
+    orch = orch or OrchestratorAgent()
     result = orch.run_hourly_cycle()
     logger.info(f"Hourly cycle result: {result}")
     return result
 
 
-def run_daily():
+def run_daily(orch=None):
     """Daily cycle: full valuation refresh → alerts → digest."""
     from valuation_system.agents.orchestrator import OrchestratorAgent
     from valuation_system.notifications.email_sender import EmailSender
 
-    orch = OrchestratorAgent()
+    orch = orch or OrchestratorAgent()
 
     # Run hourly first (catchup if needed)
     hourly_result = orch.run_hourly_cycle()
@@ -219,11 +225,11 @@ def run_nse_fetch(mode: str = 'daily', symbol: str = None, min_mcap_cr: float =
     return result
 
 
-def run_valuation(symbol: str = None, company_key: str = None):
+def run_valuation(symbol: str = None, company_key: str = None, orch=None):
     """On-demand single company valuation."""
     from valuation_system.agents.orchestrator import OrchestratorAgent
 
-    orch = OrchestratorAgent()
+    orch = orch or OrchestratorAgent()
     result = orch.run_on_demand(company_key=company_key, nse_symbol=symbol)
     logger.info(f"On-demand valuation: {result.get('company_name', symbol)}")
 
@@ -245,10 +251,10 @@ def run_valuation(symbol: str = None, company_key: str = None):
     return result
 
 
-def run_portfolio():
+def run_portfolio(orch=None):
     """On-demand full portfolio valuation."""
     from valuation_system.agents.orchestrator import OrchestratorAgent
-    orch = OrchestratorAgent()
+    orch = orch or OrchestratorAgent()
     return orch.run_portfolio_valuation()
 
 
@@ -431,4 +437,5 @@ def main():
 
 
 if __name__ == '__main__':
+    configure_logging()
     main()
@@ -0,0 +1,443 @@
+"""
+Bulk Migration Engine
+Set-based replacement for the per-row paths in migrate_companies
+(migrate_from_gem / migrate_pilot_alpha_configs), which did one mssdb lookup,
+one existence SELECT and one INSERT or UPDATE per company.
+
+- resolve_company_ids(): every NSE symbol / alternate symbol / accord code
+  resolved against mssdb.kbapp_marketscrip in one IN-list query per chunk
+  (symbol > alternate_symbol > accord_code, lowest marketscrip_id on ties)
+- plan(): one SELECT of the existing rows, then an in-memory
+  insert / update / no-op partition (no-op = every compared column equal)
+- apply(): multi-row INSERTs and CASE-based UPDATEs, chunk_size rows per
+  statement, all plans inside a single transaction
+- every applied row lands in a change log (before / after per row), written
+  as JSON; revert() replays it backwards in one transaction
+
+The same SQL runs on MySQL (MySQLBackend over ValuationMySQLClient) and on
+SQLite (SQLiteBackend, with mssdb ATTACHed), so the whole path is testable
+against an in-memory database.
+
+Usage:
+    engine = BulkMigrationEngine(MySQLBackend(ValuationMySQLClient.get_instance()))
+    ids = engine.resolve_company_ids([{'nse_symbol': 'EICHERMOT', 'accord_code': '1234'}])
+    plan = engine.plan('vs_active_companies', 'company_id', rows, UPDATE_COLUMNS, touch='last_synced')
+    report = engine.apply([plan])           # {'inserted': .., 'updated': .., 'change_log': path}
+    engine.revert(report['change_log'])     # {'deleted': .., 'restored': .., 'conflicts': [..]}
+
+Config (.env):
+    MIGRATION_CHUNK_SIZE=200
+    MIGRATION_CHANGELOG_DIR=valuation_system/data/state/migrations
+
+Edge Cases:
+- Rows with the same key keep the last one (the per-row path ended the same
+  way: insert, then update with the later row); the rest count as duplicates
+- Values compare as text after normalisation (NaN/'' → None, 5.0 → '5'), so
+  DECIMAL/INT columns read back from MySQL don't show up as spurious updates
+- plan(touch_unchanged=True) also stamps the touch column on no-op rows
+  (the per-row path set last_synced on every matched company); those
+  stamps are logged and reverted like updates
+- revert() restores the touch column (last_synced / updated_at) as well
+- revert() skips rows changed since the log was written (current values no
+  longer match 'after', or an inserted row is gone) and lists them under
+  'conflicts'; force=True reverts them anyway
+- A failure anywhere rolls the whole apply back; no change log is written
+"""
+
+import os
+import json
+import math
+import sqlite3
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
+
+CHUNK_SIZE = int(os.getenv('MIGRATION_CHUNK_SIZE', 200))
+CHANGELOG_DIR = os.getenv('MIGRATION_CHANGELOG_DIR',
+                          os.path.join(os.path.dirname(__file__), '..', 'data', 'state', 'migrations'))
+MARKETSCRIP_TABLE = 'mssdb.kbapp_marketscrip'
+
+
+# =============================================================================
+# VALUE NORMALISATION
+# =============================================================================
+
+def clean_value(value):
+    """Python/DB-bindable value: NaN/'' → None, numpy scalars unwrapped, dates as ISO text."""
+    if hasattr(value, 'item') and not isinstance(value, (str, bytes)):
+        value = value.item()
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def key_text(value) -> Optional[str]:
+    """Comparable text form of a value (5 == 5.0 == '5', None stays None)."""
+    value = clean_value(value)
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+# =============================================================================
+# BACKENDS
+# =============================================================================
+
+class MySQLBackend:
+    """ValuationMySQLClient: reads through the pool, writes in one explicit transaction."""
+
+    placeholder = '%s'
+
+    def __init__(self, client):
+        self.client = client
+
+    def fetch(self, sql: str, params: Iterable = ()) -> List[dict]:
+        return self.client.query(sql, tuple(params))
+
+    @contextmanager
+    def transaction(self):
+        with self.client.get_connection() as conn:
+            conn.start_transaction()
+            cursor = conn.cursor()
+            try:
+                yield _Executor(cursor, self.placeholder)
+                conn.commit()
+            finally:
+                cursor.close()
+
+
+class SQLiteBackend:
+    """sqlite3 connection (attach a database AS mssdb for the marketscrip lookup)."""
+
+    placeholder = '?'
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def fetch(self, sql: str, params: Iterable = ()) -> List[dict]:
+        cursor = self.conn.execute(sql.replace('%s', self.placeholder), tuple(params))
+        names = [d[0] for d in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    @contextmanager
+    def transaction(self):
+        with self.conn:
+            yield _Executor(self.conn.cursor(), self.placeholder)
+
+
+class _Executor:
+    def __init__(self, cursor, placeholder: str):
+        self.cursor = cursor
+        self.placeholder = placeholder
+        self.statements = 0
+
+    def execute(self, sql: str, params: list) -> int:
+        if self.placeholder != '%s':
+            sql = sql.replace('%s', self.placeholder)
+        self.cursor.execute(sql, params)
+        self.statements += 1
+        return self.cursor.rowcount
+
+
+# =============================================================================
+# PLAN
+# =============================================================================
+
+@dataclass
+class TablePlan:
+    table: str
+    key: str
+    columns: List[str]                      # Compared and updated
+    touch: Optional[str] = None             # Set to CURRENT_TIMESTAMP on update
+    inserts: List[dict] = field(default_factory=list)
+    updates: List[dict] = field(default_factory=list)   # {'key': .., 'before': {..}, 'after': {..}}
+    touches: List[dict] = field(default_factory=list)   # No-op rows to stamp: {'key': .., 'before': {touch: ..}}
+    unchanged: int = 0
+    duplicates: int = 0
+
+    def summary(self) -> dict:
+        return {'table': self.table, 'inserts': len(self.inserts), 'updates': len(self.updates),
+                'touches': len(self.touches), 'unchanged': self.unchanged, 'duplicates': self.duplicates}
+
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class BulkMigrationEngine:
+    """Set-based lookups, in-memory partition, chunked transactional apply, reversible change log."""
+
+    def __init__(self, backend, chunk_size: int = None, changelog_dir: str = None):
+        self.db = backend
+        self.chunk_size = max(1, chunk_size or CHUNK_SIZE)
+        self.changelog_dir = changelog_dir or CHANGELOG_DIR
+
+    # -------------------------------------------------------------------------
+    # Lookups
+    # -------------------------------------------------------------------------
+
+    def resolve_company_ids(self, rows: List[dict]) -> List[Optional[int]]:
+        """
+        marketscrip_id per row from its nse_symbol / accord_code, aligned with rows
+        (None where nothing matches). Same precedence as get_company_id_from_mssdb.
+        """
+        symbols = sorted({s for s in (key_text(r.get('nse_symbol')) for r in rows) if s})
+        accords = sorted({a for a in (key_text(r.get('accord_code')) for r in rows) if a})
+        by_symbol, by_alternate, by_accord = {}, {}, {}
+
+        def keep(index, value, scrip_id):
+            if value is not None and (value not in index or scrip_id < index[value]):
+                index[value] = scrip_id
+
+        for column, values in (('symbol', symbols), ('accord_code', accords)):
+            for chunk in _chunks(values, self.chunk_size):
+                marks = ', '.join(['%s'] * len(chunk))
+                if column == 'symbol':
+                    where, params = f"symbol IN ({marks}) OR alternate_symbol IN ({marks})", chunk + chunk
+                else:
+                    where, params = f"accord_code IN ({marks})", chunk
+                for hit in self.db.fetch(
+                        f"SELECT marketscrip_id, symbol, alternate_symbol, accord_code "
+                        f"FROM {MARKETSCRIP_TABLE} WHERE {where}", params):
+                    if column == 'symbol':
+                        keep(by_symbol, key_text(hit['symbol']), hit['marketscrip_id'])
+                        keep(by_alternate, key_text(hit['alternate_symbol']), hit['marketscrip_id'])
+                    else:
+                        keep(by_accord, key_text(hit['accord_code']), hit['marketscrip_id'])
+
+        resolved = []
+        for row in rows:
+            symbol, accord = key_text(row.get('nse_symbol')), key_text(row.get('accord_code'))
+            resolved.append(by_symbol.get(symbol) or by_alternate.get(symbol) or by_accord.get(accord))
+        return resolved
+
+    def fetch_existing(self, table: str, key: str, keys: list, columns: List[str]) -> Dict[str, dict]:
+        """key_text(key) → current row (key + columns) for the keys that exist."""
+        existing = {}
+        select = ', '.join(dict.fromkeys([key] + columns))
+        for chunk in _chunks(list(keys), self.chunk_size):
+            marks = ', '.join(['%s'] * len(chunk))
+            for row in self.db.fetch(f"SELECT {select} FROM {table} WHERE {key} IN ({marks})", chunk):
+                existing[key_text(row[key])] = row
+        return existing
+
+    # -------------------------------------------------------------------------
+    # Partition
+    # -------------------------------------------------------------------------
+
+    def plan(self, table: str, key: str, rows: List[dict], columns: List[str],
+             touch: str = None, touch_unchanged: bool = False) -> TablePlan:
+        """
+        Partition rows (dicts holding key, columns and any insert-only columns)
+        into inserts / updates / no-ops against the current table contents.
+        touch_unchanged: no-op rows still get their touch column stamped.
+        """
+        plan = TablePlan(table=table, key=key, columns=list(columns), touch=touch)
+        latest = {}
+        for row in rows:
+            row = {k: clean_value(v) for k, v in row.items()}
+            k = key_text(row.get(key))
+            if k is None:
+                continue
+            if k in latest:
+                plan.duplicates += 1
+            latest[k] = row
+
+        snapshot = columns + ([touch] if touch else [])
+        existing = self.fetch_existing(table, key, [latest[k][key] for k in latest], snapshot)
+        for k, row in latest.items():
+            current = existing.get(k)
+            if current is None:
+                plan.inserts.append(row)
+                continue
+            after = {c: row.get(c) for c in columns}
+            if all(key_text(current.get(c)) == key_text(after[c]) for c in columns):
+                plan.unchanged += 1
+                if touch and touch_unchanged:
+                    plan.touches.append({'key': row[key], 'before': {touch: clean_value(current.get(touch))}})
+                continue
+            plan.updates.append({'key': row[key],
+                                 'before': {c: clean_value(current.get(c)) for c in snapshot},
+                                 'after': after})
+        return plan
+
+    # -------------------------------------------------------------------------
+    # Apply / revert
+    # -------------------------------------------------------------------------
+
+    def insert_rows(self, tx, table: str, rows: List[dict]) -> int:
+        written = 0
+        for chunk in _chunks(rows, self.chunk_size):
+            columns = list(dict.fromkeys(c for row in chunk for c in row))
+            values = ', '.join(['(' + ', '.join(['%s'] * len(columns)) + ')'] * len(chunk))
+            params = [row.get(c) for row in chunk for c in columns]
+            tx.execute(f"INSERT INTO {table} ({', '.join(columns)}) VALUES {values}", params)
+            written += len(chunk)
+        return written
+
+    def update_rows(self, tx, table: str, key: str, changes: List[dict], touch: str = None) -> int:
+        """
+        changes: [{'key': k, 'values': {column: value}}], one CASE UPDATE per
+        chunk. Rows that don't list a column keep their current value (ELSE column).
+        """
+        written = 0
+        for chunk in _chunks(changes, self.chunk_size):
+            columns = list(dict.fromkeys(c for change in chunk for c in change['values']))
+            sets, params = [], []
+            for column in columns:
+                setting = [change for change in chunk if column in change['values']]
+                whens = ' '.join(['WHEN %s THEN %s'] * len(setting))
+                sets.append(f"{column} = CASE {key} {whens} ELSE {column} END")
+                for change in setting:
+                    params += [change['key'], change['values'][column]]
+            if touch and touch not in columns:
+                sets.append(f"{touch} = CURRENT_TIMESTAMP")
+            marks = ', '.join(['%s'] * len(chunk))
+            params += [change['key'] for change in chunk]
+            tx.execute(f"UPDATE {table} SET {', '.join(sets)} WHERE {key} IN ({marks})", params)
+            written += len(chunk)
+        return written
+
+    def touch_rows(self, tx, table: str, key: str, keys: list, touch: str) -> int:
+        """Stamp the touch column with CURRENT_TIMESTAMP, one UPDATE per chunk."""
+        written = 0
+        for chunk in _chunks(keys, self.chunk_size):
+            marks = ', '.join(['%s'] * len(chunk))
+            tx.execute(f"UPDATE {table} SET {touch} = CURRENT_TIMESTAMP WHERE {key} IN ({marks})", chunk)
+            written += len(chunk)
+        return written
+
+    def delete_rows(self, tx, table: str, key: str, keys: list) -> int:
+        deleted = 0
+        for chunk in _chunks(keys, self.chunk_size):
+            marks = ', '.join(['%s'] * len(chunk))
+            deleted += max(tx.execute(f"DELETE FROM {table} WHERE {key} IN ({marks})", chunk), 0)
+        return deleted
+
+    def apply(self, plans: List[TablePlan], dry_run: bool = False, label: str = 'migration') -> dict:
+        """Apply every plan in one transaction; returns counts plus the change-log path."""
+        report = {'plans': [p.summary() for p in plans], 'dry_run': dry_run, 'statements': 0,
+                  'inserted': sum(len(p.inserts) for p in plans),
+                  'updated': sum(len(p.updates) for p in plans),
+                  'touched': sum(len(p.touches) for p in plans),
+                  'unchanged': sum(p.unchanged for p in plans), 'change_log': None}
+        if dry_run or not (report['inserted'] or report['updated'] or report['touched']):
+            return report
+
+        entries = []
+        with self.db.transaction() as tx:
+            for plan in plans:
+                if plan.inserts:
+                    self.insert_rows(tx, plan.table, plan.inserts)
+                    entries += [{'table': plan.table, 'key_column': plan.key, 'op': 'insert',
+                                 'key': row[plan.key], 'after': row} for row in plan.inserts]
+                if plan.updates:
+                    self.update_rows(tx, plan.table, plan.key,
+                                 [{'key': u['key'], 'values': u['after']} for u in plan.updates], plan.touch)
+                    entries += [{'table': plan.table, 'key_column': plan.key, 'op': 'update',
+                                 'key': u['key'], 'before': u['before'], 'after': u['after']}
+                                for u in plan.updates]
+                if plan.touches:
+                    self.touch_rows(tx, plan.table, plan.key, [t['key'] for t in plan.touches], plan.touch)
+                    entries += [{'table': plan.table, 'key_column': plan.key, 'op': 'update',
+                                 'key': t['key'], 'before': t['before'], 'after': {}}
+                                for t in plan.touches]
+            report['statements'] = tx.statements
+
+        report['change_log'] = self.write_change_log(entries, label)
+        logger.info(f"Bulk {label}: {report['inserted']} inserted, {report['updated']} updated, "
+                    f"{report['unchanged']} unchanged ({report['touched']} touched) in {report['statements']} statements "
+                    f"(change log: {report['change_log']})")
+        return report
+
+    def write_change_log(self, entries: List[dict], label: str) -> str:
+        os.makedirs(self.changelog_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        path = os.path.join(self.changelog_dir, f"{label}_{stamp}.json")
+        with open(path, 'w') as f:
+            json.dump({'label': label, 'created_at': datetime.now().isoformat(), 'entries': entries},
+                      f, indent=1, default=str)
+        return path
+
+    def find_conflicts(self, entries: List[dict]) -> List[dict]:
+        """
+        Entries whose row changed since the log was written: the current values
+        differ from 'after', or the row is gone.
+        """
+        groups: Dict[tuple, List[dict]] = {}
+        for entry in entries:
+            groups.setdefault((entry['table'], entry['key_column']), []).append(entry)
+
+        conflicts = []
+        for (table, key), group in groups.items():
+            columns = sorted({c for e in group for c in e.get('after', {}) if c != key})
+            existing = self.fetch_existing(table, key, [e['key'] for e in group], columns)
+            for entry in group:
+                current = existing.get(key_text(entry['key']))
+                if current is None:
+                    changed = ['<missing>']
+                else:
+                    changed = [c for c, v in entry.get('after', {}).items()
+                               if c != key and key_text(current.get(c)) != key_text(v)]
+                if changed:
+                    conflicts.append({'table': table, 'key': entry['key'], 'op': entry['op'], 'columns': changed})
+        return conflicts
+
+    def revert(self, change_log, force: bool = False) -> dict:
+        """
+        Undo a change log (path or loaded dict) in one transaction: inserted
+        rows are deleted, updated rows get their before values back. Entries
+        are undone newest-first. Rows changed since the log was written are
+        skipped and reported under 'conflicts' unless force is set.
+        """
+        if isinstance(change_log, str):
+            with open(change_log) as f:
+                change_log = json.load(f)
+        entries = list(reversed(change_log.get('entries', [])))
+        conflicts = self.find_conflicts(entries)
+        if conflicts and not force:
+            skip = {(c['table'], key_text(c['key'])) for c in conflicts}
+            entries = [e for e in entries if (e['table'], key_text(e['key'])) not in skip]
+            logger.warning(f"Revert: skipping {len(conflicts)} rows changed since the change log was written")
+
+        # Consecutive entries with the same (table, op) go out as one batch, so the order stays reversed
+        batches = []
+        for entry in entries:
+            marker = (entry['table'], entry['key_column'], entry['op'])
+            if not batches or batches[-1][0] != marker:
+                batches.append((marker, []))
+            batches[-1][1].append(entry)
+
+        report = {'deleted': 0, 'restored': 0, 'statements': 0, 'conflicts': conflicts,
+                  'skipped': 0 if force else len(conflicts)}
+        with self.db.transaction() as tx:
+            for (table, key, op), batch in batches:
+                if op == 'insert':
+                    report['deleted'] += self.delete_rows(tx, table, key, [e['key'] for e in batch])
+                else:
+                    report['restored'] += self.update_rows(
+                        tx, table, key, [{'key': e['key'], 'values': e['before']} for e in batch])
+            report['statements'] = tx.statements
+        logger.info(f"Reverted change log: {report}")
+        return report
@@ -2,6 +2,11 @@
 """
 Company Migration Script - Load companies from gem classification file
 Migrates up to 1000 investable companies with balanced sector distribution
+
+Writes go through storage/bulk_migration.BulkMigrationEngine: company IDs are
+resolved in one set-based lookup, the insert/update/no-op split is computed in
+memory, changes are applied in chunked multi-row statements inside a single
+transaction, and each run leaves a JSON change log that --revert undoes.
 """
 
 import sys
@@ -18,16 +23,26 @@ from typing import Dict, List, Tuple
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from storage.mysql_client import ValuationMySQLClient
+from storage.bulk_migration import BulkMigrationEngine, MySQLBackend, key_text
 from dotenv import load_dotenv
 
 load_dotenv(Path(__file__).parent.parent / 'config' / '.env')
 
+# Columns the gem migration rewrites on an existing vs_active_companies row
+ACTIVE_COMPANY_COLUMNS = [
+    'nse_symbol', 'company_name', 'csv_name', 'bse_code', 'accord_code',
+    'valuation_group', 'valuation_subgroup', 'cd_sector', 'cd_industry',
+    'sector', 'industry', 'valuation_frequency', 'is_active',
+]
+ALPHA_CONFIG_COLUMNS = ['thesis_bull', 'thesis_bear', 'thesis_key_moat', 'alpha_drivers', 'sector_overrides']
+
 
 class CompanyMigrator:
     """Handles migration of companies from gem file to database."""
 
-    def __init__(self, mysql_client: ValuationMySQLClient):
+    def __init__(self, mysql_client: ValuationMySQLClient, backend=None, chunk_size: int = None):
         self.mysql = mysql_client
+        self.engine = BulkMigrationEngine(backend or MySQLBackend(mysql_client), chunk_size=chunk_size)
         self.gem_file = Path(__file__).parent.parent / 'data' / 'reference' / 'sector-industry-vertical-feb2026.xlsx'
         self.companies_yaml = Path(__file__).parent.parent / 'config' / 'companies.yaml'
         self.prices_file = Path(os.getenv('MONTHLY_PRICES_PATH', ''))
@@ -186,6 +201,7 @@ class CompanyMigrator:
             'by_frequency': selected['valuation_frequency'].value_counts().to_dict(),
             'inserted': 0,
             'updated': 0,
+            'unchanged': 0,
             'skipped': 0,
             'errors': []
         }
@@ -198,85 +214,13 @@ class CompanyMigrator:
 
         # Execute migration
         print(f"\nExecuting migration...")
-        for idx, row in selected.iterrows():
-            try:
-                # Get company_id from mssdb
-                company_id = self.get_company_id_from_mssdb(
-                    nse_symbol=row.get('CD_NSE Symbol1'),
-                    accord_code=str(row.get('Accord Code', ''))
-                )
-
-                if not company_id:
-                    summary['skipped'] += 1
-                    summary['errors'].append(f"No company_id for {row.get('Company Name')}")
-                    continue
-
-                # Check if already exists
-                existing = self.mysql.query_one(
-                    "SELECT id FROM vs_active_companies WHERE company_id = %s",
-                    (company_id,)
-                )
-
-                data = {
-                    'company_id': company_id,
-                    'nse_symbol': row.get('CD_NSE Symbol1'),
-                    'company_name': row.get('Company Name'),
-                    'csv_name': row.get('Company Name'),  # Will be verified later
-                    'bse_code': str(row.get('CD_Bse Scrip ID', '')),
-                    'accord_code': str(row.get('Accord Code', '')),
-                    'valuation_group': row.get('valuation_group'),
-                    'valuation_subgroup': row.get('valuation_subgroup'),
-                    'cd_sector': row.get('CD_Sector'),
-                    'cd_industry': row.get('CD_Industry1'),
-                    'sector': row.get('valuation_group'),  # Legacy field
-                    'industry': row.get('valuation_subgroup'),  # Legacy field
-                    'valuation_frequency': row.get('valuation_frequency'),
-                    'priority': 5,  # Default
-                    'is_active': 1,
-                    'added_date': date.today(),
-                    'added_by': 'gem_migration'
-                }
-
-                if existing:
-                    # Update
-                    self.mysql.execute(
-                        """UPDATE vs_active_companies SET
-                           nse_symbol = %s, company_name = %s, csv_name = %s,
-                           bse_code = %s, accord_code = %s,
-                           valuation_group = %s, valuation_subgroup = %s,
-                           cd_sector = %s, cd_industry = %s,
-                           sector = %s, industry = %s,
-                           valuation_frequency = %s, is_active = 1,
-                           last_synced = NOW()
-                           WHERE company_id = %s""",
-                        (data['nse_symbol'], data['company_name'], data['csv_name'],
-                         data['bse_code'], data['accord_code'],
-                         data['valuation_group'], data['valuation_subgroup'],
-                         data['cd_sector'], data['cd_industry'],
-                         data['sector'], data['industry'],
-                         data['valuation_frequency'], company_id)
-                    )
-                    summary['updated'] += 1
-                else:
-                    # Insert
-                    self.mysql.insert('vs_active_companies', data)
-                    summary['inserted'] += 1
-
-                # Track by group
-                group = data['valuation_group']
-                summary['by_group'][group] = summary['by_group'].get(group, 0) + 1
-
-                if (summary['inserted'] + summary['updated']) % 100 == 0:
-                    print(f"  Processed {summary['inserted'] + summary['updated']} companies...")
-
-            except Exception as e:
-                summary['errors'].append(f"Error for {row.get('Company Name')}: {str(e)}")
-                summary['skipped'] += 1
+        self.apply_selection(selected, summary)
 
         print(f"\n{'='*80}")
         print(f"Migration Summary:")
         print(f"  Inserted: {summary['inserted']}")
         print(f"  Updated:  {summary['updated']}")
+        print(f"  Unchanged: {summary['unchanged']}")
         print(f"  Skipped:  {summary['skipped']}")
         print(f"  Errors:   {len(summary['errors'])}")
         print(f"{'='*80}\n")
@@ -288,6 +232,55 @@ class CompanyMigrator:
 
         return summary
 
+    def apply_selection(self, selected: pd.DataFrame, summary: Dict) -> Dict:
+        """
+        Write the selected gem rows to vs_active_companies in bulk.
+
+        One set-based company_id lookup, one existence SELECT, then chunked
+        multi-row INSERT / CASE UPDATE statements in a single transaction.
+        Fills inserted / updated / unchanged / touched / skipped / by_group / change_log
+        on summary.
+        """
+        rows = []
+        for record in selected.to_dict('records'):
+            rows.append({
+                'nse_symbol': record.get('CD_NSE Symbol1'),
+                'company_name': record.get('Company Name'),
+                'csv_name': record.get('Company Name'),  # Will be verified later
+                'bse_code': key_text(record.get('CD_Bse Scrip ID')),
+                'accord_code': key_text(record.get('Accord Code')),
+                'valuation_group': record.get('valuation_group'),
+                'valuation_subgroup': record.get('valuation_subgroup'),
+                'cd_sector': record.get('CD_Sector'),
+                'cd_industry': record.get('CD_Industry1'),
+                'sector': record.get('valuation_group'),  # Legacy field
+                'industry': record.get('valuation_subgroup'),  # Legacy field
+                'valuation_frequency': record.get('valuation_frequency'),
+                'priority': 5,  # Default
+                'is_active': 1,
+                'added_date': date.today(),
+                'added_by': 'gem_migration'
+            })
+
+        resolved = []
+        for row, company_id in zip(rows, self.engine.resolve_company_ids(rows)):
+            if not company_id:
+                summary['skipped'] += 1
+                summary['errors'].append(f"No company_id for {row.get('company_name')}")
+                continue
+            resolved.append({'company_id': company_id, **row})
+            group = row['valuation_group']
+            summary['by_group'][group] = summary['by_group'].get(group, 0) + 1
+
+        # last_synced is stamped on every matched row, changed or not (as the per-row path did)
+        plan = self.engine.plan('vs_active_companies', 'company_id', resolved, ACTIVE_COMPANY_COLUMNS,
+                                touch='last_synced', touch_unchanged=True)
+        report = self.engine.apply([plan], label='gem_migration')
+        summary.update(inserted=report['inserted'], updated=report['updated'], unchanged=report['unchanged'],
+                       touched=report['touched'], duplicates=plan.duplicates, statements=report['statements'],
+                       change_log=report['change_log'])
+        return summary
+
     def migrate_pilot_alpha_configs(self) -> Dict:
         """Migrate Aether + Eicher alpha configs from companies.yaml."""
         print(f"\n{'='*80}")
@@ -302,74 +295,55 @@ class CompanyMigrator:
             config = yaml.safe_load(f)
 
         companies_config = config.get('companies', {})
-        summary = {'migrated': 0, 'errors': []}
-
-        for key, company_data in companies_config.items():
-            try:
-                nse_symbol = company_data.get('nse_symbol')
-                if not nse_symbol:
-                    continue
-
-                # Get company_id
-                result = self.mysql.query_one(
-                    "SELECT company_id FROM vs_active_companies WHERE nse_symbol = %s",
-                    (nse_symbol,)
-                )
-
-                if not result:
-                    summary['errors'].append(f"{nse_symbol} not found in vs_active_companies")
-                    continue
-
-                company_id = result['company_id']
-
-                # Extract alpha data
-                alpha_thesis = company_data.get('alpha_thesis', {})
-                alpha_drivers = company_data.get('alpha_drivers', {})
-                sector_overrides = company_data.get('sector_specific_overrides', {})
-
-                # Insert or update
-                existing = self.mysql.query_one(
-                    "SELECT id FROM vs_company_alpha_configs WHERE company_id = %s",
-                    (company_id,)
-                )
-
-                data = {
-                    'company_id': company_id,
-                    'thesis_bull': alpha_thesis.get('bull', ''),
-                    'thesis_bear': alpha_thesis.get('bear', ''),
-                    'thesis_key_moat': alpha_thesis.get('key_moat', ''),
-                    'alpha_drivers': json.dumps(alpha_drivers),
-                    'sector_overrides': json.dumps(sector_overrides),
-                    'created_by': 'yaml_migration',
-                    'notes': f'Migrated from companies.yaml on {datetime.now().date()}'
-                }
-
-                if existing:
-                    # Update
-                    config_id = existing['id']
-                    self.mysql.execute(
-                        """UPDATE vs_company_alpha_configs SET
-                           thesis_bull = %s, thesis_bear = %s, thesis_key_moat = %s,
-                           alpha_drivers = %s, sector_overrides = %s,
-                           updated_at = NOW()
-                           WHERE company_id = %s""",
-                        (data['thesis_bull'], data['thesis_bear'], data['thesis_key_moat'],
-                         data['alpha_drivers'], data['sector_overrides'], company_id)
-                    )
-                else:
-                    config_id = self.mysql.insert('vs_company_alpha_configs', data)
-
-                # Link to vs_active_companies
-                self.mysql.execute(
-                    "UPDATE vs_active_companies SET alpha_config_id = %s WHERE company_id = %s",
-                    (config_id, company_id)
-                )
-
-                summary['migrated'] += 1
-                print(f"✓ Migrated alpha config for {nse_symbol}")
-
-            except Exception as e:
-                summary['errors'].append(f"Error for {key}: {str(e)}")
+        summary = {'migrated': 0, 'errors': [], 'change_logs': []}
+
+        entries = {key: data for key, data in companies_config.items() if data.get('nse_symbol')}
+        active = self.engine.fetch_existing('vs_active_companies', 'nse_symbol',
+                                            sorted({d['nse_symbol'] for d in entries.values()}), ['company_id'])
+
+        rows = []
+        for key, company_data in entries.items():
+            nse_symbol = company_data['nse_symbol']
+            if nse_symbol not in active:
+                summary['errors'].append(f"{nse_symbol} not found in vs_active_companies")
+                continue
+
+            # Extract alpha data
+            alpha_thesis = company_data.get('alpha_thesis', {})
+            rows.append({
+                'company_id': active[nse_symbol]['company_id'],
+                'thesis_bull': alpha_thesis.get('bull', ''),
+                'thesis_bear': alpha_thesis.get('bear', ''),
+                'thesis_key_moat': alpha_thesis.get('key_moat', ''),
+                'alpha_drivers': json.dumps(company_data.get('alpha_drivers', {})),
+                'sector_overrides': json.dumps(company_data.get('sector_specific_overrides', {})),
+                'created_by': 'yaml_migration',
+                'notes': f'Migrated from companies.yaml on {datetime.now().date()}'
+            })
+
+        try:
+            plan = self.engine.plan('vs_company_alpha_configs', 'company_id', rows, ALPHA_CONFIG_COLUMNS,
+                                    touch='updated_at')
+            report = self.engine.apply([plan], label='alpha_configs')
+            summary['change_logs'].append(report['change_log'])
+
+            # Link to vs_active_companies (config ids exist only after the insert above)
+            company_ids = [r['company_id'] for r in rows]
+            configs = self.engine.fetch_existing('vs_company_alpha_configs', 'company_id', company_ids, ['id'])
+            links = [{'company_id': cid, 'alpha_config_id': configs[key_text(cid)]['id']}
+                     for cid in company_ids if key_text(cid) in configs]
+            link_plan = self.engine.plan('vs_active_companies', 'company_id', links, ['alpha_config_id'])
+            link_report = self.engine.apply([link_plan], label='alpha_config_links')
+            summary['change_logs'].append(link_report['change_log'])
+
+            summary['migrated'] = len(links)
+            summary.update(inserted=report['inserted'], updated=report['updated'],
+                           unchanged=report['unchanged'], linked=link_report['updated'])
+            for company_data in entries.values():
+                if company_data['nse_symbol'] in active:
+                    print(f"✓ Migrated alpha config for {company_data['nse_symbol']}")
+        except Exception as e:
+            summary['errors'].append(f"Bulk alpha config migration failed: {str(e)}")
 
         print(f"\nSummary: {summary['migrated']} configs migrated")
         if summary['errors']:
@@ -473,14 +447,20 @@ def main():
     parser.add_argument('--execute', action='store_true', help='Execute migration (write to database)')
     parser.add_argument('--pilot-alpha-only', action='store_true', help='Only migrate pilot alpha configs')
     parser.add_argument('--validate', action='store_true', help='Validate migration results')
+    parser.add_argument('--revert', metavar='CHANGE_LOG', help='Undo a migration from its JSON change log')
+    parser.add_argument('--force', action='store_true',
+                        help='With --revert: also revert rows changed since the change log was written')
+    parser.add_argument('--chunk-size', type=int, default=None, help='Rows per multi-row statement')
 
     args = parser.parse_args()
 
     # Get MySQL client
     mysql_client = ValuationMySQLClient.get_instance()
-    migrator = CompanyMigrator(mysql_client)
+    migrator = CompanyMigrator(mysql_client, chunk_size=args.chunk_size)
 
-    if args.pilot_alpha_only:
+    if args.revert:
+        print(migrator.engine.revert(args.revert, force=args.force))
+    elif args.pilot_alpha_only:
         migrator.migrate_pilot_alpha_configs()
     elif args.validate:
         migrator.validate_migration()
@@ -0,0 +1,8 @@
+-- Migration: Add fetch_attempts column to vs_nse_fetch_tracker
+-- Date: 2026-10-18
+-- Purpose: Count consecutive FAILED/NO_DATA fetches per symbol (written by the bulk tracker upsert)
+
+ALTER TABLE vs_nse_fetch_tracker
+ADD COLUMN fetch_attempts INT DEFAULT 0
+COMMENT 'consecutive FAILED/NO_DATA fetches (0 after SUCCESS)'
+AFTER last_fetch_status;
@@ -0,0 +1,25 @@
+-- Migration: Add distribution stats and change-detection fingerprints to vs_subgroup_peer_stats
+-- Date: 2026-10-18
+-- Purpose: p25/p75, trimmed mean and count per metric (written by PeerStatsEngine), plus the
+--          fingerprints its incremental mode compares to skip unchanged subgroups
+
+ALTER TABLE vs_subgroup_peer_stats
+ADD COLUMN p25_roce DECIMAL(6,4) AFTER median_roce,
+ADD COLUMN p75_roce DECIMAL(6,4) AFTER p25_roce,
+ADD COLUMN trimmed_mean_roce DECIMAL(6,4) AFTER p75_roce,
+ADD COLUMN count_roce INT DEFAULT 0 AFTER trimmed_mean_roce,
+ADD COLUMN p25_revenue_cagr DECIMAL(6,4) AFTER median_revenue_cagr,
+ADD COLUMN p75_revenue_cagr DECIMAL(6,4) AFTER p25_revenue_cagr,
+ADD COLUMN trimmed_mean_revenue_cagr DECIMAL(6,4) AFTER p75_revenue_cagr,
+ADD COLUMN count_revenue_cagr INT DEFAULT 0 AFTER trimmed_mean_revenue_cagr,
+ADD COLUMN p25_de_ratio DECIMAL(6,4) AFTER median_de_ratio,
+ADD COLUMN p75_de_ratio DECIMAL(6,4) AFTER p25_de_ratio,
+ADD COLUMN trimmed_mean_de_ratio DECIMAL(6,4) AFTER p75_de_ratio,
+ADD COLUMN count_de_ratio INT DEFAULT 0 AFTER trimmed_mean_de_ratio,
+ADD COLUMN p25_promoter_pledge DECIMAL(6,4) AFTER median_promoter_pledge,
+ADD COLUMN p75_promoter_pledge DECIMAL(6,4) AFTER p25_promoter_pledge,
+ADD COLUMN trimmed_mean_promoter_pledge DECIMAL(6,4) AFTER p75_promoter_pledge,
+ADD COLUMN count_promoter_pledge INT DEFAULT 0 AFTER trimmed_mean_promoter_pledge,
+ADD COLUMN members_hash CHAR(40) DEFAULT NULL COMMENT 'sha1 of active peer company_ids',
+ADD COLUMN inputs_hash CHAR(40) DEFAULT NULL COMMENT 'sha1 of the peer metric inputs',
+ADD COLUMN source_version VARCHAR(128) DEFAULT NULL COMMENT 'core CSV / fullstats file signature';
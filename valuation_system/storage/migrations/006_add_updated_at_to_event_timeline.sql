@@ -0,0 +1,11 @@
+-- Migration: Add updated_at to vs_event_timeline
+-- Date: 2026-10-18
+-- Purpose: Lets the local event index (utils/event_index.py) re-index rows changed after insert
+--          (company_id backfills, grok_synopsis rewrites). Delete data/cache/event_timeline_index.db
+--          after applying so the index is rebuilt once from current rows.
+
+ALTER TABLE vs_event_timeline
+ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+COMMENT 'last change (event index resync)'
+AFTER pm_notes,
+ADD INDEX idx_updated (updated_at);
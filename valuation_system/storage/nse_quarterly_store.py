@@ -0,0 +1,400 @@
+"""
+NSE Quarterly Store
+Append-only, long-format store for NSE quarterly results, replacing the
+read-merge-resort-rewrite of nse_quarterly_data.csv on every fetch.
+
+Layout (SQLite file, WAL):
+- results_q<quarter_idx>   one table per quarter partition:
+                           (seq, symbol, metric, value, source, fetched_at)
+                           rows are only ever appended; the newest seq per
+                           (symbol, metric) is the current value
+- partitions               known quarter partitions
+- companies                symbol → company_name, source and time of its newest rows
+- state                    importer bookkeeping
+
+- Writes: one transaction per append() → a crash leaves the previous state,
+  never a half-written file
+- Reads: wide_frame() pivots the latest values into the legacy CSV shape
+  (company_name, nse_symbol, data_source, fetch_date, <metric>_<quarter_idx>...)
+- Compaction: superseded rows are deleted per partition on a background
+  thread once enough rows have been appended (compact() runs it inline)
+- import_csv(): one-time import of an existing wide nse_quarterly_data.csv;
+  seed_from_csv() does it automatically before the loader's first append, so
+  a store created after the CSV starts with the CSV's whole universe
+
+Usage:
+    python -m valuation_system.storage.nse_quarterly_store --import-csv path/to/nse_quarterly_data.csv
+    python -m valuation_system.storage.nse_quarterly_store --stats
+    python -m valuation_system.storage.nse_quarterly_store --export-csv /tmp/nse_wide.csv
+
+Config (.env):
+    NSE_QUARTERLY_STORE_PATH=valuation_system/data/cache/nse_quarterly_store.db
+    NSE_STORE_COMPACT_ROWS=50000        # appended rows between background compactions
+
+Edge Cases:
+- filing_date / result_type values are text; every other metric is numeric
+- A quarter missing from a later fetch keeps its earlier value (history accumulates)
+- Re-running import_csv on the same, unchanged file is a no-op
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'cache', 'nse_quarterly_store.db')
+FIXED_COLUMNS = ['company_name', 'nse_symbol', 'data_source', 'fetch_date']
+TEXT_METRICS = {'filing_date', 'result_type'}
+QUERY_CHUNK = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS partitions (quarter_idx INTEGER PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS companies (
+    symbol        TEXT PRIMARY KEY,
+    company_name  TEXT,
+    source        TEXT,
+    fetched_at    REAL
+);
+CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class NSEQuarterlyStore:
+    """Quarter-partitioned, append-only store of (symbol, quarter_idx, metric, value) rows."""
+
+    def __init__(self, db_path: str = None, compact_rows: int = None):
+        self.db_path = db_path or os.getenv('NSE_QUARTERLY_STORE_PATH') or DEFAULT_DB_PATH
+        self.compact_rows = compact_rows if compact_rows is not None else int(
+            os.getenv('NSE_STORE_COMPACT_ROWS', 50000))
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._appended_since_compact = 0
+        self._compactor: Optional[threading.Thread] = None
+
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN")
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _ensure_partition(conn, quarter_idx: int, known: set):
+        if quarter_idx in known:
+            return
+        conn.execute(f"""CREATE TABLE IF NOT EXISTS results_q{quarter_idx} (
+                             seq        INTEGER PRIMARY KEY,
+                             symbol     TEXT NOT NULL,
+                             metric     TEXT NOT NULL,
+                             value,
+                             source     TEXT,
+                             fetched_at REAL NOT NULL
+                         )""")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_results_q{quarter_idx}_key "
+                     f"ON results_q{quarter_idx} (symbol, metric, seq)")
+        conn.execute("INSERT OR IGNORE INTO partitions (quarter_idx) VALUES (?)", (quarter_idx,))
+        known.add(quarter_idx)
+
+    def partitions(self) -> List[int]:
+        with self._connect() as conn:
+            return [r[0] for r in conn.execute("SELECT quarter_idx FROM partitions ORDER BY quarter_idx")]
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def append(self, rows: Iterable[Tuple], companies: Dict[str, str] = None,
+               source: str = 'NSE_FILING') -> int:
+        """
+        Append (symbol, quarter_idx, metric, value[, source[, fetched_at]]) rows
+        and company names in ONE transaction. Returns rows written.
+        """
+        now = time.time()
+        by_quarter: Dict[int, list] = {}
+        latest: Dict[str, Tuple[str, float]] = {}  # symbol → (source, fetched_at) of its newest row
+        for row in rows:
+            symbol, quarter_idx, metric, value = row[:4]
+            if value is None or (isinstance(value, float) and pd.isna(value)):
+                continue
+            row_source = row[4] if len(row) > 4 and row[4] else source
+            fetched_at = row[5] if len(row) > 5 and row[5] else now
+            by_quarter.setdefault(int(quarter_idx), []).append(
+                (symbol, metric, value, row_source, fetched_at))
+            if symbol not in latest or fetched_at >= latest[symbol][1]:
+                latest[symbol] = (row_source, fetched_at)
+
+        written = 0
+        with self._connect() as conn:
+            known = {r[0] for r in conn.execute("SELECT quarter_idx FROM partitions")}
+            for quarter_idx, values in by_quarter.items():
+                self._ensure_partition(conn, quarter_idx, known)
+                conn.executemany(
+                    f"INSERT INTO results_q{quarter_idx} (symbol, metric, value, source, fetched_at) "
+                    f"VALUES (?, ?, ?, ?, ?)", values)
+                written += len(values)
+            companies = companies or {}
+            for symbol in set(latest) | set(companies):
+                row_source, fetched_at = latest.get(symbol, (source, now))
+                conn.execute(
+                    "INSERT INTO companies (symbol, company_name, source, fetched_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(symbol) DO UPDATE SET "
+                    "company_name = COALESCE(excluded.company_name, company_name), "
+                    "source = CASE WHEN excluded.fetched_at >= COALESCE(fetched_at, 0) "
+                    "THEN excluded.source ELSE source END, "
+                    "fetched_at = MAX(COALESCE(fetched_at, 0), excluded.fetched_at)",
+                    (symbol, companies.get(symbol), row_source, fetched_at))
+
+        with self._lock:
+            self._appended_since_compact += written
+            due = self.compact_rows and self._appended_since_compact >= self.compact_rows
+        if due:
+            self.compact_in_background()
+        return written
+
+    # ------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------
+
+    def compact(self) -> int:
+        """Delete superseded rows (all but the newest per symbol+metric), one partition at a time."""
+        with self._lock:
+            self._appended_since_compact = 0
+        removed = 0
+        for quarter_idx in self.partitions():
+            with self._connect() as conn:
+                removed += conn.execute(
+                    f"DELETE FROM results_q{quarter_idx} WHERE seq NOT IN "
+                    f"(SELECT MAX(seq) FROM results_q{quarter_idx} GROUP BY symbol, metric)").rowcount
+        if removed:
+            logger.info(f"NSE store compacted: {removed} superseded rows removed")
+        return removed
+
+    def compact_in_background(self) -> bool:
+        """Start compaction on a daemon thread unless one is already running."""
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return False
+            self._compactor = threading.Thread(target=self._compact_safely, name='nse-store-compact',
+                                               daemon=True)
+            self._compactor.start()
+        return True
+
+    def _compact_safely(self):
+        try:
+            self.compact()
+        except Exception as e:
+            logger.error(f"NSE store background compaction failed: {e}", exc_info=True)
+
+    def wait_for_compaction(self, timeout: float = None):
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join(timeout)
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def latest_rows(self, symbols: Iterable[str] = None) -> pd.DataFrame:
+        """Current long-format rows: newest value per (symbol, quarter_idx, metric)."""
+        symbols = list(symbols) if symbols is not None else None
+        frames = []
+        with self._connect() as conn:
+            conn.row_factory = None  # Plain tuples: bulk read
+            quarters = [r[0] for r in conn.execute("SELECT quarter_idx FROM partitions ORDER BY quarter_idx")]
+            for quarter_idx in quarters:
+                # Rows come back in seq order; superseded values are dropped below (keep='last')
+                sql = f"SELECT symbol, metric, value FROM results_q{quarter_idx}"
+                chunks = ([None] if symbols is None else
+                          [symbols[i:i + QUERY_CHUNK] for i in range(0, len(symbols), QUERY_CHUNK)])
+                for chunk in chunks:
+                    where = f" WHERE symbol IN ({', '.join('?' * len(chunk))})" if chunk else ''
+                    rows = conn.execute(sql + where + " ORDER BY seq", chunk or ()).fetchall()
+                    if rows:
+                        frame = pd.DataFrame(rows, columns=['symbol', 'metric', 'value'])
+                        frame['quarter_idx'] = quarter_idx
+                        frames.append(frame)
+        if not frames:
+            return pd.DataFrame(columns=['symbol', 'quarter_idx', 'metric', 'value'])
+        long_df = pd.concat(frames, ignore_index=True)[['symbol', 'quarter_idx', 'metric', 'value']]
+        return long_df.drop_duplicates(['symbol', 'quarter_idx', 'metric'], keep='last').reset_index(drop=True)
+
+    def wide_frame(self, symbols: Iterable[str] = None) -> pd.DataFrame:
+        """Latest values pivoted into the legacy nse_quarterly_data.csv layout, one row per symbol."""
+        long_df = self.latest_rows(symbols)
+        if long_df.empty:
+            return pd.DataFrame(columns=FIXED_COLUMNS)
+
+        # Numeric and text metrics pivot separately so the numeric block stays float64
+        is_text = long_df['metric'].isin(TEXT_METRICS)
+        blocks = []
+        for part, numeric in ((long_df[~is_text], True), (long_df[is_text], False)):
+            if part.empty:
+                continue
+            values = pd.to_numeric(part['value'], errors='coerce') if numeric else part['value'].astype(object)
+            blocks.append(pd.DataFrame({'symbol': part['symbol'], 'metric': part['metric'],
+                                        'quarter_idx': part['quarter_idx'], 'value': values})
+                          .pivot(index='symbol', columns=['metric', 'quarter_idx'], values='value'))
+        wide = pd.concat(blocks, axis=1).sort_index(axis=1)  # (metric, quarter_idx) order
+        wide.columns = [f"{metric}_{quarter_idx}" for metric, quarter_idx in wide.columns]
+
+        with self._connect() as conn:
+            meta = {r['symbol']: r for r in conn.execute(
+                "SELECT symbol, company_name, source, fetched_at FROM companies")}
+        fixed = pd.DataFrame({
+            'company_name': [meta[s]['company_name'] if s in meta and meta[s]['company_name'] else s
+                             for s in wide.index],
+            'nse_symbol': wide.index,
+            'data_source': [meta[s]['source'] if s in meta else None for s in wide.index],
+            'fetch_date': [datetime.fromtimestamp(meta[s]['fetched_at']).strftime('%Y-%m-%d')
+                           if s in meta and meta[s]['fetched_at'] else None for s in wide.index],
+        }, index=wide.index)
+        return pd.concat([fixed, wide], axis=1).reset_index(drop=True)
+
+    def export_csv(self, csv_path: str) -> int:
+        """Write the wide view to csv_path atomically (tmp + rename). Returns rows written."""
+        wide = self.wide_frame()
+        os.makedirs(os.path.dirname(os.path.abspath(csv_path)), exist_ok=True)
+        tmp_path = csv_path + '.tmp'
+        wide.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, csv_path)
+        return len(wide)
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            quarters = [r[0] for r in conn.execute("SELECT quarter_idx FROM partitions ORDER BY quarter_idx")]
+            rows = sum(conn.execute(f"SELECT COUNT(*) FROM results_q{q}").fetchone()[0] for q in quarters)
+            symbols = conn.execute("SELECT COUNT(*) FROM companies").fetchone()[0]
+        return {'rows': rows, 'companies': symbols, 'partitions': quarters,
+                'size_mb': round(os.path.getsize(self.db_path) / 1024 / 1024, 2)}
+
+    # ------------------------------------------------------------------
+    # One-time import of the legacy wide CSV
+    # ------------------------------------------------------------------
+
+    def import_csv(self, csv_path: str, force: bool = False, only_missing: bool = False) -> int:
+        """
+        Melt an existing wide nse_quarterly_data.csv into the store.
+        Skipped if this exact file (path + mtime) was already imported.
+        only_missing: skip (symbol, quarter, metric) cells the store already
+        has, so older CSV values never supersede fetched ones.
+        """
+        mtime = os.path.getmtime(csv_path)
+        previous = self.get_state('csv_import')
+        if not force and previous and previous.get('path') == os.path.abspath(csv_path) \
+                and previous.get('mtime') == mtime:
+            logger.info(f"NSE CSV already imported ({previous.get('rows')} rows) — skipping")
+            return 0
+
+        df = pd.read_csv(csv_path, low_memory=False)
+        value_columns = [c for c in df.columns if c not in FIXED_COLUMNS
+                         and len(c.rsplit('_', 1)) == 2 and c.rsplit('_', 1)[1].isdigit()]
+        long_df = df.melt(id_vars=['nse_symbol'], value_vars=value_columns,
+                          var_name='column', value_name='value').dropna(subset=['value'])
+        split = long_df['column'].str.rsplit('_', n=1, expand=True)
+        long_df['metric'] = split[0]
+        long_df['quarter_idx'] = split[1].astype(int)
+
+        fetch_dates = (pd.to_datetime(df['fetch_date'], errors='coerce') if 'fetch_date' in df
+                       else pd.Series(pd.NaT, index=df.index))
+        fetched_at = {s: (t.timestamp() if pd.notna(t) else mtime)
+                      for s, t in zip(df['nse_symbol'], fetch_dates)}
+        sources = dict(zip(df['nse_symbol'], df['data_source'])) if 'data_source' in df else {}
+
+        present = set()
+        if only_missing:
+            current = self.latest_rows()
+            present = set(zip(current['symbol'], current['quarter_idx'], current['metric']))
+        rows = [(symbol, quarter_idx, metric,
+                 value if metric in TEXT_METRICS else float(value),
+                 sources.get(symbol) or 'NSE_FILING', fetched_at[symbol])
+                for symbol, quarter_idx, metric, value in zip(
+                    long_df['nse_symbol'], long_df['quarter_idx'], long_df['metric'], long_df['value'])
+                if (symbol, quarter_idx, metric) not in present]
+        names = dict(zip(df['nse_symbol'], df['company_name'])) if 'company_name' in df else {}
+        written = self.append(rows, companies=names)
+        self.set_state('csv_import', {'path': os.path.abspath(csv_path), 'mtime': mtime, 'rows': written,
+                                      'imported_at': datetime.now().isoformat()})
+        logger.info(f"Imported {csv_path}: {len(df)} companies, {written} rows")
+        return written
+
+    def is_seeded(self) -> bool:
+        """True once a legacy CSV has been imported into this store."""
+        return self.get_state('csv_import') is not None
+
+    def seed_from_csv(self, csv_path: str) -> int:
+        """
+        One-time seed from the legacy wide CSV (if it exists and nothing was
+        imported yet). Cells already in the store keep their value.
+        """
+        if self.is_seeded() or not csv_path or not os.path.exists(csv_path):
+            return 0
+        written = self.import_csv(csv_path, only_missing=True)
+        logger.info(f"NSE store seeded from {csv_path}: {written} rows")
+        return written
+
+    # ------------------------------------------------------------------
+    # State
+    # ------------------------------------------------------------------
+
+    def get_state(self, name: str, default=None):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM state WHERE name = ?", (name,)).fetchone()
+        return json.loads(row['value']) if row else default
+
+    def set_state(self, name: str, value):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO state (name, value) VALUES (?, ?)",
+                         (name, json.dumps(value)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='NSE quarterly results store')
+    parser.add_argument('--import-csv', type=str, help='One-time import of a wide nse_quarterly_data.csv')
+    parser.add_argument('--force', action='store_true', help='Re-import even if already imported')
+    parser.add_argument('--export-csv', type=str, help='Write the current wide view to this CSV')
+    parser.add_argument('--compact', action='store_true', help='Remove superseded rows now')
+    parser.add_argument('--stats', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    store = NSEQuarterlyStore()
+    if args.import_csv:
+        store.import_csv(args.import_csv, force=args.force)
+    if args.compact:
+        store.compact()
+    if args.export_csv:
+        print(f"Exported {store.export_csv(args.export_csv)} companies → {args.export_csv}")
+    if args.stats or not (args.import_csv or args.export_csv or args.compact):
+        print(store.stats())
+
+
+if __name__ == '__main__':
+    main()
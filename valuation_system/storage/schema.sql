@@ -171,10 +171,12 @@ CREATE TABLE IF NOT EXISTS vs_event_timeline (
     processed BOOLEAN DEFAULT FALSE,
     pm_reviewed BOOLEAN DEFAULT FALSE,
     pm_notes TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT 'last change (event index resync)',
 
     INDEX idx_date_scope (event_date, scope),
     INDEX idx_company_date (company_id, event_date),
-    INDEX idx_chromadb (chromadb_doc_id)
+    INDEX idx_chromadb (chromadb_doc_id),
+    INDEX idx_updated (updated_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- 8. DOCUMENTS (Metadata registry - content in ChromaDB)
@@ -338,9 +340,28 @@ CREATE TABLE IF NOT EXISTS vs_subgroup_peer_stats (
     valuation_subgroup VARCHAR(100) NOT NULL,
     peer_count INT DEFAULT 0 COMMENT 'Number of active companies in this subgroup',
     median_roce DECIMAL(6,4) COMMENT 'Median ROCE across peers (0.15 = 15%)',
+    p25_roce DECIMAL(6,4),
+    p75_roce DECIMAL(6,4),
+    trimmed_mean_roce DECIMAL(6,4),
+    count_roce INT DEFAULT 0,
     median_revenue_cagr DECIMAL(6,4) COMMENT 'Median 5yr revenue CAGR',
+    p25_revenue_cagr DECIMAL(6,4),
+    p75_revenue_cagr DECIMAL(6,4),
+    trimmed_mean_revenue_cagr DECIMAL(6,4),
+    count_revenue_cagr INT DEFAULT 0,
     median_de_ratio DECIMAL(6,4) COMMENT 'Median debt/equity ratio',
+    p25_de_ratio DECIMAL(6,4),
+    p75_de_ratio DECIMAL(6,4),
+    trimmed_mean_de_ratio DECIMAL(6,4),
+    count_de_ratio INT DEFAULT 0,
     median_promoter_pledge DECIMAL(6,4) COMMENT 'Median promoter pledge %',
+    p25_promoter_pledge DECIMAL(6,4),
+    p75_promoter_pledge DECIMAL(6,4),
+    trimmed_mean_promoter_pledge DECIMAL(6,4),
+    count_promoter_pledge INT DEFAULT 0,
+    members_hash CHAR(40) DEFAULT NULL COMMENT 'sha1 of active peer company_ids',
+    inputs_hash CHAR(40) DEFAULT NULL COMMENT 'sha1 of the peer metric inputs',
+    source_version VARCHAR(128) DEFAULT NULL COMMENT 'core CSV / fullstats file signature',
     last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     UNIQUE KEY idx_subgroup (valuation_subgroup),
     INDEX idx_updated (last_updated)
@@ -398,6 +419,7 @@ CREATE TABLE IF NOT EXISTS vs_nse_fetch_tracker (
     -- Fetch metadata
     last_fetch_date DATETIME COMMENT 'when we last called the API',
     last_fetch_status ENUM('SUCCESS','FAILED','NO_DATA') DEFAULT 'SUCCESS',
+    fetch_attempts INT DEFAULT 0 COMMENT 'consecutive FAILED/NO_DATA fetches (0 after SUCCESS)',
     quarters_available INT DEFAULT 0 COMMENT 'how many quarters returned',
     data_hash VARCHAR(32) COMMENT 'MD5 of results JSON (detect changes)',
 
@@ -476,6 +498,7 @@ CREATE TABLE IF NOT EXISTS vs_nse_fetch_tracker (
     -- Fetch metadata
     last_fetch_date DATETIME COMMENT 'when we last called the API',
     last_fetch_status ENUM('SUCCESS','FAILED','NO_DATA') DEFAULT 'SUCCESS',
+    fetch_attempts INT DEFAULT 0 COMMENT 'consecutive FAILED/NO_DATA fetches (0 after SUCCESS)',
     quarters_available INT DEFAULT 0 COMMENT 'how many quarters returned',
     data_hash VARCHAR(32) COMMENT 'MD5 of results JSON (detect changes)',
 
@@ -5,24 +5,257 @@ Sync Group Configurations and Seed Drivers to Database
 Functions:
 - sync_valuation_groups(): Sync group configs to vs_valuation_group_configs
 - seed_group_drivers(): Seed GROUP-level drivers into vs_drivers table
+- reconcile_group_configs(): Diff-based sync of groups + GROUP/SUBGROUP drivers
+  (one SELECT per table, minimal create/update/deactivate plan, batched
+  statements in one transaction; skipped when the YAML fingerprint is unchanged)
+
+Usage:
+    python storage/sync_group_configs.py --reconcile --dry-run   # print the plan
+    python storage/sync_group_configs.py --reconcile             # apply it
+    python storage/sync_group_configs.py --reconcile --force     # ignore the fingerprint
+    python storage/sync_group_configs.py --reconcile --prune     # also deactivate groups not in the YAML
+
+Config (.env):
+    GROUP_SYNC_FINGERPRINT_PATH=valuation_system/data/state/group_sync_fingerprint.json
+
+Edge Cases:
+- Only drivers still owned by the seeders (updated_by SEED_GROUP / SEED_SUBGROUP)
+  are updated, or deactivated when they drop out of the YAML; other drivers
+  (PM edits, updated_by='PM') are never touched
+- weight / current_value / impact_direction / trend are set on create only,
+  like the insert-if-missing seeders: normalize_*_weights survive a sync, and
+  a YAML weight edit only reaches new rows
+- A seeder-owned driver that is back in the YAML is reactivated. To keep one
+  off, deactivate it as a PM edit (updated_by='PM')
+- vs_valuation_group_configs.is_active is set on create only: an existing
+  group deactivated by hand stays off. Rows missing from the YAML are
+  deactivated only with --prune (prune=True), since the table has no
+  ownership column
+- The fingerprint covers sectors.yaml plus the in-code driver tables and is
+  stored per database target, and only after a successful apply
 """
 
+import os
 import sys
-import yaml
+import time
 import json
+import hashlib
+from dataclasses import dataclass, field
+from datetime import datetime
 from pathlib import Path
+from typing import Dict, List, Tuple
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from storage.mysql_client import ValuationMySQLClient
+from storage.bulk_migration import BulkMigrationEngine, MySQLBackend, key_text
+from utils.sectors_config import get_sectors_model
+
+
+# Map YAML config keys to (valuation_group, valuation_subgroup)
+# MUST match actual values in vs_active_companies table!
+CONFIG_KEY_TO_SUBGROUP = {
+    # INDUSTRIALS
+    'industrials_defense': ('INDUSTRIALS', 'INDUSTRIALS_DEFENSE'),
+
+    # AUTO (not AUTOMOBILES)
+    'automobiles': ('AUTO', 'AUTO_OEM'),
+    'auto_ancillary': ('AUTO', 'AUTO_ANCILLARY'),
+
+    # CONSUMER_STAPLES
+    'fmcg': ('CONSUMER_STAPLES', 'CONSUMER_FMCG'),
+    'consumer_food_beverage': ('CONSUMER_STAPLES', 'CONSUMER_FOOD_BEVERAGE'),
+
+    # CONSUMER_DISCRETIONARY
+    'consumer_durables': ('CONSUMER_DISCRETIONARY', 'CONSUMER_DURABLES'),
+
+    # HEALTHCARE - note: PHARMA_EXPORT not just PHARMA
+    'pharma': ('HEALTHCARE', 'HEALTHCARE_PHARMA_EXPORT'),
+    'healthcare_hospitals': ('HEALTHCARE', 'HEALTHCARE_HOSPITALS_EQUIPMENT'),
+
+    # TECHNOLOGY (not IT_SERVICES)
+    'it_services': ('TECHNOLOGY', 'TECHNOLOGY_IT_SERVICES'),
+
+    # MATERIALS_CHEMICALS
+    'specialty_chemicals': ('MATERIALS_CHEMICALS', 'CHEMICALS_SPECIALTY'),
+
+    # MATERIALS_METALS
+    'metals_steel': ('MATERIALS_METALS', 'METALS_STEEL'),
+    'metals_non_ferrous': ('MATERIALS_METALS', 'METALS_NON_FERROUS'),
+
+    # FINANCIALS - match exact subgroup names from DB
+    'financials_banking_private': ('FINANCIALS', 'FINANCIALS_BANKING_PRIVATE'),
+    'financials_banking_psu': ('FINANCIALS', 'FINANCIALS_BANKING_PSU'),
+    'financials_nbfc_diversified': ('FINANCIALS', 'FINANCIALS_NBFC_DIVERSIFIED'),
+    'financials_nbfc_housing': ('FINANCIALS', 'FINANCIALS_NBFC_HOUSING'),
+    'financials_nbfc_vehicle': ('FINANCIALS', 'FINANCIALS_NBFC_VEHICLE'),
+    'financials_asset_mgmt': ('FINANCIALS', 'FINANCIALS_ASSET_MGMT'),
+
+    # REAL_ESTATE_INFRA (not REAL_ESTATE or INFRASTRUCTURE)
+    'realty_residential': ('REAL_ESTATE_INFRA', 'REALTY_RESIDENTIAL'),
+    'infra_logistics': ('REAL_ESTATE_INFRA', 'INFRA_LOGISTICS_PORTS'),
+    'infra_construction': ('REAL_ESTATE_INFRA', 'INFRA_CONSTRUCTION'),
+
+    # ENERGY_UTILITIES
+    'energy_power': ('ENERGY_UTILITIES', 'ENERGY_POWER_GENERATION'),
+    'energy_oil_gas': ('ENERGY_UTILITIES', 'ENERGY_OIL_GAS'),
+
+    # SERVICES
+    'services_hospitality': ('SERVICES', 'SERVICES_HOSPITALITY'),
+    'services_media': ('SERVICES', 'SERVICES_MEDIA_ENTERTAINMENT'),
+    'services_telecom': ('SERVICES', 'SERVICES_TELECOM'),
+}
+
+# GROUP-level drivers are broader and apply to all subgroups
+# MUST match actual valuation_group values from vs_active_companies!
+GROUP_DRIVERS = {
+    'INDUSTRIALS': [
+        {'name': 'manufacturing_pmi', 'weight': 0.15, 'category': 'DEMAND'},
+        {'name': 'infrastructure_investment', 'weight': 0.12, 'category': 'DEMAND'},
+        {'name': 'capex_cycle', 'weight': 0.10, 'category': 'DEMAND'},
+        {'name': 'industrial_credit_growth', 'weight': 0.08, 'category': 'DEMAND'},
+        {'name': 'commodity_prices_index', 'weight': 0.10, 'category': 'COST'},
+        {'name': 'power_tariff', 'weight': 0.05, 'category': 'COST'},
+        {'name': 'labor_cost_inflation', 'weight': 0.05, 'category': 'COST'},
+        {'name': 'ease_of_doing_business', 'weight': 0.05, 'category': 'REGULATORY'},
+    ],
+    'FINANCIALS': [
+        {'name': 'credit_growth', 'weight': 0.15, 'category': 'DEMAND'},
+        {'name': 'interest_rate_cycle', 'weight': 0.12, 'category': 'DEMAND'},
+        {'name': 'gdp_growth', 'weight': 0.10, 'category': 'DEMAND'},
+        {'name': 'credit_cost_cycle', 'weight': 0.10, 'category': 'COST'},
+        {'name': 'npa_cycle', 'weight': 0.08, 'category': 'COST'},
+        {'name': 'regulatory_capital_norms', 'weight': 0.08, 'category': 'REGULATORY'},
+        {'name': 'digital_adoption', 'weight': 0.05, 'category': 'DEMAND'},
+    ],
+    'MATERIALS_CHEMICALS': [
+        {'name': 'global_chemical_demand', 'weight': 0.12, 'category': 'DEMAND'},
+        {'name': 'china_plus_one', 'weight': 0.10, 'category': 'DEMAND'},
+        {'name': 'crude_oil_prices', 'weight': 0.12, 'category': 'COST'},
+        {'name': 'feedstock_availability', 'weight': 0.08, 'category': 'COST'},
+        {'name': 'environmental_compliance', 'weight': 0.08, 'category': 'REGULATORY'},
+        {'name': 'capacity_additions', 'weight': 0.08, 'category': 'DEMAND'},
+    ],
+    'MATERIALS_METALS': [
+        {'name': 'global_steel_demand', 'weight': 0.12, 'category': 'DEMAND'},
+        {'name': 'china_steel_production', 'weight': 0.10, 'category': 'DEMAND'},
+        {'name': 'iron_ore_coking_coal', 'weight': 0.12, 'category': 'COST'},
+        {'name': 'power_cost', 'weight': 0.08, 'category': 'COST'},
+        {'name': 'anti_dumping_duties', 'weight': 0.08, 'category': 'REGULATORY'},
+        {'name': 'infrastructure_capex', 'weight': 0.10, 'category': 'DEMAND'},
+    ],
+    'HEALTHCARE': [
+        {'name': 'healthcare_spending', 'weight': 0.12, 'category': 'DEMAND'},
+        {'name': 'patent_cliff_opportunity', 'weight': 0.10, 'category': 'DEMAND'},
+        {'name': 'us_generics_pricing', 'weight': 0.10, 'category': 'COST'},
+        {'name': 'api_prices', 'weight': 0.08, 'category': 'COST'},
+        {'name': 'usfda_compliance', 'weight': 0.10, 'category': 'REGULATORY'},
+        {'name': 'price_control_nlem', 'weight': 0.08, 'category': 'REGULATORY'},
+    ],
+    'TECHNOLOGY': [  # was IT_SERVICES - renamed to match actual group
+        {'name': 'global_it_spending', 'weight': 0.15, 'category': 'DEMAND'},
+        {'name': 'digital_transformation', 'weight': 0.12, 'category': 'DEMAND'},
+        {'name': 'usdinr_movement', 'weight': 0.10, 'category': 'COST'},
+        {'name': 'talent_availability', 'weight': 0.08, 'category': 'COST'},
+        {'name': 'attrition_rate', 'weight': 0.08, 'category': 'COST'},
+        {'name': 'ai_automation_impact', 'weight': 0.10, 'category': 'DEMAND'},
+    ],
+    'CONSUMER_STAPLES': [
+        {'name': 'rural_demand', 'weight': 0.12, 'category': 'DEMAND'},
+        {'name': 'urban_consumption', 'weight': 0.10, 'category': 'DEMAND'},
+        {'name': 'input_cost_inflation', 'weight': 0.10, 'category': 'COST'},
+        {'name': 'distribution_reach', 'weight': 0.08, 'category': 'DEMAND'},
+        {'name': 'competitive_intensity', 'weight': 0.08, 'category': 'COST'},
+    ],
+    'CONSUMER_DISCRETIONARY': [
+        {'name': 'urban_consumption', 'weight': 0.12, 'category': 'DEMAND'},
+        {'name': 'consumer_sentiment', 'weight': 0.10, 'category': 'DEMAND'},
+        {'name': 'discretionary_spending', 'weight': 0.10, 'category': 'DEMAND'},
+        {'name': 'interest_rates_retail', 'weight': 0.08, 'category': 'DEMAND'},
+        {'name': 'raw_material_prices', 'weight': 0.08, 'category': 'COST'},
+        {'name': 'competitive_intensity', 'weight': 0.08, 'category': 'COST'},
+    ],
+    'AUTO': [  # was AUTOMOBILES - renamed to match actual group
+        {'name': 'vehicle_demand_cycle', 'weight': 0.12, 'category': 'DEMAND'},
+        {'name': 'ev_transition', 'weight': 0.10, 'category': 'DEMAND'},
+        {'name': 'commodity_prices', 'weight': 0.10, 'category': 'COST'},
+        {'name': 'interest_rates_retail', 'weight': 0.08, 'category': 'DEMAND'},
+        {'name': 'emission_norms', 'weight': 0.08, 'category': 'REGULATORY'},
+    ],
+    'ENERGY_UTILITIES': [
+        {'name': 'power_demand_growth', 'weight': 0.12, 'category': 'DEMAND'},
+        {'name': 'oil_gas_prices', 'weight': 0.12, 'category': 'COST'},
+        {'name': 'renewable_transition', 'weight': 0.10, 'category': 'DEMAND'},
+        {'name': 'fuel_cost', 'weight': 0.08, 'category': 'COST'},
+        {'name': 'tariff_regulation', 'weight': 0.10, 'category': 'REGULATORY'},
+        {'name': 'green_energy_mandate', 'weight': 0.08, 'category': 'REGULATORY'},
+    ],
+    'REAL_ESTATE_INFRA': [
+        {'name': 'real_estate_demand', 'weight': 0.12, 'category': 'DEMAND'},
+        {'name': 'interest_rates', 'weight': 0.10, 'category': 'DEMAND'},
+        {'name': 'infra_capex', 'weight': 0.12, 'category': 'DEMAND'},
+        {'name': 'construction_material_cost', 'weight': 0.10, 'category': 'COST'},
+        {'name': 'regulatory_approvals', 'weight': 0.08, 'category': 'REGULATORY'},
+        {'name': 'rera_compliance', 'weight': 0.08, 'category': 'REGULATORY'},
+    ],
+    'SERVICES': [
+        {'name': 'gdp_growth', 'weight': 0.12, 'category': 'DEMAND'},
+        {'name': 'consumer_spending', 'weight': 0.10, 'category': 'DEMAND'},
+        {'name': 'tourism_demand', 'weight': 0.10, 'category': 'DEMAND'},
+        {'name': 'digital_adoption', 'weight': 0.08, 'category': 'DEMAND'},
+        {'name': 'labor_cost', 'weight': 0.08, 'category': 'COST'},
+        {'name': 'regulatory_environment', 'weight': 0.08, 'category': 'REGULATORY'},
+    ],
+}
 
 
 def load_sectors_yaml():
-    """Load sectors.yaml configuration."""
+    """Load sectors.yaml configuration (compiled, validated, cached per file version)."""
     yaml_path = Path(__file__).parent.parent / 'config' / 'sectors.yaml'
-    with open(yaml_path, 'r') as f:
-        config = yaml.safe_load(f)
-    return config
+    return get_sectors_model(str(yaml_path)).raw
+
+
+def build_group_row(group_name: str, group_config: dict, all_sectors: dict) -> dict:
+    """vs_valuation_group_configs row for one valuation_groups entry (JSON columns as text)."""
+    # Get primary sector config
+    primary_sector_key = group_config.get('primary_sector')
+    primary_sector = all_sectors.get(primary_sector_key, {})
+
+    # Build driver_config by merging demand, cost, regulatory drivers
+    driver_config = {
+        'demand_drivers': primary_sector.get('demand_drivers', []),
+        'cost_drivers': primary_sector.get('cost_drivers', []),
+        'regulatory_drivers': primary_sector.get('regulatory_drivers', []),
+    }
+
+    # Porter's forces (if available in primary sector)
+    porter_forces = primary_sector.get('porter_forces', {})
+
+    # Terminal assumptions from group config (overrides sector defaults)
+    terminal_assumptions = group_config.get('terminal_assumptions',
+                                           primary_sector.get('terminal_assumptions', {}))
+
+    # Valuation methods
+    valuation_methods = primary_sector.get('valuation_methods', {})
+
+    # Build complete config
+    full_config = {
+        'description': group_config.get('description', ''),
+        'primary_sector': primary_sector_key,
+        'subgroups': group_config.get('subgroups', {}),
+        'valuation_methods': valuation_methods,
+        'key_metrics': primary_sector.get('key_metrics', []),
+    }
+
+    data = {
+        'valuation_group': group_name,
+        'driver_config': json.dumps(driver_config),
+        'porter_forces': json.dumps(porter_forces) if porter_forces else None,
+        'terminal_assumptions': json.dumps(terminal_assumptions),
+        'is_active': True,
+        'notes': json.dumps(full_config)
+    }
+    return data
 
 
 def sync_valuation_groups(mysql_client: ValuationMySQLClient, dry_run: bool = False):
@@ -51,44 +284,10 @@ def sync_valuation_groups(mysql_client: ValuationMySQLClient, dry_run: bool = Fa
 
     for group_name, group_config in valuation_groups.items():
         try:
-            # Get primary sector config
+            data = build_group_row(group_name, group_config, all_sectors)
             primary_sector_key = group_config.get('primary_sector')
-            primary_sector = all_sectors.get(primary_sector_key, {})
-
-            # Build driver_config by merging demand, cost, regulatory drivers
-            driver_config = {
-                'demand_drivers': primary_sector.get('demand_drivers', []),
-                'cost_drivers': primary_sector.get('cost_drivers', []),
-                'regulatory_drivers': primary_sector.get('regulatory_drivers', []),
-            }
-
-            # Porter's forces (if available in primary sector)
-            porter_forces = primary_sector.get('porter_forces', {})
-
-            # Terminal assumptions from group config (overrides sector defaults)
-            terminal_assumptions = group_config.get('terminal_assumptions',
-                                                   primary_sector.get('terminal_assumptions', {}))
-
-            # Valuation methods
-            valuation_methods = primary_sector.get('valuation_methods', {})
-
-            # Build complete config
-            full_config = {
-                'description': group_config.get('description', ''),
-                'primary_sector': primary_sector_key,
-                'subgroups': group_config.get('subgroups', {}),
-                'valuation_methods': valuation_methods,
-                'key_metrics': primary_sector.get('key_metrics', []),
-            }
-
-            data = {
-                'valuation_group': group_name,
-                'driver_config': json.dumps(driver_config),
-                'porter_forces': json.dumps(porter_forces) if porter_forces else None,
-                'terminal_assumptions': json.dumps(terminal_assumptions),
-                'is_active': True,
-                'notes': json.dumps(full_config)
-            }
+            driver_config = json.loads(data['driver_config'])
+            terminal_assumptions = json.loads(data['terminal_assumptions'])
 
             if dry_run:
                 print(f"Would sync: {group_name}")
@@ -147,65 +346,11 @@ def seed_subgroup_drivers(mysql_client: ValuationMySQLClient, dry_run: bool = Fa
     skipped = 0
     errors = []
 
-    # Map YAML config keys to (valuation_group, valuation_subgroup)
-    # MUST match actual values in vs_active_companies table!
-    config_key_to_subgroup = {
-        # INDUSTRIALS
-        'industrials_defense': ('INDUSTRIALS', 'INDUSTRIALS_DEFENSE'),
-
-        # AUTO (not AUTOMOBILES)
-        'automobiles': ('AUTO', 'AUTO_OEM'),
-        'auto_ancillary': ('AUTO', 'AUTO_ANCILLARY'),
-
-        # CONSUMER_STAPLES
-        'fmcg': ('CONSUMER_STAPLES', 'CONSUMER_FMCG'),
-        'consumer_food_beverage': ('CONSUMER_STAPLES', 'CONSUMER_FOOD_BEVERAGE'),
-
-        # CONSUMER_DISCRETIONARY
-        'consumer_durables': ('CONSUMER_DISCRETIONARY', 'CONSUMER_DURABLES'),
-
-        # HEALTHCARE - note: PHARMA_EXPORT not just PHARMA
-        'pharma': ('HEALTHCARE', 'HEALTHCARE_PHARMA_EXPORT'),
-        'healthcare_hospitals': ('HEALTHCARE', 'HEALTHCARE_HOSPITALS_EQUIPMENT'),
-
-        # TECHNOLOGY (not IT_SERVICES)
-        'it_services': ('TECHNOLOGY', 'TECHNOLOGY_IT_SERVICES'),
-
-        # MATERIALS_CHEMICALS
-        'specialty_chemicals': ('MATERIALS_CHEMICALS', 'CHEMICALS_SPECIALTY'),
-
-        # MATERIALS_METALS
-        'metals_steel': ('MATERIALS_METALS', 'METALS_STEEL'),
-        'metals_non_ferrous': ('MATERIALS_METALS', 'METALS_NON_FERROUS'),
-
-        # FINANCIALS - match exact subgroup names from DB
-        'financials_banking_private': ('FINANCIALS', 'FINANCIALS_BANKING_PRIVATE'),
-        'financials_banking_psu': ('FINANCIALS', 'FINANCIALS_BANKING_PSU'),
-        'financials_nbfc_diversified': ('FINANCIALS', 'FINANCIALS_NBFC_DIVERSIFIED'),
-        'financials_nbfc_housing': ('FINANCIALS', 'FINANCIALS_NBFC_HOUSING'),
-        'financials_nbfc_vehicle': ('FINANCIALS', 'FINANCIALS_NBFC_VEHICLE'),
-        'financials_asset_mgmt': ('FINANCIALS', 'FINANCIALS_ASSET_MGMT'),
-
-        # REAL_ESTATE_INFRA (not REAL_ESTATE or INFRASTRUCTURE)
-        'realty_residential': ('REAL_ESTATE_INFRA', 'REALTY_RESIDENTIAL'),
-        'infra_logistics': ('REAL_ESTATE_INFRA', 'INFRA_LOGISTICS_PORTS'),
-        'infra_construction': ('REAL_ESTATE_INFRA', 'INFRA_CONSTRUCTION'),
-
-        # ENERGY_UTILITIES
-        'energy_power': ('ENERGY_UTILITIES', 'ENERGY_POWER_GENERATION'),
-        'energy_oil_gas': ('ENERGY_UTILITIES', 'ENERGY_OIL_GAS'),
-
-        # SERVICES
-        'services_hospitality': ('SERVICES', 'SERVICES_HOSPITALITY'),
-        'services_media': ('SERVICES', 'SERVICES_MEDIA_ENTERTAINMENT'),
-        'services_telecom': ('SERVICES', 'SERVICES_TELECOM'),
-    }
-
     for config_key, group_config in sectors.items():
         if not group_config.get('is_active', True):
             continue
 
-        mapping = config_key_to_subgroup.get(config_key)
+        mapping = CONFIG_KEY_TO_SUBGROUP.get(config_key)
         if not mapping:
             continue
 
@@ -281,112 +426,10 @@ def seed_group_drivers(mysql_client: ValuationMySQLClient, dry_run: bool = False
     print(f"Mode: {'DRY RUN' if dry_run else 'EXECUTE'}")
     print(f"{'='*80}\n")
 
-    # GROUP-level drivers are broader and apply to all subgroups
-    # MUST match actual valuation_group values from vs_active_companies!
-    group_drivers = {
-        'INDUSTRIALS': [
-            {'name': 'manufacturing_pmi', 'weight': 0.15, 'category': 'DEMAND'},
-            {'name': 'infrastructure_investment', 'weight': 0.12, 'category': 'DEMAND'},
-            {'name': 'capex_cycle', 'weight': 0.10, 'category': 'DEMAND'},
-            {'name': 'industrial_credit_growth', 'weight': 0.08, 'category': 'DEMAND'},
-            {'name': 'commodity_prices_index', 'weight': 0.10, 'category': 'COST'},
-            {'name': 'power_tariff', 'weight': 0.05, 'category': 'COST'},
-            {'name': 'labor_cost_inflation', 'weight': 0.05, 'category': 'COST'},
-            {'name': 'ease_of_doing_business', 'weight': 0.05, 'category': 'REGULATORY'},
-        ],
-        'FINANCIALS': [
-            {'name': 'credit_growth', 'weight': 0.15, 'category': 'DEMAND'},
-            {'name': 'interest_rate_cycle', 'weight': 0.12, 'category': 'DEMAND'},
-            {'name': 'gdp_growth', 'weight': 0.10, 'category': 'DEMAND'},
-            {'name': 'credit_cost_cycle', 'weight': 0.10, 'category': 'COST'},
-            {'name': 'npa_cycle', 'weight': 0.08, 'category': 'COST'},
-            {'name': 'regulatory_capital_norms', 'weight': 0.08, 'category': 'REGULATORY'},
-            {'name': 'digital_adoption', 'weight': 0.05, 'category': 'DEMAND'},
-        ],
-        'MATERIALS_CHEMICALS': [
-            {'name': 'global_chemical_demand', 'weight': 0.12, 'category': 'DEMAND'},
-            {'name': 'china_plus_one', 'weight': 0.10, 'category': 'DEMAND'},
-            {'name': 'crude_oil_prices', 'weight': 0.12, 'category': 'COST'},
-            {'name': 'feedstock_availability', 'weight': 0.08, 'category': 'COST'},
-            {'name': 'environmental_compliance', 'weight': 0.08, 'category': 'REGULATORY'},
-            {'name': 'capacity_additions', 'weight': 0.08, 'category': 'DEMAND'},
-        ],
-        'MATERIALS_METALS': [
-            {'name': 'global_steel_demand', 'weight': 0.12, 'category': 'DEMAND'},
-            {'name': 'china_steel_production', 'weight': 0.10, 'category': 'DEMAND'},
-            {'name': 'iron_ore_coking_coal', 'weight': 0.12, 'category': 'COST'},
-            {'name': 'power_cost', 'weight': 0.08, 'category': 'COST'},
-            {'name': 'anti_dumping_duties', 'weight': 0.08, 'category': 'REGULATORY'},
-            {'name': 'infrastructure_capex', 'weight': 0.10, 'category': 'DEMAND'},
-        ],
-        'HEALTHCARE': [
-            {'name': 'healthcare_spending', 'weight': 0.12, 'category': 'DEMAND'},
-            {'name': 'patent_cliff_opportunity', 'weight': 0.10, 'category': 'DEMAND'},
-            {'name': 'us_generics_pricing', 'weight': 0.10, 'category': 'COST'},
-            {'name': 'api_prices', 'weight': 0.08, 'category': 'COST'},
-            {'name': 'usfda_compliance', 'weight': 0.10, 'category': 'REGULATORY'},
-            {'name': 'price_control_nlem', 'weight': 0.08, 'category': 'REGULATORY'},
-        ],
-        'TECHNOLOGY': [  # was IT_SERVICES - renamed to match actual group
-            {'name': 'global_it_spending', 'weight': 0.15, 'category': 'DEMAND'},
-            {'name': 'digital_transformation', 'weight': 0.12, 'category': 'DEMAND'},
-            {'name': 'usdinr_movement', 'weight': 0.10, 'category': 'COST'},
-            {'name': 'talent_availability', 'weight': 0.08, 'category': 'COST'},
-            {'name': 'attrition_rate', 'weight': 0.08, 'category': 'COST'},
-            {'name': 'ai_automation_impact', 'weight': 0.10, 'category': 'DEMAND'},
-        ],
-        'CONSUMER_STAPLES': [
-            {'name': 'rural_demand', 'weight': 0.12, 'category': 'DEMAND'},
-            {'name': 'urban_consumption', 'weight': 0.10, 'category': 'DEMAND'},
-            {'name': 'input_cost_inflation', 'weight': 0.10, 'category': 'COST'},
-            {'name': 'distribution_reach', 'weight': 0.08, 'category': 'DEMAND'},
-            {'name': 'competitive_intensity', 'weight': 0.08, 'category': 'COST'},
-        ],
-        'CONSUMER_DISCRETIONARY': [
-            {'name': 'urban_consumption', 'weight': 0.12, 'category': 'DEMAND'},
-            {'name': 'consumer_sentiment', 'weight': 0.10, 'category': 'DEMAND'},
-            {'name': 'discretionary_spending', 'weight': 0.10, 'category': 'DEMAND'},
-            {'name': 'interest_rates_retail', 'weight': 0.08, 'category': 'DEMAND'},
-            {'name': 'raw_material_prices', 'weight': 0.08, 'category': 'COST'},
-            {'name': 'competitive_intensity', 'weight': 0.08, 'category': 'COST'},
-        ],
-        'AUTO': [  # was AUTOMOBILES - renamed to match actual group
-            {'name': 'vehicle_demand_cycle', 'weight': 0.12, 'category': 'DEMAND'},
-            {'name': 'ev_transition', 'weight': 0.10, 'category': 'DEMAND'},
-            {'name': 'commodity_prices', 'weight': 0.10, 'category': 'COST'},
-            {'name': 'interest_rates_retail', 'weight': 0.08, 'category': 'DEMAND'},
-            {'name': 'emission_norms', 'weight': 0.08, 'category': 'REGULATORY'},
-        ],
-        'ENERGY_UTILITIES': [
-            {'name': 'power_demand_growth', 'weight': 0.12, 'category': 'DEMAND'},
-            {'name': 'oil_gas_prices', 'weight': 0.12, 'category': 'COST'},
-            {'name': 'renewable_transition', 'weight': 0.10, 'category': 'DEMAND'},
-            {'name': 'fuel_cost', 'weight': 0.08, 'category': 'COST'},
-            {'name': 'tariff_regulation', 'weight': 0.10, 'category': 'REGULATORY'},
-            {'name': 'green_energy_mandate', 'weight': 0.08, 'category': 'REGULATORY'},
-        ],
-        'REAL_ESTATE_INFRA': [
-            {'name': 'real_estate_demand', 'weight': 0.12, 'category': 'DEMAND'},
-            {'name': 'interest_rates', 'weight': 0.10, 'category': 'DEMAND'},
-            {'name': 'infra_capex', 'weight': 0.12, 'category': 'DEMAND'},
-            {'name': 'construction_material_cost', 'weight': 0.10, 'category': 'COST'},
-            {'name': 'regulatory_approvals', 'weight': 0.08, 'category': 'REGULATORY'},
-            {'name': 'rera_compliance', 'weight': 0.08, 'category': 'REGULATORY'},
-        ],
-        'SERVICES': [
-            {'name': 'gdp_growth', 'weight': 0.12, 'category': 'DEMAND'},
-            {'name': 'consumer_spending', 'weight': 0.10, 'category': 'DEMAND'},
-            {'name': 'tourism_demand', 'weight': 0.10, 'category': 'DEMAND'},
-            {'name': 'digital_adoption', 'weight': 0.08, 'category': 'DEMAND'},
-            {'name': 'labor_cost', 'weight': 0.08, 'category': 'COST'},
-            {'name': 'regulatory_environment', 'weight': 0.08, 'category': 'REGULATORY'},
-        ],
-    }
-
     seeded = 0
     skipped = 0
 
-    for valuation_group, drivers in group_drivers.items():
+    for valuation_group, drivers in GROUP_DRIVERS.items():
         for driver in drivers:
             try:
                 existing = mysql_client.query_one(
@@ -427,6 +470,288 @@ def seed_group_drivers(mysql_client: ValuationMySQLClient, dry_run: bool = False
     return {'seeded': seeded, 'skipped': skipped}
 
 
+# =============================================================================
+# DIFF-BASED RECONCILER
+# =============================================================================
+
+SECTORS_YAML = Path(__file__).parent.parent / 'config' / 'sectors.yaml'
+FINGERPRINT_PATH = os.getenv('GROUP_SYNC_FINGERPRINT_PATH',
+                             str(Path(__file__).parent.parent / 'data' / 'state' / 'group_sync_fingerprint.json'))
+
+GROUP_COLUMNS = ['driver_config', 'porter_forces', 'terminal_assumptions', 'notes']  # is_active is create-only
+JSON_COLUMNS = {'driver_config', 'porter_forces', 'terminal_assumptions'}
+DRIVER_COLUMNS = ['driver_category', 'valuation_group']  # weight is create-only
+SEED_OWNERS = ('SEED_GROUP', 'SEED_SUBGROUP')
+
+
+def yaml_fingerprint(yaml_path=SECTORS_YAML) -> str:
+    """sha256 of the YAML bytes plus the in-code driver tables (both feed the desired state)."""
+    digest = hashlib.sha256()
+    with open(yaml_path, 'rb') as f:
+        digest.update(f.read())
+    digest.update(json.dumps([CONFIG_KEY_TO_SUBGROUP, GROUP_DRIVERS], sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def driver_key(level: str, valuation_group: str, valuation_subgroup: str, name: str) -> tuple:
+    """Natural key: SUBGROUP drivers by subgroup + name, GROUP drivers by group + name (as the seeders check)."""
+    return (level, valuation_subgroup if level == 'SUBGROUP' else valuation_group, name)
+
+
+def desired_state(config: dict) -> Tuple[Dict[str, dict], Dict[tuple, dict]]:
+    """({valuation_group: group row}, {driver natural key: vs_drivers row}) from sectors.yaml."""
+    all_sectors = {**config.get('sectors', {}), **config.get('sectors_extended', {})}
+    groups = {}
+    for group_name, group_config in config.get('valuation_groups', {}).items():
+        groups[group_name] = dict(build_group_row(group_name, group_config, all_sectors), is_active=1)
+
+    drivers = {}
+
+    def add(level, category, name, valuation_group, valuation_subgroup, weight, owner):
+        key = driver_key(level, valuation_group, valuation_subgroup, name)
+        drivers.setdefault(key, {  # First occurrence wins, like the insert-if-missing seeders
+            'driver_level': level, 'driver_category': category, 'driver_name': name,
+            'valuation_group': valuation_group, 'valuation_subgroup': valuation_subgroup,
+            'current_value': 'NEUTRAL', 'weight': weight, 'impact_direction': 'NEUTRAL',
+            'trend': 'STABLE', 'updated_by': owner, 'is_active': 1,
+        })
+
+    for config_key, sector_config in config.get('sectors', {}).items():
+        mapping = CONFIG_KEY_TO_SUBGROUP.get(config_key)
+        if not mapping or not sector_config.get('is_active', True):
+            continue
+        for category in ['demand_drivers', 'cost_drivers', 'regulatory_drivers', 'group_specific_drivers']:
+            for driver in sector_config.get(category, []):
+                if driver.get('name'):
+                    add('SUBGROUP', category.replace('_drivers', '').upper(), driver['name'], mapping[0],
+                        mapping[1], driver.get('weight', 0), 'SEED_SUBGROUP')
+
+    for valuation_group, group_drivers in GROUP_DRIVERS.items():
+        for driver in group_drivers:
+            add('GROUP', driver['category'], driver['name'], valuation_group, None, driver['weight'], 'SEED_GROUP')
+    return groups, drivers
+
+
+def _same(column: str, current, desired) -> bool:
+    if column in JSON_COLUMNS and current is not None and desired is not None:
+        try:
+            return json.loads(current) == json.loads(desired)
+        except (TypeError, ValueError):
+            pass
+    return key_text(current) == key_text(desired)
+
+
+@dataclass
+class ReconcilePlan:
+    fingerprint: str
+    group_creates: List[dict] = field(default_factory=list)
+    group_updates: List[dict] = field(default_factory=list)      # {'key': id, 'name': .., 'values': {changed}}
+    group_deactivates: List[dict] = field(default_factory=list)  # {'key': id, 'name': ..}
+    driver_creates: List[dict] = field(default_factory=list)
+    driver_updates: List[dict] = field(default_factory=list)
+    driver_deactivates: List[dict] = field(default_factory=list)
+    unchanged: int = 0
+
+    def is_empty(self) -> bool:
+        return not (self.group_creates or self.group_updates or self.group_deactivates or
+                    self.driver_creates or self.driver_updates or self.driver_deactivates)
+
+    def summary(self) -> dict:
+        return {'group_creates': len(self.group_creates), 'group_updates': len(self.group_updates),
+                'group_deactivates': len(self.group_deactivates), 'driver_creates': len(self.driver_creates),
+                'driver_updates': len(self.driver_updates), 'driver_deactivates': len(self.driver_deactivates),
+                'unchanged': self.unchanged}
+
+    def lines(self) -> List[str]:
+        """Human-readable plan, one line per change."""
+        out = [f"+ GROUP {r['valuation_group']}" for r in self.group_creates]
+        out += [f"~ GROUP {u['name']}: {', '.join(sorted(u['values']))}" for u in self.group_updates]
+        out += [f"- GROUP {d['name']} (deactivate)" for d in self.group_deactivates]
+        for r in self.driver_creates:
+            key = driver_key(r['driver_level'], r['valuation_group'], r['valuation_subgroup'], r['driver_name'])
+            out.append(f"+ {'/'.join(map(str, key))} (weight={r['weight']})")
+        for u in self.driver_updates:
+            values = ', '.join(f"{c}={v}" for c, v in sorted(u['values'].items()))
+            out.append(f"~ {'/'.join(map(str, u['name']))}: {values}")
+        out += [f"- {'/'.join(map(str, d['name']))} (deactivate)" for d in self.driver_deactivates]
+        return out
+
+
+class GroupConfigReconciler:
+    """Desired state from sectors.yaml vs current state from MySQL, reconciled in one batched transaction."""
+
+    def __init__(self, backend, yaml_path=None, fingerprint_path: str = None, target: str = None,
+                 chunk_size: int = None):
+        self.engine = BulkMigrationEngine(backend, chunk_size=chunk_size)
+        self.db = backend
+        self.yaml_path = Path(yaml_path or SECTORS_YAML)
+        self.fingerprint_path = fingerprint_path or FINGERPRINT_PATH
+        self.target = target or (f"{os.getenv('MYSQL_HOST', 'localhost')}:{os.getenv('MYSQL_PORT', 3306)}/"
+                                 f"{os.getenv('MYSQL_DATABASE', 'rag')}")
+
+    # -------------------------------------------------------------------------
+    # Fingerprint
+    # -------------------------------------------------------------------------
+
+    def stored_fingerprint(self) -> str:
+        try:
+            with open(self.fingerprint_path) as f:
+                return json.load(f).get(self.target, {}).get('fingerprint')
+        except (OSError, ValueError):
+            return None
+
+    def store_fingerprint(self, fingerprint: str):
+        try:
+            with open(self.fingerprint_path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = {}
+        stored[self.target] = {'fingerprint': fingerprint, 'applied_at': datetime.now().isoformat()}
+        os.makedirs(os.path.dirname(os.path.abspath(self.fingerprint_path)), exist_ok=True)
+        tmp = f"{self.fingerprint_path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(stored, f, indent=1)
+        os.replace(tmp, self.fingerprint_path)
+
+    # -------------------------------------------------------------------------
+    # Plan
+    # -------------------------------------------------------------------------
+
+    def load_current(self) -> Tuple[Dict[str, dict], Dict[tuple, dict]]:
+        """Current groups and GROUP/SUBGROUP drivers, one query per table (lowest id wins on duplicate keys)."""
+        groups = {r['valuation_group']: r for r in self.db.fetch(
+            "SELECT id, valuation_group, driver_config, porter_forces, terminal_assumptions, notes, is_active "
+            "FROM vs_valuation_group_configs ORDER BY id DESC")}
+        drivers = {}
+        for row in self.db.fetch(
+                "SELECT id, driver_level, driver_category, driver_name, valuation_group, valuation_subgroup, "
+                "weight, is_active, updated_by FROM vs_drivers "
+                "WHERE driver_level IN ('GROUP', 'SUBGROUP') AND company_id IS NULL ORDER BY id DESC"):
+            drivers[driver_key(row['driver_level'], row['valuation_group'], row['valuation_subgroup'],
+                               row['driver_name'])] = row
+        return groups, drivers
+
+    def plan(self, fingerprint: str = None, prune: bool = False) -> ReconcilePlan:
+        """prune: also deactivate groups that are no longer in the YAML."""
+        config = get_sectors_model(str(self.yaml_path)).raw
+        plan = ReconcilePlan(fingerprint=fingerprint or yaml_fingerprint(self.yaml_path))
+        want_groups, want_drivers = desired_state(config)
+        have_groups, have_drivers = self.load_current()
+
+        for name, row in want_groups.items():
+            current = have_groups.get(name)
+            if current is None:
+                plan.group_creates.append(row)
+                continue
+            changed = {c: row[c] for c in GROUP_COLUMNS if not _same(c, current.get(c), row[c])}
+            if changed:
+                plan.group_updates.append({'key': current['id'], 'name': name, 'values': changed})
+            else:
+                plan.unchanged += 1
+        for name, current in have_groups.items():
+            if (prune and name not in want_groups
+                    and key_text(current.get('is_active')) not in (None, '0')):
+                plan.group_deactivates.append({'key': current['id'], 'name': name})
+
+        for key, row in want_drivers.items():
+            current = have_drivers.get(key)
+            if current is None:
+                plan.driver_creates.append(row)
+                continue
+            if current.get('updated_by') not in SEED_OWNERS:
+                plan.unchanged += 1  # Edited outside the seeders: left alone
+                continue
+            changed = {c: row[c] for c in DRIVER_COLUMNS if not _same(c, current.get(c), row[c])}
+            if key_text(current.get('is_active')) in (None, '0'):
+                changed['is_active'] = 1  # Dropped out of the YAML earlier, back now
+            if changed:
+                plan.driver_updates.append({'key': current['id'], 'name': key, 'values': changed})
+            else:
+                plan.unchanged += 1
+        for key, current in have_drivers.items():
+            if (key not in want_drivers and current.get('updated_by') in SEED_OWNERS
+                    and key_text(current.get('is_active')) not in (None, '0')):
+                plan.driver_deactivates.append({'key': current['id'], 'name': key})
+        return plan
+
+    # -------------------------------------------------------------------------
+    # Apply
+    # -------------------------------------------------------------------------
+
+    def apply(self, plan: ReconcilePlan) -> int:
+        """Apply the plan in one transaction; returns the number of statements."""
+        def deactivate(items):
+            return [{'key': d['key'], 'values': {'is_active': 0}} for d in items]
+
+        with self.db.transaction() as tx:
+            if plan.group_creates:
+                self.engine.insert_rows(tx, 'vs_valuation_group_configs', plan.group_creates)
+            if plan.group_updates or plan.group_deactivates:
+                self.engine.update_rows(tx, 'vs_valuation_group_configs', 'id',
+                                        plan.group_updates + deactivate(plan.group_deactivates), touch='updated_at')
+            if plan.driver_creates:
+                self.engine.insert_rows(tx, 'vs_drivers', plan.driver_creates)
+            if plan.driver_updates or plan.driver_deactivates:
+                self.engine.update_rows(tx, 'vs_drivers', 'id',
+                                        plan.driver_updates + deactivate(plan.driver_deactivates))
+            return tx.statements
+
+    def run(self, dry_run: bool = False, force: bool = False, prune: bool = False) -> dict:
+        """Plan and apply; prune plans even on an unchanged fingerprint (a plain run never prunes)."""
+        start = time.perf_counter()
+        fingerprint = yaml_fingerprint(self.yaml_path)
+        report = {'fingerprint': fingerprint, 'dry_run': dry_run, 'prune': prune, 'statements': 0}
+        if not (force or prune) and fingerprint == self.stored_fingerprint():
+            report.update(status='unchanged', elapsed_ms=round((time.perf_counter() - start) * 1000, 2))
+            return report
+
+        plan = self.plan(fingerprint, prune=prune)
+        report.update(plan.summary(), lines=plan.lines())
+        if dry_run:
+            report['status'] = 'dry_run'
+        elif plan.is_empty():
+            report['status'] = 'in_sync'
+            self.store_fingerprint(fingerprint)
+        else:
+            report['statements'] = self.apply(plan)
+            report['status'] = 'applied'
+            self.store_fingerprint(fingerprint)
+        report['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        return report
+
+
+def reconcile_group_configs(mysql_client: ValuationMySQLClient = None, dry_run: bool = False,
+                            force: bool = False, prune: bool = False, backend=None, **kwargs) -> dict:
+    """
+    Reconcile vs_valuation_group_configs and GROUP/SUBGROUP vs_drivers with sectors.yaml.
+
+    Args:
+        mysql_client: MySQL client instance (ignored when backend is given)
+        dry_run: If True, print the plan without modifying DB
+        force: Plan even when the YAML fingerprint matches the last applied run
+        prune: Also deactivate groups that are no longer in the YAML
+    """
+    reconciler = GroupConfigReconciler(backend or MySQLBackend(mysql_client), **kwargs)
+    report = reconciler.run(dry_run=dry_run, force=force, prune=prune)
+
+    print(f"\n{'='*80}")
+    print(f"Reconciling Group Configs and Drivers")
+    print(f"Mode: {'DRY RUN' if dry_run else 'EXECUTE'}")
+    print(f"{'='*80}\n")
+    if report['status'] == 'unchanged':
+        print(f"sectors.yaml unchanged since last sync ({report['elapsed_ms']} ms) - nothing to do")
+        return report
+    for line in report['lines']:
+        print(f"  {line}")
+    print(f"\nPlan: {report['group_creates']} group creates, {report['group_updates']} group updates, "
+          f"{report['group_deactivates']} group deactivations, {report['driver_creates']} driver creates, "
+          f"{report['driver_updates']} driver updates, {report['driver_deactivates']} driver deactivations, "
+          f"{report['unchanged']} unchanged")
+    if report['status'] == 'applied':
+        print(f"✓ Applied in {report['statements']} statements ({report['elapsed_ms']} ms)")
+    return report
+
+
 if __name__ == '__main__':
     import argparse
 
@@ -438,11 +763,19 @@ if __name__ == '__main__':
                         help='Seed SUBGROUP-level drivers from sector configs')
     parser.add_argument('--seed-all', action='store_true',
                         help='Seed both GROUP and SUBGROUP drivers')
+    parser.add_argument('--reconcile', action='store_true',
+                        help='Diff-based sync of groups and GROUP/SUBGROUP drivers')
+    parser.add_argument('--force', action='store_true',
+                        help='With --reconcile: plan even if sectors.yaml is unchanged')
+    parser.add_argument('--prune', action='store_true',
+                        help='With --reconcile: deactivate groups that are no longer in sectors.yaml')
     args = parser.parse_args()
 
     mysql_client = ValuationMySQLClient.get_instance()
 
-    if args.seed_all:
+    if args.reconcile:
+        reconcile_group_configs(mysql_client, dry_run=args.dry_run, force=args.force, prune=args.prune)
+    elif args.seed_all:
         seed_group_drivers(mysql_client, dry_run=args.dry_run)
         seed_subgroup_drivers(mysql_client, dry_run=args.dry_run)
     elif args.seed_group_drivers:
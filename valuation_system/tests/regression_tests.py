@@ -99,21 +99,48 @@ class RegressionTestRunner:
         self._run_test('test_financial_processor_dcf_inputs', 'PROCESSOR', self.test_financial_processor_dcf_inputs)
         self._run_test('test_financial_processor_relative_inputs', 'PROCESSOR', self.test_financial_processor_relative_inputs)
         self._run_test('test_growth_trajectory', 'PROCESSOR', self.test_growth_trajectory)
+        self._run_test('test_company_driver_panel', 'PROCESSOR', self.test_company_driver_panel)
+        self._run_test('test_peer_stats_engine', 'PROCESSOR', self.test_peer_stats_engine)
+        self._run_test('test_streaming_excel_report', 'PROCESSOR', self.test_streaming_excel_report)
 
         # Category 4: Storage
         self._run_test('test_mysql_connectivity', 'STORAGE', self.test_mysql_connectivity)
         self._run_test('test_mysql_schema_tables', 'STORAGE', self.test_mysql_schema_tables)
+        self._run_test('test_bulk_company_migration', 'STORAGE', self.test_bulk_company_migration)
+        self._run_test('test_group_config_reconciler', 'STORAGE', self.test_group_config_reconciler)
 
         # Category 5: Resilience
         self._run_test('test_run_state_manager', 'RESILIENCE', self.test_run_state_manager)
         self._run_test('test_graceful_degradation_queue', 'RESILIENCE', self.test_graceful_degradation_queue)
         self._run_test('test_data_staleness_check', 'RESILIENCE', self.test_data_staleness_check)
         self._run_test('test_dependency_check', 'RESILIENCE', self.test_dependency_check)
+        self._run_test('test_trace_recorder_ring_buffer', 'RESILIENCE', self.test_trace_recorder_ring_buffer)
+        self._run_test('test_webhook_job_store', 'RESILIENCE', self.test_webhook_job_store)
+        self._run_test('test_http_fetcher_conditional_get', 'RESILIENCE', self.test_http_fetcher_conditional_get)
+        self._run_test('test_news_batch_classification_fallback', 'RESILIENCE',
+                       self.test_news_batch_classification_fallback)
+        self._run_test('test_news_source_budget', 'RESILIENCE', self.test_news_source_budget)
+        self._run_test('test_news_lsh_dedup', 'RESILIENCE', self.test_news_lsh_dedup)
+        self._run_test('test_company_matcher', 'RESILIENCE', self.test_company_matcher)
+        self._run_test('test_event_index_parity', 'RESILIENCE', self.test_event_index_parity)
+        self._run_test('test_qualitative_pipeline_resume', 'RESILIENCE', self.test_qualitative_pipeline_resume)
+        self._run_test('test_llm_response_cache', 'RESILIENCE', self.test_llm_response_cache)
+        self._run_test('test_nse_fetch_engine_mock', 'RESILIENCE', self.test_nse_fetch_engine_mock)
+        self._run_test('test_nse_quarterly_store', 'RESILIENCE', self.test_nse_quarterly_store)
+        self._run_test('test_nse_loader_index', 'RESILIENCE', self.test_nse_loader_index)
+        self._run_test('test_xbrl_streaming_parser', 'RESILIENCE', self.test_xbrl_streaming_parser)
+        self._run_test('test_nse_tracker_bulk_upsert', 'RESILIENCE', self.test_nse_tracker_bulk_upsert)
+        self._run_test('test_pipeline_dag_executor', 'RESILIENCE', self.test_pipeline_dag_executor)
+        self._run_test('test_activity_log_sink', 'RESILIENCE', self.test_activity_log_sink)
+        self._run_test('test_run_state_store', 'RESILIENCE', self.test_run_state_store)
+        self._run_test('test_warm_job_workers', 'RESILIENCE', self.test_warm_job_workers)
 
         # Category 6: Configuration
         self._run_test('test_env_loaded', 'CONFIG', self.test_env_loaded)
         self._run_test('test_sectors_yaml', 'CONFIG', self.test_sectors_yaml)
         self._run_test('test_companies_yaml', 'CONFIG', self.test_companies_yaml)
+        self._run_test('test_sectors_model', 'CONFIG', self.test_sectors_model)
+        self._run_test('test_refine_subgroups_rules', 'CONFIG', self.test_refine_subgroups_rules)
 
         # Category 7: Edge Cases
         self._run_test('test_dcf_zero_revenue', 'EDGE', self.test_dcf_zero_revenue)
@@ -526,6 +553,1796 @@ class RegressionTestRunner:
         assert 'mysql' in deps
         assert 'core_csv' in deps
 
+    def test_trace_recorder_ring_buffer(self):
+        import logging as _logging
+        from valuation_system.utils.trace_recorder import TraceRecorder, parse_levels
+        levels = parse_levels('data.loaders=WARNING, models=DEBUG')
+        assert levels['valuation_system.data.loaders'] == _logging.WARNING
+        recorder = TraceRecorder(capacity=3, levels=levels, default_level=_logging.INFO)
+        test_logger = _logging.getLogger('valuation_system.models.dcf_model')
+        loader_logger = _logging.getLogger('valuation_system.data.loaders.core_loader')
+        old_level = test_logger.level
+        test_logger.setLevel(_logging.DEBUG)
+        try:
+            with recorder.capture():
+                loader_logger.info("dropped by subsystem level")
+                for i in range(5):
+                    test_logger.debug("iteration %d", i)
+        finally:
+            test_logger.setLevel(old_level)
+        records = recorder.get_records()
+        assert [r.getMessage() for r in records] == ['iteration 2', 'iteration 3', 'iteration 4']
+        assert recorder.dropped == 2
+        assert records[0].levelname == 'DEBUG'
+        assert recorder not in _logging.getLogger('valuation_system').handlers
+
+    def test_webhook_job_store(self):
+        from valuation_system.api.job_store import JobStore
+        import tempfile
+        db_path = os.path.join(tempfile.mkdtemp(), 'jobs.db')
+        store = JobStore(db_path=db_path, concurrency={'daily': 1, 'on-demand': 2}, ttl_hours=0)
+        first, deduped = store.enqueue('daily', {}, 'daily_1')
+        assert not deduped
+        dup, deduped = store.enqueue('daily', {}, 'daily_2')
+        assert deduped and dup == first, "Identical pending job should be deduplicated"
+        store.enqueue('on-demand', {'symbol': 'AETHER', 'callback_url': 'http://a'}, 'od_1')
+        store.enqueue('on-demand', {'symbol': 'AETHER', 'callback_url': 'http://b'}, 'od_2')
+        store.enqueue('on-demand', {'symbol': 'BEL'}, 'od_3')
+        claimed = [store.claim_next() for _ in range(3)]
+        assert [j['job_id'] for j in claimed if j] == ['daily_1', 'od_1', 'od_3']
+        # The deduplicated request's callback rides along with the job it joined
+        assert store.get('od_1')['callback_urls'] == ['http://a', 'http://b']
+        assert store.get('od_3')['callback_urls'] == []
+        store.enqueue('daily', {}, 'daily_3')
+        assert store.claim_next() is None, "daily cap of 1 should block a second run"
+        store.complete('daily_1', 'COMPLETED', result={'ok': True})
+        assert store.claim_next()['job_id'] == 'daily_3'
+        # Survives a restart: new store instance on the same file
+        restarted = JobStore(db_path=db_path, concurrency={'daily': 1}, ttl_hours=0)
+        assert restarted.get('daily_1')['result'] == {'ok': True}
+        assert restarted.recover_interrupted() == 3
+        assert restarted.metrics()['queue_depth'] == {}
+        assert restarted.evict_expired() == 4
+        # A group cap limits RUNNING across job types, not just per type
+        shared = JobStore(db_path=os.path.join(os.path.dirname(db_path), 'shared.db'),
+                          concurrency={'daily': 1, 'on-demand': 2}, ttl_hours=0)
+        shared.group_caps[('daily', 'on-demand')] = 2
+        for job_id, job_type in [('g_1', 'daily'), ('g_2', 'on-demand'), ('g_3', 'on-demand')]:
+            shared.enqueue(job_type, {'n': job_id}, job_id)
+        assert [shared.claim_next()['job_id'] for _ in range(2)] == ['g_1', 'g_2']
+        assert shared.claim_next() is None, "group cap of 2 should hold back the third job"
+        shared.complete('g_1', 'COMPLETED')
+        assert shared.claim_next()['job_id'] == 'g_3'
+
+    def test_http_fetcher_conditional_get(self):
+        from valuation_system.utils.http_fetcher import ConcurrentFetcher
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+        import tempfile, threading, time as _time
+        state = {'active': 0, 'peak': 0}
+        lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with lock:
+                    state['active'] += 1
+                    state['peak'] = max(state['peak'], state['active'])
+                _time.sleep(0.05)
+                with lock:
+                    state['active'] -= 1
+                if self.headers.get('If-None-Match') == '"v1"':
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                body = b'<rss><item><title>feed</title></item></rss>'
+                self.send_response(200)
+                self.send_header('ETag', '"v1"')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            base = f"http://127.0.0.1:{server.server_port}"
+            cache = os.path.join(tempfile.mkdtemp(), 'validators.json')
+            fetcher = ConcurrentFetcher(max_workers=8, per_host_limit=2, validator_cache_path=cache)
+            first = fetcher.get_many([f"{base}/q{i}" for i in range(6)])
+            assert all(r.ok and 'feed' in r.text for r in first)
+            assert state['peak'] <= 2, f"Per-host limit exceeded: {state['peak']}"
+            # Failed cycle: validators dropped → next cycle fetches the full feed again
+            fetcher.discard_validators()
+            fetcher.save_validators()
+            assert ConcurrentFetcher(validator_cache_path=cache).get(f"{base}/q0").ok
+            # Committed after store → next cycle (new fetcher) sends validators → 304, no body
+            fetcher.get(f"{base}/q0")
+            fetcher.save_validators()
+            fetcher.close()
+            again = ConcurrentFetcher(validator_cache_path=cache).get(f"{base}/q0")
+            assert again.not_modified and not again.text
+            late = fetcher.get(f"{base}/q1", deadline=_time.monotonic() - 1)
+            assert late.error == 'budget exhausted'
+        finally:
+            server.shutdown()
+
+        # Retry backoff never sleeps past the caller's deadline
+        from valuation_system.utils.resilience import retry_with_backoff
+
+        class Source:
+            calls = 0
+
+            @retry_with_backoff(max_retries=2, base_delay=3.0, exceptions=(IOError,),
+                                deadline_attr='deadline')
+            def scan(self):
+                self.calls += 1
+                raise IOError('feed down')
+
+        source = Source()
+        source.deadline = _time.monotonic() + 1
+        start = _time.monotonic()
+        try:
+            source.scan()
+            raise AssertionError("error swallowed")
+        except IOError:
+            pass
+        assert source.calls == 1 and _time.monotonic() - start < 0.5
+
+    def test_news_batch_classification_fallback(self):
+        from valuation_system.agents.news_scanner import NewsScannerAgent
+        from valuation_system.utils.llm_client import LLMClient
+
+        class FakeLLM:
+            def __init__(self):
+                self.batch_calls, self.single_calls = 0, 0
+
+            def batch_analyze(self, items, **kwargs):
+                self.batch_calls += 1
+                # Numbered out of order, item 2 missing, one malformed entry
+                raw = {'results': [{'item': 3, 'severity': 'LOW'}, {'item': '[1]', 'severity': 'HIGH'},
+                                   {'item': 2, 'error': 'json_parse_failed'}]}
+                return LLMClient._map_batch_results(raw, len(items))
+
+            def analyze_json(self, prompt, *args, **kwargs):
+                self.single_calls += 1
+                return {'severity': 'MEDIUM'}
+
+        agent = object.__new__(NewsScannerAgent)
+        agent.llm = FakeLLM()
+        agent._watched_companies, agent._watched_sectors = ['AETHER'], ['Chemicals']
+        agent._classification_system_prompt = 'ctx'
+        articles = [{'headline': f'Headline {i}', 'content': 'x' * 100} for i in range(3)]
+        results = agent._classify_batched(articles)
+        assert [r['severity'] for r in results] == ['HIGH', 'MEDIUM', 'LOW'], results
+        assert agent.llm.batch_calls == 1 and agent.llm.single_calls == 1
+        # Positional mapping only when the count matches and nothing is numbered
+        assert LLMClient._map_batch_results([{'a': 1}, {'a': 2}], 2) == [{'a': 1}, {'a': 2}]
+        assert LLMClient._map_batch_results([{'a': 1}], 2) == [None, None]
+
+    def test_news_source_budget(self):
+        from valuation_system.agents import news_scanner
+        from valuation_system.utils.http_fetcher import ConcurrentFetcher
+        import time as _time
+
+        class FakeLog:
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: None
+
+        agent = object.__new__(news_scanner.NewsScannerAgent)
+        agent.NEWS_SOURCES = [{'name': 'fast', 'base_url': 'http://fast/'},
+                              {'name': 'slow', 'base_url': 'http://slow/'}]
+        agent.slog = FakeLog()
+        agent.fetcher = ConcurrentFetcher(validator_cache_path=None)
+        agent._source_ctx = news_scanner.threading.local()
+        agent._build_search_terms = lambda: []
+        agent._deduplicate = lambda articles: articles
+        seen_deadlines = {}
+
+        def scan_source(source, search_terms, catchup_hours=None):
+            seen_deadlines[source['name']] = agent._scan_deadline
+            with agent.fetcher._lock:
+                agent.fetcher._staged_validators[source['base_url'] + 'feed'] = {'etag': '"v1"'}
+            if source['name'] == 'slow':
+                _time.sleep(0.6)
+            return [{'headline': source['name']}]
+
+        agent._scan_source = scan_source
+        saved = news_scanner.SOURCE_BUDGET_SECONDS, news_scanner.check_internet
+        news_scanner.SOURCE_BUDGET_SECONDS, news_scanner.check_internet = 0.2, lambda: True
+        try:
+            start = _time.monotonic()
+            articles = agent.scan_all_sources()
+            assert _time.monotonic() - start < 0.5, "Slow source should be dropped, not waited on"
+        finally:
+            news_scanner.SOURCE_BUDGET_SECONDS, news_scanner.check_internet = saved
+        assert [a['headline'] for a in articles] == ['fast']
+        # Each worker thread sees its own source's deadline
+        assert all(d is not None for d in seen_deadlines.values()), seen_deadlines
+        assert agent._scan_deadline is None
+        # The dropped source's validators never reach the commit
+        assert list(agent.fetcher._staged_validators) == ['http://fast/feed']
+
+    def test_news_lsh_dedup(self):
+        from valuation_system.agents.news_scanner import NewsScannerAgent, _headline_words, _jaccard
+        from valuation_system.utils.minhash_index import MinHashLSHIndex, _synthetic_headlines
+        import tempfile
+        # LSH lookup returns exactly the pairwise matches (no false positives, full recall here)
+        corpus = _synthetic_headlines(600, seed=3)
+        index = MinHashLSHIndex()
+        index.add_many((str(i), t, None, None) for i, t in enumerate(corpus[:500]))
+        for probe in corpus[500:]:
+            expected = {str(i) for i, t in enumerate(corpus[:500]) if _jaccard(probe, t) > 0.25}
+            assert {k for k, _, _ in index.query(probe, 0.25)} == expected
+
+        class FakeMySQL:
+            def query(self, sql, params=None):
+                return [{'id': 7, 'headline': 'Aether Industries wins large specialty chemical contract',
+                         'ts': None}] if params == (0,) else []
+
+        db_path = os.path.join(tempfile.mkdtemp(), 'lsh.db')
+        os.environ['NEWS_DEDUP_INDEX_PATH'] = db_path
+        try:
+            agent = object.__new__(NewsScannerAgent)
+            agent.mysql, agent._dedup_index, agent._seen_headlines = FakeMySQL(), None, set()
+            agent._watched_symbols_lower = {'aether'}
+            kept = agent._deduplicate([
+                {'headline': 'Aether Industries wins specialty chemical contract worth crores', 'content': 'a'},
+                {'headline': 'RBI keeps repo rate unchanged at policy meeting', 'content': 'short'},
+                {'headline': 'RBI keeps repo rate unchanged, signals caution', 'content': 'longer text'},
+            ])
+            assert [a['content'] for a in kept] == ['longer text'], kept
+            # Persisted: a fresh index on the same file has the synced event and high-water mark
+            reopened = MinHashLSHIndex(db_path=db_path, window_hours=24)
+            assert 'event:7' in reopened and reopened.get_state('last_event_id') == 7
+        finally:
+            os.environ.pop('NEWS_DEDUP_INDEX_PATH', None)
+
+    def test_company_matcher(self):
+        from valuation_system.utils import company_matcher as cm
+        import tempfile
+        rows = [
+            {'company_id': 1, 'symbol': 'AETHER', 'name': 'Aether Industries Limited'},
+            {'company_id': 2, 'symbol': 'EICHERMOT', 'name': 'Eicher Motors Ltd', 'csv_name': 'Eicher Motor Co'},
+            {'company_id': 3, 'symbol': 'M&M', 'name': 'Mahindra & Mahindra Ltd'},
+            {'company_id': 4, 'symbol': 'TCS', 'name': 'Tata Consultancy Services Ltd'},
+            {'company_id': 5, 'symbol': 'BANKINDIA', 'name': 'Bank of India'},
+        ]
+        matcher = cm.CompanyMatcher(rows)
+        best = matcher.best('Eicher Motors Q3 profit rises; EICHERMOT up 4%')
+        assert (best.company_id, best.kind, best.start, best.end) == (2, 'name', 0, 13)
+        assert matcher.best("Aether's new plant").kind == 'symbol'           # apostrophe is a word boundary
+        assert matcher.best('Aether Industries expands capacity').kind == 'name'  # Industries kept
+        assert matcher.best('AETHERX rallies').kind == 'keyword'             # no \b for keyword
+        assert matcher.best('TCSL shares', kinds=('symbol',)) is None         # \b for symbols
+        assert matcher.best('Stake sale in M&M.').company_id == 3
+        assert matcher.best('Eicher Motor Co files results').kind == 'alias'   # csv_name variant
+        assert {m.company_id for m in matcher.match_companies('TCS and M&M lead gains')} == {3, 4}
+        # "BANK OF" is not a short name for Bank of India
+        assert matcher.best('Bank of America beats estimates') is None
+        assert matcher.best('Bank of India raises MCLR').company_id == 5
+
+        class FakeMySQL:
+            def __init__(self):
+                self.version, self.universe_loads = 1, 0
+
+            def query_one(self, sql, params=None):
+                return {'active_rows': self.version}
+
+            def query(self, sql, params=None):
+                self.universe_loads += 1
+                return rows
+
+        mysql = FakeMySQL()
+        cache_file = os.path.join(tempfile.mkdtemp(), 'matcher.pkl')
+        first = cm.get_company_matcher(mysql, force=True, cache_file=cache_file)
+        assert cm.get_company_matcher(mysql, cache_file=cache_file) is first
+        cm._cache['checked_at'] = 0  # Fingerprint re-check due, unchanged → same matcher
+        assert cm.get_company_matcher(mysql, cache_file=cache_file) is first
+        mysql.version = 2
+        cm._cache['checked_at'] = 0
+        assert cm.get_company_matcher(mysql, cache_file=cache_file) is not first
+        assert mysql.universe_loads == 2
+        cm._cache.update(matcher=None, fingerprint=None, checked_at=0)
+
+    def test_event_index_parity(self):
+        from valuation_system.utils import event_index
+        from valuation_system.utils.event_index import EventTimelineIndex
+        from datetime import date, timedelta
+        import tempfile
+        import random
+        today = date.today()
+        rng = random.Random(7)
+        words = ['Aether', 'AETHER', 'aetherx', 'Eicher', 'EICHERMOT', 'M&M', 'chemicals', 'auto',
+                 'capex', 'plant', 'Q3', 'results', 'rally', 'AI']
+        sectors = ['Specialty Chemicals', 'Automobiles', 'Auto Ancillaries', 'Banking', '']
+        events = []
+        for i in range(1, 401):
+            events.append({
+                'id': i, 'event_date': today - timedelta(days=rng.randint(0, 90)),
+                'company_id': rng.choice([None, 1, 2, 3]),
+                'scope': rng.choice(['COMPANY', 'GROUP', 'MACRO']), 'sector': rng.choice(sectors),
+                'severity': 'LOW', 'source': 'test', 'event_type': 'NEWS',
+                'headline': ' '.join(rng.sample(words, 4)), 'summary': ' '.join(rng.sample(words, 3)),
+                'grok_synopsis': rng.choice([None, ' '.join(rng.sample(words, 3))]),
+                'updated_at': '2026-01-01 00:00:00',
+            })
+
+        class FakeMySQL:
+            def query(self, sql, params=None):
+                if 'MAX(updated_at)' in sql:
+                    return [{'last_updated': max(e['updated_at'] for e in events)}]
+                if '(updated_at, id) >' in sql:
+                    since, last_id, cutoff = params
+                    rows = [e for e in events if (e['updated_at'], e['id']) > (since, last_id)
+                            and e['event_date'].isoformat() >= cutoff]
+                    return sorted(rows, key=lambda e: (e['updated_at'], e['id']))[:event_index.SYNC_BATCH]
+                last_id, cutoff = params
+                rows = [e for e in events if e['id'] > last_id and e['event_date'].isoformat() >= cutoff]
+                return rows[:event_index.SYNC_BATCH]
+
+        def like(spec, cutoff):
+            """Python equivalent of the SQL LIKE path."""
+            hits = set()
+            for e in events:
+                if e['event_date'].isoformat() < cutoff:
+                    continue
+                if (spec.get('company_id') and e['company_id'] == spec['company_id']) or \
+                        any(t.lower() in (e['headline'] or '').lower() for t in spec.get('headline_terms', [])) or \
+                        any(t.lower() in (e['grok_synopsis'] or '').lower() for t in spec.get('synopsis_terms', [])) or \
+                        (e['scope'] in ('GROUP', 'MACRO') and
+                         any(k.lower() in e['sector'].lower() for k in spec.get('sector_keywords', []))):
+                    hits.add(e['id'])
+            return hits
+
+        index = EventTimelineIndex(db_path=os.path.join(tempfile.mkdtemp(), 'events.db'), retention_days=60)
+        window = [e for e in events if e['event_date'] >= today - timedelta(days=60)]
+        assert index.sync(FakeMySQL()) == len(window)
+        assert index.sync(FakeMySQL()) == 0  # High-water marks: nothing new or changed
+
+        # Already-indexed row changed in SQL (company backfill + new synopsis) → re-indexed
+        target = window[0]
+        old_company = target['company_id']
+        target.update(company_id=4, grok_synopsis='zebra capex story', updated_at='2026-02-01 09:00:00')
+        assert index.sync(FakeMySQL()) == 1
+        window_cutoff = (today - timedelta(days=60)).isoformat()
+        found = index.search(window_cutoff, company_id=4, synopsis_terms=['ZEBRA'])
+        assert [e['id'] for e in found] == [target['id']]
+        if old_company:
+            stale = index.search(window_cutoff, limit=None, company_id=old_company)
+            assert target['id'] not in {e['id'] for e in stale}
+
+        # More updated rows in one second than a sync batch: keyset paging still moves past them
+        saved_batch = event_index.SYNC_BATCH
+        event_index.SYNC_BATCH = 50
+        try:
+            for e in window[1:121]:
+                e.update(summary='batch rewrite', updated_at='2026-03-01 00:00:00')
+            assert index.sync(FakeMySQL()) == 120
+            assert index.stats()['last_updated_at'] == '2026-03-01 00:00:00'
+            assert index.sync(FakeMySQL()) == 0
+        finally:
+            event_index.SYNC_BATCH = saved_batch
+
+        specs = [
+            {'company_id': 1, 'headline_terms': ['AETHER', 'Aether'], 'synopsis_terms': ['AETHER']},
+            {'headline_terms': ['EICHERMOT'], 'sector_keywords': ['auto', 'Automobile']},
+            {'headline_terms': ['M&M', 'AI'], 'synopsis_terms': ['M&M']},  # < 3 chars → window scan
+            {'company_id': 3, 'sector_keywords': ['Chemical']},
+        ]
+        for days in (7, 30, 60):
+            cutoff = (today - timedelta(days=days)).isoformat()
+            for spec in specs:
+                found = index.search(cutoff, limit=None, **spec)
+                assert {e['id'] for e in found} == like(spec, cutoff), (days, spec)
+                assert [(e['event_date'], e['id']) for e in found] == \
+                    sorted(((e['event_date'], e['id']) for e in found), reverse=True)
+        assert len(index.search(cutoff, limit=5, **specs[0])) <= 5
+
+        # Incremental add, then pruning old partitions
+        index.add_events([dict(events[0], id=999, event_date=today, headline='Aether new plant')])
+        assert 999 in {e['id'] for e in index.search(today.isoformat(), headline_terms=['aether'])}
+        index.retention_days = 10
+        index.prune()
+        assert all(p >= (today - timedelta(days=10)).strftime('%Y%m') for p in index.stats()['partitions'])
+
+    def test_qualitative_pipeline_resume(self):
+        from valuation_system.agents.qualitative_driver_agent import QualitativeDriverAgent, _BatchCheckpoint
+        from valuation_system.utils.llm_pipeline_bench import FakeLLMServer, InMemoryDriverDB
+        from valuation_system.utils.rate_limiter import TokenBucket
+        import tempfile
+        import time as _time
+
+        class FakeLLM:
+            def analyze_json(self, prompt, system_prompt=None, temperature=0.1, **kwargs):
+                if 'Company 3 Limited' in prompt and 'DRIVERS TO ASSESS' in prompt:
+                    return {'error': 'json_parse_failed'}  # → per-driver fallback
+                return FakeLLMServer.answer(prompt)
+
+        os.environ['EVENT_INDEX_ENABLED'] = '0'
+        try:
+            db = InMemoryDriverDB(companies=10, drivers_per_company=3, db_latency=0)
+            agent = QualitativeDriverAgent(db, FakeLLM())
+            agent.write_batch_size = 4
+            agent.checkpoint_path = os.path.join(tempfile.mkdtemp(), 'checkpoint.json')
+
+            # Interrupted batch: first 4 companies written in order → resume starts at the 5th
+            _BatchCheckpoint(agent.checkpoint_path, db.companies, done_through=4).save()
+            summary = agent.run_batch(max_companies=10)
+            assert summary['resumed_from'] == 4 and summary['companies_processed'] == 6
+            assert db.filled == 18 and len(db.changelog) == 18
+            assert summary['llm_calls_made'] == 6  # one batch call per company, none for company 3
+            assert not os.path.exists(agent.checkpoint_path)  # finished → cleared
+
+            summary = agent.run_batch(max_companies=10)  # fresh batch picks up the rest
+            assert summary['drivers_filled'] == 12 and db.filled == 30
+            assert summary['llm_calls_made'] == 4 + 3  # company 3: failed batch + 3 single-driver calls
+        finally:
+            os.environ.pop('EVENT_INDEX_ENABLED', None)
+
+        checkpoint = _BatchCheckpoint(os.path.join(tempfile.mkdtemp(), 'c.json'), db.companies)
+        for index in (1, 2, 0, 4):
+            checkpoint.mark_done(index)
+        assert checkpoint.done_through == 3  # 4 is held until 3 is written
+
+        bucket = TokenBucket(rate=50, capacity=1)
+        start = _time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        assert 0.08 <= _time.monotonic() - start < 0.5  # 5 waits at 20 ms each
+
+    def test_llm_response_cache(self):
+        from valuation_system.utils.llm_cache import LLMResponseCache, cache_key
+        from valuation_system.utils.llm_pipeline_bench import FakeLLMServer
+        import tempfile, threading
+        import time as _time
+        tmp = tempfile.mkdtemp()
+
+        cache = LLMResponseCache(db_path=os.path.join(tmp, 'c.db'), default_ttl=60,
+                                 ttls={'short': 0.05}, max_bytes=2000)
+        key = cache_key('grok', 'm', 'sys', 'prompt', 0.1, 100, 'json')
+        assert key != cache_key('grok', 'm', 'sys', 'prompt', 0.2, 100, 'json')
+        assert cache.get(key) is None
+        cache.put(key, '{"a": 1}', provider='grok', model='m', tokens=1000, cost_usd=0.002)
+        assert cache.get(key)['response'] == '{"a": 1}'
+        cache.put('k-short', 'x', call_site='short')
+        _time.sleep(0.1)
+        assert cache.get('k-short') is None  # Call-site TTL expired
+        for i in range(30):
+            cache.put(f"k{i}", 'y' * 100)
+        cache.evict()
+        assert cache.summary()['size_mb'] * 1024 * 1024 <= 2000
+        assert cache.get('k29') is not None and cache.get('k0') is None  # LRU evicted first
+        stats = cache.summary()
+        assert stats['hits'] == 2 and stats['cost_saved_usd'] == 0.002
+
+        saved = {k: os.environ.get(k) for k in ('LLM_FALLBACK_CHAIN', 'OLLAMA_BASE_URL', 'LLM_CACHE_PATH', 'LOG_DIR')}
+        with FakeLLMServer(latency=0) as server:
+            os.environ.update(LLM_FALLBACK_CHAIN='ollama', OLLAMA_BASE_URL=server.url,
+                              LLM_CACHE_PATH=os.path.join(tmp, 'llm.db'), LOG_DIR=tmp)
+            try:
+                from valuation_system.utils.llm_client import LLMClient
+                llm = LLMClient()
+                prompt = "Assess the qualitative driver **pricing_power** for X"
+                first = llm.analyze_json(prompt, call_site='qualitative_drivers')
+                assert llm.analyze_json(prompt, call_site='qualitative_drivers') == first
+                assert llm.last_call_metadata.get('cached') and server.requests == 1
+                llm.analyze_json(prompt, use_cache=False)  # Bypass
+                assert server.requests == 2
+                # Usage writes are batched: nothing on disk until the flush
+                assert not os.path.exists(os.path.join(tmp, 'llm_daily_usage.json'))
+                llm.flush_usage()
+                with open(os.path.join(tmp, 'llm_daily_usage.json')) as f:
+                    usage = json.load(f)['cache']
+                assert usage['hits'] == 1 and usage['misses'] == 1  # bypass is not a lookup
+
+                # Miss counted once per call, not once per provider in the fallback chain
+                llm._clients['openai'] = llm._clients['ollama']
+                llm.fallback_chain = ['openai', 'ollama']
+                llm.analyze_json(prompt + ' again', call_site='qualitative_drivers')
+                assert llm._daily_cache['misses'] == 2 and llm._daily_cache['hits'] == 1
+                # One provider budget per process, however many clients the agents build
+                assert LLMClient().limiter is llm.limiter
+                # One exit hook for all clients; it doesn't keep dropped clients alive
+                from valuation_system.utils import llm_client
+                import gc
+                gc.collect()
+                live = len(llm_client._live_clients)
+                LLMClient()
+                gc.collect()
+                assert llm in llm_client._live_clients and len(llm_client._live_clients) == live
+                # Call metadata is per thread: a concurrent fresh call doesn't overwrite ours
+                llm.analyze_json(prompt + ' again', call_site='qualitative_drivers')
+                worker = threading.Thread(target=llm.analyze_json, args=(prompt + ' worker',),
+                                          kwargs={'use_cache': False})
+                worker.start()
+                worker.join()
+                assert llm.last_call_metadata.get('cached')
+            finally:
+                for k, v in saved.items():
+                    if v is None:
+                        os.environ.pop(k, None)
+                    else:
+                        os.environ[k] = v
+
+    def test_nse_fetch_engine_mock(self):
+        import tempfile
+        tmp = tempfile.mkdtemp()
+        os.environ.setdefault('LOG_DIR', tmp)
+        from valuation_system.nse_results_prototype.nse_fetch_engine import NSEFetchEngine
+        from valuation_system.nse_results_prototype.nse_loader import NSELoader
+        from valuation_system.nse_results_prototype.nse_mock_server import NSEMockServer
+        from valuation_system.nse_results_prototype.nse_tracker import NSETracker, SQLiteTrackerBackend
+        from valuation_system.storage.nse_quarterly_store import NSEQuarterlyStore
+
+        fetch_list = [{'nse_symbol': f"SYM{i:04d}", 'company_id': i, 'company_name': f"Company {i}"}
+                      for i in range(200)]
+        progress = os.path.join(tmp, 'progress.jsonl')
+
+        def engine_for(server):
+            return NSEFetchEngine(base_url=server.url, workers=8, sessions=3, rate_per_sec=400,
+                                  min_rate_per_sec=20, progress_path=progress, max_retries=6,
+                                  backoff_base=0.02)
+
+        with NSEMockServer(throttle_rate=0.03, forbidden_rate=0.02, max_rps=150,
+                           empty_symbols={'SYM0007'}) as server:
+            first = engine_for(server)
+            done_first = set()
+            for item, data in first.iter_fetch(fetch_list, lambda c: f"/api/results-comparision?symbol={c['nse_symbol']}",
+                                               lambda c: c['nse_symbol']):
+                done_first.add(item['nse_symbol'])
+                if len(done_first) == 120:
+                    break  # Simulated crash mid-sweep
+            assert first.stats['throttled'] > 0 and first.stats['min_rate_seen'] < 400
+            assert server.counts['cookie'] >= 3  # Every pooled session warmed up
+
+            with open(first.active_progress_path) as f:
+                checkpointed = {json.loads(line)['key'] for line in f}
+            assert done_first <= checkpointed and len(checkpointed) < 200
+            requests_before = dict(server.requests_by_symbol)
+
+            tracker = NSETracker(SQLiteTrackerBackend(os.path.join(tmp, 'tracker.db')))
+            loader = NSELoader(nse_base=server.url, progress_path=progress, tracker=tracker,
+                               store=NSEQuarterlyStore(db_path=os.path.join(tmp, 'store.db')))
+            results = loader.fetch_results(fetch_list, engine=engine_for(server))
+            assert len(results) == 199 and 'SYM0007' not in results
+            assert {r['nse_symbol']: r['last_fetch_status'] for r in tracker.rows()} == {'SYM0007': 'NO_DATA'}
+            assert loader.fetch_stats['resumed'] == len(checkpointed)
+            # Resume never re-requests what the crashed run already stored
+            assert all(server.requests_by_symbol[s] == requests_before[s] for s in checkpointed)
+            assert all(r['quarters'] and r['data_hash'] for r in results.values())
+
+            # Two different sweeps back to back: each resumes only its own progress
+            path = lambda c: f"/api/results-comparision?symbol={c['nse_symbol']}"
+            key = lambda c: c['nse_symbol']
+            daily = engine_for(server)
+            list(daily.iter_fetch(fetch_list[:50], path, key, sweep_tag='daily'))
+            assert daily.stats['resumed'] == 0 and daily.stats['fetched'] == 50
+            assert daily.active_progress_path != first.active_progress_path
+            seed = engine_for(server)
+            list(seed.iter_fetch(fetch_list[:50], path, key, sweep_tag='seed'))
+            assert seed.stats['resumed'] == 0 and seed.stats['fetched'] == 50
+            sweep = engine_for(server)
+            list(sweep.iter_fetch(fetch_list, path, key))
+            assert sweep.stats['resumed'] >= 199 and sweep.stats['requests'] <= 1
+            sweep.clear_progress()
+            assert not os.path.exists(sweep.active_progress_path) and os.path.exists(daily.active_progress_path)
+
+    def test_nse_quarterly_store(self):
+        import tempfile
+        import pandas as pd
+        tmp = tempfile.mkdtemp()
+        os.environ.setdefault('LOG_DIR', tmp)
+        from valuation_system.data.loaders.nse_data_loader import NSEDataLoader
+        from valuation_system.nse_results_prototype.nse_filing_prototype import _extract_results_quarters
+        from valuation_system.nse_results_prototype.nse_loader import NSELoader
+        from valuation_system.storage.nse_quarterly_store import NSEQuarterlyStore
+
+        legacy = pd.DataFrame([
+            {'company_name': 'Bharat Electronics', 'nse_symbol': 'BEL', 'data_source': 'NSE_FILING',
+             'fetch_date': '2025-01-05', 'sales_141': 4000.5, 'sales_144': 4100.0, 'pat_144': 900.0,
+             'filing_date_144': '30-OCT-2024', 'result_type_144': 'U'},
+            {'company_name': 'Old Co', 'nse_symbol': 'OLDCO', 'data_source': 'NSE_FILING',
+             'fetch_date': '2025-01-05', 'sales_141': 10.0, 'sales_144': None, 'pat_144': 1.0,
+             'filing_date_144': '01-NOV-2024', 'result_type_144': 'C'},
+        ])
+        csv_path = os.path.join(tmp, 'nse_quarterly_data.csv')
+        legacy.to_csv(csv_path, index=False)
+
+        store = NSEQuarterlyStore(db_path=os.path.join(tmp, 'store.db'), compact_rows=0)
+        assert store.import_csv(csv_path) == 9
+        assert store.import_csv(csv_path) == 0  # One-time: same file is not re-imported
+        wide = store.wide_frame().set_index('nse_symbol')
+        assert wide.loc['BEL', 'sales_141'] == 4000.5 and wide.loc['OLDCO', 'result_type_144'] == 'C'
+        assert pd.isna(wide.loc['OLDCO', 'sales_144']) and wide.loc['BEL', 'fetch_date'] == '2025-01-05'
+
+        # A failing append leaves nothing behind (single transaction)
+        try:
+            store.append([('BEL', 145, 'sales', 1.0), ('BEL', 145, 'pat', {'bad': 'value'})])
+            assert False, "append should reject unsupported values"
+        except Exception:
+            pass
+        assert 145 not in store.partitions()
+
+        class TrackerDB:
+            def execute(self, sql, params=None):
+                return 1
+
+            def query(self, sql, params=None):
+                return [{'Field': 'fetch_attempts'}]  # Schema check: migration 004 applied
+
+        with open(os.path.join(os.path.dirname(__file__), '..', 'nse_results_prototype', 'cache',
+                               'BEL', 'results.json')) as f:
+            quarters = _extract_results_quarters(json.load(f))
+        loader = NSELoader(mysql_client=TrackerDB(), store=store, progress_path=os.path.join(tmp, 'p.jsonl'))
+        rows_before = store.stats()['rows']
+        loader.store_results({'BEL': {'quarters': quarters, 'data_hash': 'h', 'company_id': 1,
+                                      'company_name': 'Bharat Electronics Ltd'}})
+        assert store.stats()['rows'] > rows_before
+
+        nse = NSEDataLoader(store=store)
+        assert nse.source == store.db_path
+        bel = nse.get_company_data('BEL')
+        sales = nse.get_metric_dict(bel, 'sales')
+        assert sales[141] == 4000.5  # Imported history survives the new fetch
+        assert 144 in sales and sales[144] != 4100.0  # ...but refetched quarters take the new value
+        assert nse.get_latest_quarter_idx('BEL') > 144 and bel['company_name'] == 'Bharat Electronics Ltd'
+        assert nse.get_company_data('OLDCO')['pat_144'] == 1.0
+
+        removed = store.compact()
+        assert removed > 0 and store.wide_frame().equals(nse.df)
+
+        # Store created after the CSV, holding one fetched symbol: the CSV universe still loads,
+        # store cells win over CSV cells
+        fresh = NSEQuarterlyStore(db_path=os.path.join(tmp, 'fresh.db'), compact_rows=0)
+        fresh.append([('BEL', 144, 'sales', 4200.0)], companies={'BEL': 'Bharat Electronics Ltd'})
+        overlaid = NSEDataLoader(store=fresh, csv_path=csv_path)
+        assert sorted(overlaid.df['nse_symbol']) == ['BEL', 'OLDCO'] and overlaid.source == fresh.db_path
+        bel = overlaid.get_company_data('BEL')
+        assert bel['sales_144'] == 4200.0 and bel['sales_141'] == 4000.5
+        assert list(overlaid.df.columns[:4]) == ['company_name', 'nse_symbol', 'data_source', 'fetch_date']
+
+        # The loader's first append seeds the store from the CSV without superseding fetched cells
+        from valuation_system.nse_results_prototype import nse_loader as nse_loader_module
+        with open(os.path.join(os.path.dirname(__file__), '..', 'nse_results_prototype', 'cache',
+                               'AETHER', 'results.json')) as f:
+            aether = _extract_results_quarters(json.load(f))
+        saved_csv = nse_loader_module.NSE_QUARTERLY_CSV_PATH
+        nse_loader_module.NSE_QUARTERLY_CSV_PATH = csv_path
+        try:
+            NSELoader(mysql_client=TrackerDB(), store=fresh, progress_path=os.path.join(tmp, 'p2.jsonl')) \
+                .store_results({'AETHER': {'quarters': aether, 'data_hash': 'h', 'company_id': 2}})
+        finally:
+            nse_loader_module.NSE_QUARTERLY_CSV_PATH = saved_csv
+        assert fresh.is_seeded() and fresh.seed_from_csv(csv_path) == 0
+        seeded = NSEDataLoader(store=fresh, csv_path=os.path.join(tmp, 'gone.csv'))
+        assert sorted(seeded.df['nse_symbol']) == ['AETHER', 'BEL', 'OLDCO']
+        assert seeded.get_company_data('BEL')['sales_144'] == 4200.0
+        assert seeded.get_company_data('OLDCO')['pat_144'] == 1.0
+
+    def test_nse_loader_index(self):
+        import numpy as np
+        import pandas as pd
+        from valuation_system.utils.nse_merge_bench import _loader_for, run_benchmark, synthetic_frame
+
+        df = synthetic_frame(50, 6)
+        df.loc[3, [c for c in df.columns if c.endswith('_145')]] = np.nan  # Latest quarter not filed
+        df = pd.concat([df, df.iloc[[7]].assign(company_name='Duplicate')], ignore_index=True)
+        loader = _loader_for(df)
+        row = loader.get_company_data('SYM00007')
+        assert row['company_name'] == 'Company 7'  # First row wins, as with the boolean scan
+        sales = loader.get_metric_dict(row, 'sales')
+        expected = {q: float(df.at[7, f'sales_{q}']) for q in range(140, 146) if pd.notna(df.at[7, f'sales_{q}'])}
+        assert sales == expected
+        assert loader.get_latest_quarter_idx('SYM00003') == 144
+        assert loader.get_latest_quarter_idx('SYM00004') == 145 and loader.get_company_data('NOPE') is None
+        # A Series that isn't a row of this frame falls back to the column scan
+        assert loader.get_metric_dict(row.copy().rename('x'), 'sales') == expected
+
+        report = run_benchmark(companies=300, quarters=8)
+        assert all(r['parity'] for r in report)
+
+    def test_xbrl_streaming_parser(self):
+        import json
+        import shutil
+        import tempfile
+        from valuation_system.nse_results_prototype import xbrl_parser as xp
+        from valuation_system.nse_results_prototype.xbrl_bench import FIXTURE_DIR, run_benchmark
+        from valuation_system.storage.nse_quarterly_store import NSEQuarterlyStore
+
+        with open(os.path.join(FIXTURE_DIR, 'expected.json')) as f:
+            expected = json.load(f)
+        results = {os.path.basename(r['path']): r for r in xp.parse_directory(FIXTURE_DIR, workers=2)}
+        assert set(results) == set(expected)
+        for name, result in results.items():
+            # Segment, YTD and nil facts excluded; facts-before-contexts and other prefixes resolved
+            quarters = {str(q): v for q, v in result['quarters'].items()}
+            assert quarters == expected[name], name
+            assert result['symbol'] == name.split('_')[0] and result['nature'] == 'Consolidated'
+
+        tmp = tempfile.mkdtemp()
+        shutil.copy(os.path.join(FIXTURE_DIR, 'SYM00001_20250930.xml'), tmp)
+        with open(os.path.join(tmp, 'broken.xml'), 'w') as f:
+            f.write('<xbrli:xbrl xmlns:xbrli="http://www.xbrl.org/2003/instance"><unclosed>')
+        batch = {os.path.basename(r['path']): r for r in xp.parse_directory(tmp, workers=1)}
+        assert 'error' in batch['broken.xml'] and batch['SYM00001_20250930.xml']['facts'] > 0
+
+        class FakeMySQL:
+            def __init__(self):
+                self.updates = []
+
+            def query(self, sql, params=None):
+                return [{'nse_symbol': 'SYM00001', 'company_id': 1, 'latest_quarter_idx': 147,
+                         'xbrl_url': 'https://nsearchives.nseindia.com/corporate/xbrl/SYM00001_20250930.xml'},
+                        {'nse_symbol': 'GONE', 'company_id': 2, 'latest_quarter_idx': 147,
+                         'xbrl_url': 'https://nsearchives.nseindia.com/corporate/xbrl/GONE.xml'}]
+
+            def execute(self, sql, params=None):
+                self.updates.append(params)
+
+        store = NSEQuarterlyStore(db_path=os.path.join(tmp, 'store.db'))
+        mysql = FakeMySQL()
+        summary = xp.XBRLParser(mysql_client=mysql, source=xp.LocalXBRLSource(tmp), store=store).run(batch=True)
+        assert summary['parsed'] == 1 and summary['missing'] == 1 and mysql.updates == [('SYM00001',)]
+        frame = store.wide_frame(['SYM00001'])
+        q_idx, values = max(batch['SYM00001_20250930.xml']['quarters'].items())
+        assert abs(frame.iloc[0][f'sales_{q_idx}'] - values['sales']) < 1e-9
+        assert frame.iloc[0]['company_name'] == 'SYM00001 Limited'
+
+        # Standalone filings share the consolidated metric keys: only the configured basis is stored
+        standalone = dict(batch['SYM00001_20250930.xml'], nature='Standalone')
+        assert xp.to_store_rows(standalone) == [] and xp.to_store_rows(standalone, nature='standalone')
+        assert xp.is_store_basis({'symbol': 'X'}) and len(xp.to_store_rows(batch['SYM00001_20250930.xml'])) > 0
+        saved_parse = xp.parse_file
+        xp.parse_file = lambda path: dict(saved_parse(path), nature='Standalone')
+        try:
+            other = xp.XBRLParser(mysql_client=FakeMySQL(), source=xp.LocalXBRLSource(tmp),
+                                  store=NSEQuarterlyStore(db_path=os.path.join(tmp, 'other.db'))).run(batch=True)
+        finally:
+            xp.parse_file = saved_parse
+        assert other['other_basis'] == 1 and other['rows_stored'] == 0 and other['parsed'] == 1
+
+        report = run_benchmark(files=40, workers=[1], large_segments=2000)
+        assert report[-1]['parity'] and all(r.get('errors', 0) == 0 for r in report)
+
+    def test_nse_tracker_bulk_upsert(self):
+        import tempfile
+        from datetime import date
+        tmp = tempfile.mkdtemp()
+        os.environ.setdefault('LOG_DIR', tmp)
+        from valuation_system.nse_results_prototype.nse_loader import NSELoader
+        from valuation_system.nse_results_prototype.nse_tracker import (
+            NSETracker, MySQLTrackerBackend, SQLiteTrackerBackend,
+        )
+        from valuation_system.storage.nse_quarterly_store import NSEQuarterlyStore
+
+        class FakeMySQL:
+            def __init__(self):
+                self.statements = []
+
+            def execute(self, sql, params=None):
+                self.statements.append((sql, params))
+                return len(params)
+
+        mysql = FakeMySQL()
+        tracker = NSETracker(MySQLTrackerBackend(mysql), chunk_size=500)
+        for i in range(2000):
+            if i % 10 == 0:
+                tracker.record(f"S{i:04d}", i, 'FAILED')
+            else:
+                tracker.record(f"S{i:04d}", i, 'SUCCESS', latest_quarter_idx=147, data_hash='h', xbrl_url=None)
+        tracker.flush()
+        assert tracker.stats['legacy_round_trips'] == 4000 and tracker.stats['rows_flushed'] == 2000
+        assert tracker.stats['statements'] == len(mysql.statements) <= 8  # 4 auto-flushes × 2 column sets
+        assert tracker.stats['saved_round_trips'] == 4000 - len(mysql.statements)
+        for sql, params in mysql.statements:
+            assert 'ON DUPLICATE KEY UPDATE' in sql and 'xbrl_url' not in sql  # None fields never overwrite
+            assert len(params) == sql.count('%s')
+
+        backend = SQLiteTrackerBackend(os.path.join(tmp, 'tracker.db'))
+        tracker = NSETracker(backend)
+        tracker.record('BEL', 1, 'SUCCESS', latest_quarter_end=date(2024, 12, 31), data_hash='h1')
+        tracker.flush()
+        tracker.record('BEL', 1, 'FAILED')
+        tracker.flush()
+        tracker.record('BEL', 1, 'NO_DATA')
+        row = tracker.rows()[0]
+        assert row['fetch_attempts'] == 2 and row['data_hash'] == 'h1' and row['last_fetch_status'] == 'NO_DATA'
+        assert row['latest_quarter_end'] == date(2024, 12, 31)
+        tracker.record('BEL', 1, 'SUCCESS', data_hash='h2')
+        row = tracker.rows()[0]
+        assert row['fetch_attempts'] == 0 and row['data_hash'] == 'h2'
+        tracker.record('BEL', 1, 'FAILED')
+        tracker.flush()
+        tracker.record('BEL', 1, 'SUCCESS')
+        tracker.record('BEL', 1, 'FAILED')  # Same buffer: counts from the SUCCESS, not the stored 1
+        assert tracker.rows()[0]['fetch_attempts'] == 1
+
+        # Missing fetch_attempts column (migration 004 not applied) fails at startup
+        from valuation_system.nse_results_prototype import nse_tracker as nt
+
+        class OldSchemaDB(FakeMySQL):
+            def query(self, sql, params=None):
+                return []
+
+        saved_backend = nt.TRACKER_BACKEND
+        nt.TRACKER_BACKEND = 'mysql'
+        try:
+            nt.default_backend(OldSchemaDB())
+            assert False, "default_backend should reject a tracker table without fetch_attempts"
+        except RuntimeError as e:
+            assert '004' in str(e)
+        finally:
+            nt.TRACKER_BACKEND = saved_backend
+
+        # A failing backend keeps rows pending for the next flush
+        broken = NSETracker(MySQLTrackerBackend(object()))
+        broken.record('X', 1, 'FAILED')
+        assert broken.flush() == 0 and broken.pending == 1 and broken.stats['flush_errors'] == 1
+
+        # The loader tracks state without MySQL on the embedded backend
+        with open(os.path.join(os.path.dirname(__file__), '..', 'nse_results_prototype', 'cache',
+                               'BEL', 'results.json')) as f:
+            from valuation_system.nse_results_prototype.nse_filing_prototype import _extract_results_quarters
+            quarters = _extract_results_quarters(json.load(f))
+        loader = NSELoader(tracker=NSETracker(SQLiteTrackerBackend(os.path.join(tmp, 'local.db'))),
+                           store=NSEQuarterlyStore(db_path=os.path.join(tmp, 'store.db')),
+                           progress_path=os.path.join(tmp, 'p.jsonl'))
+        assert loader.mysql is None
+        assert loader.decide_fetch_list({}, mode='symbol', symbols=['BEL'])[0]['company_id'] is None
+        loader.store_results({'BEL': {'quarters': quarters, 'data_hash': 'h', 'company_id': 5,
+                                      'company_name': 'Bharat Electronics Ltd'}})
+        sweep = loader.decide_fetch_list({}, mode='sweep')
+        assert [(c['nse_symbol'], c['company_id']) for c in sweep] == [('BEL', 5)]
+        assert loader.tracker.stats['statements'] == 1
+
+    def test_pipeline_dag_executor(self):
+        import sys
+        import types
+        import tempfile
+        import time as _time
+        from valuation_system.pipelines.pipeline_executor import PipelineExecutor, build_dag
+        from valuation_system.pipelines.xyops_config import PIPELINES, run_pipeline
+
+        mod = types.ModuleType('_pipeline_test_steps')
+        calls = {'built': 0, 'flaky': 0}
+
+        class Agent:
+            def __init__(self):
+                calls['built'] += 1
+
+            def slow(self, seconds=0.3):
+                _time.sleep(seconds)
+                return {'slept': seconds}
+
+            def flaky(self):
+                calls['flaky'] += 1
+                if calls['flaky'] == 1:
+                    raise RuntimeError('transient')
+                return 'ok'
+
+        mod.Agent = Agent
+        mod.io_step = lambda seconds=0.3: _time.sleep(seconds) or 'io'
+        mod.hang = lambda: _time.sleep(2)
+        sys.modules['_pipeline_test_steps'] = mod
+
+        def step(name, **extra):
+            base = {'name': name, 'description': name, 'module': '_pipeline_test_steps'}
+            return dict(base, **extra)
+
+        pipeline = {'description': 'test', 'timeout_minutes': 1, 'retries': 1, 'retry_backoff_minutes': 0,
+                    'alert_on_failure': False, 'steps': [
+                        step('a', **{'class': 'Agent', 'method': 'slow'}),
+                        step('b', function='io_step', depends_on=['a']),
+                        step('c', function='io_step', depends_on=['a']),
+                        step('d', **{'class': 'Agent', 'method': 'flaky', 'depends_on': ['b', 'c']}),
+                        step('e', function='hang', timeout_minutes=0.005, depends_on=[]),
+                    ]}
+        timing = os.path.join(tempfile.mkdtemp(), 'timings.jsonl')
+        executor = PipelineExecutor('test', pipeline, max_workers=4, timing_log=timing)
+        assert [[s['name'] for s in w] for w in executor.plan()] == [['a', 'e'], ['b', 'c'], ['d']]
+        start = _time.monotonic()
+        result = executor.run()
+        elapsed = _time.monotonic() - start
+        assert elapsed < 1.3, elapsed  # a, then b‖c, then d — not 4 × 0.3s in sequence
+        statuses = {n: s['status'] for n, s in result['steps'].items()}
+        assert statuses == {'a': 'SUCCESS', 'b': 'SUCCESS', 'c': 'SUCCESS', 'd': 'SUCCESS', 'e': 'TIMEOUT'}
+        assert calls['built'] == 1 and result['instances_constructed'] == {'Agent': 1}
+        assert result['steps']['d']['attempts'] == 2 and result['steps']['d']['instance_reused']
+        assert result['status'] == 'SUCCESS' and result['failed_steps'] == ['e']
+        with open(timing) as f:
+            records = [json.loads(line) for line in f]
+        assert sorted(r['step'] for r in records) == ['a', 'b', 'c', 'd', 'e']
+
+        # alert_on_failure: the first failure stops the pipeline, dependents are skipped
+        pipeline['alert_on_failure'] = True
+        pipeline['retries'] = 0
+        pipeline['steps'][3] = step('d', function='missing_function', depends_on=['a'])
+        pipeline['steps'].append(step('f', function='io_step', kwargs={'seconds': 0}))
+        result = PipelineExecutor('test', pipeline, timing_log=None).run()
+        assert result['status'] == 'FAILED' and result['steps']['f']['status'] == 'SKIPPED'
+
+        # Retry backoff never sleeps past the pipeline deadline
+        slept = []
+        late = {'description': 'test', 'timeout_minutes': 0.05, 'retries': 2, 'retry_backoff_minutes': 10,
+                'alert_on_failure': False, 'steps': [step('d', function='missing_function')]}
+        result = PipelineExecutor('test', late, timing_log=None, sleep=slept.append).run()
+        assert slept == [] and result['steps']['d']['status'] == 'FAILED' and result['steps']['d']['attempts'] == 1
+
+        # A TimeoutError raised by the step itself is an ordinary failure: retried, not TIMEOUT
+        calls['flaky_timeout'] = 0
+
+        def flaky_timeout():
+            calls['flaky_timeout'] += 1
+            if calls['flaky_timeout'] == 1:
+                raise TimeoutError('upstream API timed out')
+            return 'ok'
+
+        mod.flaky_timeout = flaky_timeout
+        unbounded = {'description': 'test', 'retries': 1, 'retry_backoff_minutes': 0,
+                     'alert_on_failure': False, 'steps': [step('t', function='flaky_timeout')]}
+        result = PipelineExecutor('test', unbounded, timing_log=None).run()
+        assert result['steps']['t']['status'] == 'SUCCESS' and result['steps']['t']['attempts'] == 2
+
+        try:
+            build_dag([step('x', depends_on=['y']), step('y', depends_on=['x'])])
+            assert False, "cycle should be rejected"
+        except ValueError:
+            pass
+        for name, definition in PIPELINES.items():
+            build_dag(definition['steps'])  # Every shipped pipeline is a valid DAG
+        dry = run_pipeline('daily_valuation', dry_run=True)
+        assert dry['status'] == 'DRY_RUN' and [s['name'] for s in dry['plan'][0]] == ['nse_fetch', 'process_discoveries']
+
+    def test_activity_log_sink(self):
+        import time
+        import tempfile
+        import threading
+        from valuation_system.utils.activity_log_bench import run_benchmark
+        from valuation_system.utils.activity_log_sink import ActivityLogSink
+        from valuation_system.utils.structured_logger import StructuredLogger
+
+        class FlakyMySQL:
+            def __init__(self):
+                self.rows, self.statements, self.down = [], 0, True
+                self.gate = threading.Event()
+                self.gate.set()
+
+            def execute(self, sql, params=None):
+                self.gate.wait()
+                if self.down:
+                    raise ConnectionError('MySQL unreachable')
+                width = sql.count('%s') // sql.count('(%s')
+                self.rows.extend(params[i:i + width] for i in range(0, len(params), width))
+                self.statements += 1
+                return 1
+
+        db = FlakyMySQL()
+        spill = os.path.join(tempfile.mkdtemp(), 'spill.jsonl')
+        sink = ActivityLogSink(db, batch_size=10, flush_interval=0.05, retry_after=0, spill_path=spill)
+        slog = StructuredLogger('TestAgent', mysql_client=db, sink=sink)
+        for i in range(25):
+            slog.log_source_scan(f"src{i}", 3, 1, 5.0)
+        assert slog.flush(5)
+        assert sink.stats['spilled'] == 25 and sink.stats['written'] == 0 and os.path.exists(spill)
+
+        db.down = False  # Recovery: the next write replays the spill file
+        slog.log_cycle_complete('hourly', 1234.5, {'companies': 3})
+        assert slog.flush(5)
+        stats = sink.stats
+        assert stats['written'] == 1 and stats['replayed'] == 25 and not os.path.exists(spill)
+        assert len(db.rows) == 26 and db.statements < 26  # Multi-row inserts
+        last = [r for r in db.rows if r[3] == 'cycle_complete'][0]
+        assert last[1] == 'TestAgent' and last[2] == 'hourly' and last[5] == 1234.5
+
+        # Bounded queue: a stalled DB never blocks the caller, excess rows are dropped and counted
+        db.gate.clear()
+        small = ActivityLogSink(db, queue_size=5, batch_size=1, flush_interval=0.01, spill_path=spill)
+        accepted = sum(small.submit((None, 'A', None, 'x', None, None, 'SUCCESS', None)) for _ in range(50))
+        assert accepted < 50 and small.stats['dropped'] == 50 - accepted and small.stats['queue_depth'] <= 5
+        started = time.monotonic()
+        assert small.flush(0.1) is False  # Bounded wait for queue space (atexit must not hang)
+        assert time.monotonic() - started < 2
+        db.gate.set()
+        small.close()
+        assert small.stats['queue_depth'] == 0 and not small.submit(('late',))
+        sink.close()
+
+        # A row the DB rejects is quarantined; the rest of its batch and the spill replay still go through
+        class DataError(Exception):
+            pass
+
+        class StrictMySQL(FlakyMySQL):
+            def execute(self, sql, params=None):
+                if 'BOGUS' in params:
+                    raise DataError("Data truncated for column 'status'")
+                return super().execute(sql, params)
+
+        strict = StrictMySQL()
+        strict.down = False
+        bad_row = ('2026-10-18 10:00:00', 'A', None, 'x', None, None, 'BOGUS', None)
+        with open(spill, 'w') as f:
+            f.write(json.dumps(bad_row) + '\n' + json.dumps(bad_row[:6] + ('SUCCESS', None)) + '\n')
+        picky = ActivityLogSink(strict, batch_size=10, flush_interval=0.05, retry_after=60, spill_path=spill)
+        for status in ('SUCCESS', 'BOGUS', 'FAILED'):
+            picky.submit(('2026-10-18 10:00:00', 'A', None, 'x', None, None, status, None))
+        assert picky.flush(5)
+        stats = picky.stats
+        assert stats['written'] == 2 and stats['replayed'] == 1 and stats['quarantined'] == 2
+        assert stats['write_errors'] == 0 and not os.path.exists(spill) and len(strict.rows) == 3
+        with open(picky.quarantine_path) as f:
+            assert [json.loads(line)['row'][6] for line in f] == ['BOGUS', 'BOGUS']
+        picky.close()
+
+        report = {r['mode']: r for r in run_benchmark(calls=200, latency_ms=1)}
+        assert report['async']['calls_per_s'] > report['sync']['calls_per_s']
+        assert report['async']['rows_written'] == report['sync']['rows_written'] == 200
+
+    def test_run_state_store(self):
+        import json
+        import tempfile
+        from valuation_system.utils.resilience import RunStateManager, GracefulDegradation, safe_task_run
+        from valuation_system.utils.state_store_bench import run_benchmark
+
+        # Legacy JSON files are imported once and left in place
+        state_dir = tempfile.mkdtemp()
+        with open(os.path.join(state_dir, 'run_state.json'), 'w') as f:
+            json.dump({'daily_valuation': {'last_success': '2026-01-05T18:00:00', 'last_status': 'SUCCESS',
+                                           'consecutive_failures': 0, 'last_details': {'companies': 12}}}, f)
+        with open(os.path.join(state_dir, 'pending_operations.json'), 'w') as f:
+            json.dump([{'type': 'store_event', 'data': {'id': 1}, 'queued_at': '2026-01-05T18:01:00'}], f)
+        state = RunStateManager(state_dir=state_dir)
+        gd = GracefulDegradation(state_dir=state_dir)
+        assert state.get_last_run('daily_valuation') == datetime(2026, 1, 5, 18, 0)
+        assert state.get_full_status()['daily_valuation']['status'] == 'SUCCESS'
+        assert gd.get_queue_size() == 1
+        assert RunStateManager(state_dir=state_dir) and GracefulDegradation(state_dir=state_dir).get_queue_size() == 1
+        assert os.path.exists(os.path.join(state_dir, 'run_state.json'))
+
+        # Failure counting, history and the atomic running lock
+        state.record_failure('daily_valuation', 'boom')
+        state.record_failure('daily_valuation', 'boom again')
+        assert state.get_retry_delay_seconds('daily_valuation') == 540 and state.should_retry('daily_valuation')
+        assert state.try_mark_running('hourly_cycle') and not state.try_mark_running('hourly_cycle')
+        assert state.is_running('hourly_cycle')
+
+        @safe_task_run('hourly_cycle', state)
+        def hourly():
+            return {'ok': True}
+        assert hourly() == {'status': 'SKIPPED', 'reason': 'already_running'}
+        state.record_success('hourly_cycle', {'ok': True})
+        assert hourly() == {'ok': True} and not state.is_running('hourly_cycle')
+        assert [h['status'] for h in state.get_history('hourly_cycle')] == ['SUCCESS', 'RUNNING', 'SUCCESS', 'RUNNING']
+
+        # Failed replays stay queued with an attempt count; successes are removed
+        gd.queue_operation({'type': 'store_valuation', 'data': {'id': 2}})
+        seen = []
+
+        def handler(op):
+            seen.append(op['type'])
+            if op['type'] == 'store_valuation':
+                raise ConnectionError('MySQL down')
+        assert gd.replay_queued_operations(handler) == 1 and seen == ['store_event', 'store_valuation']
+        assert gd.get_queue_size() == 1
+        leased = gd.store.lease('other-process')
+        assert leased[0]['attempts'] == 1 and leased[0]['operation']['data'] == {'id': 2}
+        assert gd.replay_queued_operations(handler) == 0  # Leased elsewhere: not replayed twice
+
+        # Multi-process contention: no lost updates, every operation replayed exactly once
+        report = {r['engine']: r for r in run_benchmark(processes=3, iterations=40, replayers=2)}
+        sqlite_row = report['sqlite']
+        assert sqlite_row['lost_updates'] == 0 and sqlite_row['failures_counted'] == 120
+        assert sqlite_row['history_rows'] == 120
+        assert sqlite_row['replayed'] == sqlite_row['replayed_unique'] == 120 and sqlite_row['left_in_queue'] == 0
+        assert report['json']['lost_updates'] > 0
+
+    def test_company_driver_panel(self):
+        import random
+        import numpy as np
+        from valuation_system.data.processors.company_driver_calculator import _percentile_rank
+        from valuation_system.data.processors.company_driver_panel import grouped_percentile_rank
+        from valuation_system.utils.driver_panel_bench import synthetic_universe, BenchCalculator
+
+        # Grouped rank transform == _percentile_rank per subgroup
+        rng = random.Random(3)
+        ref = [round(rng.uniform(-5, 5), 1) for _ in range(200)]
+        ref_groups = [rng.randrange(4) for _ in ref]
+        query = [round(rng.uniform(-6, 6), 1) for _ in range(50)] + [float('nan')]
+        query_groups = [rng.randrange(-1, 5) for _ in query]
+        ranks = grouped_percentile_rank(np.array(query), np.array(query_groups), np.array(ref), np.array(ref_groups))
+        for q, g, r in zip(query, query_groups, ranks):
+            peers = [v for v, vg in zip(ref, ref_groups) if vg == g] if g >= 0 else []
+            expected = 0.5 if q != q else _percentile_rank(q, peers)
+            assert r == expected, (q, g, r, expected)
+
+        # Exact parity with the per-company path on a sample; state usable afterwards
+        companies, core, prices = synthetic_universe(400, seed=11)
+        calc = BenchCalculator(core, prices)
+        report = calc.parity_check(companies, sample_size=150, seed=5)
+        assert report['sampled'] == 150 and report['drivers_compared'] > 2000
+        assert report['mismatches'] == [], report['mismatches'][:2]
+        core.calls = 0
+        drivers = calc.compute_panel(companies)
+        assert core.calls == len(companies) and calc.panel_timings['total_s'] >= 0
+        comp = next(c for c in companies if drivers[companies.index(c)] and c['valuation_subgroup'].startswith('SG'))
+        assert calc.compute_all_drivers(comp['csv_name'], comp['valuation_subgroup'], comp['company_id'],
+                                        symbol=comp['symbol'], valuation_group=comp['valuation_group'],
+                                        bse_code=comp['bse_code']) == drivers[companies.index(comp)]
+
+        # One bulk upsert: chunked statements, PM overrides skipped
+        class FakeCursor:
+            def __init__(self, log):
+                self.log = log
+                self.rowcount = 0
+
+            def execute(self, sql, params):
+                self.log.append((sql, params))
+                self.rowcount = len(params) // 5 if 'UPDATE' in sql else 0
+
+            def fetchall(self):
+                return [{'company_id': 1, 'driver_name': 'roce_trend'}]
+
+            def close(self):
+                pass
+
+        class FakeConn:
+            def __init__(self):
+                self.log, self.committed = [], False
+
+            def cursor(self, dictionary=False):
+                return FakeCursor(self.log)
+
+            def commit(self):
+                self.committed = True
+
+            def rollback(self):
+                pass
+
+            def close(self):
+                pass
+
+        conn = FakeConn()
+        calc._mysql_connect = lambda: conn
+        rows = [(1, [{'driver_name': 'roce_trend', 'current_value': '1.0%', 'impact_direction': 'NEUTRAL',
+                      'trend': 'STABLE'}])] + [(c['company_id'], d) for c, d in zip(companies, drivers)]
+        total = len({(cid, d['driver_name']) for cid, ds in rows for d in ds})
+        result = calc.upsert_drivers_bulk(rows, chunk_size=1000)
+        assert conn.committed and result['skipped_pm'] == 1 and result['updated'] == total - 1
+        updates = [params for sql, params in conn.log if 'UPDATE' in sql]
+        assert result['statements'] == len(conn.log) == 1 + len(updates) == 1 + -(-(total - 1) // 1000)
+        assert all((params[i], params[i + 1]) != (1, 'roce_trend')
+                   for params in updates for i in range(0, len(params), 5))
+
+    def test_peer_stats_engine(self):
+        import random
+        import shutil
+        import tempfile
+        import numpy as np
+        from valuation_system.utils.populate_peer_stats import PeerStatsEngine, STAT_COLUMNS
+        from valuation_system.utils.driver_panel_bench import SyntheticCore, synthetic_financials
+
+        workdir = tempfile.mkdtemp()
+        try:
+            rng = random.Random(9)
+            members = [{'valuation_subgroup': f"SG_{i % 5}", 'company_id': i, 'scrip_id': i if i % 17 else None,
+                        'symbol': f"S{i}", 'name': f"Co {i}"} for i in range(1, 121)]
+            core = SyntheticCore({f"Co {i}": synthetic_financials(rng) for i in range(1, 121) if i % 23})
+            core.csv_path = os.path.join(workdir, 'core.csv')
+            with open(core.csv_path, 'w') as f:
+                f.write('v1')
+
+            class FakeMySQL:
+                def __init__(self):
+                    self.table, self.statements = {}, []
+
+                def query(self, sql, params=()):
+                    if 'vs_active_companies' in sql:
+                        return [dict(m) for m in members if not params or m['valuation_subgroup'] == params[0]]
+                    return [dict(row, valuation_subgroup=sg) for sg, row in self.table.items()]
+
+                def execute(self, sql, params=None):
+                    self.statements.append(sql)
+                    if sql.startswith('INSERT'):
+                        width = len(STAT_COLUMNS) + 1
+                        for i in range(0, len(params), width):
+                            self.table[params[i]] = dict(zip(STAT_COLUMNS, params[i + 1:i + width]))
+                    else:
+                        for sg in params[1:]:
+                            self.table[sg]['source_version'] = params[0]
+                    return 1
+
+            mysql = FakeMySQL()
+            engine = PeerStatsEngine(core=core, mysql=mysql, trim_fraction=0.1, chunk_size=2)
+            report = engine.run(force_refresh=True)
+            assert report['written'] == 5 and report['statements'] == 3 and len(mysql.table) == 5
+
+            # Same numbers as the per-subgroup lists (legacy medians), plus the distribution columns
+            from valuation_system.utils.populate_peer_stats import extract_peer_metrics
+            for sg, row in mysql.table.items():
+                peers = [m for m in members if m['valuation_subgroup'] == sg and m['scrip_id']]
+                assert row['peer_count'] == len(peers)
+                values = [extract_peer_metrics(core, core.financials[m['name']]).get('roce')
+                          for m in peers if core.financials.get(m['name'])]
+                values = sorted(v for v in values if v is not None)
+                assert row['count_roce'] == len(values)
+                assert row['median_roce'] == round(float(np.median(values)), 4)
+                assert abs(row['p25_roce'] - np.percentile(values, 25)) < 1e-4
+                assert abs(row['p75_roce'] - np.percentile(values, 75)) < 1e-4
+                k = int(len(values) * 0.1)
+                assert abs(row['trimmed_mean_roce'] - np.mean(values[k:len(values) - k])) < 1e-4
+
+            # Incremental: nothing changed → nothing loaded or written
+            mysql.statements.clear()
+            report = engine.run(incremental=True)
+            assert report['recomputed'] == 0 and report['companies_loaded'] == 0 and not mysql.statements
+
+            # New member → only that subgroup is reloaded and written
+            members.append({'valuation_subgroup': 'SG_2', 'company_id': 500, 'scrip_id': 500, 'symbol': 'N',
+                            'name': 'Co 1'})
+            sg2 = [m for m in members if m['valuation_subgroup'] == 'SG_2' and m['scrip_id']]
+            report = engine.run(incremental=True)
+            assert report['recomputed'] == report['written'] == 1
+            assert report['companies_loaded'] == len(sg2) and mysql.table['SG_2']['peer_count'] == len(sg2)
+
+            # Source rewritten with the same numbers → fingerprints bumped, no stats rewritten
+            with open(core.csv_path, 'w') as f:
+                f.write('v2-longer')
+            report = engine.run(incremental=True)
+            assert report['recomputed'] == 5 and report['written'] == 0 and report['unchanged'] == 5
+            assert engine.run(incremental=True)['recomputed'] == 0
+
+            # Changed financials for one company → only its subgroup is written
+            core.financials['Co 3']['roce'] = {2024: 55.0}
+            with open(core.csv_path, 'w') as f:
+                f.write('v3-even-longer')
+            report = engine.run(incremental=True)
+            assert report['written'] == 1 and mysql.table['SG_3']['count_roce'] >= 1
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def test_refine_subgroups_rules(self):
+        import random
+        import sqlite3
+        import pandas as pd
+        from valuation_system.utils.refine_subgroups import (
+            refine_subgroups, parity_check, diff_report, update_mysql, SUBGROUP_RULES)
+
+        # Every keyword of every rule (plus noise) under every source subgroup
+        rng = random.Random(11)
+        words = sorted({k for r in SUBGROUP_RULES for k in r.industry_keywords + r.company_keywords})
+        industries = words + ['Insurance', 'Telecommunication - Equipment', 'Steel', None, float('nan')]
+        sources = sorted({r.source for r in SUBGROUP_RULES}) + ['CHEMICALS_SPECIALTY', None]
+        rows = []
+        for i in range(2000):
+            name = ' '.join(rng.sample(words, rng.randint(0, 2)) + [f"co{i}"]).title()
+            industry = rng.choice(industries)
+            rows.append({'Company Name': name if i % 97 else None, 'Accord Code': 1000 + i,
+                         'CD_Industry1': industry.title() if i % 3 and isinstance(industry, str) else industry,
+                         'valuation_subgroup': rng.choice(sources),
+                         'valuation_group': rng.choice(['GRP', None])})
+        df = pd.DataFrame(rows)
+        assert parity_check(df) == []
+
+        refined, changes = refine_subgroups(df.copy())
+        assert len(changes) == int((refined['original_subgroup'].notna() &
+                                    (refined['valuation_subgroup'] != refined['original_subgroup'])).sum())
+        moved = [c for c in changes if c['rule'] and c['rule'].startswith('NOT_CLASSIFIED')]
+        assert moved and all(c['refined_group'] in ('FINANCIALS', 'INDUSTRIALS') for c in moved)
+        detail, summary = diff_report(changes)
+        assert len(detail) == len(changes) and summary['companies'].sum() == len(changes)
+
+        # CASE-based bulk update, run against SQLite
+        class SqliteCursor:
+            def __init__(self, cursor):
+                self.cursor, self.rowcount, self.calls = cursor, 0, 0
+
+            def execute(self, sql, params):
+                self.calls += 1
+                self.cursor.execute(sql.replace('%s', '?').replace('NOW()', 'CURRENT_TIMESTAMP'), params)
+                self.rowcount = self.cursor.rowcount
+
+            def close(self):
+                pass
+
+        class SqliteConn:
+            def __init__(self):
+                self.db = sqlite3.connect(':memory:')
+                self.db.execute('CREATE TABLE vs_active_companies (accord_code TEXT PRIMARY KEY, '
+                                'valuation_subgroup TEXT, valuation_group TEXT, last_synced TEXT)')
+                self.db.executemany('INSERT INTO vs_active_companies VALUES (?, ?, ?, NULL)',
+                                    [(str(r['Accord Code']), r['valuation_subgroup'], r['valuation_group'])
+                                     for r in rows])
+                self.last_cursor = None
+
+            def cursor(self):
+                self.last_cursor = SqliteCursor(self.db.cursor())
+                return self.last_cursor
+
+            def commit(self):
+                self.db.commit()
+
+            def rollback(self):
+                self.db.rollback()
+
+        conn = SqliteConn()
+        updated = update_mysql(refined, changes=changes, conn=conn, chunk_size=250)
+        assert updated == len(changes)
+        assert conn.last_cursor.calls == -(-len(changes) // 250)
+        stored = dict(conn.db.execute('SELECT accord_code, valuation_subgroup FROM vs_active_companies'))
+        for c in changes:
+            assert stored[str(c['accord_code'])] == c['refined']
+        synced = conn.db.execute('SELECT COUNT(*) FROM vs_active_companies WHERE last_synced IS NOT NULL')
+        assert synced.fetchone()[0] == len(changes)
+
+    def test_bulk_company_migration(self):
+        import shutil
+        import sqlite3
+        import tempfile
+        import pandas as pd
+        from pathlib import Path
+        from valuation_system.storage.bulk_migration import SQLiteBackend
+        from valuation_system.storage.migrate_companies import CompanyMigrator
+
+        workdir = tempfile.mkdtemp()
+        try:
+            conn = sqlite3.connect(':memory:')
+            conn.execute("ATTACH DATABASE ':memory:' AS mssdb")
+            conn.executescript("""
+                CREATE TABLE mssdb.kbapp_marketscrip (marketscrip_id INTEGER PRIMARY KEY, symbol TEXT,
+                    alternate_symbol TEXT, accord_code TEXT);
+                CREATE TABLE vs_active_companies (id INTEGER PRIMARY KEY AUTOINCREMENT, company_id INTEGER UNIQUE,
+                    nse_symbol TEXT, company_name TEXT, csv_name TEXT, bse_code TEXT, accord_code TEXT,
+                    valuation_group TEXT, valuation_subgroup TEXT, cd_sector TEXT, cd_industry TEXT, sector TEXT,
+                    industry TEXT, valuation_frequency TEXT, priority INTEGER, is_active INTEGER, added_date TEXT,
+                    added_by TEXT, last_synced TEXT, alpha_config_id INTEGER);
+                CREATE TABLE vs_company_alpha_configs (id INTEGER PRIMARY KEY AUTOINCREMENT, company_id INTEGER UNIQUE,
+                    thesis_bull TEXT, thesis_bear TEXT, thesis_key_moat TEXT, alpha_drivers TEXT,
+                    sector_overrides TEXT, created_by TEXT, notes TEXT, updated_at TEXT);
+            """)
+            # 300 scrips: even ids by symbol, every 3rd also under an alternate symbol, accord codes 9000+
+            conn.executemany('INSERT INTO mssdb.kbapp_marketscrip VALUES (?, ?, ?, ?)',
+                             [(i, f"SYM{i}" if i % 2 == 0 else None, f"ALT{i}" if i % 3 == 0 else None, str(9000 + i))
+                              for i in range(1, 301)])
+            conn.execute("INSERT INTO mssdb.kbapp_marketscrip VALUES (999, 'DUPE', NULL, NULL)")
+            conn.execute("INSERT INTO mssdb.kbapp_marketscrip VALUES (998, 'DUPE', NULL, NULL)")
+            # 40 companies already present, half of them with stale data
+            for i in range(2, 82, 2):
+                conn.execute('INSERT INTO vs_active_companies (company_id, nse_symbol, company_name, csv_name, bse_code, '
+                             'accord_code, valuation_group, valuation_subgroup, cd_sector, cd_industry, sector, industry, '
+                             'valuation_frequency, is_active, last_synced) VALUES '
+                             '(?, ?, ?, ?, NULL, ?, ?, ?, NULL, NULL, ?, ?, ?, 1, ?)',
+                             (i, f"SYM{i}", f"Co {i}", f"Co {i}", str(9000 + i), 'GRP' if i % 4 else 'OLD', 'SG',
+                              'GRP' if i % 4 else 'OLD', 'SG', 'MONTHLY', '2026-01-01'))
+            conn.commit()
+
+            def snapshot():
+                return conn.execute('SELECT * FROM vs_active_companies ORDER BY company_id').fetchall()
+
+            before = snapshot()
+            rows = []
+            for i in range(1, 261):
+                symbol = f"SYM{i}" if i % 2 == 0 else (f"ALT{i}" if i % 3 == 0 else None)
+                rows.append({'Company Name': f"Co {i}", 'CD_NSE Symbol1': symbol,
+                             'Accord Code': float(9000 + i) if i % 5 else None, 'CD_Bse Scrip ID': None,
+                             'valuation_group': 'GRP', 'valuation_subgroup': 'SG', 'CD_Sector': None,
+                             'CD_Industry1': None, 'valuation_frequency': 'MONTHLY'})
+            rows.append(dict(rows[-1], **{'Company Name': 'Co 260'}))  # Same company twice
+            rows.append(dict(rows[0], **{'Company Name': 'Dupe', 'CD_NSE Symbol1': 'DUPE', 'Accord Code': None}))
+            selected = pd.DataFrame(rows)
+
+            migrator = CompanyMigrator(None, backend=SQLiteBackend(conn), chunk_size=50)
+            migrator.engine.changelog_dir = workdir
+            summary = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'errors': [], 'by_group': {}}
+            migrator.apply_selection(selected, summary)
+
+            # Resolution matches the per-query precedence: symbol, then alternate symbol, then accord code
+            expected_ids = [migrator.engine.resolve_company_ids([{'nse_symbol': r['CD_NSE Symbol1'],
+                                                                  'accord_code': r['Accord Code']}])[0] for r in rows]
+            unresolved = sum(1 for cid in expected_ids if not cid)
+            assert summary['skipped'] == unresolved and expected_ids[-1] == 998
+            distinct = {cid for cid in expected_ids if cid}
+            # Stale: the OLD-group rows (i % 4 == 0) plus rows whose accord code is now missing (10, 30, 50, 70)
+            assert summary['inserted'] == len(distinct) - 40 and summary['updated'] == 24
+            assert summary['unchanged'] == 16 and summary['duplicates'] == 1 and summary['touched'] == 16
+            assert summary['statements'] == -(-summary['inserted'] // 50) + 1 + 1  # inserts, CASE update, touch
+            stored = dict(conn.execute('SELECT company_id, accord_code FROM vs_active_companies'))
+            assert stored[10] is None and stored[6] == '9006' and 5 not in stored and len(stored) == len(distinct)
+            stale = conn.execute("SELECT COUNT(*) FROM vs_active_companies WHERE last_synced = '2026-01-01'")
+            assert stale.fetchone()[0] == 0  # No-op rows are stamped too, like the per-row path
+
+            # Re-running only stamps last_synced; reverting both runs restores the exact original table
+            again = dict(summary, inserted=0, updated=0, unchanged=0, skipped=0, errors=[], by_group={})
+            migrator.apply_selection(selected, again)
+            assert again['inserted'] == again['updated'] == 0 and again['touched'] == len(distinct)
+            assert migrator.engine.revert(again['change_log'])['restored'] == len(distinct)
+
+            # A row edited after the run is left alone (and reported) unless forced
+            conn.execute("UPDATE vs_active_companies SET valuation_group = 'PM' WHERE company_id = 4")
+            conn.commit()
+            result = migrator.engine.revert(summary['change_log'])
+            assert result['skipped'] == 1 and result['conflicts'][0]['key'] == 4
+            assert result['conflicts'][0]['columns'] == ['valuation_group']
+            assert conn.execute('SELECT valuation_group FROM vs_active_companies WHERE company_id = 4').fetchone()[0] == 'PM'
+            assert result['deleted'] == summary['inserted'] and result['restored'] == 24 + 16 - 1
+            with open(summary['change_log']) as f:
+                entries = [e for e in json.load(f)['entries'] if e['key'] == 4]
+            forced = migrator.engine.revert({'entries': entries}, force=True)
+            assert forced['restored'] == 1 and forced['skipped'] == 0 and len(forced['conflicts']) == 1
+            assert snapshot() == before
+
+            # Alpha configs: insert, link, re-run no-op
+            yaml_path = os.path.join(workdir, 'companies.yaml')
+            with open(yaml_path, 'w') as f:
+                f.write("companies:\n  a: {nse_symbol: SYM2, alpha_thesis: {bull: up}}\n"
+                        "  b: {nse_symbol: SYM4, alpha_drivers: {x: 1}}\n  c: {nse_symbol: NOPE}\n")
+            migrator.companies_yaml = Path(yaml_path)
+            alpha = migrator.migrate_pilot_alpha_configs()
+            assert alpha['migrated'] == 2 and alpha['inserted'] == 2 and alpha['linked'] == 2
+            assert len(alpha['errors']) == 1
+            linked = conn.execute('SELECT COUNT(*) FROM vs_active_companies WHERE alpha_config_id IS NOT NULL')
+            assert linked.fetchone()[0] == 2
+            alpha = migrator.migrate_pilot_alpha_configs()
+            assert alpha['unchanged'] == 2 and alpha['linked'] == 0 and alpha['change_logs'] == [None, None]
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def test_group_config_reconciler(self):
+        import shutil
+        import sqlite3
+        import tempfile
+        import yaml
+        from valuation_system.storage.bulk_migration import SQLiteBackend
+        from valuation_system.storage.sync_group_configs import GroupConfigReconciler, SECTORS_YAML, GROUP_DRIVERS
+
+        workdir = tempfile.mkdtemp()
+        try:
+            yaml_path = os.path.join(workdir, 'sectors.yaml')
+            shutil.copy(SECTORS_YAML, yaml_path)
+            conn = sqlite3.connect(':memory:')
+            conn.executescript("""
+                CREATE TABLE vs_valuation_group_configs (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    valuation_group TEXT UNIQUE, driver_config TEXT, porter_forces TEXT, terminal_assumptions TEXT,
+                    is_active INTEGER DEFAULT 1, updated_at TEXT, notes TEXT);
+                CREATE TABLE vs_drivers (id INTEGER PRIMARY KEY AUTOINCREMENT, driver_level TEXT, driver_category TEXT,
+                    driver_name TEXT, valuation_group TEXT, valuation_subgroup TEXT, company_id INTEGER,
+                    current_value TEXT, weight REAL, impact_direction TEXT, trend TEXT, updated_by TEXT,
+                    is_active INTEGER DEFAULT 1);
+                INSERT INTO vs_valuation_group_configs (valuation_group, is_active, notes) VALUES
+                    ('AUTO', 1, 'seeded'), ('NOT_CLASSIFIED', 0, 'excluded'), ('RETIRED_GROUP', 1, 'gone');
+                INSERT INTO vs_drivers (driver_level, driver_category, driver_name, valuation_group, valuation_subgroup,
+                    current_value, weight, updated_by, is_active) VALUES
+                    ('GROUP', 'COST', 'manufacturing_pmi', 'INDUSTRIALS', NULL, 'POSITIVE', 0.5, 'SEED_GROUP', 1),
+                    ('GROUP', 'COST', 'credit_growth', 'FINANCIALS', NULL, 'NEUTRAL', 0.2, 'PM', 1),
+                    ('SUBGROUP', 'DEMAND', 'dropped_driver', 'AUTO', 'AUTO_OEM', 'NEUTRAL', 0.1, 'SEED_SUBGROUP', 1),
+                    ('SUBGROUP', 'DEMAND', 'pm_driver', 'AUTO', 'AUTO_OEM', 'NEUTRAL', 0.1, 'PM', 1);
+            """)
+            # A YAML driver the PM switched off through the GSheet (updated_by='PM', is_active=0)
+            pm_off = yaml.safe_load(open(yaml_path))['sectors']['automobiles']['cost_drivers'][0]['name']
+            conn.execute("INSERT INTO vs_drivers (driver_level, driver_category, driver_name, valuation_group, "
+                         "valuation_subgroup, current_value, weight, updated_by, is_active) "
+                         "VALUES ('SUBGROUP', 'COST', ?, 'AUTO', 'AUTO_OEM', 'NEGATIVE', 0.07, 'PM', 0)", (pm_off,))
+            reconciler = GroupConfigReconciler(SQLiteBackend(conn), yaml_path=yaml_path, target='sqlite-test',
+                                               fingerprint_path=os.path.join(workdir, 'fp.json'), chunk_size=40)
+
+            def drivers():
+                return {r[0]: r[1:] for r in conn.execute(
+                    "SELECT driver_name || '@' || COALESCE(valuation_subgroup, valuation_group), weight, is_active, "
+                    "current_value, driver_category FROM vs_drivers")}
+
+            # Dry run: plan printed, nothing written, no fingerprint stored
+            report = reconciler.run(dry_run=True)
+            assert report['status'] == 'dry_run' and report['lines'] and drivers()['dropped_driver@AUTO_OEM'][1] == 1
+            assert report['group_deactivates'] == 0 and report['driver_deactivates'] == 1
+            assert report['driver_updates'] == 1 and reconciler.stored_fingerprint() is None
+            groups = len(yaml.safe_load(open(yaml_path))['valuation_groups'])
+            assert report['group_creates'] == groups - 1 and report['group_updates'] == 1
+
+            report = reconciler.run()
+            assert report['status'] == 'applied'
+            seeded = report['driver_creates'] + report['group_creates']
+            assert report['statements'] <= 2 + -(-seeded // 40) + 1
+            state = drivers()
+            # Seeder-owned: category fixed, normalised weight and current_value kept
+            assert state['manufacturing_pmi@INDUSTRIALS'] == (0.5, 1, 'POSITIVE', 'DEMAND')
+            assert state['credit_growth@FINANCIALS'] == (0.2, 1, 'NEUTRAL', 'COST')  # PM-owned: untouched
+            assert state[f"{pm_off}@AUTO_OEM"] == (0.07, 0, 'NEGATIVE', 'COST')  # PM deactivation survives
+            assert state['dropped_driver@AUTO_OEM'][1] == 0 and state['pm_driver@AUTO_OEM'][1] == 1
+            active = dict(conn.execute('SELECT valuation_group, is_active FROM vs_valuation_group_configs'))
+            assert active['RETIRED_GROUP'] == 1 and active['NOT_CLASSIFIED'] == 0 and active['AUTO'] == 1
+            assert len(active) == groups + 2
+
+            # Unchanged YAML: fingerprint short-circuit; forced: an empty plan (JSON compare is stable)
+            report = reconciler.run()
+            assert report['status'] == 'unchanged' and report['elapsed_ms'] < 100
+            assert reconciler.run(force=True)['status'] == 'in_sync'
+
+            # Groups missing from the YAML are deactivated only on request
+            report = reconciler.run(prune=True)
+            assert report['status'] == 'applied' and report['group_deactivates'] == 1 and report['driver_updates'] == 0
+            active = dict(conn.execute('SELECT valuation_group, is_active FROM vs_valuation_group_configs'))
+            assert active['RETIRED_GROUP'] == 0 and active['AUTO'] == 1
+
+            # A seeder driver back in the YAML is reactivated; a group switched off by hand stays off
+            conn.execute("UPDATE vs_drivers SET is_active = 0 WHERE driver_name = 'manufacturing_pmi'")
+            conn.execute("UPDATE vs_valuation_group_configs SET is_active = 0 WHERE valuation_group = 'AUTO'")
+            report = reconciler.run(force=True)
+            assert report['status'] == 'applied' and report['group_updates'] == 0 and report['driver_updates'] == 1
+            assert report['lines'][0].endswith('manufacturing_pmi: is_active=1'), report['lines']
+            state = drivers()
+            assert state['manufacturing_pmi@INDUSTRIALS'][1] == 1 and state[f"{pm_off}@AUTO_OEM"][1] == 0
+            active = dict(conn.execute('SELECT valuation_group, is_active FROM vs_valuation_group_configs'))
+            assert active['AUTO'] == 0
+
+            # One weight edited in the YAML → the AUTO group's driver_config; the existing driver keeps its weight
+            config = yaml.safe_load(open(yaml_path))
+            first = config['sectors']['automobiles']['demand_drivers'][0]
+            kept = drivers()[f"{first['name']}@AUTO_OEM"][0]
+            first['weight'] = 0.3333
+            with open(yaml_path, 'w') as f:
+                yaml.safe_dump(config, f, sort_keys=False)
+            report = reconciler.run()
+            assert report['status'] == 'applied' and report['statements'] == 1
+            assert report['group_updates'] == 1 and report['driver_updates'] == report['driver_creates'] == 0
+            assert report['lines'][0] == '~ GROUP AUTO: driver_config'
+            assert drivers()[f"{first['name']}@AUTO_OEM"][0] == kept
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def test_sectors_model(self):
+        import shutil
+        import tempfile
+        import time
+        import yaml
+        from valuation_system.utils import sectors_config
+        from valuation_system.utils.sectors_config import (
+            SECTORS_YAML, SectorsConfigError, get_sectors_model, snapshot_path,
+        )
+
+        workdir = tempfile.mkdtemp()
+        try:
+            yaml_path = os.path.join(workdir, 'sectors.yaml')
+            shutil.copy(SECTORS_YAML, yaml_path)
+            expected = yaml.safe_load(open(yaml_path))
+
+            # First load parses (CSafeLoader) and writes the snapshot; result identical to yaml.safe_load
+            model = get_sectors_model(yaml_path)
+            assert model.config_copy() == expected and model.raw == expected
+            assert model.config_copy() is not model.raw and os.path.exists(snapshot_path(yaml_path))
+            assert get_sectors_model(yaml_path) is model
+
+            # Indexes
+            assert model.subgroups_of('AUTO') == tuple(expected['valuation_groups']['AUTO']['subgroups'])
+            assert model.group_of('AUTO_OEM') == 'AUTO'
+            assert [d.name for d in model.drivers_for_subgroup('AUTO_OEM')] == \
+                [d['name'] for c in sectors_config.DRIVER_CATEGORIES for d in expected['sectors']['automobiles'].get(c, [])]
+            assert model.macro_link('GROUP', 'AUTO', 'commodity_prices').direction == 'INVERSE'
+            assert 'infra_logistics' in model.sectors_for_industry(' PORTS ')
+            assert set(model.active_sectors()) == {k for k, v in expected['sectors'].items() if v.get('is_active')}
+
+            # Cold process (cache cleared): snapshot reused, no YAML parse
+            sectors_config.clear_sectors_cache()
+            parse = sectors_config.yaml.load
+            sectors_config.yaml.load = None     # any parse would raise TypeError
+            try:
+                start = time.perf_counter()
+                cold = get_sectors_model(yaml_path)
+                cold_ms = (time.perf_counter() - start) * 1000
+            finally:
+                sectors_config.yaml.load = parse
+            assert cold.config_copy() == expected and cold_ms < 100, f"snapshot load {cold_ms:.1f}ms"
+
+            # Edited YAML → new stamp → reparsed; stale snapshot replaced
+            expected['valuation_groups']['AUTO']['subgroups']['AUTO_EV'] = 'automobiles'
+            with open(yaml_path, 'w') as f:
+                yaml.safe_dump(expected, f, sort_keys=False)
+            edited = get_sectors_model(yaml_path)
+            assert edited is not cold and edited.group_of('AUTO_EV') == 'AUTO'
+            assert edited.drivers_for_subgroup('AUTO_EV') == edited.drivers_for_sector('automobiles')
+
+            # Schema violations: every problem reported, previous model not cached as valid
+            expected['sectors']['automobiles']['demand_drivers'][0]['weight'] = 4
+            expected['sectors']['fmcg']['is_active'] = 'yes'
+            with open(yaml_path, 'w') as f:
+                yaml.safe_dump(expected, f, sort_keys=False)
+            try:
+                get_sectors_model(yaml_path)
+                raise AssertionError("invalid sectors.yaml accepted")
+            except SectorsConfigError as e:
+                assert 'automobiles.demand_drivers' in str(e) and 'fmcg.is_active' in str(e)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def test_streaming_excel_report(self):
+        import re
+        import shutil
+        import tempfile
+        import zipfile
+        from valuation_system.utils.excel_report import generate_valuation_excel, generate_valuation_excels
+        from valuation_system.utils.excel_report_bench import parity, synthetic_result
+
+        workdir = tempfile.mkdtemp()
+        try:
+            result = synthetic_result(3, n_peers=12, n_logs=150)
+            legacy = generate_valuation_excel(result, os.path.join(workdir, 'legacy.xlsx'), streaming=False)
+            streamed = generate_valuation_excel(result, os.path.join(workdir, 'streamed.xlsx'), streaming=True)
+            # Same sheets, same cells (values, formulas, array formulas) as the legacy writer
+            assert parity(legacy, streamed) == []
+
+            # Formulas written without an empty cached value; no leftover temp file from a rewrite
+            with zipfile.ZipFile(streamed) as z:
+                sheets = [z.read(n).decode() for n in z.namelist() if n.startswith('xl/worksheets/')]
+            assert len(sheets) == 9 and sum(x.count('<f') for x in sheets) > 50
+            assert not any(re.search(r'</f><v\s*/>|</f><v></v>', x) for x in sheets)
+            assert not os.path.exists(streamed + '.tmp')
+
+            # Hyperlinks: the streaming writer refuses them, the report falls back to the legacy writer
+            from openpyxl import Workbook, load_workbook
+            from valuation_system.utils import excel_report
+            wb = Workbook()
+            wb.active['A1'] = 'link'
+            wb.active['A1'].hyperlink = 'https://www.nseindia.com'
+            try:
+                excel_report._save_streaming(wb, os.path.join(workdir, 'refused.xlsx'))
+                assert False, "streaming writer should reject hyperlinks"
+            except ValueError:
+                pass
+            saved_build = excel_report._build_workbook
+
+            def build_with_link(wb, result):
+                saved_build(wb, result)
+                wb.worksheets[0]['A1'].hyperlink = 'https://www.nseindia.com'
+
+            excel_report._build_workbook = build_with_link
+            try:
+                linked = generate_valuation_excel(result, os.path.join(workdir, 'linked.xlsx'), streaming=True)
+            finally:
+                excel_report._build_workbook = saved_build
+            assert load_workbook(linked).worksheets[0]['A1'].hyperlink.target == 'https://www.nseindia.com'
+
+            # Comments likewise: refused by the streaming writer, kept by the legacy fallback
+            from openpyxl.comments import Comment
+            wb = Workbook()
+            wb.active['A1'] = 'noted'
+            wb.active['A1'].comment = Comment('check source', 'PM')
+            try:
+                excel_report._save_streaming(wb, os.path.join(workdir, 'refused.xlsx'))
+                assert False, "streaming writer should reject comments"
+            except ValueError:
+                pass
+
+            def build_with_comment(wb, result):
+                saved_build(wb, result)
+                wb.worksheets[0]['A1'].comment = Comment('check source', 'PM')
+
+            excel_report._build_workbook = build_with_comment
+            try:
+                noted = generate_valuation_excel(result, os.path.join(workdir, 'noted.xlsx'), streaming=True)
+            finally:
+                excel_report._build_workbook = saved_build
+            assert load_workbook(noted).worksheets[0]['A1'].comment.text == 'check source'
+
+            # Parallel mode: input order kept, colliding names de-duplicated, failures → None
+            batch = [synthetic_result(seed, n_peers=5, n_logs=20) for seed in (1, 2)]
+            batch.append(dict(batch[0]))
+            batch.append({'nse_symbol': 'BROKEN', 'relative_details': 'not-a-dict'})
+            paths = generate_valuation_excels(batch, os.path.join(workdir, 'batch'), workers=2)
+            assert [os.path.basename(p)[:7] if p else None for p in paths] == ['syn0001', 'syn0002', 'syn0001', None]
+            assert len(set(paths[:3])) == 3 and all(os.path.getsize(p) > 0 for p in paths[:3])
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def test_warm_job_workers(self):
+        import time as _time
+        import asyncio
+        import importlib
+        import logging
+        from valuation_system.api import job_workers
+        from valuation_system.api.job_workers import JobWorkerPool, WarmDataPlane
+        from valuation_system.scheduler import runner
+
+        # Importing the runner in-process must not touch the host's root logging
+        root = logging.getLogger()
+        handlers, level = list(root.handlers), root.level
+        importlib.reload(runner)
+        assert root.handlers == handlers and root.level == level
+
+        built = []
+
+        class FakeLoader:
+            def __init__(self):
+                built.append(type(self).__name__)
+                self.df = object()
+
+        fakes = {name: type(name, (FakeLoader,), {}) for name in ('CoreDataLoader', 'PriceLoader', 'DamodaranLoader')}
+        saved = {name: getattr(job_workers, name) for name in fakes}
+        saved_runner = {name: getattr(runner, name) for name in ('run_hourly', 'run_valuation')}
+        signatures = {'core': ('a', 1), 'prices': ('p', 1), 'damodaran': ('d', 1)}
+        pool = None
+        try:
+            for name, fake in fakes.items():
+                setattr(job_workers, name, fake)
+            plane = WarmDataPlane(check_interval=0)
+            plane._current_signatures = lambda: dict(signatures)
+
+            # First use loads everything; unchanged sources → no reload; one changed file → one loader
+            assert sorted(plane.refresh()) == ['core', 'damodaran', 'prices'] and plane.generation == 1
+            assert plane.refresh() == [] and len(built) == 3
+            core_before, prices_before = plane.core_loader, plane.price_loader
+            signatures['core'] = ('a', 2)
+            generation, core, prices, _ = plane.get_loaders()
+            assert generation == 2 and core is not core_before and prices is prices_before
+            assert plane.stats()['reload_counts'] == {'core': 2, 'prices': 1, 'damodaran': 1}
+
+            # Reload failure keeps the loaders already in service
+            fakes['CoreDataLoader'].__init__ = lambda self: (_ for _ in ()).throw(IOError('csv gone'))
+            signatures['core'] = ('a', 3)
+            assert plane.refresh() == [] and plane.core_loader is core and plane.generation == 2
+
+            class FakeDB:
+                def query_one(self, sql, params=None):
+                    return None
+
+            class FakeOrchestrator:
+                valuator = news_scanner = 'up'
+
+                def __init__(self):
+                    self.mysql = FakeDB()
+                    self.swaps = []
+
+                def swap_data_loaders(self, *loaders):
+                    self.swaps.append(loaders)
+
+            orch = FakeOrchestrator()
+            pool = JobWorkerPool(data_plane=plane, max_workers=1, ttl=3600, retry_after=0)
+            pool._local.orchestrator, pool._local.generation = orch, 1
+            pool._local.built_at, pool._local.config = _time.monotonic(), job_workers._config_signature()
+            runner.run_hourly = lambda orch=None: {'orch': orch}
+            runner.run_valuation = lambda symbol=None, orch=None: {'symbol': symbol, 'error': 'no data'}
+
+            # Run on the calling thread: stale generation → loaders swapped on the warm orchestrator
+            result = pool.run_job('hourly')
+            assert result['orch'] is orch and result['status'] == 'COMPLETED' and result['worker_mode'] == 'warm'
+            assert orch.swaps == [(plane.core_loader, plane.price_loader, plane.damodaran_loader)]
+            assert pool.run_job('on-demand', {'company_id': 7})['status'] == 'FAILED'
+            assert pool.run_job('on-demand', {'symbol': 'X'})['status'] == 'FAILED' and pool.running == 0
+            assert len(orch.swaps) == 1
+            assert not pool.supports('weekly') and pool.supports('portfolio')
+            try:
+                pool.run_job('weekly')
+                raise AssertionError("unsupported job type ran in-process")
+            except ValueError:
+                pass
+
+            # Degraded (MySQL was down at build) → rebuilt on the next job; a failed rebuild keeps the old one
+            builds = []
+            pool._build_orchestrator = lambda *loaders: builds.append(FakeOrchestrator()) or builds[-1]
+            orch.mysql = None
+            assert pool.run_job('hourly')['orch'] is builds[0] and len(builds) == 1
+            assert pool.run_job('hourly')['orch'] is builds[0] and len(builds) == 1  # Healthy: reused
+            pool.ttl = 0  # Expired: rebuilt
+            assert pool.run_job('hourly')['orch'] is builds[1]
+
+            def broken(*loaders):
+                raise RuntimeError('LLM client init failed')
+
+            pool._build_orchestrator = broken
+            assert pool.run_job('hourly')['orch'] is builds[1]
+            pool.ttl = 3600
+            pool._build_orchestrator = lambda *loaders: builds.append(FakeOrchestrator()) or builds[-1]
+            pool._local.config = ('stale',)  # sectors.yaml / companies.yaml changed
+            assert pool.run_job('hourly')['orch'] is builds[2]
+
+            # submit() runs the job on a pool thread without blocking the event loop
+            pool._orchestrator = lambda: orch
+            assert asyncio.run(pool.submit('hourly'))['orch'] is orch
+        finally:
+            for name, original in saved.items():
+                setattr(job_workers, name, original)
+            for name, original in saved_runner.items():
+                setattr(runner, name, original)
+            if pool:
+                pool.shutdown()
+
     # =========================================================================
     # CONFIGURATION TESTS
     # =========================================================================
@@ -0,0 +1,320 @@
+"""
+Activity Log Sink - buffered background writer for vs_agent_activity_log.
+
+StructuredLogger used to INSERT one row per log call on the caller's thread,
+so hot loops paid a DB round-trip per line and a slow DB stalled the agent.
+The sink decouples the two:
+
+- submit() puts the row on a bounded in-memory queue and returns immediately
+  (queue full → the row is dropped and counted, never blocks the caller)
+- A daemon thread drains the queue and writes multi-row INSERTs, flushing
+  when batch_size rows are waiting or flush_interval seconds have passed
+- MySQL unreachable → the batch is spilled to a local JSONL file and the DB
+  is left alone for retry_after seconds; the first successful write after
+  that replays the spill file
+- A batch rejected for its data (e.g. an invalid status ENUM) is retried row
+  by row; rows that still fail go to a quarantine JSONL file instead of
+  marking the DB down, so one bad row cannot block the batch or the replay
+- flush() drains synchronously; close() is registered with atexit so
+  buffered rows are written (or spilled) at interpreter exit
+
+One sink per MySQL client is shared by every StructuredLogger (get_sink).
+
+Usage:
+    sink = get_sink(mysql_client)
+    sink.submit((timestamp, agent, cycle_type, action, metrics_json, elapsed_ms, status, error))
+    sink.flush()
+    sink.stats  # {'queue_depth': 0, 'enqueued': ..., 'written': ..., 'dropped': ..., 'spilled': ...}
+
+Config (.env):
+    ACTIVITY_LOG_QUEUE_SIZE=10000
+    ACTIVITY_LOG_BATCH_SIZE=200
+    ACTIVITY_LOG_FLUSH_SECONDS=2.0
+    ACTIVITY_LOG_RETRY_SECONDS=30
+    ACTIVITY_LOG_SPILL_PATH=valuation_system/data/state/activity_log_spill.jsonl
+    ACTIVITY_LOG_QUARANTINE_PATH=valuation_system/data/state/activity_log_quarantine.jsonl
+
+Edge Cases:
+- Rows keep their own log timestamp, so buffering does not shift them in time
+- Spill replay claims the file with an atomic rename; rows that fail to
+  replay are appended back for the next attempt
+- flush() from inside the writer thread is a no-op (would deadlock)
+- flush()/close() wait at most their timeout for queue space, so a stalled
+  writer cannot hang interpreter exit
+- Connection-type errors (ConnectionError/TimeoutError, DB-API
+  OperationalError/InterfaceError) mean "DB down"; any other error is
+  treated as a data error for the rows involved
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = int(os.getenv('ACTIVITY_LOG_QUEUE_SIZE', '10000'))
+BATCH_SIZE = int(os.getenv('ACTIVITY_LOG_BATCH_SIZE', '200'))
+FLUSH_SECONDS = float(os.getenv('ACTIVITY_LOG_FLUSH_SECONDS', '2.0'))
+RETRY_SECONDS = float(os.getenv('ACTIVITY_LOG_RETRY_SECONDS', '30'))
+SPILL_PATH = os.getenv(
+    'ACTIVITY_LOG_SPILL_PATH',
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'state', 'activity_log_spill.jsonl')
+)
+QUARANTINE_PATH = os.getenv(
+    'ACTIVITY_LOG_QUARANTINE_PATH',
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'state', 'activity_log_quarantine.jsonl')
+)
+
+COLUMNS = ('timestamp', 'agent_name', 'cycle_type', 'action', 'metrics', 'elapsed_ms', 'status', 'error_message')
+_CONNECTION_ERRORS = ('OperationalError', 'InterfaceError', 'PoolError')  # DB-API / mysql.connector names
+
+
+def _is_connection_error(error: Exception) -> bool:
+    """True if the DB itself is unavailable (as opposed to rejecting the rows)."""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return any(cls.__name__ in _CONNECTION_ERRORS for cls in type(error).__mro__)
+
+
+class _Flush:
+    """Queue marker: write everything before it, then set done."""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class ActivityLogSink:
+    """Bounded queue + background multi-row writer with local spill/replay."""
+
+    def __init__(self, mysql_client, queue_size: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_SECONDS, retry_after: float = RETRY_SECONDS,
+                 spill_path: str = SPILL_PATH, quarantine_path: str = None):
+        self.mysql = mysql_client
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.retry_after = retry_after
+        self.spill_path = spill_path
+        if quarantine_path is None:
+            # Next to a custom spill file; the configured path otherwise
+            quarantine_path = (QUARANTINE_PATH if spill_path == SPILL_PATH
+                               else os.path.splitext(spill_path)[0] + '.quarantine.jsonl')
+        self.quarantine_path = quarantine_path
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self._down_until = 0.0
+        self._spill_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._closed = False
+        self.counters = {'enqueued': 0, 'written': 0, 'dropped': 0, 'spilled': 0, 'replayed': 0,
+                         'quarantined': 0, 'statements': 0, 'write_errors': 0, 'max_queue_depth': 0}
+        self._thread = threading.Thread(target=self._run, daemon=True, name='activity-log-sink')
+        self._thread.start()
+        atexit.register(self.close)
+
+    # -------------------------------------------------------------------------
+    # Producer side
+    # -------------------------------------------------------------------------
+
+    def submit(self, row: Sequence) -> bool:
+        """Enqueue one row (COLUMNS order). False if it was dropped."""
+        if self._closed:
+            self._count('dropped')
+            return False
+        try:
+            self._queue.put_nowait(tuple(row))
+        except queue.Full:
+            self._count('dropped')
+            return False
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            self.counters['enqueued'] += 1
+            if depth > self.counters['max_queue_depth']:
+                self.counters['max_queue_depth'] = depth
+        return True
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Block until everything submitted so far is written or spilled."""
+        if threading.current_thread() is self._thread or not self._thread.is_alive():
+            return False
+        marker = _Flush()
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(marker, timeout=timeout)  # Waits for space: a flush must not be dropped
+        except queue.Full:
+            logger.warning(f"Activity log flush timed out after {timeout}s waiting for queue space")
+            return False
+        return marker.done.wait(max(0.0, deadline - time.monotonic()))
+
+    def close(self, timeout: float = 30.0):
+        """Flush and stop the writer (idempotent; registered with atexit)."""
+        if self._closed:
+            return
+        deadline = time.monotonic() + timeout
+        self.flush(timeout)
+        self._closed = True
+        try:
+            self._queue.put(None, timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Full:
+            logger.warning(f"Activity log sink closed with {self._queue.qsize()} rows unwritten")
+            return  # Daemon thread: it dies with the interpreter
+        self._thread.join(max(0.0, deadline - time.monotonic()))
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self.counters, queue_depth=self._queue.qsize())
+
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self.counters[key] += n
+
+    # -------------------------------------------------------------------------
+    # Writer thread
+    # -------------------------------------------------------------------------
+
+    def _run(self):
+        batch: List[tuple] = []
+        last_flush = time.monotonic()
+        while True:
+            wait = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                item = self._queue.get(timeout=wait)
+            except queue.Empty:
+                item = False  # Interval elapsed
+
+            if isinstance(item, tuple):
+                batch.append(item)
+                if len(batch) < self.batch_size:
+                    continue
+            if batch:
+                self._write(batch)
+                batch = []
+            last_flush = time.monotonic()
+            if isinstance(item, _Flush):
+                item.done.set()
+            elif item is None:
+                return
+
+    def _write(self, rows: List[tuple]):
+        if time.monotonic() < self._down_until:
+            self._spill(rows)
+            return
+        written, done, error = self._store(rows)
+        self._count('written', written)
+        if error is not None:
+            self._count('write_errors')
+            self._down_until = time.monotonic() + self.retry_after
+            logger.warning(f"Activity log write failed ({error}); spilling {len(rows) - done} rows "
+                           f"to {self.spill_path}")
+            self._spill(rows[done:])
+            return
+        self._replay()
+
+    def _store(self, rows: List[tuple]) -> Tuple[int, int, Optional[Exception]]:
+        """
+        Insert rows in batch_size chunks. A chunk rejected for its data is retried
+        row by row and the rows that still fail are quarantined.
+        Stops at the first connection error.
+        Returns (rows written, rows handled = written + quarantined, connection error or None).
+        """
+        written = done = 0
+        for start in range(0, len(rows), self.batch_size):
+            chunk = rows[start:start + self.batch_size]
+            try:
+                self._insert(chunk)
+                written += len(chunk)
+                done += len(chunk)
+                continue
+            except Exception as e:
+                if _is_connection_error(e):
+                    return written, done, e
+                logger.warning(f"Activity log batch rejected ({e}); retrying {len(chunk)} rows one by one")
+            for row in chunk:
+                try:
+                    self._insert([row])
+                    written += 1
+                except Exception as e:
+                    if _is_connection_error(e):
+                        return written, done, e
+                    self._quarantine(row, e)
+                done += 1
+        return written, done, None
+
+    def _insert(self, rows: List[tuple]):
+        for start in range(0, len(rows), self.batch_size):
+            chunk = rows[start:start + self.batch_size]
+            placeholders = ', '.join(['(' + ', '.join(['%s'] * len(COLUMNS)) + ')'] * len(chunk))
+            self.mysql.execute(
+                f"INSERT INTO vs_agent_activity_log ({', '.join(COLUMNS)}) VALUES {placeholders}",
+                tuple(v for row in chunk for v in row)
+            )
+            self._count('statements')
+
+    def _spill(self, rows: List[tuple]):
+        try:
+            with self._spill_lock:
+                os.makedirs(os.path.dirname(os.path.abspath(self.spill_path)), exist_ok=True)
+                with open(self.spill_path, 'a') as f:
+                    for row in rows:
+                        f.write(json.dumps(row, default=str) + '\n')
+            self._count('spilled', len(rows))
+        except OSError as e:
+            self._count('dropped', len(rows))
+            logger.error(f"Activity log spill failed, {len(rows)} rows lost: {e}")
+
+    def _quarantine(self, row: tuple, error: Exception):
+        """Set aside a row the DB rejects on its own (never replayed automatically)."""
+        try:
+            with self._spill_lock:
+                os.makedirs(os.path.dirname(os.path.abspath(self.quarantine_path)), exist_ok=True)
+                with open(self.quarantine_path, 'a') as f:
+                    f.write(json.dumps({'row': row, 'error': str(error)}, default=str) + '\n')
+            self._count('quarantined')
+            logger.error(f"Activity log row quarantined to {self.quarantine_path}: {error}")
+        except OSError as e:
+            self._count('dropped')
+            logger.error(f"Activity log quarantine failed, row lost: {e}")
+
+    def _replay(self):
+        """Write spilled rows back to MySQL after a successful write."""
+        if not os.path.exists(self.spill_path):
+            return
+        claimed = f"{self.spill_path}.{os.getpid()}.replay"
+        with self._spill_lock:
+            try:
+                os.replace(self.spill_path, claimed)
+            except FileNotFoundError:
+                return  # Another process claimed it
+        with open(claimed) as f:
+            rows = [tuple(json.loads(line)) for line in f if line.strip()]
+        written, done, error = self._store(rows)
+        self._count('replayed', written)
+        if error is not None:
+            self._down_until = time.monotonic() + self.retry_after
+            logger.warning(f"Activity log replay failed ({error}); keeping {len(rows) - done} rows spilled")
+            self._spill(rows[done:])
+        else:
+            logger.info(f"Activity log: replayed {written} spilled rows")
+        os.remove(claimed)
+
+
+_sinks: Dict[int, ActivityLogSink] = {}
+_sinks_lock = threading.Lock()
+
+
+def get_sink(mysql_client, **kwargs) -> ActivityLogSink:
+    """Process-wide sink for mysql_client (created on first use)."""
+    with _sinks_lock:
+        sink = _sinks.get(id(mysql_client))
+        if sink is None or sink._closed:
+            sink = ActivityLogSink(mysql_client, **kwargs)
+            _sinks[id(mysql_client)] = sink
+        return sink
@@ -0,0 +1,326 @@
+"""
+Company Mention Matcher
+Aho-Corasick automaton over company names, NSE symbols and aliases for the
+whole listed universe (~18k companies), scanned in one linear pass per headline.
+
+Pattern kinds (confidence):
+    name     1.00  full name, legal suffix stripped ("TATA MOTORS")      word-bounded
+    symbol   0.90  NSE symbol ("EICHERMOT")                              word-bounded
+    alias    0.85  vs_active_companies company_name / csv_name variants  word-bounded
+    short    0.80  name minus a generic tail ("AETHER" from Aether Industries);
+                   never ends on a connector ("BANK OF" from Bank of India
+                   would match Bank of America / Bank of Japan)
+    keyword  0.50  first word of name, >= 5 chars, plain substring (legacy rule)
+
+symbol and keyword reproduce the old regex logic in
+NewsScannerAgent._extract_company_from_headline exactly: \\b on both sides of
+the upper-cased symbol; ' Limited'/' Ltd'/' Pvt' removed before taking the
+first word; names shorter than 5 chars skipped. Ranking differs on purpose:
+the old fallback returned the first symbol hit before trying names, best()
+ranks by confidence, so a full-name mention (1.00) beats a symbol (0.90).
+
+The compiled matcher is cached per process and its source rows on disk
+(data/cache/company_matcher.pkl), keyed by a fingerprint of
+vs_active_companies + the marketscrip universe — it is rebuilt only when
+those change.
+
+Config (.env):
+    COMPANY_MATCHER_CHECK_SECONDS=300   # min interval between fingerprint checks
+"""
+
+import os
+import time
+import pickle
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
+
+CACHE_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'cache', 'company_matcher.pkl')
+CHECK_SECONDS = float(os.getenv('COMPANY_MATCHER_CHECK_SECONDS', 300))
+
+CONFIDENCE = {'name': 1.0, 'symbol': 0.9, 'alias': 0.85, 'short': 0.8, 'keyword': 0.5}
+_BOUNDED_KINDS = ('name', 'symbol', 'alias', 'short')
+
+_LEGAL_SUFFIXES = {'LIMITED', 'LTD', 'PVT', 'PRIVATE'}
+_GENERIC_TAILS = {'INDUSTRIES', 'INDUSTRY', 'CORPORATION', 'CORP', 'COMPANY', 'CO',
+                  'ENTERPRISES', 'HOLDINGS', '(INDIA)', 'INDIA'}
+# A short variant ending on one of these is a fragment, not a name
+_CONNECTORS = {'OF', 'AND', '&', 'THE', 'FOR', 'IN'}
+
+_UNIVERSE_SQL = """
+    SELECT m.marketscrip_id AS company_id, m.symbol, m.name,
+           ac.company_name, ac.csv_name
+    FROM mssdb.kbapp_marketscrip m
+    LEFT JOIN vs_active_companies ac ON ac.company_id = m.marketscrip_id
+    WHERE m.scrip_type IN ('', 'EQS')
+      AND m.symbol IS NOT NULL
+      AND m.symbol != ''
+      AND m.name IS NOT NULL
+    ORDER BY LENGTH(m.name) DESC
+"""
+
+_FINGERPRINT_SQL = """
+    SELECT (SELECT COUNT(*) FROM vs_active_companies) AS active_rows,
+           (SELECT MAX(id) FROM vs_active_companies) AS active_max_id,
+           (SELECT MAX(last_synced) FROM vs_active_companies) AS active_synced,
+           (SELECT COUNT(*) FROM mssdb.kbapp_marketscrip WHERE scrip_type IN ('', 'EQS')) AS universe_rows
+"""
+
+
+def _is_word_char(ch: str) -> bool:
+    """Same character class as regex \\w on str."""
+    return ch.isalnum() or ch == '_'
+
+
+def _strip_legal_suffix(name_upper: str) -> str:
+    """'AETHER INDUSTRIES LTD.' -> 'AETHER INDUSTRIES'."""
+    words = name_upper.replace(',', ' ').split()
+    while words and words[-1].strip('.') in _LEGAL_SUFFIXES:
+        words.pop()
+    return ' '.join(words)
+
+
+def _legacy_keyword(name: str) -> Optional[str]:
+    """First-word keyword exactly as the old regex fallback derived it."""
+    if not name or len(name) < 5:
+        return None
+    name_parts = name.replace(' Limited', '').replace(' Ltd', '').replace(' Pvt', '')
+    name_clean = name_parts.split()[0] if name_parts.split() else name
+    return name_clean.upper() if len(name_clean) >= 5 else None
+
+
+@dataclass
+class CompanyMatch:
+    company_id: int
+    symbol: str
+    name: str
+    start: int
+    end: int
+    kind: str
+    confidence: float
+    rank: int  # Position in the universe (longer names first), legacy tie-break
+
+
+class AhoCorasick:
+    """Minimal Aho-Corasick automaton: add() patterns, build(), then iter_matches()."""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[list] = [[]]
+        self._out_link: List[int] = [0]  # Nearest fail-ancestor that has outputs
+        self._built = False
+
+    def add(self, pattern: str, value):
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._out_link.append(0)
+            node = nxt
+        self._out[node].append(value)
+        self._built = False
+
+    def build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                link = self._fail[child]
+                self._out_link[child] = link if self._out[link] else self._out_link[link]
+        self._built = True
+
+    def __len__(self):
+        return len(self._goto)
+
+    def iter_matches(self, text: str):
+        """Yield (end_index_exclusive, value) for every pattern occurrence."""
+        if not self._built:
+            self.build()
+        goto, fail, out, out_link = self._goto, self._fail, self._out, self._out_link
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            hit = node if out[node] else out_link[node]
+            while hit:
+                for value in out[hit]:
+                    yield i + 1, value
+                hit = out_link[hit]
+
+
+class CompanyMatcher:
+    """Headline → companies mentioned, with spans and confidence."""
+
+    def __init__(self, rows: List[dict]):
+        self.rows = rows
+        self.companies: List[Tuple[int, str, str]] = []
+        self.automaton = AhoCorasick()
+        self.pattern_count = 0
+        for rank, row in enumerate(rows):
+            self._add_company(rank, row)
+        self.automaton.build()
+
+    def _add_company(self, rank: int, row: dict):
+        symbol = (row.get('symbol') or '').strip()
+        name = (row.get('name') or '').strip()
+        self.companies.append((row['company_id'], symbol, name))
+
+        # Same text may carry several kinds (symbol == name); each is kept so
+        # kind-filtered lookups behave like the rule they reproduce
+        patterns = set()
+
+        def put(text: str, kind: str):
+            text = ' '.join(text.split())
+            if text:
+                patterns.add((text, kind))
+
+        if symbol:
+            put(symbol.upper(), 'symbol')
+        if name:
+            full = _strip_legal_suffix(name.upper())
+            if len(full) >= 5:
+                put(full, 'name')
+            words = full.split()
+            while len(words) > 1 and words[-1] in _GENERIC_TAILS:
+                words.pop()
+                if words[-1] in _CONNECTORS:
+                    break
+                short = ' '.join(words)
+                if len(short) >= 5:
+                    put(short, 'short')
+        for alias_field in ('company_name', 'csv_name'):
+            alias = _strip_legal_suffix((row.get(alias_field) or '').upper())
+            if len(alias) >= 5:
+                put(alias, 'alias')
+
+        keyword = _legacy_keyword(name)
+        if keyword:
+            patterns.add((keyword, 'keyword'))
+        for text, kind in sorted(patterns):
+            self.automaton.add(text, (len(text), rank, kind))
+            self.pattern_count += 1
+
+    def find(self, text: str) -> List[CompanyMatch]:
+        """All pattern occurrences in text (one pass), boundary rules applied."""
+        if not text:
+            return []
+        upper = text.upper()
+        n = len(upper)
+        matches = []
+        for end, (length, rank, kind) in self.automaton.iter_matches(upper):
+            start = end - length
+            if kind in _BOUNDED_KINDS:
+                # \b semantics: word/non-word transition at both edges
+                before = _is_word_char(upper[start - 1]) if start > 0 else False
+                after = _is_word_char(upper[end]) if end < n else False
+                if before == _is_word_char(upper[start]) or after == _is_word_char(upper[end - 1]):
+                    continue
+            company_id, symbol, name = self.companies[rank]
+            matches.append(CompanyMatch(company_id, symbol, name, start, end, kind,
+                                        CONFIDENCE[kind], rank))
+        return matches
+
+    def match_companies(self, text: str, kinds: Tuple[str, ...] = None) -> List[CompanyMatch]:
+        """Best match per company, highest confidence first (ties: legacy rank)."""
+        best: Dict[int, CompanyMatch] = {}
+        for m in self.find(text):
+            if kinds and m.kind not in kinds:
+                continue
+            current = best.get(m.rank)
+            if current is None or (m.confidence, -m.start) > (current.confidence, -current.start):
+                best[m.rank] = m
+        return sorted(best.values(), key=lambda m: (-m.confidence, m.rank))
+
+    def best(self, text: str, kinds: Tuple[str, ...] = None) -> Optional[CompanyMatch]:
+        matches = self.match_companies(text, kinds)
+        return matches[0] if matches else None
+
+
+# =========================================================================
+# PROCESS-WIDE CACHE
+# =========================================================================
+
+_cache = {'matcher': None, 'fingerprint': None, 'checked_at': 0.0}
+_cache_lock = threading.Lock()
+
+
+def _fingerprint(mysql_client) -> str:
+    row = mysql_client.query_one(_FINGERPRINT_SQL) or {}
+    return '|'.join(str(row.get(k)) for k in
+                    ('active_rows', 'active_max_id', 'active_synced', 'universe_rows'))
+
+
+def get_company_matcher(mysql_client, force: bool = False,
+                        cache_file: str = CACHE_FILE) -> Optional[CompanyMatcher]:
+    """
+    Shared matcher for the whole universe. Cheap after the first call: the
+    fingerprint is re-checked at most every COMPANY_MATCHER_CHECK_SECONDS and
+    the automaton is rebuilt only when it changes.
+    """
+    with _cache_lock:
+        now = time.monotonic()
+        if not force and _cache['matcher'] is not None and now - _cache['checked_at'] < CHECK_SECONDS:
+            return _cache['matcher']
+        _cache['checked_at'] = now
+
+        try:
+            fingerprint = _fingerprint(mysql_client)
+        except Exception as e:
+            logger.warning(f"Company matcher fingerprint failed, keeping current matcher: {e}")
+            return _cache['matcher']
+        if not force and _cache['matcher'] is not None and fingerprint == _cache['fingerprint']:
+            return _cache['matcher']
+
+        rows = None
+        if not force and cache_file and os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'rb') as f:
+                    cached = pickle.load(f)
+                if cached.get('fingerprint') == fingerprint:
+                    rows = cached['rows']
+            except Exception as e:
+                logger.debug(f"Ignoring unreadable company matcher cache: {e}")
+
+        if rows is None:
+            try:
+                rows = mysql_client.query(_UNIVERSE_SQL)
+            except Exception as e:
+                logger.warning(f"Company universe load failed, keeping current matcher: {e}")
+                return _cache['matcher']
+            if cache_file:
+                try:
+                    os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+                    tmp = cache_file + '.tmp'
+                    with open(tmp, 'wb') as f:
+                        pickle.dump({'fingerprint': fingerprint, 'rows': rows}, f)
+                    os.replace(tmp, cache_file)
+                except Exception as e:
+                    logger.debug(f"Failed to write company matcher cache: {e}")
+
+        start = time.perf_counter()
+        matcher = CompanyMatcher(rows)
+        _cache.update(matcher=matcher, fingerprint=fingerprint)
+        logger.info(f"Company matcher built: {len(rows)} companies, {matcher.pattern_count} patterns "
+                    f"in {time.perf_counter() - start:.2f}s")
+        return matcher
@@ -10,6 +10,8 @@ import logging
 import yaml
 from dotenv import load_dotenv
 
+from valuation_system.utils.sectors_config import get_sectors_model
+
 logger = logging.getLogger(__name__)
 
 _CONFIG_DIR = os.path.join(os.path.dirname(__file__), '..', 'config')
@@ -17,11 +19,12 @@ load_dotenv(os.path.join(_CONFIG_DIR, '.env'))
 
 
 def load_sectors_config() -> dict:
-    """Load sectors.yaml configuration."""
-    path = os.path.join(_CONFIG_DIR, 'sectors.yaml')
-    with open(path, 'r') as f:
-        config = yaml.safe_load(f)
-    logger.info(f"Loaded sectors config: {len(config.get('sectors', {}))} sectors")
+    """
+    Load sectors.yaml configuration (caller-owned copy of the compiled,
+    validated model; parsed only when the file changes, see sectors_config).
+    """
+    config = get_sectors_model(os.path.join(_CONFIG_DIR, 'sectors.yaml')).config_copy()
+    logger.debug(f"Loaded sectors config: {len(config.get('sectors', {}))} sectors")
     return config
 
 
@@ -0,0 +1,214 @@
+"""
+Company Driver Panel Benchmark
+Full-universe runtime of the per-company driver path
+(precompute_subgroup_medians + compute_all_drivers per company) vs the panel
+path (compute_panel), plus a full parity diff between the two.
+
+The universe is synthetic but shaped like the core CSV: annual / quarterly /
+half-yearly series with gaps, zeros, negatives and short histories, some
+companies without prices or financials, excluded subgroups and duplicate
+csv_names. Prices come from a real PriceLoader over a temporary CSV; the core
+loader borrows CoreDataLoader's TTM / CAGR / latest-value helpers.
+
+Usage:
+    python -m valuation_system.utils.driver_panel_bench --companies 3000 --seed 7
+
+Edge Cases:
+- Every company with an NSE symbol has price rows, so no lookup falls through
+  to Yahoo
+- Duplicate csv_names are left out of the parity diff (the per-company path
+  keeps one market-share aggregate per name)
+"""
+
+import os
+import time
+import random
+import logging
+import argparse
+import tempfile
+from collections import Counter
+from typing import Dict, List
+
+import pandas as pd
+
+from valuation_system.data.loaders.core_loader import CoreDataLoader
+from valuation_system.data.loaders.price_loader import PriceLoader
+from valuation_system.data.processors.company_driver_calculator import CompanyDriverCalculator
+from valuation_system.data.processors.company_driver_panel import diff_driver_lists
+
+logger = logging.getLogger(__name__)
+
+YEARS = list(range(2013, 2025))
+QUARTERS = list(range(1, 41))
+HALVES = [(y, h) for y in range(2019, 2025) for h in (1, 2)]
+
+
+class SyntheticCore:
+    """get_company_financials from an in-memory dict; series helpers are CoreDataLoader's own."""
+
+    get_ttm = CoreDataLoader.get_ttm
+    calculate_cagr = CoreDataLoader.calculate_cagr
+    get_latest_value = CoreDataLoader.get_latest_value
+
+    def __init__(self, financials: Dict[str, dict]):
+        self.financials = financials
+        self.calls = 0
+
+    def get_company_financials(self, csv_name: str) -> dict:
+        self.calls += 1
+        return self.financials.get(csv_name, {})
+
+
+class BenchCalculator(CompanyDriverCalculator):
+    """No MySQL: fixed GDP growth."""
+
+    def _load_gdp_growth(self):
+        self._gdp_growth = 6.5
+
+
+def _keys(rng: random.Random, full: list, min_len: int = 0) -> list:
+    n = rng.randint(min_len, len(full))
+    start = rng.randint(0, len(full) - n)
+    return [k for k in full[start:start + n] if rng.random() > 0.08]
+
+
+def _series(rng: random.Random, keys: list, lo: float, hi: float, p_zero=0.03, p_neg=0.1) -> dict:
+    out = {}
+    for k in keys:
+        r = rng.random()
+        value = round(rng.uniform(lo, hi), 2)
+        out[k] = 0.0 if r < p_zero else (-value if r < p_zero + p_neg else value)
+    return out
+
+
+def _maybe(rng: random.Random, series: dict, p_empty: float = 0.1) -> dict:
+    return {} if rng.random() < p_empty else series
+
+
+def synthetic_financials(rng: random.Random) -> dict:
+    years = _keys(rng, YEARS, 1)
+    quarters = _keys(rng, QUARTERS, 2)
+    scale = rng.choice([10, 100, 1000, 10000])
+    fin = {
+        'sales_annual': _series(rng, years, scale, scale * 3, p_neg=0.02),
+        'pbidt_annual': _maybe(rng, _series(rng, years, scale * 0.05, scale * 0.4)),
+        'pat_annual': _maybe(rng, _series(rng, years, scale * 0.02, scale * 0.2, p_neg=0.15)),
+        'pbt_excp_yearly': _maybe(rng, _series(rng, years, scale * 0.03, scale * 0.3)),
+        'interest_yearly': _maybe(rng, _series(rng, years, 0, scale * 0.05, p_neg=0)),
+        'debt': _maybe(rng, _series(rng, years, 0, scale * 2, p_neg=0)),
+        'networth': _maybe(rng, _series(rng, years, scale * 0.2, scale * 3, p_neg=0.05)),
+        'total_assets': _maybe(rng, _series(rng, years, scale, scale * 5, p_neg=0)),
+        'pur_of_fixed_assets': _maybe(rng, _series(rng, _keys(rng, years), scale * 0.01, scale * 0.5, p_neg=0.6)),
+        'cashflow_ops_yearly': _maybe(rng, _series(rng, years, scale * 0.01, scale * 0.4, p_neg=0.2)),
+        'roce': _maybe(rng, _series(rng, years, 1, 40)),
+        'roe': _maybe(rng, _series(rng, years, 1, 35)),
+        'gpm': _maybe(rng, _series(rng, years, 5, 60, p_neg=0)),
+        'cash_conversion_cycle': _maybe(rng, _series(rng, years, 5, 200, p_neg=0.1)),
+        'inventories': _maybe(rng, _series(rng, years, 0, scale, p_neg=0)),
+        'sundry_debtors': _maybe(rng, _series(rng, years, 0, scale, p_neg=0)),
+        'tot_liab': _maybe(rng, _series(rng, years, 0, scale * 2, p_neg=0)),
+        'sales_quarterly': _series(rng, quarters, scale / 4, scale, p_neg=0.02),
+        'pbidt_quarterly': _maybe(rng, _series(rng, quarters, scale * 0.01, scale * 0.1, p_zero=0.05)),
+        'pat_quarterly': _maybe(rng, _series(rng, quarters, scale * 0.005, scale * 0.05, p_neg=0.2)),
+        'interest_quarterly': _maybe(rng, _series(rng, quarters, 0, scale * 0.01, p_neg=0), 0.3),
+        'employee_cost_quarterly': _maybe(rng, _series(rng, quarters, scale * 0.01, scale * 0.1, p_neg=0)),
+        'promoter_holding_quarterly': _maybe(rng, _series(rng, quarters, 20, 75, p_neg=0)),
+        'promoter_pledged_quarterly': _maybe(rng, _series(rng, quarters, 0, 40, p_neg=0, p_zero=0.5), 0.4),
+        'pledgebypromoter_quarterly': _maybe(rng, _series(rng, quarters, 0, 40, p_neg=0, p_zero=0.4), 0.6),
+        'debt_equity_quarterly': _maybe(rng, _series(rng, _keys(rng, QUARTERS), 0, 3, p_neg=0), 0.5),
+        'roe_3yr_quarterly': _maybe(rng, _series(rng, _keys(rng, QUARTERS), 2, 30), 0.5),
+        'number_employees_quarterly': _maybe(rng, _series(rng, quarters, 50, 50000, p_neg=0, p_zero=0.05), 0.5),
+        'inventories_hy': _maybe(rng, _series(rng, _keys(rng, HALVES), 0, scale, p_neg=0), 0.4),
+        'sundry_debtors_hy': _maybe(rng, _series(rng, _keys(rng, HALVES), 0, scale, p_neg=0), 0.4),
+        'tot_liab_hy': _maybe(rng, _series(rng, _keys(rng, HALVES), 0, scale * 2, p_neg=0), 0.4),
+        'LT_borrow_hy': _maybe(rng, _series(rng, _keys(rng, HALVES), 0, scale, p_neg=0), 0.4),
+        'cash_and_bank_hy': _maybe(rng, _series(rng, _keys(rng, HALVES), 0, scale, p_neg=0), 0.3),
+    }
+    if rng.random() < 0.5:
+        fin['LT_borrow'] = _series(rng, years, 0, scale, p_neg=0)
+    else:
+        fin['lt_borrowings'] = _series(rng, years, 0, scale, p_neg=0)
+    return fin
+
+
+def synthetic_universe(n: int, seed: int = 7, workdir: str = None):
+    """(companies, SyntheticCore, PriceLoader) for n synthetic companies."""
+    rng = random.Random(seed)
+    subgroups = [f"SG_{i:03d}" for i in range(max(2, n // 15))] + ['NON_OPERATING', 'NOT_CLASSIFIED', '']
+    groups = [f"GRP_{i:02d}" for i in range(8)] + ['', None]
+
+    companies, financials, price_rows = [], {}, []
+    for i in range(n):
+        csv_name = f"Company {i:05d} Ltd"
+        if i and rng.random() < 0.005:
+            csv_name = companies[rng.randrange(len(companies))]['csv_name']  # Duplicate name
+        symbol = f"SYM{i:05d}" if rng.random() < 0.9 else ''
+        bse_code = str(500000 + i) if rng.random() < 0.5 else ''
+        companies.append({'csv_name': csv_name, 'company_id': i + 1, 'symbol': symbol, 'bse_code': bse_code,
+                          'valuation_subgroup': rng.choice(subgroups), 'valuation_group': rng.choice(groups)})
+        if rng.random() > 0.03:
+            financials.setdefault(csv_name, synthetic_financials(rng))
+        if symbol or (bse_code and rng.random() < 0.5):
+            for month in range(rng.randint(1, 3)):
+                price_rows.append({
+                    'Company Name': csv_name, 'daily_date': f"2025-{month + 1:02d}-28",
+                    'close': round(rng.uniform(10, 3000), 2),
+                    'pe': rng.choice([None, round(rng.uniform(-20, 90), 2), round(rng.uniform(5, 60), 2)]),
+                    'pb': round(rng.uniform(0.5, 10), 2), 'evebidta': round(rng.uniform(2, 40), 2),
+                    'ps': round(rng.uniform(0.2, 12), 2),
+                    'mcap': rng.choice([None, round(rng.uniform(50, 200000), 2)]),
+                    'vol': rng.randint(1000, 10 ** 6), 'nse_symbol': symbol or None,
+                    'bse_code': float(bse_code) if bse_code else None, 'sector': 'S', 'industry': 'I',
+                })
+
+    workdir = workdir or tempfile.mkdtemp(prefix='driver_panel_bench_')
+    prices_path = os.path.join(workdir, 'prices.csv')
+    pd.DataFrame(price_rows).to_csv(prices_path, index=False)
+    return companies, SyntheticCore(financials), PriceLoader(prices_path)
+
+
+def run_benchmark(companies: int = 3000, seed: int = 7) -> List[dict]:
+    universe, core, prices = synthetic_universe(companies, seed)
+    _ = prices.df  # CSV parse is shared by both paths
+
+    core.calls = 0
+    legacy = BenchCalculator(core, prices)
+    start = time.perf_counter()
+    legacy.precompute_subgroup_medians(universe)
+    expected = [legacy.compute_all_drivers(c['csv_name'], c['valuation_subgroup'], c['company_id'],
+                                           symbol=c['symbol'], valuation_group=c['valuation_group'],
+                                           bse_code=c['bse_code']) for c in universe]
+    legacy_s = time.perf_counter() - start
+    legacy_calls = core.calls
+
+    core.calls = 0
+    panel = BenchCalculator(core, prices)
+    start = time.perf_counter()
+    actual = panel.compute_panel(universe)
+    panel_s = time.perf_counter() - start
+
+    names = Counter(c['csv_name'] for c in universe)
+    compared = [i for i, c in enumerate(universe) if names[c['csv_name']] == 1]
+    mismatched = sum(1 for i in compared if diff_driver_lists(expected[i], actual[i]))
+
+    drivers = sum(len(d) for d in expected)
+    return [
+        {'mode': 'per_company', 'companies': companies, 'drivers': drivers, 'elapsed_s': round(legacy_s, 3),
+         'financials_calls': legacy_calls},
+        {'mode': 'panel', 'companies': companies, 'drivers': sum(len(d) for d in actual),
+         'elapsed_s': round(panel_s, 3), 'financials_calls': core.calls,
+         'speedup': round(legacy_s / panel_s, 1) if panel_s else None,
+         'compared': len(compared), 'mismatched': mismatched, **{k: v for k, v in panel.panel_timings.items()
+                                                                if k.endswith('_s')}},
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-company vs panel CompanyDriverCalculator benchmark')
+    parser.add_argument('--companies', type=int, default=3000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    for row in run_benchmark(args.companies, args.seed):
+        print(row)
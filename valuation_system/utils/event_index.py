@@ -0,0 +1,395 @@
+"""
+Event Timeline Index
+Embedded inverted index over vs_event_timeline so driver-news retrieval
+doesn't run a LIKE '%...%' table scan per company.
+
+Layout (SQLite file, WAL):
+- events                 one row per event (the columns the agents read)
+- postings_YYYYMM        token → (event_date, event_id), one table per month,
+                         clustered on (token, event_date, event_id)
+- sectors                distinct sector strings, for LIKE-style keyword expansion
+- state                  sync high-water marks (last id, last (updated_at, id))
+
+Tokens:
+- 3-character grams of lower-cased headline / summary / grok_synopsis.
+  A substring query intersects its grams' posting lists, then verifies the
+  candidates with a real substring test → same hits as case-insensitive LIKE.
+- 'cid:<company_id>'     company attribution
+- 'sector:<sector>'      GROUP/MACRO-scope events, per sector string
+
+Updates are incremental: sync() pulls rows above the last indexed id, then
+re-indexes rows whose updated_at moved past the last seen value (company_id
+backfills, synopsis rewrites — needs migration 006); add_events() indexes rows
+as they are written; partitions older than the retention window are dropped whole.
+
+Config (.env):
+    EVENT_INDEX_PATH=valuation_system/data/cache/event_timeline_index.db
+    EVENT_INDEX_RETENTION_DAYS=120
+"""
+
+import os
+import json
+import sqlite3
+import logging
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'cache', 'event_timeline_index.db')
+GRAM = 3
+SYNC_BATCH = 5000
+
+EVENT_COLUMNS = ('id', 'event_date', 'company_id', 'scope', 'sector', 'severity', 'source',
+                 'event_type', 'headline', 'summary', 'grok_synopsis')
+TEXT_FIELDS = ('headline', 'summary', 'grok_synopsis')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id            INTEGER PRIMARY KEY,
+    event_date    TEXT NOT NULL,
+    company_id    INTEGER,
+    scope         TEXT,
+    sector        TEXT,
+    severity      TEXT,
+    source        TEXT,
+    event_type    TEXT,
+    headline      TEXT,
+    summary       TEXT,
+    grok_synopsis TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_date ON events (event_date);
+CREATE TABLE IF NOT EXISTS sectors (sector TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS partitions (month TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def grams(text: str) -> set:
+    """Distinct lower-case character 3-grams of text."""
+    text = (text or '').lower()
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+def _iso_date(value) -> str:
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)[:10]
+
+
+def _month(iso_date: str) -> str:
+    return iso_date[:7].replace('-', '')
+
+
+class EventTimelineIndex:
+    """Date-partitioned inverted index over the event timeline."""
+
+    def __init__(self, db_path: str = None, retention_days: int = None):
+        self.db_path = db_path or os.getenv('EVENT_INDEX_PATH') or DEFAULT_DB_PATH
+        self.retention_days = retention_days or int(os.getenv('EVENT_INDEX_RETENTION_DAYS', 120))
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN")
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    @property
+    def oldest_covered_date(self) -> str:
+        """Queries with a cutoff before this date must go to MySQL."""
+        return (date.today() - timedelta(days=self.retention_days)).isoformat()
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _ensure_partition(conn, month: str, known: set):
+        if month in known:
+            return
+        conn.execute(f"""CREATE TABLE IF NOT EXISTS postings_{month} (
+                             token      TEXT NOT NULL,
+                             event_date TEXT NOT NULL,
+                             event_id   INTEGER NOT NULL,
+                             PRIMARY KEY (token, event_date, event_id)
+                         ) WITHOUT ROWID""")
+        conn.execute("INSERT OR IGNORE INTO partitions (month) VALUES (?)", (month,))
+        known.add(month)
+
+    @staticmethod
+    def _tokens(row) -> set:
+        tokens = set()
+        for field in TEXT_FIELDS:
+            tokens |= grams(row[field])
+        if row['company_id']:
+            tokens.add(f"cid:{int(row['company_id'])}")
+        sector = (row['sector'] or '').strip()
+        if sector and row['scope'] in ('GROUP', 'MACRO'):
+            tokens.add(f"sector:{sector.lower()}")
+        return tokens
+
+    def _remove_event(self, conn, old: sqlite3.Row, known: set):
+        """Drop an indexed event and its postings (tokens recomputed from the stored row)."""
+        event_id = old['id']
+        month = _month(old['event_date'])
+        if month in known:
+            conn.executemany(
+                f"DELETE FROM postings_{month} WHERE token = ? AND event_date = ? AND event_id = ?",
+                [(t, old['event_date'], event_id) for t in self._tokens(old)])
+        conn.execute("DELETE FROM events WHERE id = ?", (event_id,))
+
+    def add_events(self, rows: Iterable[dict], replace: bool = False) -> int:
+        """
+        Index events (dicts with EVENT_COLUMNS). Already-indexed ids are skipped,
+        or re-indexed when replace=True and any indexed column changed.
+        """
+        cutoff = self.oldest_covered_date
+        added = 0
+        with self._connect() as conn:
+            known = {r['month'] for r in conn.execute("SELECT month FROM partitions")}
+            for row in rows:
+                event_date = _iso_date(row.get('event_date'))
+                values = [row.get(c) for c in EVENT_COLUMNS]
+                values[1] = event_date
+                if replace and row.get('id'):
+                    old = conn.execute(f"SELECT {', '.join(EVENT_COLUMNS)} FROM events WHERE id = ?",
+                                       (row['id'],)).fetchone()
+                    if old is not None:
+                        if list(old) == values:
+                            continue
+                        self._remove_event(conn, old, known)
+                if not row.get('id') or not event_date or event_date < cutoff:
+                    continue
+                cur = conn.execute(
+                    f"INSERT OR IGNORE INTO events ({', '.join(EVENT_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(EVENT_COLUMNS))})", values)
+                if not cur.rowcount:
+                    continue
+
+                tokens = self._tokens({c: row.get(c) for c in EVENT_COLUMNS})
+                sector = (row.get('sector') or '').strip()
+                if f"sector:{sector.lower()}" in tokens:
+                    conn.execute("INSERT OR IGNORE INTO sectors (sector) VALUES (?)", (sector.lower(),))
+
+                month = _month(event_date)
+                self._ensure_partition(conn, month, known)
+                conn.executemany(
+                    f"INSERT OR IGNORE INTO postings_{month} (token, event_date, event_id) VALUES (?, ?, ?)",
+                    [(t, event_date, row['id']) for t in tokens])
+                added += 1
+        return added
+
+    def prune(self) -> int:
+        """Drop month partitions (and events) older than the retention window."""
+        cutoff = self.oldest_covered_date
+        with self._connect() as conn:
+            stale = [r['month'] for r in conn.execute(
+                "SELECT month FROM partitions WHERE month < ?", (_month(cutoff),))]
+            for month in stale:
+                conn.execute(f"DROP TABLE IF EXISTS postings_{month}")
+                conn.execute("DELETE FROM partitions WHERE month = ?", (month,))
+            conn.execute("DELETE FROM events WHERE event_date < ?", (cutoff,))
+        return len(stale)
+
+    def sync(self, mysql_client) -> int:
+        """
+        Pull events above the indexed high-water id from vs_event_timeline, then
+        re-index rows updated since the last sync. Returns new + re-indexed count.
+        """
+        total = self._sync_new(mysql_client)
+        total += self._sync_updated(mysql_client)
+        return total
+
+    def _sync_new(self, mysql_client) -> int:
+        last_id = int(self.get_state('last_event_id', 0))
+        total = 0
+        while True:
+            rows = mysql_client.query(
+                f"""SELECT {', '.join(EVENT_COLUMNS)}
+                    FROM vs_event_timeline
+                    WHERE id > %s AND event_date >= %s
+                    ORDER BY id
+                    LIMIT {SYNC_BATCH}""",
+                (last_id, self.oldest_covered_date)
+            )
+            if not rows:
+                break
+            total += self.add_events(rows)
+            last_id = max(int(r['id']) for r in rows)
+            self.set_state('last_event_id', last_id)
+            if len(rows) < SYNC_BATCH:
+                break
+        if total:
+            logger.info(f"Event index synced {total} events (high-water id={last_id})")
+        return total
+
+    def _sync_updated(self, mysql_client) -> int:
+        """
+        Re-index rows updated since the last sync, paging on the (updated_at, id)
+        keyset so any number of rows sharing one timestamp still pages forward.
+        Once caught up, the id half of the mark rewinds to 0: the next sync
+        re-reads the last second, so a row updated later within that same second
+        isn't missed. Rows seen again unchanged are skipped by add_events.
+        """
+        since = self.get_state('last_updated_at')
+        if since is None:
+            # First sync: everything just pulled is current; start watching from now
+            row = mysql_client.query("SELECT MAX(updated_at) AS last_updated FROM vs_event_timeline")
+            last = row[0]['last_updated'] if row else None
+            self.set_state('last_updated_at', str(last) if last else '1970-01-01 00:00:00')
+            self.set_state('last_updated_id', 0)
+            return 0
+        last_id = int(self.get_state('last_updated_id', 0))
+
+        total = 0
+        while True:
+            rows = mysql_client.query(
+                f"""SELECT {', '.join(EVENT_COLUMNS)}, updated_at
+                    FROM vs_event_timeline
+                    WHERE (updated_at, id) > (%s, %s) AND event_date >= %s
+                    ORDER BY updated_at, id
+                    LIMIT {SYNC_BATCH}""",
+                (since, last_id, self.oldest_covered_date)
+            )
+            if rows:
+                total += self.add_events(rows, replace=True)
+                since, last_id = str(rows[-1]['updated_at']), int(rows[-1]['id'])
+            if len(rows) < SYNC_BATCH:
+                last_id = 0
+            self.set_state('last_updated_at', since)
+            self.set_state('last_updated_id', last_id)
+            if len(rows) < SYNC_BATCH:
+                break
+        if total:
+            logger.info(f"Event index re-indexed {total} updated events (updated_at >= {since})")
+        return total
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def _months_since(self, conn, cutoff: str) -> List[str]:
+        return [r['month'] for r in conn.execute(
+            "SELECT month FROM partitions WHERE month >= ? ORDER BY month", (_month(cutoff),))]
+
+    @staticmethod
+    def _token_ids(conn, months: List[str], token: str, cutoff: str) -> set:
+        ids = set()
+        for month in months:
+            ids.update(r[0] for r in conn.execute(
+                f"SELECT event_id FROM postings_{month} WHERE token = ? AND event_date >= ?",
+                (token, cutoff)))
+        return ids
+
+    def _substring_ids(self, conn, months: List[str], pattern: str, field: str,
+                       cutoff: str) -> set:
+        """Events whose field contains pattern (case-insensitive), like LIKE '%p%'."""
+        needle = pattern.lower()
+        pattern_grams = grams(needle)
+        if pattern_grams:
+            candidates = None
+            # Rarest-first would need counts; posting lists per month are small enough
+            for gram in pattern_grams:
+                ids = self._token_ids(conn, months, gram, cutoff)
+                candidates = ids if candidates is None else candidates & ids
+                if not candidates:
+                    return set()
+            rows = self._fetch(conn, candidates, columns=('id', field))
+        else:
+            # Pattern shorter than a gram: verify every event in the window
+            rows = conn.execute(f"SELECT id, {field} FROM events WHERE event_date >= ?", (cutoff,))
+        return {r['id'] for r in rows if needle in (r[field] or '').lower()}
+
+    @staticmethod
+    def _fetch(conn, ids: Iterable[int], columns: Iterable[str] = EVENT_COLUMNS) -> list:
+        ids = list(ids)
+        rows = []
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows.extend(conn.execute(
+                f"SELECT {', '.join(columns)} FROM events WHERE id IN ({', '.join('?' * len(chunk))})",
+                chunk).fetchall())
+        return rows
+
+    def search(self, cutoff_date: str, company_id: int = None,
+               headline_terms: List[str] = (), synopsis_terms: List[str] = (),
+               sector_keywords: List[str] = (), limit: Optional[int] = 50) -> List[dict]:
+        """
+        Events on/after cutoff_date matching ANY of: company_id, a headline
+        substring, a grok_synopsis substring, or a GROUP/MACRO event whose
+        sector contains a keyword. Newest first.
+        """
+        cutoff = _iso_date(cutoff_date)
+        with self._connect() as conn:
+            months = self._months_since(conn, cutoff)
+            if not months:
+                return []
+            ids = set()
+            if company_id:
+                ids |= self._token_ids(conn, months, f"cid:{int(company_id)}", cutoff)
+            for term in headline_terms:
+                ids |= self._substring_ids(conn, months, term, 'headline', cutoff)
+            for term in synopsis_terms:
+                ids |= self._substring_ids(conn, months, term, 'grok_synopsis', cutoff)
+            if sector_keywords:
+                sectors = [r['sector'] for r in conn.execute("SELECT sector FROM sectors")]
+                for keyword in sector_keywords:
+                    for sector in sectors:
+                        if keyword.lower() in sector:
+                            ids |= self._token_ids(conn, months, f"sector:{sector}", cutoff)
+            rows = self._fetch(conn, ids)
+
+        events = []
+        for row in rows:
+            event = dict(row)
+            event['event_date'] = date.fromisoformat(event['event_date'])
+            events.append(event)
+        events.sort(key=lambda e: (e['event_date'], e['id']), reverse=True)
+        return events[:limit] if limit else events
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            return {
+                'events': conn.execute("SELECT COUNT(*) FROM events").fetchone()[0],
+                'partitions': [r['month'] for r in conn.execute("SELECT month FROM partitions ORDER BY month")],
+                'last_event_id': self.get_state('last_event_id', 0),
+                'last_updated_at': self.get_state('last_updated_at'),
+                'last_updated_id': self.get_state('last_updated_id', 0),
+            }
+
+    # ------------------------------------------------------------------
+    # State
+    # ------------------------------------------------------------------
+
+    def get_state(self, name: str, default=None):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM state WHERE name = ?", (name,)).fetchone()
+        return json.loads(row['value']) if row else default
+
+    def set_state(self, name: str, value):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO state (name, value) VALUES (?, ?)",
+                         (name, json.dumps(value)))
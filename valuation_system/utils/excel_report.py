@@ -7,25 +7,64 @@ Generates a comprehensive .xlsx with:
 - Ratio numerator/denominator in remarks
 - 4 driver tabs (Macro 15%, Group 20%, Subgroup 35%, Company 30%)
 - 10 sheets total (4-level driver hierarchy)
+
+Streaming mode (opt-in, EXCEL_STREAMING=1): rows are serialised in order
+straight into the zip entry, formula cells are written without the empty
+cached <v></v> (no _fix_empty_formula_values rewrite), and the module-level
+styles are pre-registered in an identity-keyed palette so style assignment
+skips openpyxl's per-cell hashing. Sheet builders are shared by both modes.
+generate_valuation_excels() renders many reports across worker processes.
+
+Config (.env):
+    EXCEL_STREAMING=0             # 1 = streaming writer; 0 = legacy Workbook.save + post-process rewrite
+    EXCEL_REPORT_WORKERS=4        # Processes for generate_valuation_excels
+
+Edge Cases:
+- Cells the fast row serialiser does not handle (dates, booleans, NaN/inf,
+  rich text) go through openpyxl's own cell writer
+- Hyperlinks and cell comments are not supported by the streaming writer
+  (openpyxl emits the <hyperlinks> / <legacyDrawing> tail before the rows are
+  streamed): a workbook with either is saved with the legacy writer instead
+- The streaming writer subclasses openpyxl internals (WorksheetWriter,
+  ExcelWriter, cell._writer); requirements.txt pins openpyxl <3.2 for it
+- Palette hits are by object identity: styles must not be mutated after first
+  use (openpyxl treats them as immutable anyway)
+- A failed report in the parallel mode is logged and returned as None
 """
 
 import os
 import re
+import math
 import logging
 import zipfile
-from datetime import date, datetime
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timezone
+from io import BytesIO
+from typing import List, Optional
 
 from openpyxl import Workbook
+from openpyxl.cell._writer import etree_write_cell
+from openpyxl.cell.rich_text import CellRichText
+from openpyxl.drawing.spreadsheet_drawing import SpreadsheetDrawing
+from openpyxl.utils.indexed_list import IndexedList
+from openpyxl.worksheet._writer import WorksheetWriter
+from openpyxl.writer.excel import ExcelWriter
+from openpyxl.xml.functions import tostring
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, numbers
 from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.datavalidation import DataValidation
 from openpyxl.worksheet.formula import ArrayFormula
 from dotenv import load_dotenv
 
+from valuation_system.utils.trace_recorder import TraceEvent
+
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
 
 logger = logging.getLogger(__name__)
 
+EXCEL_STREAMING = os.getenv('EXCEL_STREAMING', '0') == '1'
+EXCEL_REPORT_WORKERS = int(os.getenv('EXCEL_REPORT_WORKERS', min(4, os.cpu_count() or 1)))
+
 # ── Styles ──────────────────────────────────────────────────────────────────
 HEADER_FONT = Font(bold=True, size=12, color='FFFFFF')
 HEADER_FILL = PatternFill(start_color='2F5496', end_color='2F5496', fill_type='solid')
@@ -48,6 +87,8 @@ ERROR_FILL = PatternFill(start_color='FFC7CE', end_color='FFC7CE', fill_type='so
 DEBUG_FONT = Font(color='808080', size=9)
 LOG_FONT = Font(name='Courier New', size=9)
 
+CENTER_ALIGN = Alignment(horizontal='center')
+
 PCT_FMT = '0.00%'
 NUM_FMT = '#,##0.00'
 INT_FMT = '#,##0'
@@ -58,7 +99,7 @@ def _style_header(ws, row, max_col):
         cell = ws.cell(row=row, column=col)
         cell.font = HEADER_FONT
         cell.fill = HEADER_FILL
-        cell.alignment = Alignment(horizontal='center')
+        cell.alignment = CENTER_ALIGN
         # Set empty string to avoid invalid XML with styled but empty cells
         if cell.value is None:
             cell.value = ''
@@ -185,28 +226,56 @@ def _format_cod_components(components):
 
 # ── Main Entry Point ────────────────────────────────────────────────────────
 
-def generate_valuation_excel(result: dict, output_path: str = None) -> str:
+def generate_valuation_excel(result: dict, output_path: str = None, streaming: bool = None) -> str:
     """
     Generate a comprehensive Excel valuation report.
 
     Args:
         result: Output from ValuatorAgent.run_full_valuation()
         output_path: Optional output path. Defaults to logs/ with timestamp.
+        streaming: Streaming writer (default EXCEL_STREAMING); False = legacy
+            Workbook.save followed by the _fix_empty_formula_values rewrite.
+            Workbooks with hyperlinks or comments always use the legacy writer.
 
     Returns:
         Path to generated Excel file.
     """
-    company = result.get('company_name', 'Unknown')
-    symbol = result.get('nse_symbol', '')
-
+    streaming = EXCEL_STREAMING if streaming is None else streaming
     if not output_path:
         log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
         os.makedirs(log_dir, exist_ok=True)
-        safe_name = symbol.lower() if symbol else company.lower().replace(' ', '_')
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M')
-        output_path = os.path.join(log_dir, f'{safe_name}_valuation_{timestamp}.xlsx')
+        output_path = _default_output_path(result, log_dir)
 
     wb = Workbook()
+    if streaming:
+        _install_style_palette(wb)
+    _build_workbook(wb, result)
+
+    if streaming and (_has_hyperlinks(wb) or _has_comments(wb)):
+        logger.info("Workbook has hyperlinks or comments: saving with the legacy writer")
+        streaming = False
+    if streaming:
+        _save_streaming(wb, output_path)
+    else:
+        wb.save(output_path)
+        # Post-process: Fix openpyxl bug where formula cells get empty <v></v> tags
+        # which can cause Excel repair warnings
+        _fix_empty_formula_values(output_path)
+
+    logger.info(f"Valuation Excel saved to: {output_path}")
+    return output_path
+
+
+def _default_output_path(result: dict, directory: str) -> str:
+    company = result.get('company_name', 'Unknown')
+    symbol = result.get('nse_symbol', '')
+    safe_name = symbol.lower() if symbol else company.lower().replace(' ', '_')
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M')
+    return os.path.join(directory, f'{safe_name}_valuation_{timestamp}.xlsx')
+
+
+def _build_workbook(wb, result: dict):
+    """Build all sheets into wb (both writer modes)."""
     # Cell registry: tracks key cells for cross-sheet references
     refs = {}
 
@@ -259,14 +328,63 @@ def generate_valuation_excel(result: dict, output_path: str = None) -> str:
     # Move Summary to position 0 (now 9 sheets: Summary + 8 others)
     wb.move_sheet('Summary', offset=-8)
 
-    wb.save(output_path)
 
-    # Post-process: Fix openpyxl bug where formula cells get empty <v></v> tags
-    # which can cause Excel repair warnings
-    _fix_empty_formula_values(output_path)
+def generate_valuation_excels(results: List[dict], output_dir: str = None, workers: int = None,
+                              streaming: bool = None) -> List[Optional[str]]:
+    """
+    One report per valuation result, rendered across worker processes.
 
-    logger.info(f"Valuation Excel saved to: {output_path}")
-    return output_path
+    Args:
+        results: run_full_valuation() outputs
+        output_dir: Directory for the reports. Defaults to logs/.
+        workers: Processes (default EXCEL_REPORT_WORKERS); 1 = in-process
+        streaming: As in generate_valuation_excel
+
+    Returns:
+        Paths in input order; None where a report failed (logged).
+    """
+    output_dir = output_dir or os.path.join(os.path.dirname(__file__), '..', 'logs')
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or EXCEL_REPORT_WORKERS
+    jobs = [(_portable_result(result), _default_output_path(result, output_dir), streaming)
+            for result in results]
+    # Same symbol twice in one batch would share a timestamped name
+    seen = {}
+    for i, (result, path, _) in enumerate(jobs):
+        if path in seen:
+            root, ext = os.path.splitext(path)
+            jobs[i] = (result, f'{root}_{i}{ext}', streaming)
+        seen[path] = i
+
+    if workers <= 1 or len(jobs) < 2:
+        paths = [_generate_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            paths = list(pool.map(_generate_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    logger.info(f"Valuation Excel batch: {sum(1 for p in paths if p)}/{len(jobs)} reports in {output_dir}")
+    return paths
+
+
+def _generate_job(job) -> Optional[str]:
+    result, path, streaming = job
+    try:
+        return generate_valuation_excel(result, path, streaming=streaming)
+    except Exception as e:
+        logger.error(f"Excel report failed for {result.get('nse_symbol') or result.get('company_name')}: {e}")
+        return None
+
+
+def _portable_result(result: dict) -> dict:
+    """Result safe to pickle to a worker: computation logs rendered to plain TraceEvents."""
+    logs = result.get('_computation_logs')
+    if not logs:
+        return result
+    rendered = []
+    for record in logs:
+        message = record.getMessage() if hasattr(record, 'getMessage') else str(record)
+        rendered.append(TraceEvent(getattr(record, 'name', ''), getattr(record, 'levelno', logging.INFO),
+                                   message, created=getattr(record, 'created', None)))
+    return {**result, '_computation_logs': rendered}
 
 
 def _fix_empty_formula_values(xlsx_path: str):
@@ -293,6 +411,152 @@ def _fix_empty_formula_values(xlsx_path: str):
             os.remove(temp_path)
 
 
+# ── Streaming writer ────────────────────────────────────────────────────────
+
+_PALETTE_STYLES = (HEADER_FONT, HEADER_FILL, SECTION_FONT, SECTION_FILL, INPUT_FILL, FORMULA_FILL,
+                   REMARK_FONT, ACTUAL_FONT, DERIVED_FONT, BOLD_FONT, TITLE_FONT, THIN_BORDER,
+                   WARNING_FILL, ERROR_FILL, DEBUG_FONT, LOG_FONT, CENTER_ALIGN)
+_XML_TEXT = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+_SHEET_DATA = re.compile(rb'<sheetData\s*/>|<sheetData></sheetData>')
+_ROW_FLUSH = 256
+
+
+class _StylePalette(IndexedList):
+    """IndexedList with an identity fast path: re-adding the same style object skips hashing."""
+
+    def __init__(self, iterable=None):
+        super().__init__(iterable)
+        self._by_id = {}
+
+    def add(self, value):
+        hit = self._by_id.get(id(value))
+        if hit is not None and hit[0] is value:
+            return hit[1]
+        idx = super().add(value)
+        self._by_id[id(value)] = (value, idx)    # Holds a reference so the id is never reused
+        return idx
+
+
+def _install_style_palette(wb):
+    """Swap the workbook's style collections for palettes and pre-register the module styles."""
+    for name in ('_fonts', '_fills', '_borders', '_alignments'):
+        setattr(wb, name, _StylePalette(getattr(wb, name)))
+    for style in _PALETTE_STYLES:
+        collection = {Font: wb._fonts, PatternFill: wb._fills, Border: wb._borders,
+                      Alignment: wb._alignments}[type(style)]
+        collection.add(style)
+
+
+def _has_hyperlinks(wb) -> bool:
+    return any(cell.hyperlink is not None for ws in wb.worksheets for cell in ws._cells.values())
+
+
+def _has_comments(wb) -> bool:
+    return any(cell._comment is not None for ws in wb.worksheets for cell in ws._cells.values())
+
+
+class _ElementSink:
+    """Collects what openpyxl's etree cell writer emits, for the rare cells it serialises."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, el):
+        self.parts.append(tostring(el).decode('utf-8'))
+
+
+class _StreamingSheetWriter(WorksheetWriter):
+    """
+    openpyxl writes the sheet head/tail (cols, merges, validations, views);
+    <sheetData> is serialised here row by row straight into the zip entry.
+    """
+
+    def __init__(self, ws, archive):
+        super().__init__(ws, out=BytesIO())
+        self.archive = archive
+
+    def write_rows(self):
+        xf = self.xf.send(True)
+        with xf.element('sheetData'):
+            pass
+        self.xf.send(None)
+
+    def write(self):
+        super().write()
+        xml = self.out.getvalue()
+        match = _SHEET_DATA.search(xml)
+        with self.archive.open(self.ws.path[1:], 'w') as out:
+            out.write(xml[:match.start()])
+            out.write(b'<sheetData>')
+            buffer = []
+            for row_idx, row in self.rows():
+                buffer.append(self._row_xml(row_idx, row))
+                if len(buffer) >= _ROW_FLUSH:
+                    out.write(''.join(buffer).encode('utf-8'))
+                    buffer = []
+            buffer.append('</sheetData>')
+            out.write(''.join(buffer).encode('utf-8'))
+            out.write(xml[match.end():])
+
+    def _row_xml(self, row_idx, row) -> str:
+        attrs = {'r': f"{row_idx}"}
+        attrs.update(self.ws.row_dimensions.get(row_idx, {}))
+        parts = ['<row', *(f' {k}="{v}"' for k, v in attrs.items()), '>']
+        for cell in row:
+            if cell._comment is not None:
+                # The tail has no <legacyDrawing>; the comment would be silently lost
+                raise ValueError(f"{self.ws.title}!{cell.coordinate}: comments need the legacy writer")
+            if cell._value is None and not cell.has_style:
+                continue
+            parts.append(self._cell_xml(cell))
+        parts.append('</row>')
+        return ''.join(parts)
+
+    def _cell_xml(self, cell) -> str:
+        value, data_type = cell._value, cell.data_type
+        style = f' s="{cell.style_id}"' if cell.has_style else ''
+        coordinate = cell.coordinate
+        if cell.hyperlink is not None:
+            # The <hyperlinks> tail is already written; the link would be silently lost
+            raise ValueError(f"{self.ws.title}!{coordinate}: hyperlinks need the legacy writer")
+        if value is None or value == '':
+            return f'<c r="{coordinate}"{style} t="{"inlineStr" if data_type == "s" else data_type}"/>'
+        if data_type == 'f' and isinstance(value, str):
+            # No cached <v>: Excel computes on open, nothing to strip afterwards
+            return f'<c r="{coordinate}"{style}><f>{value[1:].translate(_XML_TEXT)}</f></c>'
+        if isinstance(value, ArrayFormula) and value.text:
+            return (f'<c r="{coordinate}"{style}><f t="array" ref="{value.ref}">'
+                    f'{value.text[1:].translate(_XML_TEXT)}</f></c>')
+        if data_type == 'n' and not isinstance(value, bool) and isinstance(value, (int, float)) \
+                and math.isfinite(value):
+            return f'<c r="{coordinate}"{style} t="n"><v>{"%.16g" % value}</v></c>'
+        if data_type == 's' and isinstance(value, str) and not isinstance(value, CellRichText):
+            space = ' xml:space="preserve"' if value != value.strip() else ''
+            return f'<c r="{coordinate}"{style} t="inlineStr"><is><t{space}>{value.translate(_XML_TEXT)}</t></is></c>'
+        sink = _ElementSink()
+        etree_write_cell(sink, self.ws, cell, cell.has_style)
+        return ''.join(sink.parts)
+
+
+class _StreamingExcelWriter(ExcelWriter):
+
+    def write_worksheet(self, ws):
+        ws._drawing = SpreadsheetDrawing()
+        ws._drawing.charts = ws._charts
+        ws._drawing.images = ws._images
+        writer = _StreamingSheetWriter(ws, self._archive)
+        writer.write()
+        ws._rels = writer._rels
+        self.manifest.append(ws)
+
+
+def _save_streaming(wb, output_path: str):
+    """Single pass: every sheet streamed into the zip, no temp files, no rewrite."""
+    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        wb.properties.modified = datetime.now(tz=timezone.utc).replace(tzinfo=None)
+        _StreamingExcelWriter(wb, archive).write_data()
+
+
 # ── Sheet 2: Assumptions (Single Source of Truth) ───────────────────────────
 
 def _build_assumptions_sheet(ws, result, refs):
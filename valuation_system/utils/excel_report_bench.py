@@ -0,0 +1,217 @@
+"""
+Excel Report Benchmark
+Per-report time and peak memory of generate_valuation_excel in the legacy
+mode (Workbook save + _fix_empty_formula_values rewrite) vs the streaming mode,
+a sheet-by-sheet cell parity check between the two, and throughput of the
+parallel multi-company mode (generate_valuation_excels).
+
+Results are synthetic but shaped like ValuatorAgent.run_full_valuation output:
+10-year FCFF projections, three beta scenarios, a tight/broad peer table,
+a 7x7 sensitivity grid, group/subgroup/company drivers and a few thousand
+computation-log events (the largest sheet in real reports).
+
+Usage:
+    python -m valuation_system.utils.excel_report_bench --reports 200 --workers 1,4
+    python -m valuation_system.utils.excel_report_bench --reports 20 --logs 5000
+
+Edge Cases:
+- Peak memory is tracemalloc's peak for one report built in this process
+  (separate from the timed run); worker processes are measured by wall time only
+- The log sheet's 'Generated:' timestamp is skipped in the parity diff
+"""
+
+import os
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from typing import Dict, List
+
+from openpyxl import load_workbook
+from openpyxl.worksheet.formula import ArrayFormula
+
+from valuation_system.utils.excel_report import generate_valuation_excel, generate_valuation_excels
+from valuation_system.utils.trace_recorder import TraceEvent
+
+logger = logging.getLogger(__name__)
+
+GROUPS = [('AUTO', 'AUTO_OEM'), ('INDUSTRIALS', 'INDUSTRIALS_DEFENSE'), ('CHEMICALS', 'CHEMICALS_SPECIALTY'),
+          ('FINANCIALS', 'FINANCIALS_BANKING_PRIVATE'), ('HEALTHCARE', 'HEALTHCARE_HOSPITALS')]
+LOG_MODULES = ['valuation_system.models.dcf_model', 'valuation_system.agents.valuator',
+               'valuation_system.data.loaders.core_loader', 'valuation_system.models.relative_valuation']
+
+
+def _drivers(rng: random.Random, prefix: str, n: int, source: str = None) -> Dict[str, dict]:
+    drivers = {}
+    for i in range(n):
+        name = f"{prefix.lower()}_driver_{i}"
+        drivers[f"{prefix}_{name}"] = {
+            'name': name, 'category': rng.choice(['DEMAND', 'COST', 'REGULATORY']),
+            'weight': round(rng.uniform(0.02, 0.2), 3), 'value': rng.choice(['HIGH', 'LOW', 'NEUTRAL', 12.5]),
+            'impact_direction': rng.choice(['POSITIVE', 'NEGATIVE', 'NEUTRAL']),
+            'trend': rng.choice(['IMPROVING', 'STABLE', 'DETERIORATING']), 'source': source or 'CONFIG',
+        }
+    return drivers
+
+
+def synthetic_result(seed: int, n_peers: int = 40, n_logs: int = 2000, years: int = 10) -> dict:
+    """One run_full_valuation-shaped result."""
+    rng = random.Random(seed)
+    group, subgroup = GROUPS[seed % len(GROUPS)]
+    cmp = round(rng.uniform(100, 5000), 2)
+    dcf_value = round(cmp * rng.uniform(0.6, 1.5), 2)
+    symbol = f"SYN{seed:04d}"
+    growth = [round(rng.uniform(0.04, 0.18), 4) for _ in range(years)]
+    wacc_values = [0.10 + 0.01 * i for i in range(7)]
+    growth_values = [0.03 + 0.005 * i for i in range(7)]
+    start = time.time() - 60
+    logs = [TraceEvent(rng.choice(LOG_MODULES), rng.choice([10, 20, 20, 20, 30, 40]),
+                       'Step %d: computed %s = %.4f', (i, rng.choice(['wacc', 'fcff', 'roce', 'margin']),
+                                                      rng.uniform(0, 2)), created=start + i * 0.01)
+            for i in range(n_logs)]
+    return {
+        'company_name': f"Synthetic Industries {seed}", 'nse_symbol': symbol, 'sector': group.lower(),
+        'valuation_group': group, 'valuation_subgroup': subgroup, 'cmp': cmp, 'mcap_cr': round(cmp * 50, 0),
+        'price_date': '2026-10-16', 'daily_date': '2026-10-16', 'ttm_pat': 850.0, 'ttm_pbidt': 1400.0,
+        'revenue_cagr_3y': 0.12, 'revenue_cagr_5y': 0.10,
+        'revenue_yoy_growth': [{'to_year': y, 'growth': 0.1, 'to_value': 1100.0 * 1.1 ** i, 'from_value': 1000.0 * 1.1 ** i}
+                               for i, y in enumerate(range(2021, 2026))],
+        'capex_components': [{'ratio': 0.06, 'numerator': 60.0 + i, 'denominator': 1000.0} for i in range(3)],
+        'depr_components': [{'ratio': 0.04, 'numerator': 40.0 + i, 'denominator': 1000.0} for i in range(3)],
+        'nwc_components': [{'inv': 120.0, 'debtors': 90.0, 'payables': 80.0, 'denominator': 1000.0, 'ratio': 0.13}],
+        'tax_components': [{'pat': 750.0, 'pbt': 1000.0, 'rate': 0.25}],
+        'cost_of_debt_components': [{'interest': 12.0, 'debt': 150.0, 'rate': 0.08}],
+        'dcf_base': dcf_value, 'relative_value': round(cmp * rng.uniform(0.7, 1.3), 2),
+        'intrinsic_value_blended': dcf_value, 'upside_pct': round((dcf_value / cmp - 1) * 100, 1),
+        'confidence_score': 0.7, 'blend_weights': {'dcf': 0.6, 'relative': 0.3, 'monte_carlo': 0.1},
+        'dcf_assumptions': {'risk_free_rate': 0.0674, 'erp': 0.0708, 'beta': 1.05, 'wacc': 0.125,
+                            'cost_of_debt_at': 0.065, 'debt_ratio': 0.2, 'tax_rate': 0.252,
+                            'terminal_growth': 0.05, 'terminal_roce': 0.18, 'ebitda_margin': 0.17},
+        'dcf_details': {'fcff_projections': [{'year': i + 1, 'growth_rate': g} for i, g in enumerate(growth)],
+                        'assumptions': {'capex_to_sales': 0.06, 'nwc_to_sales': 0.12}},
+        'dcf_beta_scenarios': {key: {'beta': round(rng.uniform(0.7, 1.4), 3),
+                                     'beta_unlevered': round(rng.uniform(0.6, 1.1), 3),
+                                     'wacc': round(rng.uniform(0.1, 0.14), 4),
+                                     'cost_of_equity': round(rng.uniform(0.12, 0.16), 4),
+                                     'intrinsic_value': round(dcf_value * rng.uniform(0.8, 1.2), 2),
+                                     'beta_source': key, 'industry': group.title(), 'n_firms': 40}
+                               for key in ('individual_weekly', 'damodaran_india', 'subgroup_aggregate')},
+        'relative_details': {
+            'implied_values': {k: {'company_metric': round(rng.uniform(5, 500), 2),
+                                   'implied_per_share': round(cmp * rng.uniform(0.7, 1.3), 2)}
+                               for k in ('pe', 'pb', 'ev_ebitda', 'ps')},
+            'multiple_weights_used': {'pe': 0.4, 'pb': 0.2, 'ev_ebitda': 0.3, 'ps': 0.1},
+            'adjustment_factors': {'growth': 0.05, 'size': -0.02},
+            'peer_multiples_list': [{'nse_symbol': f"PEER{i}", 'Company Name': f"Peer Company {i}",
+                                     'tier': 'tight' if i % 3 else 'broad', 'valuation_group': group,
+                                     'valuation_subgroup': subgroup, 'cd_sector': 'Sector',
+                                     'cd_industry': 'Industry', 'mcap': round(rng.uniform(500, 90000), 0),
+                                     'pe': round(rng.uniform(8, 60), 2), 'pb': round(rng.uniform(1, 12), 2),
+                                     'evebidta': round(rng.uniform(5, 35), 2), 'ps': round(rng.uniform(0.5, 8), 2)}
+                                    for i in range(n_peers)],
+        },
+        'mc_mean': dcf_value, 'mc_median': dcf_value * 0.98, 'mc_probability_above_cmp': 0.55,
+        'mc_percentiles': {p: round(dcf_value * f, 2) for p, f in
+                           [('5th', 0.6), ('10th', 0.7), ('25th', 0.85), ('75th', 1.15), ('90th', 1.3), ('95th', 1.4)]},
+        'sensitivity': {'base_intrinsic': dcf_value, 'wacc_values': wacc_values, 'growth_values': growth_values,
+                        'sensitivity_table': [[round(dcf_value * (1 + (g - 0.045) * 5 - (w - 0.13) * 6), 2)
+                                               for g in growth_values] for w in wacc_values]},
+        'driver_hierarchy': {'macro_weight': 0.15, 'group_weight': 0.20, 'subgroup_weight': 0.35,
+                             'company_weight': 0.30},
+        'sector_outlook': {'group_score': 0.12, 'subgroup_score': 0.05, 'key_positives': [], 'key_negatives': []},
+        'group_drivers': _drivers(rng, 'GROUP', 12),
+        'subgroup_drivers': _drivers(rng, 'SUBGROUP', 8),
+        'company_drivers': {**_drivers(rng, 'COMPANY', 6, 'AUTO'), **_drivers(rng, 'QUAL', 4, 'LLM')},
+        'company_adjustment': {'company_score': 0.03},
+        'company_alpha_config': {'csv_name': f"Synthetic Industries {seed}",
+                                 'alpha_thesis': {'bull': 'Share gains', 'bear': 'Input costs', 'key_moat': 'Scale'}},
+        'data_sources': {}, '_computation_logs': logs,
+    }
+
+
+def _cell_value(value):
+    return (value.ref, value.text) if isinstance(value, ArrayFormula) else value
+
+
+def sheet_values(path: str) -> Dict[str, list]:
+    """{sheet: [row tuples]} of stored values (formulas as text)."""
+    wb = load_workbook(path)
+    try:
+        return {ws.title: [tuple(_cell_value(c.value) for c in row) for row in ws.iter_rows()]
+                for ws in wb.worksheets}
+    finally:
+        wb.close()
+
+
+def parity(legacy_path: str, streaming_path: str) -> List[str]:
+    """Cells that differ between the two modes (log sheet timestamp line excluded)."""
+    a, b = sheet_values(legacy_path), sheet_values(streaming_path)
+    diffs = [f"sheets: {list(a)} != {list(b)}"] if list(a) != list(b) else []
+    for title in a:
+        for i, (ra, rb) in enumerate(zip(a[title], b.get(title, []))):
+            if ra != rb and not (title == 'Computation Log' and i == 1):
+                diffs.append(f"{title}!row {i + 1}")
+        if len(a[title]) != len(b.get(title, [])):
+            diffs.append(f"{title}: {len(a[title])} vs {len(b.get(title, []))} rows")
+    return diffs
+
+
+def _single_report(result: dict, path: str, streaming: bool) -> dict:
+    """Timed run, then a tracemalloc run (tracing slows openpyxl several-fold, so not both at once)."""
+    start = time.perf_counter()
+    generate_valuation_excel(result, path, streaming=streaming)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    generate_valuation_excel(result, path, streaming=streaming)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'elapsed_ms': elapsed * 1000, 'peak_mb': peak / 1e6, 'kb': os.path.getsize(path) / 1e3}
+
+
+def run_benchmark(reports: int = 200, workers: List[int] = (1, 4), samples: int = 5,
+                  n_peers: int = 40, n_logs: int = 2000) -> List[dict]:
+    """Per-report rows for both modes, one parity row, one throughput row per worker count."""
+    report = []
+    tmp = tempfile.mkdtemp(prefix='excel_bench_')
+    try:
+        results = [synthetic_result(seed, n_peers, n_logs) for seed in range(max(reports, samples))]
+        for streaming in (False, True):
+            mode = 'streaming' if streaming else 'legacy'
+            runs = [_single_report(results[i], os.path.join(tmp, f"{mode}_{i}.xlsx"), streaming)
+                    for i in range(samples)]
+            report.append({'mode': mode, 'reports': samples,
+                           'ms_per_report': round(sum(r['elapsed_ms'] for r in runs) / samples, 1),
+                           'peak_mb': round(max(r['peak_mb'] for r in runs), 2),
+                           'kb_per_report': round(runs[0]['kb'], 1)})
+        diffs = parity(os.path.join(tmp, 'legacy_0.xlsx'), os.path.join(tmp, 'streaming_0.xlsx'))
+        report.append({'mode': 'parity', 'differences': len(diffs), 'first': diffs[:5]})
+
+        for n in workers:
+            out_dir = os.path.join(tmp, f"batch_{n}")
+            start = time.perf_counter()
+            paths = generate_valuation_excels(results[:reports], out_dir, workers=n)
+            elapsed = time.perf_counter() - start
+            report.append({'mode': f"parallel workers={n}", 'reports': reports, 'elapsed_s': round(elapsed, 2),
+                           'ms_per_report': round(elapsed * 1000 / reports, 1),
+                           'failed': sum(1 for p in paths if p is None)})
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Excel valuation report benchmark')
+    parser.add_argument('--reports', type=int, default=200, help='Reports in each parallel run')
+    parser.add_argument('--workers', type=str, default='1,4', help='Comma-separated worker counts')
+    parser.add_argument('--samples', type=int, default=5, help='Reports timed per single-process mode')
+    parser.add_argument('--peers', type=int, default=40)
+    parser.add_argument('--logs', type=int, default=2000, help='Computation-log events per report')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    for row in run_benchmark(args.reports, [int(w) for w in args.workers.split(',')], args.samples,
+                             args.peers, args.logs):
+        print(row)
@@ -0,0 +1,215 @@
+"""
+Concurrent HTTP Fetcher
+Thread-pool fetch layer for news sources (RSS feeds, scraped pages).
+
+- One pooled requests.Session → keep-alive connection reuse across sources
+- Per-host concurrency limit so a burst of Google News queries can't hammer one host
+- Conditional GET: ETag / Last-Modified validators persisted between runs;
+  a 304 means "nothing new" and the caller skips parsing entirely. Validators
+  seen this cycle are staged until the caller commits them with
+  save_validators() (after its items are stored) or drops them with
+  discard_validators(), so a failed cycle re-fetches instead of 304-ing past
+  items it never stored. A response that lands after the caller's deadline
+  is not staged, so a source dropped for its budget can't commit validators
+  from a straggling thread
+- Deadline-aware: every request timeout is clipped to the caller's remaining budget
+
+Config (.env):
+    HTTP_FETCH_WORKERS=16
+    HTTP_PER_HOST_LIMIT=4
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
+
+DEFAULT_USER_AGENT = ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) '
+                      'AppleWebKit/537.36 (KHTML, like Gecko) '
+                      'Chrome/120.0.0.0 Safari/537.36')
+
+_VALIDATOR_CACHE_FILE = os.path.join(
+    os.path.dirname(__file__), '..', 'data', 'cache', 'http_validators.json'
+)
+
+
+@dataclass
+class FetchResult:
+    """Outcome of one GET. text is empty when not_modified or on error."""
+    url: str
+    status: int = 0
+    text: str = ''
+    not_modified: bool = False
+    elapsed_ms: float = 0
+    error: str = ''
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 200 and not self.error
+
+
+class ConcurrentFetcher:
+    """
+    Shared fetcher for one scan cycle (or the life of a long-running process).
+    Thread-safe: get() may be called from any worker thread.
+    """
+
+    def __init__(self, max_workers: int = None, per_host_limit: int = None,
+                 validator_cache_path: str = _VALIDATOR_CACHE_FILE):
+        self.max_workers = max_workers or int(os.getenv('HTTP_FETCH_WORKERS', 16))
+        self.per_host_limit = per_host_limit or int(os.getenv('HTTP_PER_HOST_LIMIT', 4))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = DEFAULT_USER_AGENT
+
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+        self._validator_path = validator_cache_path
+        self._validators = self._load_validators()
+        self._staged_validators: Dict[str, dict] = {}
+        self.stats = {'requests': 0, 'not_modified': 0, 'errors': 0}
+
+    # ------------------------------------------------------------------
+    # Conditional GET validators
+    # ------------------------------------------------------------------
+
+    def _load_validators(self) -> dict:
+        if self._validator_path and os.path.exists(self._validator_path):
+            try:
+                with open(self._validator_path, 'r') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.debug(f"Ignoring unreadable HTTP validator cache: {e}")
+        return {}
+
+    def save_validators(self):
+        """
+        Commit this cycle's ETag/Last-Modified values and persist them so the
+        next cycle can send conditional GETs. Call only once the fetched items
+        have been stored.
+        """
+        with self._lock:
+            self._validators.update(self._staged_validators)
+            self._staged_validators.clear()
+            data = dict(self._validators)
+        if not self._validator_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self._validator_path)), exist_ok=True)
+            tmp = self._validator_path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp, self._validator_path)
+        except Exception as e:
+            logger.debug(f"Failed to save HTTP validator cache: {e}")
+
+    def discard_validators(self, prefix: str = None):
+        """
+        Drop this cycle's validators; the next cycle re-fetches those URLs in full.
+        With prefix, only URLs starting with it are dropped (one source's feeds).
+        """
+        with self._lock:
+            urls = [u for u in self._staged_validators if prefix is None or u.startswith(prefix)]
+            for url in urls:
+                del self._staged_validators[url]
+            dropped = len(urls)
+        if dropped:
+            logger.info(f"Discarded {dropped} uncommitted HTTP validators")
+
+    # ------------------------------------------------------------------
+    # Fetching
+    # ------------------------------------------------------------------
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self._lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.per_host_limit)
+                self._host_slots[host] = slot
+            return slot
+
+    def get(self, url: str, timeout: float = 15, headers: Dict = None,
+            deadline: float = None, conditional: bool = True) -> FetchResult:
+        """
+        GET with per-host limiting and conditional headers.
+        deadline is a time.monotonic() value; the request timeout never runs past it.
+        """
+        result = FetchResult(url=url)
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                result.error = 'budget exhausted'
+                return result
+
+        request_headers = dict(headers or {})
+        validators = self._validators.get(url, {}) if conditional else {}
+        if validators.get('etag'):
+            request_headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            request_headers['If-Modified-Since'] = validators['last_modified']
+
+        start = time.monotonic()
+        slot = self._host_slot(url)
+        with slot:
+            try:
+                resp = self.session.get(url, headers=request_headers, timeout=timeout)
+                result.status = resp.status_code
+                if resp.status_code == 304:
+                    result.not_modified = True
+                elif resp.status_code == 200:
+                    result.text = resp.text
+                    if conditional:
+                        new_validators = {
+                            'etag': resp.headers.get('ETag'),
+                            'last_modified': resp.headers.get('Last-Modified'),
+                        }
+                        if any(new_validators.values()):
+                            with self._lock:
+                                # Past the deadline the caller has given up on this response
+                                if deadline is None or time.monotonic() < deadline:
+                                    self._staged_validators[url] = new_validators
+            except requests.RequestException as e:
+                result.error = str(e)
+
+        result.elapsed_ms = (time.monotonic() - start) * 1000
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['not_modified'] += int(result.not_modified)
+            self.stats['errors'] += int(bool(result.error))
+        return result
+
+    def get_many(self, urls: List[str], timeout: float = 15, headers: Dict = None,
+                 deadline: float = None) -> List[FetchResult]:
+        """
+        Fetch several URLs concurrently; results are in input order.
+        Threads live only for the call, so an idle fetcher holds none.
+        """
+        if not urls:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls)),
+                                thread_name_prefix='http-fetch') as executor:
+            futures = [executor.submit(self.get, url, timeout, headers, deadline)
+                       for url in urls]
+            return [f.result() for f in futures]
+
+    def close(self):
+        """Release pooled connections. Uncommitted validators are not persisted."""
+        self.session.close()
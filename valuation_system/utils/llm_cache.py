@@ -0,0 +1,229 @@
+"""
+LLM Response Cache
+Content-addressed, disk-backed cache of LLM completions so re-classifying
+overlapping news in the hourly cycle, or re-running a crashed batch, doesn't
+pay for the same prompt twice.
+
+Key: sha256 of (provider, model, system prompt, prompt, temperature,
+max_tokens, response format) — any change to what the provider would see
+is a different entry.
+
+Storage: SQLite file (WAL), one row per response with its expiry, size and
+the token count / cost of the original call (for cost-saved accounting).
+
+- TTL per call site (LLM_CACHE_TTLS), else the caller's ttl, else the default
+- Size-bounded: least-recently-used entries are evicted once the file's
+  payload exceeds LLM_CACHE_MAX_MB (down to 90%)
+- Bypass: LLM_CACHE_ENABLED=0 globally, or use_cache=False per call
+
+Config (.env):
+    LLM_CACHE_ENABLED=1
+    LLM_CACHE_PATH=valuation_system/data/cache/llm_responses.db
+    LLM_CACHE_TTL_SECONDS=21600
+    LLM_CACHE_TTLS=news_classification=86400,qualitative_drivers=86400,group_driver_impact=21600
+    LLM_CACHE_MAX_MB=256
+
+Edge Cases:
+- Corrupt/unwritable cache file → logged, calls go to the provider uncached
+- Expired entry → treated as a miss and deleted on read
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'cache', 'llm_responses.db')
+EVICT_CHECK_EVERY = 50  # puts between size checks
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    cache_key    TEXT PRIMARY KEY,
+    provider     TEXT,
+    model        TEXT,
+    call_site    TEXT,
+    response     TEXT NOT NULL,
+    tokens       INTEGER DEFAULT 0,
+    cost_usd     REAL DEFAULT 0,
+    size_bytes   INTEGER NOT NULL,
+    created_at   REAL NOT NULL,
+    expires_at   REAL NOT NULL,
+    last_access  REAL NOT NULL,
+    hits         INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_responses_access ON responses (last_access);
+CREATE INDEX IF NOT EXISTS idx_responses_expires ON responses (expires_at);
+"""
+
+
+def cache_key(provider: str, model: str, system_prompt: Optional[str], prompt: str,
+              temperature: float, max_tokens: int = None, response_format: str = None) -> str:
+    """Stable hash of everything that determines the provider's answer."""
+    payload = json.dumps([provider, model, system_prompt or '', prompt, round(float(temperature), 4),
+                          max_tokens, response_format or ''], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def parse_ttls(spec: str) -> Dict[str, float]:
+    """Parse 'news_classification=86400,qualitative_drivers=3600' into seconds per call site."""
+    ttls = {}
+    for part in (spec or '').split(','):
+        if '=' in part:
+            name, value = (p.strip() for p in part.split('=', 1))
+            try:
+                ttls[name] = float(value)
+            except ValueError:
+                logger.warning(f"Ignoring invalid LLM cache TTL '{part}'")
+    return ttls
+
+
+class LLMResponseCache:
+    """Thread-safe: every operation is its own short SQLite transaction."""
+
+    def __init__(self, db_path: str = None, default_ttl: float = None,
+                 ttls: Dict[str, float] = None, max_bytes: int = None):
+        self.db_path = db_path or os.getenv('LLM_CACHE_PATH') or DEFAULT_DB_PATH
+        self.default_ttl = default_ttl if default_ttl is not None else float(
+            os.getenv('LLM_CACHE_TTL_SECONDS', 21600))
+        self.ttls = ttls if ttls is not None else parse_ttls(os.getenv('LLM_CACHE_TTLS', ''))
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            float(os.getenv('LLM_CACHE_MAX_MB', 256)) * 1024 * 1024)
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._puts_since_check = 0
+        self.stats = {'hits': 0, 'misses': 0, 'tokens_saved': 0, 'cost_saved_usd': 0.0,
+                      'writes': 0, 'evicted': 0}
+
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN")
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def ttl_for(self, call_site: str = None, ttl: float = None) -> float:
+        """Call-site TTL from config wins, then the caller's ttl, then the default."""
+        if call_site and call_site in self.ttls:
+            return self.ttls[call_site]
+        return ttl if ttl is not None else self.default_ttl
+
+    # ------------------------------------------------------------------
+    # Lookup / store
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[dict]:
+        """Cached {'response', 'model', 'tokens', 'cost_usd'} or None (miss/expired)."""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT response, model, tokens, cost_usd, expires_at FROM responses WHERE cache_key = ?",
+                (key,)).fetchone()
+            if row and row['expires_at'] < now:
+                conn.execute("DELETE FROM responses WHERE cache_key = ?", (key,))
+                row = None
+            if row:
+                conn.execute("UPDATE responses SET last_access = ?, hits = hits + 1 WHERE cache_key = ?",
+                             (now, key))
+
+        with self._lock:
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            self.stats['tokens_saved'] += row['tokens'] or 0
+            self.stats['cost_saved_usd'] += row['cost_usd'] or 0.0
+        return {'response': row['response'], 'model': row['model'],
+                'tokens': row['tokens'] or 0, 'cost_usd': row['cost_usd'] or 0.0}
+
+    def put(self, key: str, response: str, provider: str = None, model: str = None,
+            call_site: str = None, ttl: float = None, tokens: int = 0, cost_usd: float = 0.0):
+        ttl = self.ttl_for(call_site, ttl)
+        if ttl <= 0:
+            return
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (cache_key, provider, model, call_site, response, tokens, "
+                "cost_usd, size_bytes, created_at, expires_at, last_access, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, provider, model, call_site, response, tokens or 0, cost_usd or 0.0, size,
+                 now, now + ttl, now))
+        with self._lock:
+            self.stats['writes'] += 1
+            self._puts_since_check += 1
+            check = self._puts_since_check >= EVICT_CHECK_EVERY
+            if check:
+                self._puts_since_check = 0
+        if check:
+            self.evict()
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def evict(self) -> int:
+        """Drop expired entries, then least-recently-used ones until under 90% of max_bytes."""
+        removed = 0
+        with self._connect() as conn:
+            removed += conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),)).rowcount
+            total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                target = total - int(self.max_bytes * 0.9)
+                freed = 0
+                victims = []
+                for row in conn.execute("SELECT cache_key, size_bytes FROM responses ORDER BY last_access"):
+                    victims.append((row['cache_key'],))
+                    freed += row['size_bytes']
+                    if freed >= target:
+                        break
+                conn.executemany("DELETE FROM responses WHERE cache_key = ?", victims)
+                removed += len(victims)
+        if removed:
+            with self._lock:
+                self.stats['evicted'] += removed
+            logger.info(f"LLM cache evicted {removed} entries")
+        return removed
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def summary(self) -> dict:
+        """Session counters plus what is on disk."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT COUNT(*) AS n, COALESCE(SUM(size_bytes), 0) AS size "
+                               "FROM responses").fetchone()
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses']
+        stats.update(entries=row['n'], size_mb=round(row['size'] / 1024 / 1024, 2),
+                     hit_rate=round(stats['hits'] / lookups, 3) if lookups else 0.0,
+                     cost_saved_usd=round(stats['cost_saved_usd'], 4))
+        return stats
@@ -1,22 +1,50 @@
 """
 LLM Client - Unified interface for Grok (primary), Ollama (fallback), OpenAI (fallback).
 All LLM calls go through this client for consistent behavior and fallback chain.
+Identical requests are served from a disk-backed response cache (utils/llm_cache.py).
 """
 
 import os
 import json
+import time
+import atexit
 import logging
-from typing import Optional
+import threading
+import weakref
+from typing import Callable, Optional, Tuple
 
 from dotenv import load_dotenv
 from openai import OpenAI
 
 from valuation_system.utils.resilience import retry_with_backoff, check_internet
+from valuation_system.utils.rate_limiter import get_provider_limiter
+from valuation_system.utils.llm_cache import LLMResponseCache, cache_key
 
 logger = logging.getLogger(__name__)
 
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
 
+# Cost per 1M tokens (approximate - adjust based on actual pricing)
+COST_PER_1M_TOKENS = {
+    'grok': 2.0,       # grok-3-mini-fast estimate
+    'openai': 5.0,     # gpt-4o estimate
+    'ollama': 0.0,     # local, free
+}
+
+# Daily usage file is rewritten at most this often (and once at exit)
+USAGE_FLUSH_SECONDS = float(os.getenv('LLM_USAGE_FLUSH_SECONDS', 10))
+
+# Live clients, flushed by one exit hook; a dropped client isn't kept alive by it
+_live_clients = weakref.WeakSet()
+
+
+def _flush_live_clients():
+    for client in list(_live_clients):
+        client.flush_usage()
+
+
+atexit.register(_flush_live_clients)
+
 
 class LLMClient:
     """
@@ -29,11 +57,24 @@ class LLMClient:
         self.provider = os.getenv('LLM_PROVIDER', 'grok')
         self.model = os.getenv('LLM_MODEL', 'grok-3-mini-fast')
         self.fallback_chain = os.getenv('LLM_FALLBACK_CHAIN', 'grok,ollama,openai').split(',')
-        self.last_call_metadata = {}
+        self._call_meta = threading.local()  # last_call_metadata, per calling thread
 
         # Daily budget tracking ($5/day cap)
         self.daily_budget_usd = float(os.getenv('LLM_DAILY_BUDGET_USD', '5.0'))
+        self._usage_lock = threading.Lock()  # Calls may run concurrently (batched classification)
         self._load_daily_usage()
+        _live_clients.add(self)
+
+        # Per-provider in-flight cap + request-rate bucket, shared process-wide
+        self.limiter = get_provider_limiter()
+
+        # Content-addressed response cache (LLM_CACHE_ENABLED=0 disables it)
+        self.cache = None
+        if os.getenv('LLM_CACHE_ENABLED', '1') == '1':
+            try:
+                self.cache = LLMResponseCache()
+            except Exception as e:
+                logger.warning(f"LLM response cache unavailable, calls will not be cached: {e}")
 
         # Initialize clients for each provider
         self._clients = {}
@@ -96,7 +137,7 @@ class LLMClient:
                     for attempt in range(2):
                         try:
                             response = requests.get(
-                                'http://localhost:11434/api/tags',
+                                f"{os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')}/api/tags",
                                 timeout=3
                             )
                             if response.status_code == 200:
@@ -132,10 +173,13 @@ class LLMClient:
 
     def analyze(self, prompt: str, system_prompt: str = None,
                 temperature: float = 0.3, max_tokens: int = 2000,
-                response_format: str = None) -> str:
+                response_format: str = None, call_site: str = None,
+                cache_ttl: float = None, use_cache: bool = True,
+                cache_if: Callable[[str], bool] = None) -> str:
         """
         Send a prompt to the LLM and get a response.
-        Tries providers in fallback chain order.
+        Tries providers in fallback chain order; each provider's cached answer
+        for the identical request is returned without calling it.
 
         Args:
             prompt: User prompt
@@ -143,6 +187,10 @@ class LLMClient:
             temperature: 0.0 = deterministic, 1.0 = creative
             max_tokens: Max response length
             response_format: 'json' to request JSON output
+            call_site: Name used for per-call-site cache TTLs (LLM_CACHE_TTLS)
+            cache_ttl: Cache TTL in seconds when the call site has none configured
+            use_cache: False forces a fresh provider call (and doesn't store it)
+            cache_if: Only responses for which this returns True are cached
 
         Returns:
             Response text from the LLM.
@@ -151,35 +199,73 @@ class LLMClient:
         if system_prompt:
             messages.append({'role': 'system', 'content': system_prompt})
         messages.append({'role': 'user', 'content': prompt})
+        cache = self.cache if use_cache else None
+        looked_up = False
 
-        for provider in self.fallback_chain:
-            provider = provider.strip()
-            if provider not in self._clients:
-                continue
-
-            # Skip cloud providers if no internet
-            if provider in ('grok', 'openai') and not check_internet(timeout=3):
-                logger.warning(f"No internet, skipping {provider}")
-                continue
+        try:
+            for provider in self.fallback_chain:
+                provider = provider.strip()
+                if provider not in self._clients:
+                    continue
+
+                key = None
+                if cache is not None:
+                    model = self._clients[provider]['model']
+                    key = cache_key(provider, model, system_prompt, prompt, temperature,
+                                    max_tokens, response_format)
+                    try:
+                        hit = cache.get(key)
+                    except Exception as e:
+                        logger.warning(f"LLM cache lookup failed: {e}")
+                        hit, key = None, None
+                    if hit:
+                        looked_up = False  # Served from cache: no miss for this call
+                        self._track_cache_lookup(hit)
+                        self.last_call_metadata = {'model': hit['model'], 'prompt_tokens': 0,
+                                                   'completion_tokens': 0, 'total_tokens': 0,
+                                                   'cached': True}
+                        logger.debug(f"LLM cache hit ({provider}, call_site={call_site})")
+                        return hit['response']
+                    looked_up = looked_up or bool(key)
+
+                # Skip cloud providers if no internet
+                if provider in ('grok', 'openai') and not check_internet(timeout=3):
+                    logger.warning(f"No internet, skipping {provider}")
+                    continue
 
-            try:
-                result = self._call_provider(
-                    provider, messages, temperature, max_tokens, response_format
-                )
-                if result:
-                    return result
-            except Exception as e:
-                logger.warning(f"LLM provider '{provider}' failed: {e}")
-                continue
+                try:
+                    result, metadata = self._call_provider(
+                        provider, messages, temperature, max_tokens, response_format
+                    )
+                    self.last_call_metadata = metadata
+                    if result:
+                        if key and (cache_if is None or cache_if(result)):
+                            tokens = metadata.get('total_tokens') or 0
+                            try:
+                                cache.put(key, result, provider=provider,
+                                          model=metadata.get('model'),
+                                          call_site=call_site, ttl=cache_ttl, tokens=tokens,
+                                          cost_usd=tokens / 1_000_000 * COST_PER_1M_TOKENS.get(provider, 0.0))
+                            except Exception as e:
+                                logger.warning(f"LLM cache store failed: {e}")
+                        return result
+                except Exception as e:
+                    logger.warning(f"LLM provider '{provider}' failed: {e}")
+                    continue
 
-        logger.error("All LLM providers failed")
-        raise RuntimeError("All LLM providers unavailable")
+            logger.error("All LLM providers failed")
+            raise RuntimeError("All LLM providers unavailable")
+        finally:
+            # One miss per analyze() call, however many providers were looked up
+            if looked_up:
+                self._track_cache_lookup(None)
 
     def analyze_json(self, prompt: str, system_prompt: str = None,
-                     temperature: float = 0.1) -> dict:
+                     temperature: float = 0.1, call_site: str = None,
+                     cache_ttl: float = None, use_cache: bool = True) -> dict:
         """
         Get structured JSON response from LLM.
-        Parses the response and returns a dict.
+        Parses the response and returns a dict. Only parseable responses are cached.
         """
         if system_prompt is None:
             system_prompt = "You are an equity research analyst. Respond ONLY with valid JSON."
@@ -187,16 +273,42 @@ class LLMClient:
         full_prompt = prompt + "\n\nRespond with valid JSON only. No markdown, no code blocks."
 
         response = self.analyze(full_prompt, system_prompt, temperature,
-                                response_format='json')
+                                response_format='json', call_site=call_site,
+                                cache_ttl=cache_ttl, use_cache=use_cache,
+                                cache_if=self._is_json_response)
 
         # Try to parse JSON from response
         return self._extract_json(response)
 
+    def _is_json_response(self, text: str) -> bool:
+        parsed = self._extract_json(text)
+        return not (isinstance(parsed, dict) and parsed.get('error') == 'json_parse_failed')
+
+    def cache_stats(self) -> dict:
+        """Response cache counters for this process plus today's totals."""
+        if self.cache is None:
+            return {'enabled': False}
+        with self._usage_lock:
+            today = dict(self._daily_cache)
+        return dict(self.cache.summary(), enabled=True, today=today)
+
+    @property
+    def last_call_metadata(self) -> dict:
+        """Model/token usage of the calling thread's most recent analyze()."""
+        return getattr(self._call_meta, 'value', {})
+
+    @last_call_metadata.setter
+    def last_call_metadata(self, metadata: dict):
+        self._call_meta.value = metadata
+
     @retry_with_backoff(max_retries=2, base_delay=2.0)
     def _call_provider(self, provider: str, messages: list,
                        temperature: float, max_tokens: int,
-                       response_format: str = None) -> Optional[str]:
-        """Call a specific LLM provider."""
+                       response_format: str = None) -> Tuple[Optional[str], dict]:
+        """
+        Call a specific LLM provider. Returns (content, usage metadata); the
+        metadata travels with the result so concurrent calls can't mix them up.
+        """
         config = self._clients[provider]
         client = config['client']
         model = config['model']
@@ -214,47 +326,54 @@ class LLMClient:
 
         logger.debug(f"Calling LLM provider '{provider}' (model={model})")
 
-        response = client.chat.completions.create(**kwargs)
+        with self.limiter.limit(provider):
+            response = client.chat.completions.create(**kwargs)
 
         # Extract usage metadata (zero extra API calls — already in response)
         usage = getattr(response, 'usage', None)
-        self.last_call_metadata = {
+        metadata = {
             'model': getattr(response, 'model', model),
             'prompt_tokens': getattr(usage, 'prompt_tokens', 0) if usage else 0,
             'completion_tokens': getattr(usage, 'completion_tokens', 0) if usage else 0,
             'total_tokens': getattr(usage, 'total_tokens', 0) if usage else 0,
         }
-        logger.debug(f"LLM usage: model={self.last_call_metadata['model']}, "
-                      f"tokens={self.last_call_metadata['total_tokens']}")
+        logger.debug(f"LLM usage: model={metadata['model']}, "
+                      f"tokens={metadata['total_tokens']}")
 
         content = response.choices[0].message.content
 
         if not content:
             logger.warning(f"Empty response from {provider}")
-            return None
+            return None, metadata
 
         logger.debug(f"LLM response from {provider}: {content[:200]}...")
 
         # Track cost and enforce daily budget
-        self._track_usage_cost(provider)
+        self._track_usage_cost(provider, metadata['total_tokens'])
 
-        return content
+        return content, metadata
 
     def batch_analyze(self, items: list[str], system_prompt: str = None,
                       instruction: str = "Analyze each of the following:",
-                      temperature: float = 0.3) -> list[str]:
+                      temperature: float = 0.3, max_tokens: int = 2000,
+                      call_site: str = None, use_cache: bool = True) -> list:
         """
         Batch analyze multiple items (e.g., news articles) in a single LLM call.
         More cost-efficient than individual calls.
 
         Args:
             items: List of texts to analyze (5-10 recommended)
-            system_prompt: System-level instruction
+            system_prompt: System-level instruction (shared context goes here)
             instruction: How to process each item
             temperature: LLM temperature
+            max_tokens: Max response length for the whole batch
+            call_site: Cache TTL key (see analyze)
+            use_cache: False forces a fresh provider call
 
         Returns:
-            List of analysis results (one per item)
+            List aligned with items. Each entry is the parsed result dict, or
+            None when that item's result could not be identified — callers
+            should retry those individually.
         """
         if not items:
             return []
@@ -268,25 +387,61 @@ class LLMClient:
 
 {chr(10).join(numbered_items)}
 
-Respond with a JSON array containing {len(items)} analysis results, one for each numbered item above.
-Each result should be a complete analysis object."""
+Respond with a JSON object {{"results": [...]}} containing {len(items)} analysis results,
+one for each numbered item above. Each result must be a complete analysis object and
+must include "item": <the item number in brackets>."""
 
         try:
-            result = self.analyze_json(batch_prompt, system_prompt, temperature)
-
-            # Handle different response formats
-            if isinstance(result, list):
-                return result
-            elif isinstance(result, dict) and 'results' in result:
-                return result['results']
-            else:
-                logger.warning(f"Unexpected batch response format: {type(result)}")
-                return [result] * len(items)  # Fallback: same result for all
-
+            if system_prompt is None:
+                system_prompt = "You are an equity research analyst. Respond ONLY with valid JSON."
+            response = self.analyze(
+                batch_prompt + "\n\nRespond with valid JSON only. No markdown, no code blocks.",
+                system_prompt, temperature, max_tokens=max_tokens, response_format='json',
+                call_site=call_site, use_cache=use_cache, cache_if=self._is_json_response)
+            result = self._extract_json(response)
         except Exception as e:
             logger.error(f"Batch analysis failed: {e}")
-            # Fallback: return empty results
-            return [{}] * len(items)
+            return [None] * len(items)
+
+        return self._map_batch_results(result, len(items))
+
+    @staticmethod
+    def _map_batch_results(result, count: int) -> list:
+        """
+        Align a batch response with its input items.
+        Prefers the explicit "item" number; falls back to position only when
+        the model returned exactly one result per item without numbering.
+        """
+        if isinstance(result, dict) and isinstance(result.get('results'), list):
+            entries = result['results']
+        elif isinstance(result, list):
+            entries = result
+        else:
+            logger.warning(f"Unexpected batch response format: {type(result)}")
+            return [None] * count
+
+        entries = [e for e in entries if isinstance(e, dict)]
+        mapped = [None] * count
+        unnumbered = []
+        for entry in entries:
+            number = entry.pop('item', None)
+            try:
+                idx = int(str(number).strip('[] ')) - 1
+            except (TypeError, ValueError):
+                unnumbered.append(entry)
+                continue
+            if 0 <= idx < count and mapped[idx] is None:
+                mapped[idx] = entry
+
+        if unnumbered and len(entries) == count and all(m is None for m in mapped):
+            mapped = unnumbered
+        elif unnumbered:
+            logger.warning(f"Batch response had {len(unnumbered)} unnumbered results, ignored")
+
+        missing = sum(1 for m in mapped if m is None)
+        if missing:
+            logger.warning(f"Batch response missing {missing}/{count} results")
+        return mapped
 
     def _load_daily_usage(self):
         """Load today's usage from tracking file."""
@@ -299,6 +454,9 @@ Each result should be a complete analysis object."""
         self._usage_file = usage_file
         self._today = today
         self._daily_spend_usd = 0.0
+        self._daily_cache = {'hits': 0, 'misses': 0, 'tokens_saved': 0, 'cost_saved_usd': 0.0}
+        self._usage_dirty = False
+        self._usage_saved_at = time.monotonic()
 
         if usage_file.exists():
             try:
@@ -306,46 +464,74 @@ Each result should be a complete analysis object."""
                     data = json.load(f)
                     if data.get('date') == today:
                         self._daily_spend_usd = data.get('spend_usd', 0.0)
+                        self._daily_cache.update(data.get('cache') or {})
                         logger.info(f"Daily LLM spend so far: ${self._daily_spend_usd:.3f}")
             except Exception as e:
                 logger.warning(f"Could not load usage tracking: {e}")
 
-    def _track_usage_cost(self, provider: str):
-        """Track cost of last call and enforce daily budget."""
+    def _track_usage_cost(self, provider: str, tokens: int):
+        """Track cost of one call and enforce daily budget."""
+        with self._usage_lock:
+            self._track_usage_cost_locked(provider, tokens)
+
+    def _track_usage_cost_locked(self, provider: str, tokens: int):
         import datetime
         from pathlib import Path
 
         # Estimate cost based on tokens (approximate pricing)
-        tokens = self.last_call_metadata.get('total_tokens', 0)
-
-        # Cost per 1M tokens (approximate - adjust based on actual pricing)
-        COST_PER_1M_TOKENS = {
-            'grok': 2.0,       # grok-3-mini-fast estimate
-            'openai': 5.0,     # gpt-4o estimate
-            'ollama': 0.0,     # local, free
-        }
-
         cost_usd = (tokens / 1_000_000) * COST_PER_1M_TOKENS.get(provider, 0.0)
         self._daily_spend_usd += cost_usd
 
         logger.debug(f"Call cost: ${cost_usd:.4f}, Daily total: ${self._daily_spend_usd:.3f}")
 
-        # Save updated usage
+        # Save updated usage (batched)
+        self._mark_usage_dirty_locked()
+
+        # Check budget
+        if self._daily_spend_usd > self.daily_budget_usd:
+            logger.warning(f"Daily budget exceeded: ${self._daily_spend_usd:.2f} > ${self.daily_budget_usd:.2f}")
+            # Don't raise exception - just log warning. PM can adjust budget or accept overage.
+
+    def _mark_usage_dirty_locked(self):
+        """Record that usage changed; write the file if the last write is old enough."""
+        self._usage_dirty = True
+        if time.monotonic() - self._usage_saved_at >= USAGE_FLUSH_SECONDS:
+            self._save_daily_usage_locked()
+
+    def flush_usage(self):
+        """Write pending usage counters now (also runs at interpreter exit)."""
+        with self._usage_lock:
+            if self._usage_dirty:
+                self._save_daily_usage_locked()
+
+    def _save_daily_usage_locked(self):
+        import datetime
+
+        self._usage_dirty = False
+        self._usage_saved_at = time.monotonic()
         try:
             self._usage_file.parent.mkdir(parents=True, exist_ok=True)
             with open(self._usage_file, 'w') as f:
                 json.dump({
                     'date': self._today,
                     'spend_usd': self._daily_spend_usd,
+                    'cache': self._daily_cache,
                     'last_updated': datetime.datetime.now().isoformat()
                 }, f, indent=2)
         except Exception as e:
             logger.warning(f"Could not save usage tracking: {e}")
 
-        # Check budget
-        if self._daily_spend_usd > self.daily_budget_usd:
-            logger.warning(f"Daily budget exceeded: ${self._daily_spend_usd:.2f} > ${self.daily_budget_usd:.2f}")
-            # Don't raise exception - just log warning. PM can adjust budget or accept overage.
+    def _track_cache_lookup(self, hit: Optional[dict]):
+        """Count a cache lookup in today's usage; hits also record tokens/cost saved."""
+        with self._usage_lock:
+            if hit is None:
+                self._daily_cache['misses'] += 1
+            else:
+                self._daily_cache['hits'] += 1
+                self._daily_cache['tokens_saved'] += hit['tokens']
+                self._daily_cache['cost_saved_usd'] = round(
+                    self._daily_cache['cost_saved_usd'] + hit['cost_usd'], 6)
+            self._mark_usage_dirty_locked()
 
     def _extract_json(self, text: str) -> dict:
         """Extract JSON from LLM response, handling markdown code blocks."""
@@ -0,0 +1,296 @@
+"""
+Qualitative Driver Pipeline Benchmark
+Throughput of QualitativeDriverAgent.run_batch against a local fake LLM
+server, compared with the sequential per-company path.
+
+- FakeLLMServer: OpenAI-compatible /v1/chat/completions (+ Ollama /api/tags
+  for provider detection) that sleeps a configurable latency per request and
+  answers driver-assessment prompts with valid JSON
+- InMemoryDriverDB: just enough of ValuationMySQLClient (query, query_one,
+  execute, insert_batch) for the agent, with a per-call round-trip delay
+- The real LLMClient is used (provider 'ollama' pointed at the fake server),
+  so the provider limiter and the OpenAI SDK path are part of the measurement
+
+Usage:
+    python -m valuation_system.utils.llm_pipeline_bench --companies 60 --latency 0.5 --workers 1,4,8
+
+Edge Cases:
+- Rate limit (--rpm) applies to every run; at low rpm it, not latency, bounds throughput
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+_DRIVER_LINE = re.compile(r'^- (\S+) \(category: ', re.MULTILINE)
+_SINGLE_DRIVER = re.compile(r'qualitative driver \*\*(\S+)\*\*')
+
+
+class FakeLLMServer:
+    """Threaded local HTTP server imitating an OpenAI-compatible chat endpoint."""
+
+    def __init__(self, latency: float = 0.5, host: str = '127.0.0.1', port: int = 0):
+        self.latency = latency
+        self.requests = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, payload: dict):
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._send({'models': [{'name': 'fake'}]})
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                with server._lock:
+                    server.requests += 1
+                    server._in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server._in_flight)
+                try:
+                    time.sleep(server.latency)
+                    prompt = request.get('messages', [{}])[-1].get('content', '')
+                    self._send({
+                        'id': f"fake-{server.requests}",
+                        'object': 'chat.completion',
+                        'created': int(time.time()),
+                        'model': request.get('model', 'fake'),
+                        'choices': [{'index': 0, 'finish_reason': 'stop',
+                                     'message': {'role': 'assistant',
+                                                 'content': json.dumps(server.answer(prompt))}}],
+                        'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': 50,
+                                  'total_tokens': len(prompt) // 4 + 50},
+                    })
+                finally:
+                    with server._lock:
+                        server._in_flight -= 1
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self.url = f"http://{host}:{self._httpd.server_address[1]}"
+        self._thread = None
+
+    @staticmethod
+    def answer(prompt: str):
+        drivers = _DRIVER_LINE.findall(prompt)
+        if drivers:
+            return {'assessments': [
+                {'driver_name': name, 'direction': 'POSITIVE', 'trend': 'UP',
+                 'reasoning': f"Fake assessment for {name}"}
+                for name in drivers
+            ]}
+        match = _SINGLE_DRIVER.search(prompt)
+        return {'direction': 'NEUTRAL', 'trend': 'STABLE',
+                'reasoning': f"Fake assessment for {match.group(1) if match else 'driver'}"}
+
+    def start(self) -> 'FakeLLMServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class InMemoryDriverDB:
+    """
+    Stand-in for ValuationMySQLClient covering the statements QualitativeDriverAgent
+    issues. Every call sleeps db_latency seconds to model a network round-trip.
+    """
+
+    def __init__(self, companies: int = 60, drivers_per_company: int = 6,
+                 news_per_company: int = 8, db_latency: float = 0.002):
+        self.db_latency = db_latency
+        self.calls = 0
+        self.changelog = []
+        self._lock = threading.Lock()
+        self.companies = [{'company_id': 1000 + i, 'nse_symbol': f"SYM{i}",
+                           'company_name': f"Company {i} Limited", 'priority': 1}
+                          for i in range(companies)]
+        self.drivers = {}
+        for c in self.companies:
+            for j in range(drivers_per_company):
+                driver_id = c['company_id'] * 100 + j
+                self.drivers[driver_id] = {
+                    'id': driver_id, 'driver_level': 'COMPANY', 'driver_category': 'STRATEGIC',
+                    'driver_name': f"driver_{j}", 'company_id': c['company_id'], 'current_value': None,
+                    'weight': 1, 'impact_direction': None, 'trend': None, 'source': 'SEED',
+                    'valuation_group': 'AUTO', 'valuation_subgroup': '', 'updated_by': None,
+                }
+        self.news_per_company = news_per_company
+
+    def _tick(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.db_latency)
+
+    def query(self, sql: str, params: tuple = None) -> list:
+        self._tick()
+        params = params or ()
+        with self._lock:
+            if 'JOIN vs_active_companies' in sql:
+                pending = {d['company_id'] for d in self.drivers.values() if not d['current_value']}
+                return [dict(c) for c in self.companies if c['company_id'] in pending][:params[0]]
+            if 'FROM vs_event_timeline' in sql:
+                return [{'id': i, 'event_date': '2026-01-01', 'headline': f"News item {i}",
+                         'summary': 'Capacity expansion and margin guidance', 'severity': 'MEDIUM',
+                         'source': 'bench', 'scope': 'COMPANY', 'event_type': 'NEWS',
+                         'grok_synopsis': None}
+                        for i in range(self.news_per_company)]
+            if 'SELECT id FROM vs_drivers' in sql:
+                return [{'id': i} for i in params if not self.drivers[i]['current_value']]
+            if 'SELECT id, current_value, updated_by' in sql:
+                return [dict(self.drivers[i]) for i in params]
+            if 'FROM vs_drivers' in sql:
+                return [dict(d) for d in self.drivers.values()
+                        if d['company_id'] == params[0] and not d['current_value']]
+        return []
+
+    def query_one(self, sql: str, params: tuple = None) -> dict:
+        self._tick()
+        with self._lock:
+            if 'FROM vs_active_companies' in sql:
+                company = next(c for c in self.companies if c['nse_symbol'] == params[0])
+                return {'company_id': company['company_id'], 'valuation_group': 'AUTO',
+                        'valuation_subgroup': ''}
+            if 'FROM vs_drivers WHERE id' in sql:
+                return dict(self.drivers[params[0]])
+        return None
+
+    def _fill(self, driver_id: int, value: str, direction: str, trend: str) -> int:
+        driver = self.drivers[driver_id]
+        if driver['current_value']:
+            return 0
+        driver.update(current_value=value, impact_direction=direction, trend=trend,
+                      source='AUTO', updated_by='qualitative_driver_agent')
+        return 1
+
+    def execute(self, sql: str, params: tuple = None) -> int:
+        self._tick()
+        with self._lock:
+            if 'CASE id' in sql:
+                n = len(params) // 7
+                values = [dict(zip(params[g * 2 * n:(g + 1) * 2 * n:2],
+                                   params[g * 2 * n + 1:(g + 1) * 2 * n:2])) for g in range(3)]
+                return sum(self._fill(i, values[0][i], values[1][i], values[2][i])
+                           for i in params[6 * n:])
+            if sql.lstrip().startswith('UPDATE vs_drivers'):
+                value, direction, trend, driver_id = params
+                return self._fill(driver_id, value, direction, trend)
+            if 'INSERT INTO vs_driver_changelog' in sql:
+                self.changelog.append(params)
+                return 1
+        return 0
+
+    def insert_batch(self, table: str, rows: list) -> int:
+        self._tick()
+        with self._lock:
+            self.changelog.extend(rows)
+        return len(rows)
+
+    @property
+    def filled(self) -> int:
+        return sum(1 for d in self.drivers.values() if d['current_value'])
+
+
+def _agent(server: FakeLLMServer, db: InMemoryDriverDB, workers: int, rpm: float, tmp_dir: str):
+    from valuation_system.agents.qualitative_driver_agent import QualitativeDriverAgent
+    from valuation_system.utils.llm_client import LLMClient
+    from valuation_system.utils.rate_limiter import ProviderLimiter
+
+    llm = LLMClient()
+    llm.limiter = ProviderLimiter({'ollama': workers}, {'ollama': rpm})
+    agent = QualitativeDriverAgent(db, llm)
+    agent.llm_workers = workers
+    agent.checkpoint_path = os.path.join(tmp_dir, f"checkpoint_{workers}.json")
+    return agent
+
+
+def run_benchmark(companies: int = 60, drivers: int = 6, latency: float = 0.5,
+                  workers: List[int] = (1, 4, 8), rpm: float = 6000,
+                  db_latency: float = 0.002) -> List[dict]:
+    """
+    Sequential populate_qualitative_drivers loop (without the legacy 1s sleeps)
+    vs run_batch at each worker count. Returns one row per run.
+    """
+    import tempfile
+
+    overrides = {'LLM_FALLBACK_CHAIN': 'ollama', 'EVENT_INDEX_ENABLED': '0', 'LLM_CACHE_ENABLED': '0'}
+    saved_env = {k: os.environ.get(k) for k in list(overrides) + ['OLLAMA_BASE_URL']}
+    report = []
+    with FakeLLMServer(latency=latency) as server:
+        os.environ.update(overrides, OLLAMA_BASE_URL=server.url)
+        tmp_dir = tempfile.mkdtemp(prefix='qd_bench_')
+        try:
+            runs = [('sequential', 1)] + [('pipeline', w) for w in workers]
+            for mode, w in runs:
+                db = InMemoryDriverDB(companies, drivers, db_latency=db_latency)
+                agent = _agent(server, db, w, rpm, tmp_dir)
+                requests_before = server.requests
+                server.max_in_flight = 0
+                start = time.perf_counter()
+                if mode == 'sequential':
+                    agent._llm_pause = 0
+                    for c in db.companies:
+                        agent.populate_qualitative_drivers(c['company_id'], c['nse_symbol'], c['company_name'])
+                else:
+                    agent.run_batch(max_companies=companies, resume=False)
+                elapsed = time.perf_counter() - start
+                report.append({
+                    'mode': mode,
+                    'llm_workers': w,
+                    'elapsed_s': round(elapsed, 2),
+                    'companies_per_min': round(companies / elapsed * 60, 1),
+                    'llm_requests': server.requests - requests_before,
+                    'max_in_flight': server.max_in_flight,
+                    'drivers_filled': db.filled,
+                    'db_calls': db.calls,
+                })
+        finally:
+            for k, v in saved_env.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Qualitative driver pipeline throughput benchmark')
+    parser.add_argument('--companies', type=int, default=60)
+    parser.add_argument('--drivers', type=int, default=6, help='Empty SEED drivers per company')
+    parser.add_argument('--latency', type=float, default=0.5, help='Fake LLM latency per request (s)')
+    parser.add_argument('--workers', type=str, default='1,4,8', help='Comma-separated LLM worker counts')
+    parser.add_argument('--rpm', type=float, default=6000, help='Provider rate limit (requests/minute)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    for row in run_benchmark(args.companies, args.drivers, args.latency,
+                             [int(w) for w in args.workers.split(',')], args.rpm):
+        print(row)
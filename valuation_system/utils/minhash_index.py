@@ -0,0 +1,401 @@
+"""
+MinHash / LSH Near-Duplicate Index
+Constant-cost lookup of similar headlines, replacing pairwise Jaccard scans.
+
+Each entry is a set of tokens (headline words). A MinHash signature of
+num_perm hashes is split into bands of rows_per_band; two entries become
+candidates when any band matches exactly. Candidates are then verified with
+the exact Jaccard similarity, so there are no false positives — LSH only
+decides which entries get compared.
+
+Recall for the default 128 perms / 2 rows (64 bands):
+    Jaccard 0.20 → 93%    0.25 → 98.4%    0.30 → 99.8%    0.40 → ~100%
+
+Buckets holding more than max_bucket entries (bands made of very common
+words) are skipped: they carry little signal and would make lookup cost
+grow with the index. A real near-duplicate shares many bands, so it is still
+found through the others.
+
+Storage:
+- Band keys live in numpy arrays: a sorted "base" (searchsorted lookup) plus a
+  small unsorted "pending" tail for fresh adds, merged when it grows. Memory
+  is ~1 KB per entry, independent of vocabulary.
+- Optional SQLite file (db_path) persists entries + small state values so the
+  index survives restarts and is only updated incrementally.
+
+Benchmark:
+    python -m valuation_system.utils.minhash_index --bench 1000,10000,100000
+"""
+
+import os
+import json
+import time
+import zlib
+import random
+import sqlite3
+import logging
+import argparse
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_PRIME = np.uint64(4294967291)  # Largest prime < 2^32: (a*h + b) stays inside uint64
+_MIX = np.uint64(0x100000001B3)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key    TEXT PRIMARY KEY,
+    ts     REAL NOT NULL,
+    tokens TEXT NOT NULL,
+    meta   TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_entries_ts ON entries (ts);
+CREATE TABLE IF NOT EXISTS state (
+    name  TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def jaccard(set_a, set_b) -> float:
+    """Jaccard similarity between two sets (0 when either is empty)."""
+    if not set_a or not set_b:
+        return 0.0
+    return len(set_a & set_b) / len(set_a | set_b)
+
+
+class MinHashLSHIndex:
+    """
+    Incremental MinHash-LSH index over token sets.
+
+    add()/remove()/query() are O(bands) per call plus the exact check on the
+    (few) candidates, independent of how many entries the index holds.
+    """
+
+    def __init__(self, num_perm: int = 128, rows_per_band: int = 2,
+                 db_path: str = None, window_hours: float = None, seed: int = 1,
+                 max_bucket: int = 256):
+        if num_perm % rows_per_band:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of rows_per_band ({rows_per_band})")
+        self.num_perm = num_perm
+        self.rows_per_band = rows_per_band
+        self.num_bands = num_perm // rows_per_band
+        self.window_hours = window_hours
+        self.max_bucket = max_bucket
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 2 ** 31, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, 2 ** 31, size=num_perm).astype(np.uint64)
+        self._band_salt = rng.randint(0, 2 ** 62, size=self.num_bands, dtype=np.int64).astype(np.uint64)
+
+        # Entry storage (position-addressed)
+        self._keys: List[str] = []
+        self._tokens: List[frozenset] = []
+        self._meta: List[dict] = []
+        self._ts: List[float] = []
+        self._alive: List[bool] = []
+        self._pos: Dict[str, int] = {}
+        self._band_rows = np.zeros((0, self.num_bands), dtype=np.uint64)
+
+        # Sorted base over positions < _n_base; positions >= _n_base are pending
+        self._n_base = 0
+        self._sorted_keys = np.zeros(0, dtype=np.uint64)
+        self._sorted_pos = np.zeros(0, dtype=np.int64)
+
+        self.db_path = db_path
+        self._conn = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(db_path)
+            self._conn.executescript(_SCHEMA)
+            self._load()
+
+    def __len__(self):
+        return len(self._pos)
+
+    def __contains__(self, key: str):
+        return key in self._pos
+
+    # ------------------------------------------------------------------
+    # Hashing
+    # ------------------------------------------------------------------
+
+    def signature(self, tokens: Iterable[str]) -> Optional[np.ndarray]:
+        """MinHash signature (num_perm,) uint64; None for an empty token set."""
+        hashes = np.fromiter((zlib.crc32(t.encode()) for t in tokens), dtype=np.uint64)
+        if hashes.size == 0:
+            return None
+        return ((self._a[:, None] * hashes[None, :] + self._b[:, None]) % _PRIME).min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> np.ndarray:
+        """Collapse each band's rows into one salted uint64 key."""
+        rows = signature.reshape(self.num_bands, self.rows_per_band)
+        keys = rows[:, 0].copy()
+        for j in range(1, self.rows_per_band):
+            keys = keys * _MIX ^ rows[:, j]
+        return keys ^ self._band_salt
+
+    # ------------------------------------------------------------------
+    # Mutation
+    # ------------------------------------------------------------------
+
+    def add(self, key: str, tokens: Iterable[str], meta: dict = None,
+            ts: float = None, persist: bool = True) -> bool:
+        """Add an entry. Returns False (no-op) if the key exists or tokens are empty."""
+        added = self._add(key, frozenset(tokens), meta or {}, ts if ts is not None else time.time())
+        if added and persist and self._conn is not None:
+            pos = self._pos[key]
+            with self._conn:
+                self._persist(self._conn, pos)
+        return added
+
+    def add_many(self, entries: Iterable[Tuple[str, Iterable[str], dict, Optional[float]]]) -> int:
+        """Bulk add (key, tokens, meta, ts) tuples in one transaction."""
+        added = []
+        now = time.time()
+        for key, tokens, meta, ts in entries:
+            if self._add(key, frozenset(tokens), meta or {}, ts if ts is not None else now,
+                         merge=False):
+                added.append(self._pos[key])
+        if added and self._conn is not None:
+            with self._conn:
+                for pos in added:
+                    self._persist(self._conn, pos)
+        self._maybe_merge()
+        return len(added)
+
+    def _add(self, key, tokens: frozenset, meta: dict, ts: float, merge: bool = True) -> bool:
+        if key in self._pos or not tokens:
+            return False
+        band_keys = self._band_keys(self.signature(tokens))
+
+        pos = len(self._keys)
+        if pos >= self._band_rows.shape[0]:
+            grown = np.zeros((max(64, pos * 2), self.num_bands), dtype=np.uint64)
+            grown[:pos] = self._band_rows[:pos]
+            self._band_rows = grown
+        self._band_rows[pos] = band_keys
+
+        self._keys.append(key)
+        self._tokens.append(tokens)
+        self._meta.append(meta)
+        self._ts.append(ts)
+        self._alive.append(True)
+        self._pos[key] = pos
+        if merge:
+            self._maybe_merge()
+        return True
+
+    def remove(self, key: str, persist: bool = True) -> bool:
+        pos = self._pos.pop(key, None)
+        if pos is None:
+            return False
+        self._alive[pos] = False
+        if persist and self._conn is not None:
+            with self._conn:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        return True
+
+    def evict_before(self, cutoff_ts: float) -> int:
+        """Drop entries older than cutoff_ts (epoch seconds)."""
+        stale = [k for k, pos in self._pos.items() if self._ts[pos] < cutoff_ts]
+        for key in stale:
+            self.remove(key, persist=False)
+        if self._conn is not None:
+            with self._conn:
+                self._conn.execute("DELETE FROM entries WHERE ts < ?", (cutoff_ts,))
+        if stale:
+            self._compact()
+        return len(stale)
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    def _candidate_positions(self, band_keys: np.ndarray) -> set:
+        positions = set()
+        if self._n_base:
+            left = np.searchsorted(self._sorted_keys, band_keys, side='left')
+            right = np.searchsorted(self._sorted_keys, band_keys, side='right')
+            for lo, hi in zip(left.tolist(), right.tolist()):
+                if hi > lo and (hi - lo <= self.max_bucket or not self.max_bucket):
+                    positions.update(self._sorted_pos[lo:hi].tolist())
+        n = len(self._keys)
+        if n > self._n_base:
+            pending = self._band_rows[self._n_base:n]
+            hits = np.nonzero((pending == band_keys).any(axis=1))[0]
+            positions.update((hits + self._n_base).tolist())
+        return positions
+
+    def query(self, tokens: Iterable[str], min_similarity: float = 0.0,
+              since_ts: float = None) -> List[Tuple[str, float, dict]]:
+        """
+        Entries with exact Jaccard > min_similarity (strict, like the
+        pairwise check it replaces), best first: [(key, similarity, meta)].
+        """
+        tokens = frozenset(tokens)
+        if not tokens or not self._pos:
+            return []
+        band_keys = self._band_keys(self.signature(tokens))
+
+        matches = []
+        for pos in self._candidate_positions(band_keys):
+            if not self._alive[pos] or (since_ts is not None and self._ts[pos] < since_ts):
+                continue
+            similarity = jaccard(tokens, self._tokens[pos])
+            if similarity > min_similarity:
+                matches.append((self._keys[pos], similarity, self._meta[pos]))
+        matches.sort(key=lambda m: m[1], reverse=True)
+        return matches
+
+    def get_meta(self, key: str) -> Optional[dict]:
+        pos = self._pos.get(key)
+        return self._meta[pos] if pos is not None else None
+
+    # ------------------------------------------------------------------
+    # Base/pending maintenance
+    # ------------------------------------------------------------------
+
+    def _maybe_merge(self):
+        pending = len(self._keys) - self._n_base
+        if pending > max(1024, self._n_base // 4):
+            self._merge()
+
+    def _merge(self):
+        """Fold pending entries into the sorted base (dead entries are skipped)."""
+        n = len(self._keys)
+        alive = np.fromiter(self._alive, dtype=bool, count=n)
+        positions = np.nonzero(alive)[0]
+        keys = self._band_rows[positions].ravel()
+        owners = np.repeat(positions, self.num_bands)
+        order = np.argsort(keys, kind='stable')
+        self._sorted_keys = keys[order]
+        self._sorted_pos = owners[order]
+        self._n_base = n
+
+    def _compact(self):
+        """Rebuild storage without dead entries (after bulk eviction)."""
+        live = [pos for pos, alive in enumerate(self._alive) if alive]
+        self._keys = [self._keys[p] for p in live]
+        self._tokens = [self._tokens[p] for p in live]
+        self._meta = [self._meta[p] for p in live]
+        self._ts = [self._ts[p] for p in live]
+        self._alive = [True] * len(live)
+        self._band_rows = self._band_rows[live].copy() if live else \
+            np.zeros((0, self.num_bands), dtype=np.uint64)
+        self._pos = {k: i for i, k in enumerate(self._keys)}
+        self._merge()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _persist(self, conn, pos: int):
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, ts, tokens, meta) VALUES (?, ?, ?, ?)",
+            (self._keys[pos], self._ts[pos], json.dumps(sorted(self._tokens[pos])),
+             json.dumps(self._meta[pos], default=str))
+        )
+
+    def _load(self):
+        cutoff = time.time() - self.window_hours * 3600 if self.window_hours else 0
+        rows = self._conn.execute(
+            "SELECT key, ts, tokens, meta FROM entries WHERE ts >= ? ORDER BY ts", (cutoff,)
+        ).fetchall()
+        for key, ts, tokens, meta in rows:
+            self._add(key, frozenset(json.loads(tokens)), json.loads(meta) if meta else {},
+                      ts, merge=False)
+        self._merge()
+        if rows:
+            logger.debug(f"Loaded {len(rows)} entries into LSH index from {self.db_path}")
+
+    def get_state(self, name: str, default=None):
+        if self._conn is None:
+            return default
+        row = self._conn.execute("SELECT value FROM state WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_state(self, name: str, value):
+        if self._conn is None:
+            return
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO state (name, value) VALUES (?, ?)",
+                               (name, json.dumps(value)))
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# =========================================================================
+# BENCHMARK
+# =========================================================================
+
+def _synthetic_headlines(n: int, dup_rate: float = 0.2, seed: int = 7) -> List[frozenset]:
+    """Token sets shaped like deduped headlines: ~8 words from a 20k vocabulary,
+    with dup_rate of items being light rewrites of an earlier item."""
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(20000)]
+    weights = [1.0 / (i + 1) ** 0.8 for i in range(len(vocab))]  # Zipf-ish word frequency
+    items = []
+    for _ in range(n):
+        if items and rng.random() < dup_rate:
+            base = list(rng.choice(items))
+            keep = base[:max(2, len(base) - rng.randint(1, 3))]
+            items.append(frozenset(keep + rng.choices(vocab, weights, k=rng.randint(1, 3))))
+        else:
+            items.append(frozenset(rng.choices(vocab, weights, k=rng.randint(6, 10))))
+    return items
+
+
+def run_benchmark(sizes: List[int], threshold: float = 0.25, queries: int = 500) -> List[dict]:
+    """
+    For each corpus size: index build time, per-query latency (LSH vs the
+    pairwise scan it replaces, measured on a sample) and recall vs exact.
+    """
+    report = []
+    for n in sizes:
+        corpus = _synthetic_headlines(n + queries)
+        indexed, probes = corpus[:n], corpus[n:]
+
+        start = time.perf_counter()
+        index = MinHashLSHIndex()
+        index.add_many((str(i), tokens, None, None) for i, tokens in enumerate(indexed))
+        build_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        lsh_hits = [index.query(tokens, threshold) for tokens in probes]
+        lsh_ms = (time.perf_counter() - start) * 1000 / len(probes)
+
+        sample = probes[:max(10, min(len(probes), 200_000 // max(n, 1)))]
+        start = time.perf_counter()
+        exact_hits = [[i for i, other in enumerate(indexed) if jaccard(tokens, other) > threshold]
+                      for tokens in sample]
+        scan_ms = (time.perf_counter() - start) * 1000 / len(sample)
+
+        expected = sum(len(h) for h in exact_hits)
+        found = sum(len(lsh_hits[i]) for i in range(len(sample)))
+        report.append({
+            'corpus': n,
+            'build_s': round(build_s, 2),
+            'lsh_query_ms': round(lsh_ms, 3),
+            'pairwise_query_ms': round(scan_ms, 3),
+            'speedup': round(scan_ms / lsh_ms, 1) if lsh_ms else None,
+            'recall': round(found / expected, 3) if expected else 1.0,
+        })
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='MinHash LSH near-duplicate index')
+    parser.add_argument('--bench', type=str, default='1000,10000,100000',
+                        help='Comma-separated corpus sizes to benchmark')
+    parser.add_argument('--threshold', type=float, default=0.25)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    for row in run_benchmark([int(s) for s in args.bench.split(',')], args.threshold):
+        print(row)
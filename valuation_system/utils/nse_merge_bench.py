@@ -0,0 +1,172 @@
+"""
+NSE Merge Benchmark
+Time merge_nse_into_financials over a synthetic batch of companies:
+the previous column-scanning implementation vs the indexed per-company path
+vs the one-pass batch API, with a parity check between all three.
+
+- Synthetic NSE wide frame: N companies × (21 metrics + filing metadata) × Q quarters
+- Synthetic core financials: quarterly dicts ending a few quarters earlier,
+  with some metrics absent (exercises the "create metric_quarterly" path)
+
+Usage:
+    python -m valuation_system.utils.nse_merge_bench --companies 5000 --quarters 12
+
+Edge Cases:
+- The legacy path is reproduced here verbatim (boolean scan + header parsing per call)
+  so the comparison survives the loader's rewrite
+"""
+
+import copy
+import time
+import logging
+import argparse
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from valuation_system.data.loaders.nse_data_loader import (
+    NSEDataLoader, MERGE_METRICS, merge_nse_into_financials, merge_nse_into_financials_batch,
+)
+
+logger = logging.getLogger(__name__)
+
+FRAME_METRICS = MERGE_METRICS + ['totalincome', 'curr_tax', 'def_tax', 'pbt']
+
+
+def synthetic_frame(companies: int, quarters: int, first_quarter: int = 140, seed: int = 7) -> pd.DataFrame:
+    """Wide NSE frame in the nse_quarterly_data.csv layout, ~10% cells missing."""
+    rng = np.random.default_rng(seed)
+    q_range = range(first_quarter, first_quarter + quarters)
+    columns = {'company_name': [f"Company {i}" for i in range(companies)],
+               'nse_symbol': [f"SYM{i:05d}" for i in range(companies)],
+               'data_source': 'NSE_FILING', 'fetch_date': '2026-01-15'}
+    for metric in FRAME_METRICS:
+        for q in q_range:
+            values = rng.uniform(1, 5000, companies).round(2)
+            values[rng.random(companies) < 0.1] = np.nan
+            columns[f"{metric}_{q}"] = values
+    for q in q_range:
+        columns[f"filing_date_{q}"] = '30-OCT-2024'
+        columns[f"result_type_{q}"] = 'C'
+    return pd.DataFrame(columns)
+
+
+def synthetic_financials(companies: int, core_latest: int = 145, seed: int = 11) -> Dict[str, Dict]:
+    rng = np.random.default_rng(seed)
+    batch = {}
+    for i in range(companies):
+        latest = core_latest - int(rng.integers(0, 4))
+        fin = {}
+        for metric in MERGE_METRICS:
+            if rng.random() < 0.2:
+                continue  # Metric absent from core
+            key = f"{metric}_quarterly" if rng.random() < 0.8 else metric
+            fin[key] = {q: float(q) for q in range(latest - 12, latest + 1)}
+        batch[f"SYM{i:05d}"] = fin
+    return batch
+
+
+def _legacy_merge(financials: Dict, nse_symbol: str, df: pd.DataFrame) -> Dict:
+    """merge_nse_into_financials as it was before the loader was indexed."""
+    matches = df[df['nse_symbol'] == nse_symbol]
+    if len(matches) == 0:
+        return financials
+    company_data = matches.iloc[0]
+
+    for metric in MERGE_METRICS:
+        nse_data = {}
+        for col in company_data.index:
+            if col.startswith(f'{metric}_') and col.split('_')[-1].isdigit():
+                val = company_data[col]
+                if pd.notna(val):
+                    nse_data[int(col.split('_')[-1])] = float(val)
+        if not nse_data:
+            continue
+
+        fin_key = None
+        if f'{metric}_quarterly' in financials:
+            fin_key = f'{metric}_quarterly'
+        elif metric in financials:
+            fin_key = metric
+        elif f'{metric}_annual' in financials:
+            fin_key = f'{metric}_annual'
+        if fin_key is None:
+            fin_key = f'{metric}_quarterly'
+            financials[fin_key] = {}
+
+        core_data = financials[fin_key]
+        if not isinstance(core_data, dict):
+            continue
+        core_latest_idx = max(core_data.keys()) if core_data else 0
+        for q_idx, value in nse_data.items():
+            if q_idx > core_latest_idx:
+                core_data[q_idx] = value
+    return financials
+
+
+def _loader_for(df: pd.DataFrame) -> NSEDataLoader:
+    loader = NSEDataLoader.__new__(NSEDataLoader)
+    loader.df = df
+    loader.store = None
+    loader.source = 'synthetic'
+    loader.csv_path = None
+    loader.loaded_at = None
+    loader._build_index()
+    return loader
+
+
+def run_benchmark(companies: int = 5000, quarters: int = 12, legacy_sample: int = None) -> List[dict]:
+    """
+    One row per implementation. legacy_sample times the legacy path on the
+    first N companies only and extrapolates (it is O(companies²)).
+    """
+    df = synthetic_frame(companies, quarters)
+    base = synthetic_financials(companies)
+    symbols = list(base)
+    report = []
+
+    start = time.perf_counter()
+    loader = _loader_for(df)
+    index_s = time.perf_counter() - start
+
+    legacy_n = min(legacy_sample or companies, companies)
+    legacy = {s: copy.deepcopy(base[s]) for s in symbols[:legacy_n]}
+    start = time.perf_counter()
+    for symbol, fin in legacy.items():
+        _legacy_merge(fin, symbol, df)
+    legacy_s = (time.perf_counter() - start) * companies / legacy_n
+    report.append({'mode': 'legacy_scan', 'companies': companies, 'elapsed_s': round(legacy_s, 3),
+                   'extrapolated_from': legacy_n if legacy_n < companies else None})
+
+    per_company = copy.deepcopy(base)
+    start = time.perf_counter()
+    for symbol, fin in per_company.items():
+        merge_nse_into_financials(fin, symbol, loader)
+    report.append({'mode': 'indexed_per_company', 'companies': companies,
+                   'elapsed_s': round(time.perf_counter() - start, 3), 'index_build_s': round(index_s, 3)})
+
+    batch = copy.deepcopy(base)
+    start = time.perf_counter()
+    merge_nse_into_financials_batch(batch, loader)
+    report.append({'mode': 'batch', 'companies': companies,
+                   'elapsed_s': round(time.perf_counter() - start, 3), 'index_build_s': round(index_s, 3)})
+
+    parity = all(per_company[s] == batch[s] for s in symbols) and \
+        all(legacy[s] == batch[s] for s in legacy)
+    for row in report:
+        row['parity'] = parity
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='NSE merge into financials benchmark')
+    parser.add_argument('--companies', type=int, default=5000)
+    parser.add_argument('--quarters', type=int, default=12)
+    parser.add_argument('--legacy-sample', type=int, default=None,
+                        help='Time the legacy path on N companies and extrapolate')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    for row in run_benchmark(args.companies, args.quarters, args.legacy_sample):
+        print(row)
@@ -3,6 +3,19 @@
 Populate Peer Statistics Cache
 Pre-compute peer statistics for all valuation subgroups to enable fast quality score calculations.
 
+PeerStatsEngine builds one company × metric frame for the universe (each
+company's financials loaded once), computes every subgroup statistic
+(median, p25/p75, count, trimmed mean per metric) in one grouped aggregation,
+and writes the results with chunked multi-row upserts.
+
+Incremental mode recomputes only subgroups whose member list or underlying
+financials changed since the last run:
+- members_hash: hash of the subgroup's active company_ids
+- source_version: core CSV / fullstats file signatures (name, mtime, size);
+  unchanged members + unchanged source → the subgroup is not reloaded at all
+- inputs_hash: hash of the subgroup's metric inputs; a reloaded subgroup whose
+  inputs hash is unchanged only gets its source_version bumped
+
 Usage:
     # Populate all subgroups
     python -m valuation_system.utils.populate_peer_stats
@@ -12,13 +25,35 @@ Usage:
 
     # Force refresh (ignore last_updated)
     python -m valuation_system.utils.populate_peer_stats --force
+
+    # Only subgroups whose members or financials changed
+    python -m valuation_system.utils.populate_peer_stats --incremental
+
+Config (.env):
+    PEER_STATS_TRIM_FRACTION=0.1    # cut from each tail for the trimmed mean
+    PEER_STATS_UPSERT_CHUNK=200     # subgroup rows per INSERT ... ON DUPLICATE KEY UPDATE
+
+Edge Cases:
+- Needs storage/migrations/005_add_peer_stats_distribution.sql (p25/p75,
+  trimmed mean, count and fingerprint columns)
+- Active companies with no kbapp_marketscrip match are not peers (peer_count
+  counts matched companies, as before)
+- A metric with no values in a subgroup is stored as NULL with count 0
 """
 
 import os
 import sys
+import time
+import math
+import hashlib
 import logging
 import argparse
-from datetime import datetime, timedelta
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
 
 # Add project root to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
@@ -26,6 +61,8 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 from valuation_system.data.loaders.core_loader import CoreDataLoader
 from valuation_system.storage.mysql_client import ValuationMySQLClient
 
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -33,152 +70,329 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-
-def populate_peer_stats(subgroup_filter=None, force_refresh=False):
+TRIM_FRACTION = float(os.getenv('PEER_STATS_TRIM_FRACTION', '0.1'))
+UPSERT_CHUNK = int(os.getenv('PEER_STATS_UPSERT_CHUNK', '200'))
+STALE_DAYS = 7
+
+# Metric key → column suffix in vs_subgroup_peer_stats
+METRICS = {
+    'roce': 'roce',
+    'revenue_cagr': 'revenue_cagr',
+    'de_ratio': 'de_ratio',
+    'promoter_pledge': 'promoter_pledge',
+}
+STAT_COLUMNS = (['peer_count']
+                + [f"{stat}_{col}" for col in METRICS.values()
+                   for stat in ('median', 'p25', 'p75', 'trimmed_mean', 'count')]
+                + ['members_hash', 'inputs_hash', 'source_version'])
+
+MEMBERS_SQL = '''
+    SELECT DISTINCT a.valuation_subgroup, a.company_id, m.marketscrip_id AS scrip_id, m.symbol, m.name
+    FROM vs_active_companies a
+    LEFT JOIN mssdb.kbapp_marketscrip m ON a.company_id = m.marketscrip_id
+    WHERE a.is_active = 1 AND a.valuation_subgroup IS NOT NULL
+'''
+
+
+def extract_peer_metrics(core, financials: dict) -> dict:
+    """Peer metrics for one company (keys of METRICS; absent → missing)."""
+    row = {}
+    # ROCE, normalized to decimal (0.15 = 15%)
+    roce_series = financials.get('roce', {})
+    if roce_series:
+        latest_roce = core.get_latest_value(roce_series)
+        if latest_roce and latest_roce > 0:
+            row['roce'] = latest_roce / 100 if latest_roce > 1 else latest_roce
+
+    # 5yr revenue CAGR
+    sales = financials.get('sales_annual', {})
+    if sales:
+        cagr = core.calculate_cagr(sales, years=5)
+        if cagr is not None:
+            row['revenue_cagr'] = cagr
+
+    # D/E ratio
+    debt = core.get_latest_value(financials.get('debt', {})) or 0
+    nw = core.get_latest_value(financials.get('networth', {})) or 1
+    if nw > 0:
+        row['de_ratio'] = debt / nw
+
+    # Promoter pledge (fullstats quarterly data)
+    pledge_series = financials.get('pledgebypromoter_quarterly', {})
+    if pledge_series:
+        latest_pledge = core.get_latest_value(pledge_series)
+        if latest_pledge is not None:
+            row['promoter_pledge'] = latest_pledge
+    return row
+
+
+def source_version(core) -> str:
+    """Signature of the financials source files; changes whenever they are rewritten."""
+    paths = [getattr(core, 'csv_path', None)]
+    fullstats = getattr(core, '_fullstats_path', None)
+    if fullstats is None and hasattr(core, '_resolve_fullstats_path'):
+        fullstats = core._resolve_fullstats_path()
+    paths.append(fullstats)
+    parts = []
+    for path in paths:
+        if path and os.path.exists(path):
+            st = os.stat(path)
+            parts.append(f"{os.path.basename(path)}:{int(st.st_mtime)}:{st.st_size}")
+    return '|'.join(parts)[:128]
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def grouped_stats(codes: np.ndarray, values: np.ndarray, n_groups: int,
+                  trim: float = TRIM_FRACTION) -> Dict[str, np.ndarray]:
+    """
+    median / p25 / p75 / trimmed mean / count of values per group code, in one
+    sort over all groups (NaN values ignored; empty groups → NaN, count 0).
+    """
+    keep = ~np.isnan(values)
+    codes, values = codes[keep], values[keep]
+    order = np.lexsort((values, codes))
+    codes, values = codes[order], values[order]
+
+    count = np.bincount(codes, minlength=n_groups)
+    start = np.concatenate([[0], np.cumsum(count)[:-1]])
+    rank = np.arange(len(values)) - start[codes]
+    has = count > 0
+
+    def at(pos: np.ndarray) -> np.ndarray:
+        return values[np.clip(start + pos, 0, max(len(values) - 1, 0))] if len(values) else np.zeros(n_groups)
+
+    def quantile(q: float) -> np.ndarray:
+        pos = (count - 1) * q
+        lo, hi = np.floor(pos).astype(int), np.ceil(pos).astype(int)
+        a, b = at(lo), at(hi)
+        return np.where(has, a + (b - a) * (pos - lo), np.nan)
+
+    lo, hi = (count - 1) // 2, count // 2
+    k = np.floor(count * trim).astype(int)
+    inner = (rank >= k[codes]) & (rank < (count - k)[codes])
+    inner_sum = np.bincount(codes, weights=np.where(inner, values, 0.0), minlength=n_groups)
+    inner_n = np.bincount(codes, weights=inner.astype(float), minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            'median': np.where(has, (at(lo) + at(hi)) / 2, np.nan),
+            'p25': quantile(0.25),
+            'p75': quantile(0.75),
+            'trimmed_mean': np.where(inner_n > 0, inner_sum / inner_n, np.nan),
+            'count': count,
+        }
+
+
+class PeerStatsEngine:
+    """Universe-wide peer statistics for vs_subgroup_peer_stats."""
+
+    def __init__(self, core=None, mysql=None, trim_fraction: float = TRIM_FRACTION,
+                 chunk_size: int = UPSERT_CHUNK):
+        self.core = core or CoreDataLoader()
+        self.mysql = mysql or ValuationMySQLClient()
+        self.trim_fraction = trim_fraction
+        self.chunk_size = max(1, chunk_size)
+        self.companies_loaded = 0
+
+    # -------------------------------------------------------------------------
+    # Inputs
+    # -------------------------------------------------------------------------
+
+    def load_members(self, subgroup_filter: str = None) -> pd.DataFrame:
+        """Active (subgroup, company) rows: valuation_subgroup, company_id, scrip_id, symbol, name."""
+        sql, params = MEMBERS_SQL, ()
+        if subgroup_filter:
+            sql += ' AND a.valuation_subgroup = %s'
+            params = (subgroup_filter,)
+        rows = self.mysql.query(sql, params)
+        return pd.DataFrame(rows, columns=['valuation_subgroup', 'company_id', 'scrip_id', 'symbol', 'name'])
+
+    def build_metric_frame(self, members: pd.DataFrame) -> pd.DataFrame:
+        """members + one column per metric; financials are loaded once per company name."""
+        peers = members[members['scrip_id'].notna()]
+        cache: Dict[str, dict] = {}
+        rows = []
+        for name, symbol in zip(peers['name'], peers['symbol']):
+            if name not in cache:
+                metrics = {}
+                try:
+                    financials = self.core.get_company_financials(name)
+                    if financials:
+                        metrics = extract_peer_metrics(self.core, financials)
+                except Exception as e:
+                    logger.debug(f"    Skipping {symbol}: {e}")
+                cache[name] = metrics
+            rows.append(cache[name])
+        self.companies_loaded += len(cache)
+        frame = pd.DataFrame(rows, columns=list(METRICS), index=peers.index, dtype=float)
+        return pd.concat([peers, frame], axis=1)
+
+    # -------------------------------------------------------------------------
+    # Aggregation
+    # -------------------------------------------------------------------------
+
+    def aggregate(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """One row per subgroup with every STAT_COLUMNS statistic (fingerprints except source_version)."""
+        labels, codes = np.unique(frame['valuation_subgroup'].to_numpy(dtype=str), return_inverse=True)
+        n = len(labels)
+        out = pd.DataFrame(index=pd.Index(labels, name='valuation_subgroup'))
+        out['peer_count'] = np.bincount(codes, minlength=n)
+
+        # All metrics in one pass: group = subgroup × metric
+        keys = list(METRICS)
+        long_codes = np.concatenate([codes * len(keys) + j for j in range(len(keys))])
+        long_values = np.concatenate([frame[key].to_numpy(dtype=float) for key in keys])
+        stats = grouped_stats(long_codes, long_values, n * len(keys), self.trim_fraction)
+        for j, key in enumerate(keys):
+            for stat, values in stats.items():
+                out[f"{stat}_{METRICS[key]}"] = values[j::len(keys)]
+
+        ordered = frame.sort_values(['valuation_subgroup', 'company_id'])
+        members_hash, inputs_hash = {}, {}
+        for sg, part in ordered.groupby('valuation_subgroup', sort=False):
+            members_hash[sg] = _hash(','.join(str(int(c)) for c in part['company_id']))
+            inputs_hash[sg] = _hash(part[['company_id'] + keys].round(8).to_csv(index=False, header=False))
+        out['members_hash'] = pd.Series(members_hash)
+        out['inputs_hash'] = pd.Series(inputs_hash)
+        return out
+
+    @staticmethod
+    def members_hashes(members: pd.DataFrame) -> Dict[str, str]:
+        peers = members[members['scrip_id'].notna()].sort_values(['valuation_subgroup', 'company_id'])
+        hashes = {sg: _hash(','.join(str(int(c)) for c in part['company_id']))
+                  for sg, part in peers.groupby('valuation_subgroup', sort=False)}
+        for sg in members['valuation_subgroup'].unique():
+            hashes.setdefault(sg, _hash(''))
+        return hashes
+
+    # -------------------------------------------------------------------------
+    # Writes
+    # -------------------------------------------------------------------------
+
+    def upsert(self, stats: pd.DataFrame, version: str) -> int:
+        """Chunked INSERT ... ON DUPLICATE KEY UPDATE. Returns statements executed."""
+        columns = ['valuation_subgroup'] + STAT_COLUMNS
+        row_sql = '(' + ', '.join(['%s'] * len(columns)) + ')'
+        updates = ', '.join(f"{c} = VALUES({c})" for c in STAT_COLUMNS) + ', last_updated = CURRENT_TIMESTAMP'
+        records = [self._row(sg, row, version) for sg, row in stats.iterrows()]
+        statements = 0
+        for start in range(0, len(records), self.chunk_size):
+            chunk = records[start:start + self.chunk_size]
+            self.mysql.execute(
+                f"INSERT INTO vs_subgroup_peer_stats ({', '.join(columns)}) "
+                f"VALUES {', '.join([row_sql] * len(chunk))} ON DUPLICATE KEY UPDATE {updates}",
+                tuple(v for record in chunk for v in record)
+            )
+            statements += 1
+        return statements
+
+    @staticmethod
+    def _row(subgroup: str, row: pd.Series, version: str) -> tuple:
+        values = [subgroup]
+        for col in STAT_COLUMNS:
+            if col == 'source_version':
+                values.append(version)
+            elif col in ('members_hash', 'inputs_hash'):
+                values.append(row[col])
+            elif col == 'peer_count' or col.startswith('count_'):
+                values.append(int(row[col]))
+            else:
+                value = float(row[col])
+                values.append(None if math.isnan(value) else round(value, 4))
+        return tuple(values)
+
+    def touch(self, subgroups: List[str], version: str) -> int:
+        """Record the new source_version for subgroups whose inputs did not change."""
+        statements = 0
+        for start in range(0, len(subgroups), self.chunk_size):
+            chunk = subgroups[start:start + self.chunk_size]
+            self.mysql.execute(
+                f"UPDATE vs_subgroup_peer_stats SET source_version = %s, last_updated = last_updated "
+                f"WHERE valuation_subgroup IN ({', '.join(['%s'] * len(chunk))})",
+                (version, *chunk)
+            )
+            statements += 1
+        return statements
+
+    # -------------------------------------------------------------------------
+    # Run
+    # -------------------------------------------------------------------------
+
+    def existing(self) -> Dict[str, dict]:
+        rows = self.mysql.query('''
+            SELECT valuation_subgroup, members_hash, inputs_hash, source_version, last_updated
+            FROM vs_subgroup_peer_stats
+        ''')
+        return {r['valuation_subgroup']: r for r in rows}
+
+    def run(self, subgroup_filter: str = None, force_refresh: bool = False,
+            incremental: bool = False) -> dict:
+        t0 = time.perf_counter()
+        self.companies_loaded = 0
+        members = self.load_members(subgroup_filter)
+        subgroups = sorted(members['valuation_subgroup'].unique())
+        existing = self.existing() if not force_refresh else {}
+        version = source_version(self.core)
+
+        if force_refresh:
+            targets = subgroups
+        elif incremental:
+            current = self.members_hashes(members)
+            targets = [sg for sg in subgroups
+                       if sg not in existing or existing[sg].get('members_hash') != current[sg]
+                       or existing[sg].get('source_version') != version]
+        else:
+            targets = []
+            for sg in subgroups:
+                updated = (existing.get(sg) or {}).get('last_updated')
+                days_old = (datetime.now() - updated).days if updated else None
+                if days_old is not None and days_old < STALE_DAYS:
+                    logger.info(f"  {sg}: Skipping (updated {days_old} days ago)")
+                else:
+                    targets.append(sg)
+
+        report = {'subgroups': len(subgroups), 'recomputed': len(targets), 'written': 0, 'unchanged': 0,
+                  'skipped': len(subgroups) - len(targets), 'statements': 0}
+        if targets:
+            frame = self.build_metric_frame(members[members['valuation_subgroup'].isin(targets)])
+            stats = self.aggregate(frame).reindex(targets)
+            for sg in stats.index[stats['peer_count'].isna()]:  # No matched companies
+                stats.loc[sg, ['peer_count'] + [c for c in STAT_COLUMNS if c.startswith('count_')]] = 0
+                stats.loc[sg, 'members_hash'] = _hash('')
+                stats.loc[sg, 'inputs_hash'] = _hash('')
+
+            changed = [sg for sg in targets
+                       if not incremental or sg not in existing
+                       or existing[sg].get('members_hash') != stats.loc[sg, 'members_hash']
+                       or existing[sg].get('inputs_hash') != stats.loc[sg, 'inputs_hash']]
+            unchanged = [sg for sg in targets if sg not in set(changed)]
+            report['statements'] += self.upsert(stats.loc[changed], version) if changed else 0
+            report['statements'] += self.touch(unchanged, version) if unchanged else 0
+            report.update(written=len(changed), unchanged=len(unchanged))
+
+        report['companies_loaded'] = self.companies_loaded
+        report['elapsed_s'] = round(time.perf_counter() - t0, 3)
+        logger.info(f"Peer stats: {report['written']} written, {report['unchanged']} unchanged, "
+                    f"{report['skipped']} skipped of {report['subgroups']} subgroups "
+                    f"({report['companies_loaded']} companies loaded, {report['statements']} statements, "
+                    f"{report['elapsed_s']:.1f}s)")
+        return report
+
+
+def populate_peer_stats(subgroup_filter=None, force_refresh=False, incremental=False):
     """
     Pre-compute peer statistics for all valuation subgroups.
 
     Args:
         subgroup_filter: Optional specific subgroup to refresh (e.g., 'BANKING_PRIVATE')
         force_refresh: If True, refresh all; if False, skip recently updated (<7 days)
+        incremental: If True, refresh only subgroups whose members or financials changed
     """
-    core = CoreDataLoader()
-    mysql = ValuationMySQLClient()
-
-    # Get all unique subgroups
-    query = '''
-        SELECT DISTINCT valuation_subgroup, COUNT(*) as count
-        FROM vs_active_companies
-        WHERE is_active = 1
-    '''
-    params = []
-
-    if subgroup_filter:
-        query += ' AND valuation_subgroup = %s'
-        params.append(subgroup_filter)
-
-    query += ' GROUP BY valuation_subgroup ORDER BY valuation_subgroup'
-
-    subgroups = mysql.query(query, tuple(params) if params else ())
-
-    logger.info(f"Found {len(subgroups)} valuation subgroups to process")
-
-    total_updated = 0
-    total_skipped = 0
-
-    for sg in subgroups:
-        subgroup = sg['valuation_subgroup']
-        company_count = sg['count']
-
-        # Check if recently updated (skip if < 7 days and not forcing)
-        if not force_refresh:
-            existing = mysql.query_one(
-                'SELECT last_updated FROM vs_subgroup_peer_stats WHERE valuation_subgroup = %s',
-                (subgroup,)
-            )
-            if existing and existing['last_updated']:
-                days_old = (datetime.now() - existing['last_updated']).days
-                if days_old < 7:
-                    logger.info(f"  {subgroup}: Skipping (updated {days_old} days ago)")
-                    total_skipped += 1
-                    continue
-
-        logger.info(f"  {subgroup}: Processing {company_count} companies...")
-
-        # Get all companies in this subgroup
-        companies = mysql.query('''
-            SELECT DISTINCT a.company_id, m.symbol, m.name
-            FROM vs_active_companies a
-            JOIN mssdb.kbapp_marketscrip m ON a.company_id = m.marketscrip_id
-            WHERE a.valuation_subgroup = %s AND a.is_active = 1
-        ''', (subgroup,))
-
-        roce_list = []
-        growth_list = []
-        de_list = []
-        pledge_list = []
-
-        for comp in companies:
-            try:
-                # Try to get financials by company name (most reliable for core CSV)
-                financials = core.get_company_financials(comp['name'])
-
-                if financials:
-                    # Extract ROCE
-                    roce_series = financials.get('roce', {})
-                    if roce_series:
-                        latest_roce = core.get_latest_value(roce_series)
-                        if latest_roce and latest_roce > 0:
-                            # Normalize to decimal (0.15 = 15%)
-                            roce_normalized = latest_roce / 100 if latest_roce > 1 else latest_roce
-                            roce_list.append(roce_normalized)
-
-                    # Extract 5yr revenue CAGR
-                    sales = financials.get('sales_annual', {})
-                    if sales:
-                        cagr = core.calculate_cagr(sales, years=5)
-                        if cagr is not None:
-                            growth_list.append(cagr)
-
-                    # Extract D/E ratio
-                    debt_series = financials.get('debt', {})
-                    nw_series = financials.get('networth', {})
-
-                    debt = core.get_latest_value(debt_series) or 0
-                    nw = core.get_latest_value(nw_series) or 1
-
-                    if nw > 0:
-                        de_ratio = debt / nw
-                        de_list.append(de_ratio)
-
-                    # Extract promoter pledge (from fullstats quarterly data)
-                    pledge_series = financials.get('pledgebypromoter_quarterly', {})
-                    if pledge_series:
-                        latest_pledge = core.get_latest_value(pledge_series)
-                        if latest_pledge is not None:
-                            pledge_list.append(latest_pledge)
-
-            except Exception as e:
-                logger.debug(f"    Skipping {comp['symbol']}: {e}")
-                continue
-
-        # Calculate medians
-        import numpy as np
-
-        median_roce = float(np.median(roce_list)) if roce_list else None
-        median_cagr = float(np.median(growth_list)) if growth_list else None
-        median_de = float(np.median(de_list)) if de_list else None
-        median_pledge = float(np.median(pledge_list)) if pledge_list else None
-
-        # Upsert to database
-        mysql.execute('''
-            INSERT INTO vs_subgroup_peer_stats (
-                valuation_subgroup, peer_count,
-                median_roce, median_revenue_cagr, median_de_ratio, median_promoter_pledge
-            )
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-                peer_count = VALUES(peer_count),
-                median_roce = VALUES(median_roce),
-                median_revenue_cagr = VALUES(median_revenue_cagr),
-                median_de_ratio = VALUES(median_de_ratio),
-                median_promoter_pledge = VALUES(median_promoter_pledge),
-                last_updated = CURRENT_TIMESTAMP
-        ''', (
-            subgroup,
-            len(companies),
-            median_roce,
-            median_cagr,
-            median_de,
-            median_pledge
-        ))
-
-        logger.info(f"    ✓ Updated: {len(roce_list)} ROCE, {len(growth_list)} Growth, "
-                   f"{len(de_list)} D/E, {len(pledge_list)} Pledge")
-        total_updated += 1
-
-    logger.info(f"\nCompleted: {total_updated} updated, {total_skipped} skipped")
-    return total_updated
+    report = PeerStatsEngine().run(subgroup_filter=subgroup_filter, force_refresh=force_refresh,
+                                   incremental=incremental)
+    return report['written']
 
 
 def refresh_single_subgroup(valuation_subgroup):
@@ -190,7 +404,7 @@ def refresh_single_subgroup(valuation_subgroup):
         valuation_subgroup: The subgroup to refresh (e.g., 'BANKING_PRIVATE')
     """
     try:
-        updated = populate_peer_stats(subgroup_filter=valuation_subgroup, force_refresh=True)
+        updated = populate_peer_stats(subgroup_filter=valuation_subgroup, incremental=True)
         logger.debug(f"Refreshed peer stats for {valuation_subgroup}")
         return updated
     except Exception as e:
@@ -202,7 +416,9 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Populate peer statistics cache')
     parser.add_argument('--subgroup', type=str, help='Specific subgroup to refresh')
     parser.add_argument('--force', action='store_true', help='Force refresh all (ignore last_updated)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Refresh only subgroups whose members or financials changed')
 
     args = parser.parse_args()
 
-    populate_peer_stats(subgroup_filter=args.subgroup, force_refresh=args.force)
+    populate_peer_stats(subgroup_filter=args.subgroup, force_refresh=args.force, incremental=args.incremental)
@@ -0,0 +1,166 @@
+"""
+Provider Rate Limiter
+Per-LLM-provider concurrency cap + token bucket, shared by every thread
+that calls the provider through LLMClient. get_provider_limiter() returns the
+one process-wide instance, so separate LLMClient objects (one per agent) draw
+from the same provider budget.
+
+- Concurrency cap: at most N requests in flight per provider (semaphore)
+- Token bucket: sustained requests/minute with a small burst allowance;
+  callers block until a token is available instead of failing
+
+Config (.env):
+    LLM_CONCURRENCY=grok=8,openai=4,ollama=1     # in-flight requests per provider
+    LLM_RATE_PER_MINUTE=grok=120,openai=60,ollama=600
+    LLM_RATE_BURST=4                             # bucket capacity above steady rate
+
+Edge Cases:
+- Provider not listed → default cap/rate (LLM_CONCURRENCY_DEFAULT / LLM_RATE_PER_MINUTE_DEFAULT)
+- Rate of 0 → bucket disabled (no pacing), cap still applies
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
+
+DEFAULT_CONCURRENCY = 'grok=8,openai=4,ollama=1'
+DEFAULT_RATE_PER_MINUTE = 'grok=120,openai=60,ollama=600'
+
+
+def parse_provider_map(spec: str) -> Dict[str, float]:
+    """Parse 'grok=8,openai=4' into {'grok': 8.0, 'openai': 4.0}."""
+    values = {}
+    for part in (spec or '').split(','):
+        if '=' in part:
+            name, value = (p.strip() for p in part.split('=', 1))
+            try:
+                values[name] = float(value)
+            except ValueError:
+                logger.warning(f"Ignoring invalid provider limit '{part}'")
+    return values
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens/second, holding at most `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens if available. Returns 0 on success, else seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def set_rate(self, rate: float):
+        """Change the refill rate (adaptive throttling); tokens accrued so far are kept."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until tokens are available. Returns seconds spent waiting."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            delay = self.try_acquire(tokens)
+            if not delay:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+
+class ProviderLimiter:
+    """Concurrency cap + request-rate bucket for each provider."""
+
+    def __init__(self, concurrency: Dict[str, float] = None,
+                 rate_per_minute: Dict[str, float] = None, burst: float = None):
+        self.concurrency = concurrency if concurrency is not None else parse_provider_map(
+            os.getenv('LLM_CONCURRENCY', DEFAULT_CONCURRENCY))
+        self.rate_per_minute = rate_per_minute if rate_per_minute is not None else parse_provider_map(
+            os.getenv('LLM_RATE_PER_MINUTE', DEFAULT_RATE_PER_MINUTE))
+        self.burst = burst if burst is not None else float(os.getenv('LLM_RATE_BURST', 4))
+        self.default_concurrency = int(os.getenv('LLM_CONCURRENCY_DEFAULT', 2))
+        self.default_rate = float(os.getenv('LLM_RATE_PER_MINUTE_DEFAULT', 60))
+
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self.stats: Dict[str, dict] = {}
+
+    def _for(self, provider: str):
+        with self._lock:
+            if provider not in self._slots:
+                cap = max(1, int(self.concurrency.get(provider, self.default_concurrency)))
+                rate = self.rate_per_minute.get(provider, self.default_rate) / 60.0
+                self._slots[provider] = threading.BoundedSemaphore(cap)
+                self._buckets[provider] = TokenBucket(rate, self.burst)
+                self.stats[provider] = {'requests': 0, 'wait_seconds': 0.0, 'in_flight_max': 0,
+                                        '_in_flight': 0}
+            return self._slots[provider], self._buckets[provider], self.stats[provider]
+
+    @contextmanager
+    def limit(self, provider: str):
+        """Hold one of the provider's slots (after a rate token) for the duration of a call."""
+        slot, bucket, stats = self._for(provider)
+        start = time.monotonic()
+        slot.acquire()
+        try:
+            bucket.acquire()
+            with self._lock:
+                stats['requests'] += 1
+                stats['wait_seconds'] += time.monotonic() - start
+                stats['_in_flight'] += 1
+                stats['in_flight_max'] = max(stats['in_flight_max'], stats['_in_flight'])
+            try:
+                yield
+            finally:
+                with self._lock:
+                    stats['_in_flight'] -= 1
+        finally:
+            slot.release()
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {p: {k: (round(v, 3) if isinstance(v, float) else v)
+                        for k, v in s.items() if not k.startswith('_')}
+                    for p, s in self.stats.items()}
+
+
+# =========================================================================
+# PROCESS-WIDE INSTANCE
+# =========================================================================
+
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+
+def get_provider_limiter() -> ProviderLimiter:
+    """The limiter every LLMClient in this process shares (built on first use)."""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = ProviderLimiter()
+        return _shared_limiter
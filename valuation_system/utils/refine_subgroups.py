@@ -3,13 +3,20 @@
 Refine Subgroup Classification Script
 - Adds granularity to existing valuation_subgroup classifications
 - Updates Excel, MySQL, and GSheet with refined subgroups and drivers
+- Rules are a declarative table (SUBGROUP_RULES) compiled into vectorized
+  string masks over the whole frame; the refine_* functions below are kept as
+  the row-wise reference (refine_subgroups_rowwise / parity_check)
+- MySQL gets one CASE-based UPDATE per REFINE_UPDATE_CHUNK changed companies
 """
 
 import os
+import re
 import sys
 import pandas as pd
 import mysql.connector
+from dataclasses import dataclass
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
@@ -229,12 +236,207 @@ def classify_telecom_equipment(row):
     return 'INDUSTRIALS_TELECOM_EQUIPMENT'
 
 
+# ============================================================================
+# DECLARATIVE RULE TABLE
+# ============================================================================
+# A rule fires for rows whose current subgroup == source when every condition
+# it sets holds: industry_equals (exact CD_Industry1), any industry_keywords
+# substring of lower(CD_Industry1), any company_keywords substring of
+# lower(Company Name). Per source subgroup the lowest priority that fires wins;
+# a rule with no conditions is the default. Sources without a default (e.g.
+# NOT_CLASSIFIED) are left unchanged when nothing fires.
+
+UPDATE_CHUNK = int(os.getenv('REFINE_UPDATE_CHUNK', '1000'))
+
+
+@dataclass(frozen=True)
+class SubgroupRule:
+    source: str
+    target: str
+    priority: int
+    industry_keywords: Tuple[str, ...] = ()
+    company_keywords: Tuple[str, ...] = ()
+    industry_equals: Optional[str] = None
+    group: Optional[str] = None  # Set valuation_group too (NOT_CLASSIFIED moves)
+
+
+ONLINE_RETAILERS = ('flipkart', 'amazon', 'nykaa', 'zomato', 'swiggy', 'meesho', 'paytm mall', 'myntra', 'ajio',
+                    'snapdeal', 'shopclues', 'firstcry', 'lenskart', 'pepperfry', 'urbanladder', 'bigbasket')
+HPC_COMPANIES = ('hindustan unilever', 'marico', 'dabur', 'colgate', 'godrej consumer', 'emami', 'jyothy',
+                 'bajaj consumer')
+STAPLES_COMPANIES = ('itc', 'adani wilmar', 'patanjali foods', 'godfrey phillips')
+CRO_CDMO_COMPANIES = ('syngene', 'divi', 'laurus', 'jubilant', 'piramal', 'suven', 'dishman', 'aragen', 'neuland',
+                      'hikal', 'aarti pharma', 'pi industries')
+DIAGNOSTICS_COMPANIES = ('lal path', 'thyrocare', 'metropolis', 'srl', 'suburban', 'krsnaa')
+AYUSH_COMPANIES = ('patanjali', 'dabur', 'himalaya', 'baidyanath', 'hamdard', 'zandu')
+OTT_COMPANIES = ('netflix', 'hotstar', 'zee5', 'sonyliv', 'voot', 'jiocinema', 'prime video')
+PRINT_COMPANIES = ('times', 'hindustan times', 'indian express', 'hindu', 'jagran', 'dainik', 'sakal', 'lokmat',
+                   'deccan', 'telegraph', 'tribune')
+AD_AGENCIES = ('wpp', 'omnicom', 'publicis', 'interpublic', 'dentsu', 'ogilvy')
+LIFE_INSURERS = ('lic ', 'sbi life', 'hdfc life', 'icici pru', 'max life')
+
+SUBGROUP_RULES = [
+    SubgroupRule('AUTO_ANCILLARY', 'AUTO_ANCILLARY_TIRES', 10, industry_keywords=('tyre', 'tire')),
+    SubgroupRule('AUTO_ANCILLARY', 'AUTO_ANCILLARY_BATTERIES', 20, industry_keywords=('batter',)),
+    SubgroupRule('AUTO_ANCILLARY', 'AUTO_ANCILLARY_COMPONENTS', 99),
+
+    SubgroupRule('CONSUMER_DURABLES', 'CONSUMER_DURABLES_WHITE_GOODS', 10,
+                 industry_keywords=('air condition', 'domestic appliance')),
+    SubgroupRule('CONSUMER_DURABLES', 'CONSUMER_DURABLES_BROWN_GOODS', 20,
+                 industry_keywords=('electronic', 'hardware')),
+    SubgroupRule('CONSUMER_DURABLES', 'CONSUMER_DURABLES_SMALL_APPLIANCES', 99),
+
+    SubgroupRule('CONSUMER_RETAIL', 'CONSUMER_RETAIL_ONLINE', 10, company_keywords=ONLINE_RETAILERS),
+    SubgroupRule('CONSUMER_RETAIL', 'CONSUMER_RETAIL_OFFLINE', 99),
+
+    SubgroupRule('CONSUMER_FMCG', 'CONSUMER_FMCG_HPC', 10,
+                 industry_keywords=('personal', 'household', 'detergent', 'soap', 'cosmetic', 'beauty')),
+    SubgroupRule('CONSUMER_FMCG', 'CONSUMER_FMCG_STAPLES', 20,
+                 industry_keywords=('edible oil', 'cigarette', 'tobacco', 'sugar')),
+    SubgroupRule('CONSUMER_FMCG', 'CONSUMER_FMCG_HPC', 30, company_keywords=HPC_COMPANIES),
+    SubgroupRule('CONSUMER_FMCG', 'CONSUMER_FMCG_STAPLES', 40, company_keywords=STAPLES_COMPANIES),
+    SubgroupRule('CONSUMER_FMCG', 'CONSUMER_FMCG_PACKAGED_FOOD', 99),
+
+    SubgroupRule('ENERGY_OIL_GAS', 'ENERGY_UPSTREAM', 10, industry_keywords=('exploration',)),
+    SubgroupRule('ENERGY_OIL_GAS', 'ENERGY_MIDSTREAM', 20, industry_keywords=('transmission', 'marketing')),
+    SubgroupRule('ENERGY_OIL_GAS', 'ENERGY_DOWNSTREAM', 99),
+
+    SubgroupRule('FINANCIALS_OTHER', 'FINANCIALS_RATINGS', 10, industry_keywords=('rating',)),
+    SubgroupRule('FINANCIALS_OTHER', 'FINANCIALS_EXCHANGES_DEPOSITORIES', 20, industry_keywords=('depository',)),
+    SubgroupRule('FINANCIALS_OTHER', 'FINANCIALS_BROKING', 99),
+
+    SubgroupRule('FINANCIALS_ASSET_MGMT', 'FINANCIALS_BROKING', 10, industry_keywords=('broking',)),
+    SubgroupRule('FINANCIALS_ASSET_MGMT', 'FINANCIALS_EXCHANGES_DEPOSITORIES', 20,
+                 industry_keywords=('depository',)),
+    SubgroupRule('FINANCIALS_ASSET_MGMT', 'FINANCIALS_ASSET_MGMT', 99),
+
+    SubgroupRule('HEALTHCARE_PHARMA_EXPORT', 'HEALTHCARE_PHARMA_CRO_CDMO', 10, company_keywords=CRO_CDMO_COMPANIES),
+    SubgroupRule('HEALTHCARE_PHARMA_EXPORT', 'HEALTHCARE_PHARMA_MFG', 99),
+
+    SubgroupRule('HEALTHCARE_HOSPITALS_EQUIPMENT', 'HEALTHCARE_DIAGNOSTICS', 10,
+                 company_keywords=DIAGNOSTICS_COMPANIES),
+    SubgroupRule('HEALTHCARE_HOSPITALS_EQUIPMENT', 'HEALTHCARE_AYUSH', 20, company_keywords=AYUSH_COMPANIES),
+    SubgroupRule('HEALTHCARE_HOSPITALS_EQUIPMENT', 'HEALTHCARE_MEDICAL_EQUIPMENT', 30,
+                 industry_keywords=('equipment', 'supplies')),
+    SubgroupRule('HEALTHCARE_HOSPITALS_EQUIPMENT', 'HEALTHCARE_HOSPITALS', 99),
+
+    SubgroupRule('METALS_NON_FERROUS', 'METALS_ALUMINUM', 10, industry_keywords=('alumin',)),
+    SubgroupRule('METALS_NON_FERROUS', 'METALS_COPPER_ZINC', 99),
+
+    SubgroupRule('SERVICES_MEDIA_ENTERTAINMENT', 'SERVICES_MEDIA_OTT', 10, company_keywords=OTT_COMPANIES),
+    SubgroupRule('SERVICES_MEDIA_ENTERTAINMENT', 'SERVICES_MEDIA_PRINT', 20, company_keywords=PRINT_COMPANIES),
+    SubgroupRule('SERVICES_MEDIA_ENTERTAINMENT', 'SERVICES_MEDIA_ADVERTISING', 30,
+                 industry_keywords=('advertising', 'media'), company_keywords=AD_AGENCIES),
+    SubgroupRule('SERVICES_MEDIA_ENTERTAINMENT', 'SERVICES_MEDIA_BROADCASTING', 99),
+
+    SubgroupRule('SERVICES_TELECOM', 'SERVICES_TELECOM_TOWERS', 10,
+                 company_keywords=('indus tower', 'bharti infratel', 'tower', 'infratel')),
+    SubgroupRule('SERVICES_TELECOM', 'SERVICES_TELECOM_OPERATORS', 99),
+
+    SubgroupRule('NOT_CLASSIFIED', 'FINANCIALS_INSURANCE_HEALTH', 10, industry_equals='Insurance',
+                 company_keywords=('health',), group='FINANCIALS'),
+    SubgroupRule('NOT_CLASSIFIED', 'FINANCIALS_INSURANCE_LIFE', 20, industry_equals='Insurance',
+                 company_keywords=('life',), group='FINANCIALS'),
+    SubgroupRule('NOT_CLASSIFIED', 'FINANCIALS_INSURANCE_GENERAL', 30, industry_equals='Insurance',
+                 company_keywords=('general', 'lombard'), group='FINANCIALS'),
+    SubgroupRule('NOT_CLASSIFIED', 'FINANCIALS_INSURANCE_LIFE', 40, industry_equals='Insurance',
+                 company_keywords=LIFE_INSURERS, group='FINANCIALS'),
+    SubgroupRule('NOT_CLASSIFIED', 'FINANCIALS_INSURANCE_GENERAL', 50, industry_equals='Insurance',
+                 group='FINANCIALS'),
+    SubgroupRule('NOT_CLASSIFIED', 'INDUSTRIALS_TELECOM_EQUIPMENT', 60,
+                 industry_equals='Telecommunication - Equipment', group='INDUSTRIALS'),
+]
+
+
+def compile_rules(rules: List[SubgroupRule] = None) -> Dict[str, List[Tuple[SubgroupRule, Optional[str], Optional[str]]]]:
+    """source subgroup → [(rule, industry regex, company regex)] in priority order."""
+    compiled = {}
+    for rule in sorted(rules or SUBGROUP_RULES, key=lambda r: (r.source, r.priority)):
+        industry_re = '|'.join(re.escape(k) for k in rule.industry_keywords) or None
+        company_re = '|'.join(re.escape(k) for k in rule.company_keywords) or None
+        compiled.setdefault(rule.source, []).append((rule, industry_re, company_re))
+    return compiled
+
+
+def _text_column(df, column) -> pd.Series:
+    """str() of each cell, as the row-wise rules see it (NaN → 'nan', missing column → '')."""
+    if column not in df.columns:
+        return pd.Series('', index=df.index)
+    return df[column].map(str)
+
+
+def apply_rules(df, rules: List[SubgroupRule] = None) -> pd.DataFrame:
+    """
+    Evaluate the rule table over the whole frame.
+
+    Returns a frame aligned to df.index with refined_subgroup, refined_group
+    (None unless the winning rule moves the group) and rule ('source#priority',
+    None where nothing fired).
+    """
+    subgroup = df['valuation_subgroup']
+    industry = _text_column(df, 'CD_Industry1')
+    industry_lower = industry.str.lower()
+    company_lower = _text_column(df, 'Company Name').str.lower()
+
+    out = pd.DataFrame({'refined_subgroup': subgroup, 'refined_group': None, 'rule': None}, index=df.index,
+                       dtype=object)
+    for source, source_rules in compile_rules(rules).items():
+        pending = (subgroup == source).to_numpy(copy=True)
+        for rule, industry_re, company_re in source_rules:
+            if not pending.any():
+                break
+            hit = pending.copy()
+            if rule.industry_equals is not None:
+                hit &= (industry == rule.industry_equals).to_numpy()
+            if industry_re:
+                hit &= industry_lower.str.contains(industry_re, regex=True).to_numpy()
+            if company_re:
+                hit &= company_lower.str.contains(company_re, regex=True).to_numpy()
+            if hit.any():
+                out.loc[hit, 'refined_subgroup'] = rule.target
+                out.loc[hit, 'refined_group'] = rule.group
+                out.loc[hit, 'rule'] = f"{rule.source}#{rule.priority}"
+                pending &= ~hit
+    return out
+
+
 # ============================================================================
 # MAIN REFINEMENT FUNCTION
 # ============================================================================
 
-def refine_subgroups(df):
-    """Apply all refinement rules to the dataframe"""
+def refine_subgroups(df, rules: List[SubgroupRule] = None):
+    """Apply the rule table to the dataframe (vectorized). Same output as refine_subgroups_rowwise."""
+    df['original_subgroup'] = df['valuation_subgroup'].copy()
+
+    refined = apply_rules(df, rules)
+    original_group = df['valuation_group'] if 'valuation_group' in df.columns else pd.Series('', index=df.index)
+    changed = (refined['rule'].notna() & (refined['refined_subgroup'] != df['valuation_subgroup'])).to_numpy()
+    if not changed.any():
+        return df, []
+
+    moved = changed & refined['refined_group'].notna().to_numpy() & \
+        (refined['refined_group'] != original_group).to_numpy()
+    if moved.any():
+        if 'valuation_group' not in df.columns:
+            df['valuation_group'] = None
+        df.loc[moved, 'valuation_group'] = refined.loc[moved, 'refined_group']
+    df.loc[changed, 'valuation_subgroup'] = refined.loc[changed, 'refined_subgroup']
+
+    accord = df['Accord Code'] if 'Accord Code' in df.columns else pd.Series(None, index=df.index)
+    diff = pd.DataFrame({
+        'company': df.loc[changed, 'Company Name'],
+        'original': df.loc[changed, 'original_subgroup'],
+        'refined': refined.loc[changed, 'refined_subgroup'],
+        'accord_code': accord[changed],
+        'original_group': original_group[changed],
+        'refined_group': df.loc[changed, 'valuation_group'] if 'valuation_group' in df.columns else None,
+        'rule': refined.loc[changed, 'rule'],
+    })
+    return df, diff.to_dict('records')
+
+
+def refine_subgroups_rowwise(df):
+    """Row-wise reference implementation (one refine_* call per row); kept for parity_check."""
 
     # Create a copy of valuation_subgroup for comparison
     df['original_subgroup'] = df['valuation_subgroup'].copy()
@@ -307,38 +509,105 @@ def refine_subgroups(df):
     return df, changes
 
 
-def update_mysql(df):
-    """Update vs_active_companies with refined subgroups"""
-    conn = mysql.connector.connect(
-        host=os.getenv('MYSQL_HOST', 'localhost'),
-        port=int(os.getenv('MYSQL_PORT', 3306)),
-        user=os.getenv('MYSQL_USER', 'root'),
-        password=os.getenv('MYSQL_PASSWORD', ''),
-        database=os.getenv('MYSQL_DATABASE', 'rag')
-    )
+def parity_check(df, rules: List[SubgroupRule] = None) -> List[dict]:
+    """Rows where the rule table and the row-wise functions disagree (empty list = parity)."""
+    rowwise, _ = refine_subgroups_rowwise(df.copy())
+    vectorized, _ = refine_subgroups(df.copy(), rules)
+    columns = [c for c in ('valuation_subgroup', 'valuation_group') if c in rowwise.columns]
+    mismatches = []
+    for column in columns:
+        a, b = rowwise[column], vectorized[column]
+        differs = (a != b) & ~(a.isna() & b.isna())
+        for idx in df.index[differs.to_numpy()]:
+            mismatches.append({'index': idx, 'company': df.at[idx, 'Company Name'], 'column': column,
+                               'rowwise': a[idx], 'rules': b[idx]})
+    return mismatches
+
+
+def diff_report(changes: List[dict]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """(per-company old → new rows, old → new transition counts)."""
+    columns = ['company', 'accord_code', 'original', 'refined', 'original_group', 'refined_group', 'rule']
+    detail = pd.DataFrame(changes, columns=columns)
+    summary = (detail.groupby(['original', 'refined']).size().rename('companies').reset_index()
+               .sort_values(['original', 'companies'], ascending=[True, False]).reset_index(drop=True))
+    return detail.sort_values(['original', 'refined', 'company']).reset_index(drop=True), summary
+
+
+def build_bulk_updates(rows: List[Tuple[str, str, str]], chunk_size: int = None) -> List[Tuple[str, list]]:
+    """
+    One CASE-based UPDATE per chunk of (accord_code, subgroup, group) rows.
+
+    Duplicate accord codes keep the last row (matches the old per-row UPDATE
+    order, where the last write won).
+    """
+    latest = {}
+    for accord_code, subgroup, group in rows:
+        latest[accord_code] = (subgroup, group)
+    items = list(latest.items())
+    chunk_size = max(1, chunk_size or UPDATE_CHUNK)
+
+    statements = []
+    for start in range(0, len(items), chunk_size):
+        chunk = items[start:start + chunk_size]
+        whens = ' '.join(['WHEN %s THEN %s'] * len(chunk))
+        sql = (f"UPDATE vs_active_companies SET "
+               f"valuation_subgroup = CASE accord_code {whens} END, "
+               f"valuation_group = CASE accord_code {whens} END, "
+               f"last_synced = NOW() "
+               f"WHERE accord_code IN ({', '.join(['%s'] * len(chunk))})")
+        params = [v for code, (subgroup, _) in chunk for v in (code, subgroup)]
+        params += [v for code, (_, group) in chunk for v in (code, group)]
+        params += [code for code, _ in chunk]
+        statements.append((sql, params))
+    return statements
+
+
+def update_mysql(df, changes: List[dict] = None, conn=None, chunk_size: int = None):
+    """
+    Update vs_active_companies with refined subgroups.
+
+    With changes, only those companies are written; without, every row of df
+    (the old full-sync behaviour). Either way it is one CASE UPDATE per chunk
+    inside a single transaction.
+    """
+    rows = []
+    if changes is not None:
+        wanted = {str(c.get('accord_code')) for c in changes}
+        frame = df[df['Accord Code'].map(str).isin(wanted)] if wanted else df.iloc[0:0]
+    else:
+        frame = df
+    for accord_code, subgroup, group in zip(frame['Accord Code'].map(str), frame['valuation_subgroup'],
+                                            frame['valuation_group']):
+        if accord_code and subgroup:
+            rows.append((accord_code, subgroup, None if pd.isna(group) else group))
+
+    own_conn = conn is None
+    if own_conn:
+        conn = mysql.connector.connect(
+            host=os.getenv('MYSQL_HOST', 'localhost'),
+            port=int(os.getenv('MYSQL_PORT', 3306)),
+            user=os.getenv('MYSQL_USER', 'root'),
+            password=os.getenv('MYSQL_PASSWORD', ''),
+            database=os.getenv('MYSQL_DATABASE', 'rag')
+        )
     cursor = conn.cursor()
 
-    # Update each company
     updated = 0
-    for _, row in df.iterrows():
-        accord_code = str(row.get('Accord Code'))
-        subgroup = row.get('valuation_subgroup')
-        group = row.get('valuation_group')
-
-        if accord_code and subgroup:
-            cursor.execute("""
-                UPDATE vs_active_companies
-                SET valuation_subgroup = %s, valuation_group = %s, last_synced = NOW()
-                WHERE accord_code = %s
-            """, (subgroup, group, accord_code))
-            if cursor.rowcount > 0:
-                updated += 1
-
-    conn.commit()
-    print(f"[MySQL] Updated {updated} companies in vs_active_companies")
-
-    cursor.close()
-    conn.close()
+    statements = build_bulk_updates(rows, chunk_size)
+    try:
+        for sql, params in statements:
+            cursor.execute(sql, params)
+            updated += max(cursor.rowcount, 0)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        if own_conn:
+            conn.close()
+
+    print(f"[MySQL] Updated {updated} companies in vs_active_companies ({len(statements)} statements)")
     return updated
 
 
@@ -376,6 +645,14 @@ def main():
         for c in changes[:20]:
             print(f"      {c['company'][:40]:<40} {c['original']:<35} -> {c['refined']}")
 
+    if changes:
+        detail, summary = diff_report(changes)
+        report_path = os.path.splitext(excel_path)[0] + '_refine_diff.csv'
+        detail.to_csv(report_path, index=False)
+        print(f"\n    Transitions ({len(summary)}), per-company diff saved to {report_path}:")
+        for _, t in summary.iterrows():
+            print(f"      {t['original']:<35} -> {t['refined']:<40} {t['companies']:>5}")
+
     # Get new counts
     print("\n[4] New subgroup counts:")
     new_counts = get_subgroup_counts(df)
@@ -397,7 +674,7 @@ def main():
 
     # Step 5: Update MySQL
     print("\n[6] Updating MySQL...")
-    update_mysql(df)
+    update_mysql(df, changes=changes)
 
     # Final summary
     print("\n" + "=" * 70)
@@ -5,7 +5,6 @@ gap/catchup days after machine shutdown, graceful degradation.
 """
 
 import os
-import json
 import time
 import logging
 import traceback
@@ -16,6 +15,8 @@ from typing import Callable, Optional
 
 from dotenv import load_dotenv
 
+from valuation_system.utils.state_store import StateStore, DB_FILENAME, lease_owner_id
+
 logger = logging.getLogger(__name__)
 
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
@@ -29,7 +30,9 @@ class RunStateManager:
     - Failed runs → retry with backoff
     - On-demand runs → skip scheduling conflicts
 
-    State persisted to disk so it survives restarts.
+    State persisted to a SQLite file (utils/state_store.py) so it survives
+    restarts and concurrent runner processes never overwrite each other.
+    An existing run_state.json in state_dir is imported on first use.
     """
 
     def __init__(self, state_dir: str = None):
@@ -38,27 +41,22 @@ class RunStateManager:
         )
         os.makedirs(self.state_dir, exist_ok=True)
         self._state_file = os.path.join(self.state_dir, 'run_state.json')
-        self._state = self._load_state()
-
-    def _load_state(self) -> dict:
-        if os.path.exists(self._state_file):
-            try:
-                with open(self._state_file, 'r') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"Failed to load run state: {e}", exc_info=True)
-        return {}
+        self.store = StateStore(os.path.join(self.state_dir, DB_FILENAME))
+        try:
+            self.store.import_json(run_state_path=self._state_file)
+        except Exception as e:
+            logger.error(f"Failed to import legacy run state: {e}", exc_info=True)
 
-    def _save_state(self):
+    def _entry(self, task_name: str) -> dict:
         try:
-            with open(self._state_file, 'w') as f:
-                json.dump(self._state, f, indent=2, default=str)
+            return self.store.get_task(task_name) or {}
         except Exception as e:
-            logger.error(f"Failed to save run state: {e}", exc_info=True)
+            logger.error(f"Failed to load run state for '{task_name}': {e}", exc_info=True)
+            return {}
 
     def get_last_run(self, task_name: str) -> Optional[datetime]:
         """Get timestamp of last successful run for a task."""
-        entry = self._state.get(task_name, {})
+        entry = self._entry(task_name)
         last_success = entry.get('last_success')
         if last_success:
             try:
@@ -109,46 +107,33 @@ class RunStateManager:
 
     def record_success(self, task_name: str, details: dict = None):
         """Record a successful task run."""
-        if task_name not in self._state:
-            self._state[task_name] = {}
-
-        self._state[task_name].update({
-            'last_success': datetime.now().isoformat(),
-            'last_status': 'SUCCESS',
-            'consecutive_failures': 0,
-            'last_details': details or {},
-        })
-        self._save_state()
+        try:
+            self.store.record_success(task_name, details)
+        except Exception as e:
+            logger.error(f"Failed to save run state: {e}", exc_info=True)
 
     def record_failure(self, task_name: str, error: str):
         """Record a failed task run."""
-        if task_name not in self._state:
-            self._state[task_name] = {}
-
-        failures = self._state[task_name].get('consecutive_failures', 0) + 1
-        self._state[task_name].update({
-            'last_failure': datetime.now().isoformat(),
-            'last_status': 'FAILED',
-            'last_error': error,
-            'consecutive_failures': failures,
-        })
-        self._save_state()
+        try:
+            self.store.record_failure(task_name, error)
+        except Exception as e:
+            logger.error(f"Failed to save run state: {e}", exc_info=True)
 
     def should_retry(self, task_name: str, max_retries: int = 3) -> bool:
         """Check if task should be retried based on failure count."""
-        entry = self._state.get(task_name, {})
+        entry = self._entry(task_name)
         failures = entry.get('consecutive_failures', 0)
         return failures < max_retries
 
     def get_retry_delay_seconds(self, task_name: str) -> int:
         """Exponential backoff: 60s, 300s, 900s, ..."""
-        entry = self._state.get(task_name, {})
+        entry = self._entry(task_name)
         failures = entry.get('consecutive_failures', 0)
         return min(60 * (3 ** failures), 3600)  # Max 1 hour
 
     def is_running(self, task_name: str) -> bool:
         """Check if task is currently running (prevent overlap)."""
-        entry = self._state.get(task_name, {})
+        entry = self._entry(task_name)
         if entry.get('last_status') == 'RUNNING':
             # Check if it's been running too long (stale lock)
             started_at = entry.get('started_at')
@@ -165,13 +150,25 @@ class RunStateManager:
 
     def mark_running(self, task_name: str):
         """Mark task as currently running."""
-        if task_name not in self._state:
-            self._state[task_name] = {}
-        self._state[task_name].update({
-            'last_status': 'RUNNING',
-            'started_at': datetime.now().isoformat(),
-        })
-        self._save_state()
+        try:
+            self.store.mark_running(task_name)
+        except Exception as e:
+            logger.error(f"Failed to save run state: {e}", exc_info=True)
+
+    def try_mark_running(self, task_name: str, stale_after_seconds: int = 3600) -> bool:
+        """
+        Atomic is_running() + mark_running(): False if another process holds a
+        non-stale RUNNING lock. On a state store error the task is allowed to run.
+        """
+        try:
+            return self.store.mark_running(task_name, stale_after_seconds=stale_after_seconds)
+        except Exception as e:
+            logger.error(f"Failed to save run state: {e}", exc_info=True)
+            return True
+
+    def get_history(self, task_name: str = None, limit: int = 50) -> list:
+        """Recent RUNNING/SUCCESS/FAILED transitions, newest first."""
+        return self.store.history(task_name, limit)
 
     def get_full_status(self) -> dict:
         """Get status of all tasks for monitoring."""
@@ -180,14 +177,18 @@ class RunStateManager:
             'last_success': v.get('last_success'),
             'last_failure': v.get('last_failure'),
             'failures': v.get('consecutive_failures', 0),
-        } for k, v in self._state.items()}
+        } for k, v in self.store.all_tasks().items()}
 
 
 def retry_with_backoff(max_retries: int = 3, base_delay: float = 1.0,
-                       exceptions: tuple = (Exception,)):
+                       exceptions: tuple = (Exception,), deadline_attr: str = None):
     """
     Decorator for retrying functions with exponential backoff.
     Handles transient network errors, API rate limits, etc.
+
+    deadline_attr: for methods, name of an instance attribute holding a
+    time.monotonic() deadline (or None). No retry is attempted when the
+    backoff would sleep past it — the last error is raised instead.
     """
     def decorator(func):
         @functools.wraps(func)
@@ -200,6 +201,10 @@ def retry_with_backoff(max_retries: int = 3, base_delay: float = 1.0,
                     last_exception = e
                     if attempt < max_retries:
                         delay = base_delay * (2 ** attempt)
+                        deadline = getattr(args[0], deadline_attr, None) if deadline_attr and args else None
+                        if deadline is not None and time.monotonic() + delay >= deadline:
+                            logger.warning(f"{func.__name__} failed ({e}); no time left in budget to retry")
+                            break
                         logger.warning(
                             f"{func.__name__} failed (attempt {attempt + 1}/{max_retries + 1}): "
                             f"{e}. Retrying in {delay:.1f}s..."
@@ -215,14 +220,30 @@ def retry_with_backoff(max_retries: int = 3, base_delay: float = 1.0,
     return decorator
 
 
-def check_internet(timeout: int = 5) -> bool:
-    """Quick check if internet is available."""
+_internet_check_cache = {'checked_at': 0.0, 'result': False}
+
+
+def check_internet(timeout: int = 5, force: bool = False) -> bool:
+    """
+    Quick check if internet is available.
+    Result is cached for INTERNET_CHECK_TTL_SECONDS (default 60) so hot paths
+    (every LLM call, every scan) don't each pay a socket round-trip.
+    """
     import socket
+    ttl = float(os.getenv('INTERNET_CHECK_TTL_SECONDS', 60))
+    now = time.monotonic()
+    if not force and _internet_check_cache['checked_at'] and \
+            now - _internet_check_cache['checked_at'] < ttl:
+        return _internet_check_cache['result']
+
     try:
-        socket.create_connection(("8.8.8.8", 53), timeout=timeout)
-        return True
+        sock = socket.create_connection(("8.8.8.8", 53), timeout=timeout)
+        sock.close()
+        result = True
     except OSError:
-        return False
+        result = False
+    _internet_check_cache.update(checked_at=now, result=result)
+    return result
 
 
 def check_service(host: str, port: int, timeout: int = 3) -> bool:
@@ -289,11 +310,10 @@ def safe_task_run(task_name: str, state_manager: RunStateManager):
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            if state_manager.is_running(task_name):
+            if not state_manager.try_mark_running(task_name):
                 logger.info(f"Task '{task_name}' already running, skipping")
                 return {'status': 'SKIPPED', 'reason': 'already_running'}
 
-            state_manager.mark_running(task_name)
             start_time = datetime.now()
 
             try:
@@ -333,56 +353,55 @@ class GracefulDegradation:
         )
         os.makedirs(self.state_dir, exist_ok=True)
         self._queue_file = os.path.join(self.state_dir, 'pending_operations.json')
+        self.store = StateStore(os.path.join(self.state_dir, DB_FILENAME))
+        try:
+            self.store.import_json(queue_path=self._queue_file)
+        except Exception as e:
+            logger.error(f"Failed to import legacy operation queue: {e}", exc_info=True)
 
     def queue_operation(self, operation: dict):
         """Queue a failed operation for later replay."""
-        queue = self._load_queue()
         operation['queued_at'] = datetime.now().isoformat()
-        queue.append(operation)
-        self._save_queue(queue)
+        try:
+            self.store.enqueue(operation)
+        except Exception as e:
+            logger.error(f"Failed to save operation queue: {e}", exc_info=True)
+            return
         logger.info(f"Queued operation: {operation.get('type', 'unknown')}")
 
     def replay_queued_operations(self, handler_fn: Callable) -> int:
-        """Replay queued operations through the handler function."""
-        queue = self._load_queue()
-        if not queue:
+        """
+        Replay queued operations through the handler function.
+        Operations are leased to this call, so a concurrent replay in another
+        process skips them; each is removed as soon as its handler succeeds.
+        """
+        owner = lease_owner_id()
+        leased = self.store.lease(owner)
+        if not leased:
             return 0
 
-        logger.info(f"Replaying {len(queue)} queued operations")
+        logger.info(f"Replaying {len(leased)} queued operations")
         succeeded = 0
-        remaining = []
+        failed = []
 
-        for op in queue:
+        for item in leased:
             try:
-                handler_fn(op)
-                succeeded += 1
+                handler_fn(item['operation'])
             except Exception as e:
                 logger.warning(f"Replay failed for operation: {e}")
-                remaining.append(op)
-
-        self._save_queue(remaining)
-        logger.info(f"Replayed {succeeded}/{len(queue)} operations, "
-                     f"{len(remaining)} remaining")
+                failed.append((item['op_id'], str(e)))
+                continue
+            self.store.ack([item['op_id']], owner=owner)
+            succeeded += 1
+
+        for op_id, error in failed:
+            self.store.release([op_id], error=error, owner=owner)
+        logger.info(f"Replayed {succeeded}/{len(leased)} operations, "
+                     f"{len(failed)} remaining")
         return succeeded
 
     def get_queue_size(self) -> int:
-        return len(self._load_queue())
-
-    def _load_queue(self) -> list:
-        if os.path.exists(self._queue_file):
-            try:
-                with open(self._queue_file, 'r') as f:
-                    return json.load(f)
-            except Exception:
-                return []
-        return []
-
-    def _save_queue(self, queue: list):
-        try:
-            with open(self._queue_file, 'w') as f:
-                json.dump(queue, f, indent=2, default=str)
-        except Exception as e:
-            logger.error(f"Failed to save operation queue: {e}", exc_info=True)
+        return self.store.queue_size()
 
     def check_data_staleness(self) -> dict:
         """Check if data files are stale and report staleness."""
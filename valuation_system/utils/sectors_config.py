@@ -0,0 +1,440 @@
+"""
+Compiled Sectors Configuration
+sectors.yaml (~3,250 lines) parsed once per file version, validated, and
+compiled into typed indexes behind one process-wide accessor. Replaces the
+per-call yaml.safe_load in load_sectors_config / GroupAnalystAgent /
+sync_group_configs (~275 ms each with the pure-Python loader).
+
+- get_sectors_model(): cached model; re-stats the YAML on every call and
+  recompiles only when its mtime / size change
+- Cold start reads a snapshot written next to the YAML (sectors.yaml.pickle:
+  stamp + pickled parse, plain data only) instead of parsing; indexes are
+  rebuilt from it (~7 ms vs ~60 ms CSafeLoader / ~275 ms pure-Python parse)
+- validate_sectors_config(): schema check run on every compile; every
+  problem is reported at once in one SectorsConfigError
+- Indexes: group → subgroups, subgroup → group / sector, sector / subgroup → drivers,
+  (level, group or subgroup, driver) → macro link, industry keyword → sectors
+
+Usage:
+    from valuation_system.utils.sectors_config import get_sectors_model
+    model = get_sectors_model()
+    model.config_copy()                              # same dict as yaml.safe_load, caller-owned
+    model.subgroups_of('AUTO')                       # ('AUTO_OEM', 'AUTO_ANCILLARY')
+    model.drivers_for_subgroup('AUTO_OEM')           # DriverSpecs of the 'automobiles' sector
+    model.macro_link('GROUP', 'AUTO', 'commodity_prices')   # MacroLink(..., 'wpi_manufactured', 'INVERSE')
+    model.sectors_for_industry('Passenger Cars')     # sector keys whose csv_industry_filter lists it
+
+Config (.env):
+    SECTORS_SNAPSHOT=1            # 0 = never read/write the pickle snapshot
+
+Edge Cases:
+- Unwritable config dir → snapshot skipped, model kept in memory only
+- Corrupt / stale / other-version snapshot → ignored and rewritten
+- model.raw is shared by every caller; code that may mutate the config uses
+  config_copy() (load_sectors_config does)
+- primary_sector pointing at no sector (e.g. a sector block nested under
+  driver_hierarchy by indentation) → logged warning, not a schema error
+- Macro links come from populate_drivers.MACRO_LINK_MAPPINGS (code, not YAML),
+  read on every compile; an import failure leaves the index empty rather than
+  failing the load
+"""
+
+import os
+import pickle
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import yaml
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+_CONFIG_DIR = os.path.join(os.path.dirname(__file__), '..', 'config')
+load_dotenv(os.path.join(_CONFIG_DIR, '.env'))
+
+SECTORS_YAML = os.path.abspath(os.path.join(_CONFIG_DIR, 'sectors.yaml'))
+SNAPSHOT_ENABLED = os.getenv('SECTORS_SNAPSHOT', '1') != '0'
+SNAPSHOT_VERSION = 1
+
+DRIVER_CATEGORIES = ('demand_drivers', 'cost_drivers', 'regulatory_drivers', 'group_specific_drivers')
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+class SectorsConfigError(ValueError):
+    """sectors.yaml failed schema validation."""
+
+
+@dataclass(frozen=True)
+class DriverSpec:
+    name: str
+    category: str                     # 'demand_drivers', 'cost_drivers', ...
+    sector: str                       # Sector key the driver is defined under
+    weight: float = 0.0
+    metric: Optional[str] = None
+    impact: Optional[str] = None
+    sensitivity: Optional[float] = None
+    source: Optional[str] = None
+    frequency: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class SectorSpec:
+    key: str
+    csv_sector_name: Optional[str]
+    is_active: bool
+    extended: bool                    # Defined under sectors_extended
+    industry_filter: Tuple[str, ...]
+    drivers: Tuple[DriverSpec, ...]
+
+
+@dataclass(frozen=True)
+class GroupSpec:
+    name: str
+    primary_sector: Optional[str]
+    description: str
+    subgroups: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class MacroLink:
+    level: str                        # 'GROUP' | 'SUBGROUP'
+    scope: str                        # valuation_group or valuation_subgroup
+    driver_name: str
+    macro_driver: str
+    direction: str                    # 'SAME' | 'INVERSE'
+
+
+# =============================================================================
+# VALIDATION
+# =============================================================================
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_sectors_config(config) -> List[str]:
+    """Every schema problem in a parsed sectors.yaml (empty list = valid)."""
+    if not isinstance(config, dict):
+        return ['top level must be a mapping']
+    errors = []
+    if not isinstance(config.get('sectors'), dict):
+        errors.append("'sectors' must be a mapping")
+
+    for section in ('sectors', 'sectors_extended'):
+        block = config.get(section) or {}
+        if not isinstance(block, dict):
+            errors.append(f"'{section}' must be a mapping")
+            continue
+        for key, sector in block.items():
+            where = f"{section}.{key}"
+            if not isinstance(sector, dict):
+                errors.append(f"{where}: must be a mapping")
+                continue
+            if 'is_active' in sector and not isinstance(sector['is_active'], bool):
+                errors.append(f"{where}.is_active: must be true/false")
+            for name in ('terminal_assumptions', 'valuation_methods', 'porter_forces'):
+                if sector.get(name) is not None and not isinstance(sector[name], dict):
+                    errors.append(f"{where}.{name}: must be a mapping")
+            margin = (sector.get('terminal_assumptions') or {}).get('margin_range') \
+                if isinstance(sector.get('terminal_assumptions'), dict) else None
+            if margin is not None and not (isinstance(margin, list) and len(margin) == 2
+                                           and all(_is_number(m) for m in margin) and margin[0] <= margin[1]):
+                errors.append(f"{where}.terminal_assumptions.margin_range: must be [low, high]")
+            industry_filter = sector.get('csv_industry_filter')
+            if industry_filter is not None and not (isinstance(industry_filter, list)
+                                                    and all(isinstance(i, str) for i in industry_filter)):
+                errors.append(f"{where}.csv_industry_filter: must be a list of strings")
+            for category in DRIVER_CATEGORIES:
+                drivers = sector.get(category)
+                if drivers is None:
+                    continue
+                if not isinstance(drivers, list):
+                    errors.append(f"{where}.{category}: must be a list")
+                    continue
+                for i, driver in enumerate(drivers):
+                    if not isinstance(driver, dict) or not isinstance(driver.get('name'), str) \
+                            or not driver['name']:
+                        errors.append(f"{where}.{category}[{i}]: needs a non-empty name")
+                        continue
+                    weight = driver.get('weight')
+                    if weight is not None and not (_is_number(weight) and 0 <= weight <= 1):
+                        errors.append(f"{where}.{category}.{driver['name']}.weight: must be within [0, 1]")
+
+    groups = config.get('valuation_groups') or {}
+    if not isinstance(groups, dict):
+        errors.append("'valuation_groups' must be a mapping")
+        groups = {}
+    for name, group in groups.items():
+        where = f"valuation_groups.{name}"
+        if not isinstance(group, dict):
+            errors.append(f"{where}: must be a mapping")
+            continue
+        primary = group.get('primary_sector')
+        if primary is not None and not isinstance(primary, str):
+            errors.append(f"{where}.primary_sector: must be a sector key")
+        subgroups = group.get('subgroups')
+        if subgroups is not None and not isinstance(subgroups, dict):
+            errors.append(f"{where}.subgroups: must be a mapping of subgroup → description")
+
+    hierarchy = config.get('driver_hierarchy') or {}
+    if not isinstance(hierarchy, dict):
+        errors.append("'driver_hierarchy' must be a mapping")
+    else:
+        for level in ('macro_weight', 'group_weight', 'subgroup_weight', 'company_weight'):
+            if level in hierarchy and not _is_number(hierarchy[level]):
+                errors.append(f"driver_hierarchy.{level}: must be a number")
+    return errors
+
+
+def unresolved_primary_sectors(config: dict) -> List[str]:
+    """
+    valuation_groups whose primary_sector is not a sectors / sectors_extended
+    key. Warning only: build_group_row and GroupAnalystAgent fall back to an
+    empty sector config for these.
+    """
+    known = set(config.get('sectors') or {}) | set(config.get('sectors_extended') or {})
+    return [f"valuation_groups.{name}.primary_sector: unknown sector '{group['primary_sector']}'"
+            for name, group in (config.get('valuation_groups') or {}).items()
+            if group.get('primary_sector') and group['primary_sector'] not in known]
+
+
+# =============================================================================
+# MODEL
+# =============================================================================
+
+@dataclass
+class SectorsModel:
+    path: str
+    stamp: tuple
+    raw_blob: bytes                                   # pickle of the parsed YAML (for config_copy)
+    groups: Dict[str, GroupSpec] = field(default_factory=dict)
+    sectors: Dict[str, SectorSpec] = field(default_factory=dict)
+    subgroup_group: Dict[str, str] = field(default_factory=dict)
+    subgroup_sector: Dict[str, str] = field(default_factory=dict)
+    subgroup_drivers: Dict[str, Tuple[DriverSpec, ...]] = field(default_factory=dict)
+    macro_links: Dict[tuple, MacroLink] = field(default_factory=dict)
+    industry_sectors: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self._raw = None
+
+    # -------------------------------------------------------------------------
+    # Raw config
+    # -------------------------------------------------------------------------
+
+    @property
+    def raw(self) -> dict:
+        """Parsed YAML, shared across callers (read-only by convention)."""
+        if self._raw is None:
+            self._raw = pickle.loads(self.raw_blob)
+        return self._raw
+
+    def config_copy(self) -> dict:
+        """Fresh, caller-owned copy of the parsed YAML."""
+        return pickle.loads(self.raw_blob)
+
+    # -------------------------------------------------------------------------
+    # Queries
+    # -------------------------------------------------------------------------
+
+    def subgroups_of(self, valuation_group: str) -> Tuple[str, ...]:
+        group = self.groups.get(valuation_group)
+        return group.subgroups if group else ()
+
+    def group_of(self, valuation_subgroup: str) -> Optional[str]:
+        return self.subgroup_group.get(valuation_subgroup)
+
+    def sector(self, key: str) -> Optional[SectorSpec]:
+        return self.sectors.get(key)
+
+    def drivers_for_sector(self, key: str) -> Tuple[DriverSpec, ...]:
+        sector = self.sectors.get(key)
+        return sector.drivers if sector else ()
+
+    def drivers_for_subgroup(self, valuation_subgroup: str) -> Tuple[DriverSpec, ...]:
+        return self.subgroup_drivers.get(valuation_subgroup, ())
+
+    def macro_link(self, level: str, scope: str, driver_name: str) -> Optional[MacroLink]:
+        return self.macro_links.get((level, scope, driver_name))
+
+    def sectors_for_industry(self, industry: str) -> Tuple[str, ...]:
+        return self.industry_sectors.get((industry or '').strip().lower(), ())
+
+    def active_sectors(self) -> Dict[str, dict]:
+        """Same as config_loader.get_active_sectors on the raw config (shared dicts)."""
+        return {k: v for k, v in self.raw.get('sectors', {}).items() if v.get('is_active', False)}
+
+    def resolve_sector_config(self, valuation_group: str, valuation_subgroup: str = '') -> dict:
+        """
+        Sector config for a group/subgroup, GroupAnalystAgent's lookup order:
+        subgroup key (lowercase), then group key, following primary_sector /
+        primary_group. Returns a shared dict ({} when nothing matches).
+        """
+        sectors = self.raw.get('sectors', {})
+        subgroup_key = valuation_subgroup.lower() if valuation_subgroup else ''
+        if subgroup_key and subgroup_key in sectors:
+            return sectors.get(subgroup_key, {})
+        group_key = valuation_group.lower() if valuation_group else ''
+        config = sectors.get(group_key, {})
+        primary_group = config.get('primary_sector') or config.get('primary_group')
+        if primary_group and primary_group in sectors:
+            config = sectors.get(primary_group, {})
+        return config
+
+
+def _load_macro_links() -> Dict[tuple, MacroLink]:
+    try:
+        # Relative: also importable when storage/ scripts load this module as utils.sectors_config
+        from .populate_drivers import MACRO_LINK_MAPPINGS
+    except Exception as e:
+        logger.warning(f"Macro link mappings unavailable: {e}")
+        return {}
+    return {(level, scope, name): MacroLink(level, scope, name, macro, direction)
+            for level, name, scope, macro, direction in MACRO_LINK_MAPPINGS}
+
+
+def compile_sectors_model(config: dict, path: str = SECTORS_YAML, stamp: tuple = (),
+                          raw_blob: bytes = None) -> SectorsModel:
+    """Validate a parsed sectors.yaml and build the indexes. Raises SectorsConfigError."""
+    errors = validate_sectors_config(config)
+    if errors:
+        raise SectorsConfigError(f"{path}: {len(errors)} schema error(s):\n  " + '\n  '.join(errors))
+    for warning in unresolved_primary_sectors(config):
+        logger.warning(f"{os.path.basename(path)}: {warning}")
+
+    if raw_blob is None:
+        raw_blob = pickle.dumps(config, protocol=pickle.HIGHEST_PROTOCOL)
+    model = SectorsModel(path=path, stamp=stamp, raw_blob=raw_blob)
+    industry_sectors: Dict[str, List[str]] = {}
+    for extended, section in ((False, 'sectors'), (True, 'sectors_extended')):
+        for key, sector in (config.get(section) or {}).items():
+            drivers = tuple(
+                DriverSpec(name=d['name'], category=category, sector=key, weight=float(d.get('weight') or 0),
+                           metric=d.get('metric'), impact=d.get('impact'), sensitivity=d.get('sensitivity'),
+                           source=d.get('source'), frequency=d.get('frequency'))
+                for category in DRIVER_CATEGORIES for d in (sector.get(category) or []))
+            industry_filter = tuple(sector.get('csv_industry_filter') or ())
+            # sectors_extended overrides sectors on key clashes, like {**sectors, **sectors_extended}
+            model.sectors[key] = SectorSpec(key=key, csv_sector_name=sector.get('csv_sector_name'),
+                                            is_active=bool(sector.get('is_active', False)), extended=extended,
+                                            industry_filter=industry_filter, drivers=drivers)
+            for industry in industry_filter:
+                industry_sectors.setdefault(industry.strip().lower(), []).append(key)
+    model.industry_sectors = {k: tuple(v) for k, v in industry_sectors.items()}
+
+    for name, group in (config.get('valuation_groups') or {}).items():
+        subgroup_map = group.get('subgroups') or {}
+        model.groups[name] = GroupSpec(name=name, primary_sector=group.get('primary_sector'),
+                                       description=group.get('description', ''), subgroups=tuple(subgroup_map))
+        for subgroup, mapped in subgroup_map.items():
+            model.subgroup_group.setdefault(subgroup, name)
+            # Mapped sector key, then the subgroup's own key, then the group's primary sector
+            for key in (mapped, subgroup.lower(), group.get('primary_sector')):
+                if isinstance(key, str) and key in model.sectors:
+                    model.subgroup_sector.setdefault(subgroup, key)
+                    break
+    model.subgroup_drivers = {sub: model.sectors[key].drivers for sub, key in model.subgroup_sector.items()}
+
+    model.macro_links = _load_macro_links()
+    return model
+
+
+# =============================================================================
+# CACHE + SNAPSHOT
+# =============================================================================
+
+def _stat_stamp(path: str) -> tuple:
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return (None, None)
+
+
+def file_stamp(path: str) -> tuple:
+    """(mtime_ns, size) of the YAML plus SNAPSHOT_VERSION."""
+    return _stat_stamp(path) + (SNAPSHOT_VERSION,)
+
+
+def snapshot_path(path: str) -> str:
+    return f"{path}.pickle"
+
+
+def _read_snapshot(path: str, stamp: tuple) -> Optional[bytes]:
+    """Pickled parse from the snapshot if it was taken from this exact file version."""
+    try:
+        with open(snapshot_path(path), 'rb') as f:
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable sectors snapshot {snapshot_path(path)}: {e}")
+        return None
+    if not isinstance(snapshot, dict) or tuple(snapshot.get('stamp', ())) != stamp:
+        return None
+    return snapshot.get('config')
+
+
+def _write_snapshot(model: SectorsModel):
+    # Plain data only, so the file loads whichever package path imported this module
+    target = snapshot_path(model.path)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            pickle.dump({'stamp': model.stamp, 'config': model.raw_blob}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, target)
+    except OSError as e:
+        logger.debug(f"Sectors snapshot not written ({e})")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def build_sectors_model(path: str = SECTORS_YAML, use_snapshot: bool = None) -> SectorsModel:
+    """Model for path: snapshot if its stamp matches, else parse + validate + compile (+ write snapshot)."""
+    use_snapshot = SNAPSHOT_ENABLED if use_snapshot is None else use_snapshot
+    stamp = file_stamp(path)
+    raw_blob = _read_snapshot(path, stamp) if use_snapshot else None
+    if raw_blob is not None:
+        model = compile_sectors_model(pickle.loads(raw_blob), path, stamp, raw_blob)
+        logger.debug(f"Sectors config loaded from snapshot: {len(model.sectors)} sectors")
+        return model
+
+    with open(path, 'r') as f:
+        config = yaml.load(f, Loader=_YAML_LOADER)
+    model = compile_sectors_model(config, path, stamp)
+    logger.info(f"Compiled sectors config: {len(model.sectors)} sectors, {len(model.groups)} groups, "
+                f"{len(model.subgroup_group)} subgroups")
+    if use_snapshot:
+        _write_snapshot(model)
+    return model
+
+
+_MODELS: Dict[str, SectorsModel] = {}
+_LOCK = threading.Lock()
+
+
+def get_sectors_model(path: str = None) -> SectorsModel:
+    """
+    Process-wide compiled sectors config. One os.stat per call; recompiles
+    only when the YAML changed on disk.
+    """
+    path = os.path.abspath(path or SECTORS_YAML)
+    model = _MODELS.get(path)
+    if model is not None and model.stamp == file_stamp(path):
+        return model
+    with _LOCK:
+        model = _MODELS.get(path)
+        if model is None or model.stamp != file_stamp(path):
+            model = build_sectors_model(path)
+            _MODELS[path] = model
+    return model
+
+
+def clear_sectors_cache():
+    """Drop the in-process models (snapshots on disk are left alone)."""
+    with _LOCK:
+        _MODELS.clear()
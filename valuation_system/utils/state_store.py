@@ -0,0 +1,353 @@
+"""
+Run State Store
+SQLite-backed (WAL) state engine behind RunStateManager and
+GracefulDegradation. Replaces run_state.json / pending_operations.json,
+which were fully re-read and fully rewritten on every update — two runner
+processes (hourly, daily, webhook-spawned jobs) could silently lose each
+other's updates or leave a half-written file behind.
+
+- task_state: one row per task; every transition is a single UPDATE inside
+  its own transaction (consecutive_failures is incremented in SQL, not
+  read-modify-written in Python)
+- run_history: append-only log of every RUNNING / SUCCESS / FAILED transition
+- pending_ops: durable operation queue; replay leases rows to one owner for
+  lease_seconds so two replayers never run the same operation, and an
+  operation leased by a crashed process becomes available again on expiry
+- import_json(): one-time import of the legacy JSON files
+
+Usage:
+    store = StateStore('valuation_system/data/state/run_state.db')
+    store.record_success('daily_valuation', {'elapsed_seconds': 12.3})
+    store.get_task('daily_valuation')        # {'last_status': 'SUCCESS', ...}
+    op_id = store.enqueue({'type': 'mysql_insert', ...})
+    for op in store.lease('replayer-1'):     # [{'op_id': 1, 'operation': {...}, 'attempts': 0}]
+        store.ack([op['op_id']])
+
+Config (.env):
+    STATE_LEASE_SECONDS=600
+
+Edge Cases:
+- Legacy JSON files are imported once per path (marker in the meta table) and
+  left on disk untouched; rows already in the database win over JSON entries
+- Corrupt legacy JSON → logged and skipped, the database starts empty
+- run_history is never pruned by the store (a handful of rows per task per day)
+"""
+
+import os
+import json
+import socket
+import sqlite3
+import logging
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
+
+DB_FILENAME = 'run_state.db'
+LEASE_SECONDS = float(os.getenv('STATE_LEASE_SECONDS', 600))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS task_state (
+    task_name             TEXT PRIMARY KEY,
+    last_status           TEXT,
+    last_success          TEXT,
+    last_failure          TEXT,
+    last_error            TEXT,
+    consecutive_failures  INTEGER NOT NULL DEFAULT 0,
+    started_at            TEXT,
+    last_details          TEXT,
+    updated_at            TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS run_history (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_name   TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    at          TEXT NOT NULL,
+    details     TEXT,
+    error       TEXT,
+    pid         INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_run_history_task ON run_history (task_name, id);
+CREATE TABLE IF NOT EXISTS pending_ops (
+    op_id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    op_type        TEXT,
+    payload        TEXT NOT NULL,
+    queued_at      TEXT NOT NULL,
+    attempts       INTEGER NOT NULL DEFAULT 0,
+    last_error     TEXT,
+    lease_owner    TEXT,
+    lease_expires  TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_pending_ops_lease ON pending_ops (lease_expires);
+CREATE TABLE IF NOT EXISTS meta (
+    key    TEXT PRIMARY KEY,
+    value  TEXT
+);
+"""
+
+_TASK_FIELDS = ('last_status', 'last_success', 'last_failure', 'last_error',
+                'consecutive_failures', 'started_at', 'last_details')
+
+
+def lease_owner_id() -> str:
+    """Unique per-process/per-call owner tag: host:pid:random."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class StateStore:
+    """Every operation is one short transaction; writers use BEGIN IMMEDIATE."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _connect(self, immediate: bool = False):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    # -------------------------------------------------------------------------
+    # Task state
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def _task_dict(row: sqlite3.Row) -> dict:
+        entry = {k: row[k] for k in _TASK_FIELDS if row[k] is not None}
+        entry['consecutive_failures'] = row['consecutive_failures'] or 0
+        if 'last_details' in entry:
+            try:
+                entry['last_details'] = json.loads(entry['last_details'])
+            except (TypeError, ValueError):
+                pass
+        return entry
+
+    def get_task(self, task_name: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM task_state WHERE task_name = ?", (task_name,)).fetchone()
+        return self._task_dict(row) if row else None
+
+    def all_tasks(self) -> Dict[str, dict]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM task_state ORDER BY task_name").fetchall()
+        return {row['task_name']: self._task_dict(row) for row in rows}
+
+    @staticmethod
+    def _ensure_task(conn, task_name: str, now: str):
+        conn.execute("INSERT OR IGNORE INTO task_state (task_name, updated_at) VALUES (?, ?)",
+                     (task_name, now))
+
+    @staticmethod
+    def _append_history(conn, task_name: str, status: str, now: str,
+                        details: dict = None, error: str = None):
+        conn.execute(
+            "INSERT INTO run_history (task_name, status, at, details, error, pid) VALUES (?, ?, ?, ?, ?, ?)",
+            (task_name, status, now, json.dumps(details, default=str) if details is not None else None,
+             error, os.getpid())
+        )
+
+    def record_success(self, task_name: str, details: dict = None):
+        now = datetime.now().isoformat()
+        with self._connect(immediate=True) as conn:
+            self._ensure_task(conn, task_name, now)
+            conn.execute(
+                "UPDATE task_state SET last_success = ?, last_status = 'SUCCESS', consecutive_failures = 0, "
+                "last_details = ?, updated_at = ? WHERE task_name = ?",
+                (now, json.dumps(details or {}, default=str), now, task_name)
+            )
+            self._append_history(conn, task_name, 'SUCCESS', now, details=details or {})
+
+    def record_failure(self, task_name: str, error: str) -> int:
+        """Returns the new consecutive failure count."""
+        now = datetime.now().isoformat()
+        with self._connect(immediate=True) as conn:
+            self._ensure_task(conn, task_name, now)
+            conn.execute(
+                "UPDATE task_state SET last_failure = ?, last_status = 'FAILED', last_error = ?, "
+                "consecutive_failures = consecutive_failures + 1, updated_at = ? WHERE task_name = ?",
+                (now, error, now, task_name)
+            )
+            self._append_history(conn, task_name, 'FAILED', now, error=error)
+            row = conn.execute("SELECT consecutive_failures FROM task_state WHERE task_name = ?",
+                               (task_name,)).fetchone()
+        return row['consecutive_failures']
+
+    def mark_running(self, task_name: str, stale_after_seconds: float = None) -> bool:
+        """
+        Set the task RUNNING. With stale_after_seconds, this is a check-and-set:
+        it returns False (and changes nothing) when the task is already RUNNING
+        and its lock is younger than stale_after_seconds.
+        """
+        now_dt = datetime.now()
+        now = now_dt.isoformat()
+        with self._connect(immediate=True) as conn:
+            if stale_after_seconds is not None:
+                row = conn.execute("SELECT last_status, started_at FROM task_state WHERE task_name = ?",
+                                   (task_name,)).fetchone()
+                if row and row['last_status'] == 'RUNNING' and row['started_at'] and \
+                        row['started_at'] > (now_dt - timedelta(seconds=stale_after_seconds)).isoformat():
+                    return False
+            self._ensure_task(conn, task_name, now)
+            conn.execute("UPDATE task_state SET last_status = 'RUNNING', started_at = ?, updated_at = ? "
+                         "WHERE task_name = ?", (now, now, task_name))
+            self._append_history(conn, task_name, 'RUNNING', now)
+        return True
+
+    def history(self, task_name: str = None, limit: int = 50) -> List[dict]:
+        """Most recent transitions first."""
+        sql = "SELECT * FROM run_history"
+        params: tuple = ()
+        if task_name:
+            sql += " WHERE task_name = ?"
+            params = (task_name,)
+        with self._connect() as conn:
+            rows = conn.execute(sql + " ORDER BY id DESC LIMIT ?", params + (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    # -------------------------------------------------------------------------
+    # Operation queue
+    # -------------------------------------------------------------------------
+
+    def enqueue(self, operation: dict) -> int:
+        with self._connect() as conn:
+            cur = conn.execute(
+                "INSERT INTO pending_ops (op_type, payload, queued_at) VALUES (?, ?, ?)",
+                (operation.get('type'), json.dumps(operation, default=str),
+                 operation.get('queued_at') or datetime.now().isoformat())
+            )
+            return cur.lastrowid
+
+    def lease(self, owner: str, limit: int = None, lease_seconds: float = LEASE_SECONDS) -> List[dict]:
+        """
+        Claim up to limit operations (oldest first) that are unleased or whose
+        lease has expired. They stay in the table until ack()ed.
+        """
+        now_dt = datetime.now()
+        now = now_dt.isoformat()
+        expires = (now_dt + timedelta(seconds=lease_seconds)).isoformat()
+        with self._connect(immediate=True) as conn:
+            rows = conn.execute(
+                "SELECT op_id, payload, attempts FROM pending_ops "
+                "WHERE lease_expires IS NULL OR lease_expires <= ? ORDER BY op_id LIMIT ?",
+                (now, -1 if limit is None else limit)
+            ).fetchall()
+            if rows:
+                ids = [row['op_id'] for row in rows]
+                conn.execute(
+                    f"UPDATE pending_ops SET lease_owner = ?, lease_expires = ? "
+                    f"WHERE op_id IN ({', '.join('?' * len(ids))})",
+                    (owner, expires, *ids)
+                )
+        return [{'op_id': row['op_id'], 'operation': json.loads(row['payload']), 'attempts': row['attempts']}
+                for row in rows]
+
+    def ack(self, op_ids: Iterable[int], owner: str = None) -> int:
+        """Delete completed operations. With owner, only rows still leased to it."""
+        ids = list(op_ids)
+        if not ids:
+            return 0
+        sql = f"DELETE FROM pending_ops WHERE op_id IN ({', '.join('?' * len(ids))})"
+        params = tuple(ids)
+        if owner:
+            sql += " AND lease_owner = ?"
+            params += (owner,)
+        with self._connect() as conn:
+            return conn.execute(sql, params).rowcount
+
+    def release(self, op_ids: Iterable[int], error: str = None, owner: str = None) -> int:
+        """Return failed operations to the queue with attempts + 1."""
+        ids = list(op_ids)
+        if not ids:
+            return 0
+        sql = (f"UPDATE pending_ops SET lease_owner = NULL, lease_expires = NULL, "
+               f"attempts = attempts + 1, last_error = ? WHERE op_id IN ({', '.join('?' * len(ids))})")
+        params = (error, *ids)
+        if owner:
+            sql += " AND lease_owner = ?"
+            params += (owner,)
+        with self._connect() as conn:
+            return conn.execute(sql, params).rowcount
+
+    def queue_size(self) -> int:
+        """Every queued operation, leased or not."""
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM pending_ops").fetchone()[0]
+
+    # -------------------------------------------------------------------------
+    # Legacy JSON import
+    # -------------------------------------------------------------------------
+
+    def import_json(self, run_state_path: str = None, queue_path: str = None) -> dict:
+        """
+        Import run_state.json (task dict) and pending_operations.json (list) once.
+        Returns {'tasks': n, 'operations': n} for what was imported this call.
+        """
+        imported = {'tasks': 0, 'operations': 0}
+        for kind, path in (('tasks', run_state_path), ('operations', queue_path)):
+            if not path or not os.path.exists(path):
+                continue
+            marker = f"json_import:{os.path.abspath(path)}"
+            with self._connect(immediate=True) as conn:
+                if conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+                    continue
+                try:
+                    with open(path, 'r') as f:
+                        data = json.load(f)
+                except Exception as e:
+                    logger.error(f"Legacy state file {path} unreadable, not imported: {e}")
+                    data = None
+                if kind == 'tasks' and isinstance(data, dict):
+                    imported['tasks'] = self._import_tasks(conn, data)
+                elif kind == 'operations' and isinstance(data, list):
+                    for op in data:
+                        if isinstance(op, dict):
+                            conn.execute(
+                                "INSERT INTO pending_ops (op_type, payload, queued_at) VALUES (?, ?, ?)",
+                                (op.get('type'), json.dumps(op, default=str),
+                                 op.get('queued_at') or datetime.now().isoformat())
+                            )
+                            imported['operations'] += 1
+                conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)",
+                             (marker, datetime.now().isoformat()))
+        if imported['tasks'] or imported['operations']:
+            logger.info(f"Imported legacy state into {self.db_path}: {imported['tasks']} tasks, "
+                        f"{imported['operations']} queued operations")
+        return imported
+
+    @staticmethod
+    def _import_tasks(conn, data: dict) -> int:
+        now = datetime.now().isoformat()
+        count = 0
+        for task_name, entry in data.items():
+            if not isinstance(entry, dict):
+                continue
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO task_state (task_name, last_status, last_success, last_failure, "
+                "last_error, consecutive_failures, started_at, last_details, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (task_name, entry.get('last_status'), entry.get('last_success'), entry.get('last_failure'),
+                 entry.get('last_error'), int(entry.get('consecutive_failures') or 0), entry.get('started_at'),
+                 json.dumps(entry['last_details'], default=str) if 'last_details' in entry else None, now)
+            )
+            count += cur.rowcount
+        return count
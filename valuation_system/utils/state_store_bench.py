@@ -0,0 +1,142 @@
+"""
+Run State Stress Benchmark
+Several processes hammer one state directory at once, the way the hourly,
+daily and webhook-spawned runners do, and the result is checked for lost
+updates:
+
+- Phase 1: each process records M failures of one shared task and queues
+  M operations
+- Phase 2 (SQLite only): R processes replay the queue concurrently; every
+  operation must be handled exactly once
+
+The legacy JSON engine (load once, rewrite the whole file per update) is
+reproduced here so the comparison survives the rewrite of resilience.py.
+
+Usage:
+    python -m valuation_system.utils.state_store_bench --processes 4 --iterations 200 --replayers 3
+
+Edge Cases:
+- The legacy queue file can be caught half-written by a reader, which then
+  sees an empty queue and rewrites it — those operations count as lost
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+import tempfile
+import multiprocessing
+from typing import List
+
+from valuation_system.utils.resilience import RunStateManager, GracefulDegradation
+
+logger = logging.getLogger(__name__)
+
+SHARED_TASK = 'stress_task'
+
+
+class LegacyJsonState:
+    """The pre-SQLite RunStateManager / GracefulDegradation persistence, trimmed to the two hot calls."""
+
+    def __init__(self, state_dir: str):
+        self._state_file = os.path.join(state_dir, 'run_state.json')
+        self._queue_file = os.path.join(state_dir, 'pending_operations.json')
+        self._state = self._load(self._state_file, {})
+
+    @staticmethod
+    def _load(path: str, default):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except Exception:
+            return default
+
+    def record_failure(self, task_name: str, error: str):
+        entry = self._state.setdefault(task_name, {})
+        entry.update(last_status='FAILED', last_error=error,
+                     consecutive_failures=entry.get('consecutive_failures', 0) + 1)
+        with open(self._state_file, 'w') as f:
+            json.dump(self._state, f, indent=2, default=str)
+
+    def queue_operation(self, operation: dict):
+        queue = self._load(self._queue_file, [])
+        queue.append(operation)
+        with open(self._queue_file, 'w') as f:
+            json.dump(queue, f, indent=2, default=str)
+
+
+def _writer(engine: str, state_dir: str, worker: int, iterations: int):
+    logging.disable(logging.CRITICAL)
+    state = LegacyJsonState(state_dir) if engine == 'json' else RunStateManager(state_dir=state_dir)
+    queue = state if engine == 'json' else GracefulDegradation(state_dir=state_dir)
+    for i in range(iterations):
+        state.record_failure(SHARED_TASK, f"w{worker}-{i}")
+        queue.queue_operation({'type': 'stress', 'key': f"{worker}:{i}"})
+
+
+def _replayer(state_dir: str, out_path: str):
+    logging.disable(logging.CRITICAL)
+    handled = []
+    GracefulDegradation(state_dir=state_dir).replay_queued_operations(lambda op: handled.append(op['key']))
+    with open(out_path, 'w') as f:
+        json.dump(handled, f)
+
+
+def _run_all(target, arg_list: List[tuple]):
+    procs = [multiprocessing.Process(target=target, args=args) for args in arg_list]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    failed = [p.exitcode for p in procs if p.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"{len(failed)} stress worker(s) exited abnormally: {failed}")
+
+
+def run_benchmark(processes: int = 4, iterations: int = 200, replayers: int = 3,
+                  engines=('json', 'sqlite')) -> List[dict]:
+    report = []
+    expected = processes * iterations
+    for engine in engines:
+        state_dir = tempfile.mkdtemp(prefix=f"state_stress_{engine}_")
+        start = time.perf_counter()
+        _run_all(_writer, [(engine, state_dir, w, iterations) for w in range(processes)])
+        elapsed = time.perf_counter() - start
+
+        row = {'engine': engine, 'processes': processes, 'iterations': iterations, 'expected': expected,
+               'elapsed_s': round(elapsed, 3), 'updates_per_s': round(2 * expected / elapsed)}
+        if engine == 'json':
+            state = LegacyJsonState._load(os.path.join(state_dir, 'run_state.json'), {})
+            queued = LegacyJsonState._load(os.path.join(state_dir, 'pending_operations.json'), [])
+            row.update(failures_counted=state.get(SHARED_TASK, {}).get('consecutive_failures', 0),
+                       queued=len(queued))
+        else:
+            manager = RunStateManager(state_dir=state_dir)
+            row.update(failures_counted=manager._entry(SHARED_TASK).get('consecutive_failures', 0),
+                       history_rows=len(manager.get_history(SHARED_TASK, limit=expected + 1)),
+                       queued=GracefulDegradation(state_dir=state_dir).get_queue_size())
+
+            outs = [os.path.join(state_dir, f"replayed_{r}.json") for r in range(replayers)]
+            _run_all(_replayer, [(state_dir, out) for out in outs])
+            handled = []
+            for out in outs:
+                with open(out) as f:
+                    handled.extend(json.load(f))
+            row.update(replayed=len(handled), replayed_unique=len(set(handled)),
+                       left_in_queue=GracefulDegradation(state_dir=state_dir).get_queue_size())
+        row['lost_updates'] = (expected - row['failures_counted']) + (expected - row['queued'])
+        report.append(row)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Multi-process run state stress test')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--replayers', type=int, default=3)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    for row in run_benchmark(args.processes, args.iterations, args.replayers):
+        print(row)
@@ -1,13 +1,22 @@
 """
 Structured Logger - JSON-formatted logging for agent activity tracking.
 Enables parsing agent metrics for dashboards and analysis.
+
+MySQL rows go through a shared background ActivityLogSink (bounded queue,
+multi-row inserts, spill-to-file when MySQL is down) unless
+ACTIVITY_LOG_ASYNC=0, which restores the synchronous per-call INSERT.
 """
 
+import os
 import json
 import logging
 from datetime import datetime
 from typing import Any, Dict, Optional
 
+from valuation_system.utils.activity_log_sink import ActivityLogSink, get_sink
+
+ASYNC_WRITES = os.getenv('ACTIVITY_LOG_ASYNC', '1') == '1'
+
 
 class StructuredLogger:
     """
@@ -17,10 +26,18 @@ class StructuredLogger:
     """
 
     def __init__(self, agent_name: str, logger: Optional[logging.Logger] = None,
-                 mysql_client=None):
+                 mysql_client=None, sink: Optional[ActivityLogSink] = None,
+                 async_writes: bool = ASYNC_WRITES):
         self.agent_name = agent_name
         self.logger = logger or logging.getLogger(f'valuation_system.{agent_name}')
         self.mysql = mysql_client  # Optional: if provided, logs persist to MySQL
+        self.sink = sink
+        if self.sink is None and mysql_client is not None and async_writes:
+            self.sink = get_sink(mysql_client)
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Wait until buffered activity rows are written (or spilled)."""
+        return self.sink.flush(timeout) if self.sink else True
 
     def log_action(self, action: str, metrics: Dict[str, Any] = None,
                    level: str = 'INFO', **kwargs):
@@ -152,10 +169,10 @@ class StructuredLogger:
     def _write_to_mysql(self, action: str, metrics: Dict[str, Any] = None,
                        extra_fields: Dict[str, Any] = None):
         """
-        Write log entry to MySQL vs_agent_activity_log table.
-        Silently skips if MySQL is unavailable (degrades gracefully).
+        Write log entry to MySQL vs_agent_activity_log table (queued on the
+        sink when async). Silently skips if MySQL is unavailable (degrades gracefully).
         """
-        if not self.mysql:
+        if not self.mysql and not self.sink:
             return  # MySQL not available, skip persistence
 
         try:
@@ -172,19 +189,25 @@ class StructuredLogger:
                 metrics_json.update({k: v for k, v in extra_fields.items()
                                    if k not in ('cycle_type', 'elapsed_ms', 'status', 'error_message')})
 
+            row = (
+                datetime.now().replace(microsecond=0),
+                self.agent_name,
+                cycle_type,
+                action,
+                json.dumps(metrics_json, default=str) if metrics_json else None,
+                elapsed_ms,
+                status,
+                error_message
+            )
+            if self.sink:
+                self.sink.submit(row)
+                return
+
             self.mysql.execute(
                 """INSERT INTO vs_agent_activity_log
-                   (agent_name, cycle_type, action, metrics, elapsed_ms, status, error_message)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s)""",
-                (
-                    self.agent_name,
-                    cycle_type,
-                    action,
-                    json.dumps(metrics_json) if metrics_json else None,
-                    elapsed_ms,
-                    status,
-                    error_message
-                )
+                   (timestamp, agent_name, cycle_type, action, metrics, elapsed_ms, status, error_message)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
+                row
             )
         except Exception as e:
             # Don't fail the agent if MySQL write fails - log and continue
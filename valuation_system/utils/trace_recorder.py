@@ -0,0 +1,178 @@
+"""
+Trace Recorder - bounded, lazily-formatted capture of a valuation run.
+Replaces the old per-run ListHandler on the valuation_system logger.
+
+Events are stored unformatted (template + args) in a ring buffer and only
+rendered when a consumer (Excel Computation Log tab) asks for the message.
+Per-subsystem levels let batch runs keep WARNING+ from noisy loaders while
+still recording INFO from the DCF model. Levels only narrow what reaches the
+recorder — the logger's own effective level still decides whether a record
+is created at all, so DEBUG capture needs that logger enabled for DEBUG.
+
+Config (.env):
+    TRACE_BUFFER_SIZE=5000
+    TRACE_LEVELS=models.dcf_model=DEBUG,data.loaders=WARNING
+"""
+
+import os
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
+
+ROOT_LOGGER_NAME = 'valuation_system'
+DEFAULT_BUFFER_SIZE = 5000
+
+
+class TraceEvent:
+    """
+    One captured event. Exposes the LogRecord attributes the Excel log sheet
+    reads (created, name, levelname, getMessage) so existing consumers work.
+    """
+
+    __slots__ = ('created', 'name', 'levelno', 'levelname', 'kind', 'msg', 'args', '_message')
+
+    def __init__(self, name: str, levelno: int, msg, args=(), kind: str = 'log',
+                 created: float = None):
+        self.created = created if created is not None else time.time()
+        self.name = name
+        self.levelno = levelno
+        self.levelname = logging.getLevelName(levelno)
+        self.kind = kind
+        self.msg = msg
+        self.args = args
+        self._message = None
+
+    def getMessage(self) -> str:
+        """Render the message on first access (lazy %-formatting, like LogRecord)."""
+        if self._message is None:
+            msg = str(self.msg)
+            if self.args:
+                try:
+                    msg = msg % self.args
+                except (TypeError, ValueError):
+                    msg = f"{msg} {self.args}"
+            self._message = msg
+        return self._message
+
+    def __repr__(self):
+        return f"TraceEvent({self.name}, {self.levelname}, {self.kind}, {self.getMessage()[:60]!r})"
+
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """
+    Parse 'subsystem=LEVEL,...' into {logger_name: levelno}.
+    Subsystem names may omit the 'valuation_system.' prefix.
+    """
+    levels = {}
+    for part in (spec or '').split(','):
+        if '=' not in part:
+            continue
+        name, level = (p.strip() for p in part.split('=', 1))
+        levelno = logging.getLevelName(level.upper())
+        if not name or not isinstance(levelno, int):
+            continue
+        if name != ROOT_LOGGER_NAME and not name.startswith(ROOT_LOGGER_NAME + '.'):
+            name = f"{ROOT_LOGGER_NAME}.{name}"
+        levels[name] = levelno
+    return levels
+
+
+class TraceRecorder(logging.Handler):
+    """
+    Logging handler that keeps the last N events of a run in a ring buffer.
+
+    - Stores record.msg/record.args, never calls format() on the hot path
+    - Per-subsystem minimum levels (longest logger-name prefix wins)
+    - record_event() for typed events that bypass the logging machinery
+    """
+
+    def __init__(self, capacity: int = None, levels: Dict[str, int] = None,
+                 default_level: int = logging.DEBUG):
+        super().__init__(level=logging.DEBUG)
+        self.capacity = capacity or int(os.getenv('TRACE_BUFFER_SIZE', DEFAULT_BUFFER_SIZE))
+        self.events = deque(maxlen=self.capacity)
+        self.levels = dict(levels or {})
+        self.default_level = default_level
+        self.total = 0
+        self._level_cache: Dict[str, int] = {}
+        self._attached_to: Optional[logging.Logger] = None
+
+    @classmethod
+    def from_env(cls) -> 'TraceRecorder':
+        """Build a recorder from TRACE_BUFFER_SIZE / TRACE_LEVELS."""
+        return cls(levels=parse_levels(os.getenv('TRACE_LEVELS', '')))
+
+    # ------------------------------------------------------------------
+    # Level resolution
+    # ------------------------------------------------------------------
+
+    def level_for(self, name: str) -> int:
+        """Minimum level recorded for a logger name (cached prefix lookup)."""
+        level = self._level_cache.get(name)
+        if level is None:
+            level = self.default_level
+            best = -1
+            for prefix, prefix_level in self.levels.items():
+                if (name == prefix or name.startswith(prefix + '.')) and len(prefix) > best:
+                    best = len(prefix)
+                    level = prefix_level
+            self._level_cache[name] = level
+        return level
+
+    def is_enabled_for(self, name: str, levelno: int) -> bool:
+        return levelno >= self.level_for(name)
+
+    # ------------------------------------------------------------------
+    # Capture
+    # ------------------------------------------------------------------
+
+    def emit(self, record: logging.LogRecord):
+        if record.levelno < self.level_for(record.name):
+            return
+        self.events.append(TraceEvent(record.name, record.levelno, record.msg,
+                                      record.args, created=record.created))
+        self.total += 1
+
+    def record_event(self, name: str, kind: str, msg: str, *args,
+                     level: int = logging.INFO):
+        """Record a typed event directly (formatting deferred until read)."""
+        if level < self.level_for(name):
+            return
+        self.events.append(TraceEvent(name, level, msg, args, kind=kind))
+        self.total += 1
+
+    @property
+    def dropped(self) -> int:
+        """Events evicted from the ring buffer."""
+        return max(0, self.total - len(self.events))
+
+    def attach(self, logger_name: str = ROOT_LOGGER_NAME):
+        self._attached_to = logging.getLogger(logger_name)
+        self._attached_to.addHandler(self)
+
+    def detach(self):
+        if self._attached_to is not None:
+            self._attached_to.removeHandler(self)
+            self._attached_to = None
+
+    @contextmanager
+    def capture(self, logger_name: str = ROOT_LOGGER_NAME):
+        """Attach for the duration of a with-block; always detaches."""
+        self.attach(logger_name)
+        try:
+            yield self
+        finally:
+            self.detach()
+
+    def get_records(self) -> list:
+        return list(self.events)
+
+    def clear(self):
+        self.events.clear()
+        self.total = 0